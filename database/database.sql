@@ -1,6 +1,6 @@
 -- ============================================================================
 -- NEXORYN TECH - Database Schema (PostgreSQL)
--- Version: 2.7 - Controlado por en comprobantes
+-- Version: 3.4 - Numeración de comprobantes
 -- ============================================================================
 
 -- Acquire advisory lock to prevent concurrent schema updates from multiple instances
@@ -218,6 +218,16 @@ CREATE TABLE IF NOT EXISTS app.articulo_stock_resumen (
   ultima_actualizacion TIMESTAMPTZ DEFAULT now()
 );
 
+-- Stock per article and deposit, maintained by app.fn_sync_stock_resumen
+CREATE TABLE IF NOT EXISTS app.articulo_stock_deposito (
+  id_articulo          BIGINT NOT NULL REFERENCES app.articulo(id) ON DELETE CASCADE,
+  id_deposito          BIGINT NOT NULL REFERENCES ref.deposito(id) ON DELETE CASCADE,
+  stock_actual         NUMERIC(14,4) NOT NULL DEFAULT 0,
+  ultima_actualizacion TIMESTAMPTZ DEFAULT now(),
+  PRIMARY KEY (id_articulo, id_deposito)
+);
+CREATE INDEX IF NOT EXISTS idx_stock_deposito_deposito ON app.articulo_stock_deposito (id_deposito, id_articulo);
+
 CREATE TABLE IF NOT EXISTS app.articulo_precio (
   id_articulo          BIGINT NOT NULL REFERENCES app.articulo(id) ON UPDATE CASCADE ON DELETE CASCADE,
   id_lista_precio      BIGINT NOT NULL REFERENCES ref.lista_precio(id) ON UPDATE CASCADE ON DELETE CASCADE,
@@ -258,6 +268,11 @@ CREATE TABLE IF NOT EXISTS app.documento (
   cae_vencimiento         DATE,
   cuit_emisor             VARCHAR(11),
   qr_data                 TEXT,
+  -- Payment summary, maintained by app.fn_sync_documento_pago
+  id_forma_pago           BIGINT REFERENCES ref.forma_pago(id) ON UPDATE CASCADE ON DELETE RESTRICT,
+  forma_pago              VARCHAR(50),
+  monto_pagado            NUMERIC(14,4) NOT NULL DEFAULT 0,
+  saldo_pendiente         NUMERIC(14,4) GENERATED ALWAYS AS (total - monto_pagado) STORED,
   CONSTRAINT ck_doc_estado CHECK (estado IN ('BORRADOR', 'CONFIRMADO', 'ANULADO', 'PAGADO')),
   CONSTRAINT ck_doc_desc CHECK (descuento_porcentaje >= 0 AND descuento_porcentaje <= 100),
   CONSTRAINT ck_doc_totales CHECK (TRUE), -- Relaxed to allow legacy negative values
@@ -340,9 +355,55 @@ CREATE TABLE IF NOT EXISTS app.remito_detalle (
   CONSTRAINT ck_remito_det_cant CHECK (cantidad > 0)
 );
 
+-- Batched mass price updates: one row per job, counters committed with each batch (resumable)
+CREATE TABLE IF NOT EXISTS app.actualizacion_masiva (
+  id                   BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+  estado               VARCHAR(12) NOT NULL DEFAULT 'EN_CURSO',
+  objetivo             VARCHAR(20) NOT NULL,
+  operacion            VARCHAR(20) NOT NULL,
+  valor                NUMERIC(14,4) NOT NULL,
+  id_lista_precio      BIGINT REFERENCES ref.lista_precio(id) ON DELETE SET NULL,
+  filtros              JSONB NOT NULL DEFAULT '{}'::jsonb,
+  ids                  BIGINT[],
+  tamano_lote          INTEGER NOT NULL,
+  total                INTEGER NOT NULL DEFAULT 0,
+  procesados           INTEGER NOT NULL DEFAULT 0,
+  actualizados         INTEGER NOT NULL DEFAULT 0,
+  omitidos             INTEGER NOT NULL DEFAULT 0,
+  ultimo_id            BIGINT NOT NULL DEFAULT 0,
+  error                TEXT,
+  id_usuario           BIGINT REFERENCES seguridad.usuario(id) ON DELETE SET NULL,
+  fecha_inicio         TIMESTAMPTZ NOT NULL DEFAULT now(),
+  fecha_actualizacion  TIMESTAMPTZ NOT NULL DEFAULT now(),
+  fecha_fin            TIMESTAMPTZ,
+  CONSTRAINT ck_actualizacion_masiva_estado CHECK (estado IN ('EN_CURSO', 'DETENIDO', 'CANCELADO', 'FALLIDO', 'COMPLETADO'))
+);
+
+-- DETENIDO (stopped by the user, resumable) came after the first version of the table
+DO $$
+BEGIN
+  IF NOT EXISTS (
+    SELECT 1 FROM pg_constraint
+    WHERE conname = 'ck_actualizacion_masiva_estado'
+      AND pg_get_constraintdef(oid) LIKE '%DETENIDO%'
+  ) THEN
+    ALTER TABLE app.actualizacion_masiva DROP CONSTRAINT IF EXISTS ck_actualizacion_masiva_estado;
+    ALTER TABLE app.actualizacion_masiva ADD CONSTRAINT ck_actualizacion_masiva_estado
+      CHECK (estado IN ('EN_CURSO', 'DETENIDO', 'CANCELADO', 'FALLIDO', 'COMPLETADO'));
+    DROP INDEX IF EXISTS app.idx_actualizacion_masiva_pendiente;
+  END IF;
+END $$;
+
+CREATE INDEX IF NOT EXISTS idx_actualizacion_masiva_pendiente ON app.actualizacion_masiva (id DESC)
+  WHERE estado IN ('EN_CURSO', 'DETENIDO', 'FALLIDO');
+
 -- Schema updates for existing tables (ensure columns exist before views)
 ALTER TABLE app.movimiento_articulo ADD COLUMN IF NOT EXISTS stock_resultante NUMERIC(14,4);
 ALTER TABLE app.documento ADD COLUMN IF NOT EXISTS controlado_por TEXT;
+ALTER TABLE app.documento ADD COLUMN IF NOT EXISTS id_forma_pago BIGINT REFERENCES ref.forma_pago(id) ON UPDATE CASCADE ON DELETE RESTRICT;
+ALTER TABLE app.documento ADD COLUMN IF NOT EXISTS forma_pago VARCHAR(50);
+ALTER TABLE app.documento ADD COLUMN IF NOT EXISTS monto_pagado NUMERIC(14,4) NOT NULL DEFAULT 0;
+ALTER TABLE app.documento ADD COLUMN IF NOT EXISTS saldo_pendiente NUMERIC(14,4) GENERATED ALWAYS AS (total - monto_pagado) STORED;
 ALTER TABLE app.documento_detalle ADD COLUMN IF NOT EXISTS descuento_importe NUMERIC(14,4) NOT NULL DEFAULT 0;
 ALTER TABLE app.documento_detalle ADD COLUMN IF NOT EXISTS unidades_por_bulto_historico INTEGER;
 ALTER TABLE app.articulo ADD COLUMN IF NOT EXISTS unidades_por_bulto INTEGER;
@@ -420,16 +481,14 @@ JOIN seguridad.rol r ON r.id = u.id_rol;
 DROP VIEW IF EXISTS app.v_stock_actual CASCADE;
 CREATE OR REPLACE VIEW app.v_stock_actual AS
 SELECT
-  ma.id_articulo,
+  sd.id_articulo,
   a.nombre AS articulo,
-  ma.id_deposito,
+  sd.id_deposito,
   d.nombre AS deposito,
-  SUM(ma.cantidad * tma.signo_stock) AS stock_actual
-FROM app.movimiento_articulo ma
-JOIN app.articulo a ON a.id = ma.id_articulo
-JOIN ref.deposito d ON d.id = ma.id_deposito
-JOIN ref.tipo_movimiento_articulo tma ON tma.id = ma.id_tipo_movimiento
-GROUP BY ma.id_articulo, a.nombre, ma.id_deposito, d.nombre;
+  sd.stock_actual::numeric AS stock_actual
+FROM app.articulo_stock_deposito sd
+JOIN app.articulo a ON a.id = sd.id_articulo
+JOIN ref.deposito d ON d.id = sd.id_deposito;
 
 DROP VIEW IF EXISTS app.v_stock_total CASCADE;
 CREATE OR REPLACE VIEW app.v_stock_total AS
@@ -543,7 +602,10 @@ SELECT
   ec.cuit AS cuit_receptor,
   u.nombre AS usuario,
   doc.id_usuario,
-  (SELECT fp.descripcion FROM app.pago p JOIN ref.forma_pago fp ON fp.id = p.id_forma_pago WHERE p.id_documento = doc.id ORDER BY p.id LIMIT 1) as forma_pago
+  doc.forma_pago,
+  doc.id_forma_pago,
+  doc.monto_pagado,
+  doc.saldo_pendiente
 FROM app.documento doc
 JOIN ref.tipo_documento td ON td.id = doc.id_tipo_documento
 JOIN app.entidad_comercial ec ON ec.id = doc.id_entidad_comercial
@@ -627,47 +689,113 @@ LEFT JOIN app.articulo_precio ap ON ap.id_articulo = a.id AND ap.id_lista_precio
 
 -- Auditoría en DB deshabilitada: los logs se escriben en archivos TXT diarios.
 
--- Function to keep stock summary synchronized
+-- Keeps app.articulo_stock_resumen, app.articulo_stock_deposito and
+-- movimiento_articulo.stock_resultante in sync.
+-- Statement-level (transition tables): one upsert per article and one UPDATE of
+-- stock_resultante per INSERT statement, however many lines it carries.
 CREATE OR REPLACE FUNCTION app.fn_sync_stock_resumen()
 RETURNS TRIGGER AS $$
-DECLARE
-  v_signo INTEGER;
-  v_new_stock NUMERIC(14,4);
 BEGIN
-  -- Get the sign from the movement type
-  SELECT signo_stock INTO v_signo 
-  FROM ref.tipo_movimiento_articulo 
-  WHERE id = COALESCE(NEW.id_tipo_movimiento, OLD.id_tipo_movimiento);
-
-  IF (TG_OP = 'INSERT') THEN
+  IF TG_OP = 'INSERT' THEN
+    -- One upsert per article and per (article, deposit), then stock_resultante
+    -- of every new movement in a single UPDATE
+    WITH mov AS (
+      SELECT n.id, n.id_articulo, n.id_deposito, n.cantidad * tm.signo_stock AS cambio
+      FROM new_rows n
+      JOIN ref.tipo_movimiento_articulo tm ON tm.id = n.id_tipo_movimiento
+    ),
+    delta AS (
+      SELECT id_articulo, SUM(cambio) AS cambio
+      FROM mov
+      GROUP BY id_articulo
+    ),
+    deposito AS (
+      INSERT INTO app.articulo_stock_deposito (id_articulo, id_deposito, stock_actual)
+      SELECT id_articulo, id_deposito, SUM(cambio) FROM mov GROUP BY id_articulo, id_deposito
+      ON CONFLICT (id_articulo, id_deposito) DO UPDATE
+      SET stock_actual = app.articulo_stock_deposito.stock_actual + EXCLUDED.stock_actual,
+          ultima_actualizacion = now()
+    ),
+    resumen AS (
+      INSERT INTO app.articulo_stock_resumen (id_articulo, stock_total)
+      SELECT id_articulo, cambio FROM delta
+      ON CONFLICT (id_articulo) DO UPDATE
+      SET stock_total = app.articulo_stock_resumen.stock_total + EXCLUDED.stock_total,
+          ultima_actualizacion = now()
+      RETURNING id_articulo, stock_total
+    ),
+    resultante AS (
+      SELECT mov.id,
+             r.stock_total - d.cambio
+               + SUM(mov.cambio) OVER (PARTITION BY mov.id_articulo ORDER BY mov.id) AS stock_resultante
+      FROM mov
+      JOIN delta d ON d.id_articulo = mov.id_articulo
+      JOIN resumen r ON r.id_articulo = mov.id_articulo
+    )
+    UPDATE app.movimiento_articulo m
+    SET stock_resultante = resultante.stock_resultante
+    FROM resultante
+    WHERE m.id = resultante.id;
+
+  ELSIF TG_OP = 'UPDATE' THEN
+    -- Net change per article/deposit (also when a movement moves to another one);
+    -- the stock_resultante UPDATE of the INSERT branch nets to zero and is skipped
+    WITH cambios AS (
+      SELECT o.id_articulo, o.id_deposito, -(o.cantidad * tm.signo_stock) AS cambio
+      FROM old_rows o
+      JOIN ref.tipo_movimiento_articulo tm ON tm.id = o.id_tipo_movimiento
+      UNION ALL
+      SELECT n.id_articulo, n.id_deposito, n.cantidad * tm.signo_stock
+      FROM new_rows n
+      JOIN ref.tipo_movimiento_articulo tm ON tm.id = n.id_tipo_movimiento
+    ),
+    deposito AS (
+      INSERT INTO app.articulo_stock_deposito (id_articulo, id_deposito, stock_actual)
+      SELECT id_articulo, id_deposito, SUM(cambio)
+      FROM cambios
+      GROUP BY id_articulo, id_deposito
+      HAVING SUM(cambio) <> 0
+      ON CONFLICT (id_articulo, id_deposito) DO UPDATE
+      SET stock_actual = app.articulo_stock_deposito.stock_actual + EXCLUDED.stock_actual,
+          ultima_actualizacion = now()
+    )
     INSERT INTO app.articulo_stock_resumen (id_articulo, stock_total)
-    VALUES (NEW.id_articulo, NEW.cantidad * v_signo)
-    ON CONFLICT (id_articulo) DO UPDATE 
-    SET stock_total = app.articulo_stock_resumen.stock_total + (NEW.cantidad * v_signo),
+    SELECT id_articulo, SUM(cambio)
+    FROM cambios
+    GROUP BY id_articulo
+    HAVING SUM(cambio) <> 0
+    ON CONFLICT (id_articulo) DO UPDATE
+    SET stock_total = app.articulo_stock_resumen.stock_total + EXCLUDED.stock_total,
         ultima_actualizacion = now();
-    
-    -- Get the new stock total and save it to the movement
-    SELECT stock_total INTO v_new_stock 
-    FROM app.articulo_stock_resumen 
-    WHERE id_articulo = NEW.id_articulo;
-    
-    UPDATE app.movimiento_articulo 
-    SET stock_resultante = v_new_stock 
-    WHERE id = NEW.id;
-            
-  ELSIF (TG_OP = 'UPDATE') THEN
-    UPDATE app.articulo_stock_resumen 
-    SET stock_total = stock_total - (OLD.cantidad * v_signo) + (NEW.cantidad * v_signo),
-        ultima_actualizacion = now()
-    WHERE id_articulo = NEW.id_articulo;
-        
-  ELSIF (TG_OP = 'DELETE') THEN
-    UPDATE app.articulo_stock_resumen 
-    SET stock_total = stock_total - (OLD.cantidad * v_signo),
+
+  ELSIF TG_OP = 'DELETE' THEN
+    WITH cambios AS (
+      SELECT o.id_articulo, o.id_deposito, o.cantidad * tm.signo_stock AS cambio
+      FROM old_rows o
+      JOIN ref.tipo_movimiento_articulo tm ON tm.id = o.id_tipo_movimiento
+    ),
+    deposito AS (
+      UPDATE app.articulo_stock_deposito sd
+      SET stock_actual = sd.stock_actual - d.cambio,
+          ultima_actualizacion = now()
+      FROM (
+        SELECT id_articulo, id_deposito, SUM(cambio) AS cambio
+        FROM cambios
+        GROUP BY id_articulo, id_deposito
+      ) d
+      WHERE sd.id_articulo = d.id_articulo AND sd.id_deposito = d.id_deposito
+    )
+    UPDATE app.articulo_stock_resumen sr
+    SET stock_total = sr.stock_total - d.cambio,
         ultima_actualizacion = now()
-    WHERE id_articulo = OLD.id_articulo;
+    FROM (
+      SELECT id_articulo, SUM(cambio) AS cambio
+      FROM cambios
+      GROUP BY id_articulo
+    ) d
+    WHERE sr.id_articulo = d.id_articulo;
   END IF;
-    
+
   RETURN NULL;
 END;
 $$ LANGUAGE plpgsql;
@@ -690,11 +818,84 @@ DROP TRIGGER IF EXISTS tr_audit_articulo ON app.articulo;
 
 DROP TRIGGER IF EXISTS tr_audit_entidad ON app.entidad_comercial;
 
--- Trigger for stock summary synchronization
+-- Triggers for stock summary synchronization (statement level)
 DROP TRIGGER IF EXISTS trg_sync_stock_resumen ON app.movimiento_articulo;
-CREATE TRIGGER trg_sync_stock_resumen
-AFTER INSERT OR UPDATE OR DELETE ON app.movimiento_articulo
-FOR EACH ROW EXECUTE FUNCTION app.fn_sync_stock_resumen();
+
+DROP TRIGGER IF EXISTS trg_sync_stock_resumen_ins ON app.movimiento_articulo;
+CREATE TRIGGER trg_sync_stock_resumen_ins
+AFTER INSERT ON app.movimiento_articulo
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION app.fn_sync_stock_resumen();
+
+DROP TRIGGER IF EXISTS trg_sync_stock_resumen_upd ON app.movimiento_articulo;
+CREATE TRIGGER trg_sync_stock_resumen_upd
+AFTER UPDATE ON app.movimiento_articulo
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION app.fn_sync_stock_resumen();
+
+DROP TRIGGER IF EXISTS trg_sync_stock_resumen_del ON app.movimiento_articulo;
+CREATE TRIGGER trg_sync_stock_resumen_del
+AFTER DELETE ON app.movimiento_articulo
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION app.fn_sync_stock_resumen();
+
+-- Catalog change notifications (clients LISTEN on 'nexoryn_catalog' to drop cached catalogs)
+CREATE OR REPLACE FUNCTION ref.fn_notify_catalog_change()
+RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM pg_notify('nexoryn_catalog', TG_TABLE_SCHEMA || '.' || TG_TABLE_NAME);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+  t RECORD;
+BEGIN
+  FOR t IN
+    SELECT schemaname, tablename FROM pg_tables
+    WHERE schemaname = 'ref'
+       OR (schemaname = 'app' AND tablename = 'entidad_comercial')
+  LOOP
+    EXECUTE format('DROP TRIGGER IF EXISTS trg_notify_catalog_change ON %I.%I', t.schemaname, t.tablename);
+    EXECUTE format(
+      'CREATE TRIGGER trg_notify_catalog_change '
+      'AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I.%I '
+      'FOR EACH STATEMENT EXECUTE FUNCTION ref.fn_notify_catalog_change()',
+      t.schemaname, t.tablename
+    );
+  END LOOP;
+END $$;
+
+-- Data change notifications (clients LISTEN on 'nexoryn_changes' to refresh open views)
+CREATE OR REPLACE FUNCTION app.fn_notify_data_change()
+RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM pg_notify('nexoryn_changes', TG_TABLE_SCHEMA || '.' || TG_TABLE_NAME);
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+DECLARE
+  t TEXT;
+BEGIN
+  FOREACH t IN ARRAY ARRAY[
+    'documento', 'articulo', 'movimiento_articulo', 'pago',
+    'movimiento_cuenta_corriente', 'remito'
+  ]
+  LOOP
+    IF to_regclass('app.' || t) IS NOT NULL THEN
+      EXECUTE format('DROP TRIGGER IF EXISTS trg_notify_data_change ON app.%I', t);
+      EXECUTE format(
+        'CREATE TRIGGER trg_notify_data_change '
+        'AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON app.%I '
+        'FOR EACH STATEMENT EXECUTE FUNCTION app.fn_notify_data_change()',
+        t
+      );
+    END IF;
+  END LOOP;
+END $$;
 
 -- Initialize the summary table with current totals (Ensures consistency if data exists)
 -- Initialize the summary table with current totals only if empty or missing data
@@ -711,6 +912,786 @@ BEGIN
   END IF;
 END $$;
 
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM app.articulo_stock_deposito LIMIT 1) THEN
+    INSERT INTO app.articulo_stock_deposito (id_articulo, id_deposito, stock_actual)
+    SELECT ma.id_articulo, ma.id_deposito, SUM(ma.cantidad * tma.signo_stock)
+    FROM app.movimiento_articulo ma
+    JOIN ref.tipo_movimiento_articulo tma ON tma.id = ma.id_tipo_movimiento
+    GROUP BY ma.id_articulo, ma.id_deposito;
+  END IF;
+END $$;
+
+-- ============================================================================
+-- ARTICLE LIST PROJECTION (denormalized copy of v_articulo_detallado)
+-- ============================================================================
+-- Maintained by triggers so list/count/filter queries avoid the 6-table join
+-- and can use trigram/composite indexes on marca, rubro and proveedor.
+CREATE TABLE IF NOT EXISTS app.articulo_listado (
+  id                     BIGINT PRIMARY KEY REFERENCES app.articulo(id) ON DELETE CASCADE,
+  id_articulo            BIGINT NOT NULL,
+  nombre                 VARCHAR(200) NOT NULL,
+  id_marca               BIGINT,
+  marca                  VARCHAR(100),
+  id_rubro               BIGINT,
+  rubro                  VARCHAR(100),
+  costo                  NUMERIC(14,4) NOT NULL DEFAULT 0,
+  id_tipo_iva            BIGINT,
+  porcentaje_iva         DECIMAL(6,2),
+  id_unidad_medida       BIGINT,
+  unidad_medida          VARCHAR(30),
+  unidad_abreviatura     VARCHAR(10),
+  id_proveedor           BIGINT,
+  proveedor              TEXT,
+  stock_minimo           NUMERIC(14,4) NOT NULL DEFAULT 0,
+  descuento_base         NUMERIC(6,2) NOT NULL DEFAULT 0,
+  redondeo               BOOLEAN NOT NULL DEFAULT FALSE,
+  porcentaje_ganancia_2  NUMERIC(6,2),
+  unidades_por_bulto     INTEGER,
+  activo                 BOOLEAN NOT NULL DEFAULT TRUE,
+  observacion            TEXT,
+  ubicacion              VARCHAR(100),
+  stock_actual           NUMERIC(14,4) NOT NULL DEFAULT 0,
+  precio_lista           NUMERIC(14,4),
+  codigo                 VARCHAR(80)
+);
+
+CREATE INDEX IF NOT EXISTS idx_art_listado_nombre ON app.articulo_listado (nombre, id);
+CREATE INDEX IF NOT EXISTS idx_art_listado_activo_nombre ON app.articulo_listado (activo, nombre, id);
+CREATE INDEX IF NOT EXISTS idx_art_listado_marca_nombre ON app.articulo_listado (id_marca, nombre, id);
+CREATE INDEX IF NOT EXISTS idx_art_listado_rubro_nombre ON app.articulo_listado (id_rubro, nombre, id);
+CREATE INDEX IF NOT EXISTS idx_art_listado_proveedor_nombre ON app.articulo_listado (id_proveedor, nombre, id);
+CREATE INDEX IF NOT EXISTS idx_art_listado_codigo ON app.articulo_listado (codigo);
+CREATE INDEX IF NOT EXISTS idx_art_listado_nombre_trgm ON app.articulo_listado USING gin (nombre gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_art_listado_codigo_trgm ON app.articulo_listado USING gin (codigo gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_art_listado_marca_trgm ON app.articulo_listado USING gin (marca gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_art_listado_rubro_trgm ON app.articulo_listado USING gin (rubro gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_art_listado_proveedor_trgm ON app.articulo_listado USING gin (proveedor gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_art_listado_bajo_minimo ON app.articulo_listado (nombre, id)
+  WHERE COALESCE(stock_actual, 0) < COALESCE(stock_minimo, 0);
+-- Dashboard counters (bajo_stock / sin_stock): index-only scans of small partial indexes
+CREATE INDEX IF NOT EXISTS idx_art_listado_stock_bajo ON app.articulo_listado (id)
+  WHERE stock_actual <= stock_minimo;
+CREATE INDEX IF NOT EXISTS idx_art_listado_sin_stock ON app.articulo_listado (id)
+  WHERE stock_actual <= 0;
+
+CREATE OR REPLACE FUNCTION app.fn_articulo_listado_refresh(p_ids BIGINT[])
+RETURNS VOID AS $$
+BEGIN
+  INSERT INTO app.articulo_listado (
+    id, id_articulo, nombre, id_marca, marca, id_rubro, rubro, costo, id_tipo_iva,
+    porcentaje_iva, id_unidad_medida, unidad_medida, unidad_abreviatura, id_proveedor,
+    proveedor, stock_minimo, descuento_base, redondeo, porcentaje_ganancia_2,
+    unidades_por_bulto, activo, observacion, ubicacion, stock_actual, precio_lista, codigo
+  )
+  SELECT
+    a.id, a.id, a.nombre, a.id_marca, m.nombre, a.id_rubro, r.nombre, a.costo, a.id_tipo_iva,
+    ti.porcentaje, a.id_unidad_medida, um.nombre, um.abreviatura, a.id_proveedor,
+    COALESCE(prov.razon_social, TRIM(COALESCE(prov.apellido, '') || ' ' || COALESCE(prov.nombre, ''))),
+    a.stock_minimo, a.descuento_base, a.redondeo, a.porcentaje_ganancia_2,
+    a.unidades_por_bulto, a.activo, a.observacion, a.ubicacion,
+    COALESCE(sr.stock_total, 0), ap.precio, a.codigo
+  FROM app.articulo a
+  LEFT JOIN ref.marca m ON m.id = a.id_marca
+  LEFT JOIN ref.rubro r ON r.id = a.id_rubro
+  LEFT JOIN ref.tipo_iva ti ON ti.id = a.id_tipo_iva
+  LEFT JOIN ref.unidad_medida um ON um.id = a.id_unidad_medida
+  LEFT JOIN app.entidad_comercial prov ON prov.id = a.id_proveedor
+  LEFT JOIN app.articulo_stock_resumen sr ON sr.id_articulo = a.id
+  LEFT JOIN app.articulo_precio ap ON ap.id_articulo = a.id AND ap.id_lista_precio = 1
+  WHERE a.id = ANY(p_ids)
+  ON CONFLICT (id) DO UPDATE SET
+    nombre = EXCLUDED.nombre,
+    id_marca = EXCLUDED.id_marca,
+    marca = EXCLUDED.marca,
+    id_rubro = EXCLUDED.id_rubro,
+    rubro = EXCLUDED.rubro,
+    costo = EXCLUDED.costo,
+    id_tipo_iva = EXCLUDED.id_tipo_iva,
+    porcentaje_iva = EXCLUDED.porcentaje_iva,
+    id_unidad_medida = EXCLUDED.id_unidad_medida,
+    unidad_medida = EXCLUDED.unidad_medida,
+    unidad_abreviatura = EXCLUDED.unidad_abreviatura,
+    id_proveedor = EXCLUDED.id_proveedor,
+    proveedor = EXCLUDED.proveedor,
+    stock_minimo = EXCLUDED.stock_minimo,
+    descuento_base = EXCLUDED.descuento_base,
+    redondeo = EXCLUDED.redondeo,
+    porcentaje_ganancia_2 = EXCLUDED.porcentaje_ganancia_2,
+    unidades_por_bulto = EXCLUDED.unidades_por_bulto,
+    activo = EXCLUDED.activo,
+    observacion = EXCLUDED.observacion,
+    ubicacion = EXCLUDED.ubicacion,
+    stock_actual = EXCLUDED.stock_actual,
+    precio_lista = EXCLUDED.precio_lista,
+    codigo = EXCLUDED.codigo;
+END;
+$$ LANGUAGE plpgsql;
+
+-- app.articulo: statement-level so mass updates refresh the projection in one pass
+CREATE OR REPLACE FUNCTION app.fn_trg_articulo_listado_articulo()
+RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM app.fn_articulo_listado_refresh(ARRAY(SELECT id FROM new_rows));
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_articulo_listado_ins ON app.articulo;
+CREATE TRIGGER trg_articulo_listado_ins
+AFTER INSERT ON app.articulo
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION app.fn_trg_articulo_listado_articulo();
+
+DROP TRIGGER IF EXISTS trg_articulo_listado_upd ON app.articulo;
+CREATE TRIGGER trg_articulo_listado_upd
+AFTER UPDATE ON app.articulo
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION app.fn_trg_articulo_listado_articulo();
+
+-- app.articulo_precio: only the base list (id 1) is projected
+CREATE OR REPLACE FUNCTION app.fn_trg_articulo_listado_precio()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    UPDATE app.articulo_listado al
+    SET precio_lista = NULL
+    FROM old_rows o
+    WHERE o.id_lista_precio = 1 AND al.id = o.id_articulo;
+  ELSE
+    UPDATE app.articulo_listado al
+    SET precio_lista = n.precio
+    FROM new_rows n
+    WHERE n.id_lista_precio = 1 AND al.id = n.id_articulo
+      AND al.precio_lista IS DISTINCT FROM n.precio;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_articulo_listado_precio_ins ON app.articulo_precio;
+CREATE TRIGGER trg_articulo_listado_precio_ins
+AFTER INSERT ON app.articulo_precio
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION app.fn_trg_articulo_listado_precio();
+
+DROP TRIGGER IF EXISTS trg_articulo_listado_precio_upd ON app.articulo_precio;
+CREATE TRIGGER trg_articulo_listado_precio_upd
+AFTER UPDATE ON app.articulo_precio
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION app.fn_trg_articulo_listado_precio();
+
+DROP TRIGGER IF EXISTS trg_articulo_listado_precio_del ON app.articulo_precio;
+CREATE TRIGGER trg_articulo_listado_precio_del
+AFTER DELETE ON app.articulo_precio
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION app.fn_trg_articulo_listado_precio();
+
+-- app.articulo_stock_resumen: written once per article and statement from fn_sync_stock_resumen
+CREATE OR REPLACE FUNCTION app.fn_trg_articulo_listado_stock()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'DELETE' THEN
+    UPDATE app.articulo_listado SET stock_actual = 0 WHERE id = OLD.id_articulo;
+  ELSE
+    UPDATE app.articulo_listado
+    SET stock_actual = NEW.stock_total
+    WHERE id = NEW.id_articulo AND stock_actual IS DISTINCT FROM NEW.stock_total;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_articulo_listado_stock ON app.articulo_stock_resumen;
+CREATE TRIGGER trg_articulo_listado_stock
+AFTER INSERT OR UPDATE OR DELETE ON app.articulo_stock_resumen
+FOR EACH ROW EXECUTE FUNCTION app.fn_trg_articulo_listado_stock();
+
+-- Lookup tables: propagate renames to the denormalized columns
+CREATE OR REPLACE FUNCTION app.fn_trg_articulo_listado_lookup()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_TABLE_NAME = 'marca' THEN
+    UPDATE app.articulo_listado SET marca = NEW.nombre WHERE id_marca = NEW.id;
+  ELSIF TG_TABLE_NAME = 'rubro' THEN
+    UPDATE app.articulo_listado SET rubro = NEW.nombre WHERE id_rubro = NEW.id;
+  ELSIF TG_TABLE_NAME = 'tipo_iva' THEN
+    UPDATE app.articulo_listado SET porcentaje_iva = NEW.porcentaje WHERE id_tipo_iva = NEW.id;
+  ELSIF TG_TABLE_NAME = 'unidad_medida' THEN
+    UPDATE app.articulo_listado
+    SET unidad_medida = NEW.nombre, unidad_abreviatura = NEW.abreviatura
+    WHERE id_unidad_medida = NEW.id;
+  ELSIF TG_TABLE_NAME = 'entidad_comercial' THEN
+    UPDATE app.articulo_listado
+    SET proveedor = COALESCE(NEW.razon_social, TRIM(COALESCE(NEW.apellido, '') || ' ' || COALESCE(NEW.nombre, '')))
+    WHERE id_proveedor = NEW.id;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_articulo_listado_marca ON ref.marca;
+CREATE TRIGGER trg_articulo_listado_marca
+AFTER UPDATE OF nombre ON ref.marca
+FOR EACH ROW EXECUTE FUNCTION app.fn_trg_articulo_listado_lookup();
+
+DROP TRIGGER IF EXISTS trg_articulo_listado_rubro ON ref.rubro;
+CREATE TRIGGER trg_articulo_listado_rubro
+AFTER UPDATE OF nombre ON ref.rubro
+FOR EACH ROW EXECUTE FUNCTION app.fn_trg_articulo_listado_lookup();
+
+DROP TRIGGER IF EXISTS trg_articulo_listado_tipo_iva ON ref.tipo_iva;
+CREATE TRIGGER trg_articulo_listado_tipo_iva
+AFTER UPDATE OF porcentaje ON ref.tipo_iva
+FOR EACH ROW EXECUTE FUNCTION app.fn_trg_articulo_listado_lookup();
+
+DROP TRIGGER IF EXISTS trg_articulo_listado_unidad ON ref.unidad_medida;
+CREATE TRIGGER trg_articulo_listado_unidad
+AFTER UPDATE OF nombre, abreviatura ON ref.unidad_medida
+FOR EACH ROW EXECUTE FUNCTION app.fn_trg_articulo_listado_lookup();
+
+DROP TRIGGER IF EXISTS trg_articulo_listado_proveedor ON app.entidad_comercial;
+CREATE TRIGGER trg_articulo_listado_proveedor
+AFTER UPDATE OF razon_social, apellido, nombre ON app.entidad_comercial
+FOR EACH ROW EXECUTE FUNCTION app.fn_trg_articulo_listado_lookup();
+
+-- Backfill (also repairs rows missing after a partial restore)
+SELECT app.fn_articulo_listado_refresh(ARRAY(
+  SELECT a.id FROM app.articulo a
+  WHERE NOT EXISTS (SELECT 1 FROM app.articulo_listado al WHERE al.id = a.id)
+));
+
+-- ============================================================================
+-- DAILY SALES FACT TABLES (dashboard aggregates)
+-- ============================================================================
+-- Kept up to date by triggers on documento / pago / documento_detalle so the
+-- dashboard KPIs, charts and top/bottom articles read O(days) rows instead of
+-- scanning every document. Days are bucketed in the business time zone so the
+-- result does not depend on each session's TimeZone setting.
+
+-- Business time zone, named only here (the desktop_app migration mirrors it).
+-- fn_zona_negocio and fn_ventas_dia are IMMUTABLE on the assumption that this zone (and its UTC
+-- offset rules) never change for stored rows. After changing it, run
+-- app.fn_ventas_diarias_rebuild() so the stored days follow the new zone, and
+-- reconnect the sessions (cached plans may have folded the old value).
+CREATE OR REPLACE FUNCTION app.fn_zona_negocio()
+RETURNS TEXT AS $$
+  SELECT 'America/Argentina/Buenos_Aires'::text;
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION app.fn_ventas_dia(p_fecha TIMESTAMPTZ)
+RETURNS DATE AS $$
+  SELECT (p_fecha AT TIME ZONE app.fn_zona_negocio())::date;
+$$ LANGUAGE sql IMMUTABLE;
+
+-- id_forma_pago = 0: one row per document (cantidad = documentos, total, total_sin_pago).
+-- id_forma_pago > 0: payments of the documents in the bucket (cantidad = pagos, monto_pagado).
+CREATE TABLE IF NOT EXISTS app.ventas_diarias (
+  dia                DATE NOT NULL,
+  id_tipo_documento  BIGINT NOT NULL,
+  estado             VARCHAR(12) NOT NULL,
+  id_forma_pago      BIGINT NOT NULL DEFAULT 0,
+  cantidad           INTEGER NOT NULL DEFAULT 0,
+  total              NUMERIC(18,4) NOT NULL DEFAULT 0,
+  total_sin_pago     NUMERIC(18,4) NOT NULL DEFAULT 0,
+  monto_pagado       NUMERIC(18,4) NOT NULL DEFAULT 0,
+  PRIMARY KEY (dia, id_tipo_documento, estado, id_forma_pago)
+);
+
+CREATE TABLE IF NOT EXISTS app.ventas_diarias_articulo (
+  dia                DATE NOT NULL,
+  id_tipo_documento  BIGINT NOT NULL,
+  estado             VARCHAR(12) NOT NULL,
+  id_articulo        BIGINT NOT NULL,
+  cantidad           NUMERIC(18,4) NOT NULL DEFAULT 0,
+  total              NUMERIC(18,4) NOT NULL DEFAULT 0,
+  lineas             INTEGER NOT NULL DEFAULT 0,
+  PRIMARY KEY (dia, id_tipo_documento, estado, id_articulo)
+);
+
+CREATE INDEX IF NOT EXISTS idx_ventas_diarias_art_articulo ON app.ventas_diarias_articulo (id_articulo, dia);
+
+CREATE OR REPLACE FUNCTION app.fn_ventas_diarias_sumar(
+  p_dia DATE, p_tipo BIGINT, p_estado VARCHAR, p_forma BIGINT,
+  p_cantidad INTEGER, p_total NUMERIC, p_sin_pago NUMERIC, p_pagado NUMERIC
+)
+RETURNS VOID AS $$
+BEGIN
+  INSERT INTO app.ventas_diarias AS v (
+    dia, id_tipo_documento, estado, id_forma_pago, cantidad, total, total_sin_pago, monto_pagado
+  )
+  VALUES (p_dia, p_tipo, p_estado, p_forma, p_cantidad, p_total, p_sin_pago, p_pagado)
+  ON CONFLICT (dia, id_tipo_documento, estado, id_forma_pago) DO UPDATE SET
+    cantidad = v.cantidad + EXCLUDED.cantidad,
+    total = v.total + EXCLUDED.total,
+    total_sin_pago = v.total_sin_pago + EXCLUDED.total_sin_pago,
+    monto_pagado = v.monto_pagado + EXCLUDED.monto_pagado;
+  IF p_cantidad < 0 THEN
+    DELETE FROM app.ventas_diarias
+    WHERE dia = p_dia AND id_tipo_documento = p_tipo AND estado = p_estado
+      AND id_forma_pago = p_forma AND cantidad = 0;
+  END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION app.fn_ventas_diarias_articulo_sumar(
+  p_dia DATE, p_tipo BIGINT, p_estado VARCHAR, p_articulo BIGINT,
+  p_cantidad NUMERIC, p_total NUMERIC, p_lineas INTEGER
+)
+RETURNS VOID AS $$
+BEGIN
+  INSERT INTO app.ventas_diarias_articulo AS v (
+    dia, id_tipo_documento, estado, id_articulo, cantidad, total, lineas
+  )
+  VALUES (p_dia, p_tipo, p_estado, p_articulo, p_cantidad, p_total, p_lineas)
+  ON CONFLICT (dia, id_tipo_documento, estado, id_articulo) DO UPDATE SET
+    cantidad = v.cantidad + EXCLUDED.cantidad,
+    total = v.total + EXCLUDED.total,
+    lineas = v.lineas + EXCLUDED.lineas;
+  IF p_lineas < 0 THEN
+    DELETE FROM app.ventas_diarias_articulo
+    WHERE dia = p_dia AND id_tipo_documento = p_tipo AND estado = p_estado
+      AND id_articulo = p_articulo AND lineas = 0;
+  END IF;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Adds (p_signo = 1) or removes (p_signo = -1) a whole document, with its
+-- current payments and lines, from the buckets of the given header values.
+CREATE OR REPLACE FUNCTION app.fn_ventas_diarias_documento(
+  p_id BIGINT, p_fecha TIMESTAMPTZ, p_tipo BIGINT, p_estado VARCHAR, p_total NUMERIC, p_signo INTEGER
+)
+RETURNS VOID AS $$
+DECLARE
+  v_dia DATE := app.fn_ventas_dia(p_fecha);
+  v_pagado BOOLEAN := EXISTS (SELECT 1 FROM app.pago WHERE id_documento = p_id);
+  r RECORD;
+BEGIN
+  PERFORM app.fn_ventas_diarias_sumar(
+    v_dia, p_tipo, p_estado, 0, p_signo, p_signo * p_total,
+    CASE WHEN v_pagado THEN 0 ELSE p_signo * p_total END, 0
+  );
+  FOR r IN
+    SELECT id_forma_pago, COUNT(*)::int AS n, SUM(monto) AS monto
+    FROM app.pago WHERE id_documento = p_id
+    GROUP BY id_forma_pago
+  LOOP
+    PERFORM app.fn_ventas_diarias_sumar(v_dia, p_tipo, p_estado, r.id_forma_pago, p_signo * r.n, 0, 0, p_signo * r.monto);
+  END LOOP;
+  FOR r IN
+    SELECT id_articulo, SUM(cantidad) AS cantidad, SUM(total_linea) AS total, COUNT(*)::int AS n
+    FROM app.documento_detalle WHERE id_documento = p_id
+    GROUP BY id_articulo
+  LOOP
+    PERFORM app.fn_ventas_diarias_articulo_sumar(
+      v_dia, p_tipo, p_estado, r.id_articulo, p_signo * r.cantidad, p_signo * r.total, p_signo * r.n
+    );
+  END LOOP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- app.documento: move the document between buckets when a grouped column changes.
+-- DELETE runs BEFORE so payments and lines are still there (they cascade afterwards
+-- and their own triggers skip documents that no longer exist).
+CREATE OR REPLACE FUNCTION app.fn_trg_ventas_diarias_documento()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    PERFORM app.fn_ventas_diarias_documento(OLD.id, OLD.fecha, OLD.id_tipo_documento, OLD.estado, OLD.total, -1);
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    PERFORM app.fn_ventas_diarias_documento(NEW.id, NEW.fecha, NEW.id_tipo_documento, NEW.estado, NEW.total, 1);
+  END IF;
+  IF TG_OP = 'DELETE' THEN
+    RETURN OLD;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_ventas_diarias_documento_ins ON app.documento;
+CREATE TRIGGER trg_ventas_diarias_documento_ins
+AFTER INSERT ON app.documento
+FOR EACH ROW EXECUTE FUNCTION app.fn_trg_ventas_diarias_documento();
+
+DROP TRIGGER IF EXISTS trg_ventas_diarias_documento_upd ON app.documento;
+CREATE TRIGGER trg_ventas_diarias_documento_upd
+AFTER UPDATE OF fecha, id_tipo_documento, estado, total ON app.documento
+FOR EACH ROW
+WHEN (OLD.fecha IS DISTINCT FROM NEW.fecha
+   OR OLD.id_tipo_documento IS DISTINCT FROM NEW.id_tipo_documento
+   OR OLD.estado IS DISTINCT FROM NEW.estado
+   OR OLD.total IS DISTINCT FROM NEW.total)
+EXECUTE FUNCTION app.fn_trg_ventas_diarias_documento();
+
+DROP TRIGGER IF EXISTS trg_ventas_diarias_documento_del ON app.documento;
+CREATE TRIGGER trg_ventas_diarias_documento_del
+BEFORE DELETE ON app.documento
+FOR EACH ROW EXECUTE FUNCTION app.fn_trg_ventas_diarias_documento();
+
+-- app.pago: BEFORE so "first/last payment of the document" is checked against
+-- the rows that existed before this one (the document moves in/out of total_sin_pago).
+CREATE OR REPLACE FUNCTION app.fn_trg_ventas_diarias_pago()
+RETURNS TRIGGER AS $$
+DECLARE
+  d RECORD;
+  v_old_doc BIGINT;
+  v_new_doc BIGINT;
+BEGIN
+  IF TG_OP <> 'INSERT' THEN
+    v_old_doc := OLD.id_documento;
+  END IF;
+  IF TG_OP <> 'DELETE' THEN
+    v_new_doc := NEW.id_documento;
+  END IF;
+  IF TG_OP = 'UPDATE' THEN
+    IF v_old_doc IS NOT DISTINCT FROM v_new_doc
+       AND OLD.id_forma_pago = NEW.id_forma_pago AND OLD.monto = NEW.monto THEN
+      RETURN NEW;
+    END IF;
+  END IF;
+
+  IF v_old_doc IS NOT NULL THEN
+    SELECT id, fecha, id_tipo_documento, estado, total INTO d FROM app.documento WHERE id = v_old_doc;
+    IF FOUND THEN
+      PERFORM app.fn_ventas_diarias_sumar(
+        app.fn_ventas_dia(d.fecha), d.id_tipo_documento, d.estado, OLD.id_forma_pago, -1, 0, 0, -OLD.monto
+      );
+      IF v_old_doc IS DISTINCT FROM v_new_doc
+         AND NOT EXISTS (SELECT 1 FROM app.pago WHERE id_documento = v_old_doc AND id <> OLD.id) THEN
+        PERFORM app.fn_ventas_diarias_sumar(
+          app.fn_ventas_dia(d.fecha), d.id_tipo_documento, d.estado, 0, 0, 0, d.total, 0
+        );
+      END IF;
+    END IF;
+  END IF;
+
+  IF v_new_doc IS NOT NULL THEN
+    SELECT id, fecha, id_tipo_documento, estado, total INTO d FROM app.documento WHERE id = v_new_doc;
+    IF FOUND THEN
+      IF v_old_doc IS DISTINCT FROM v_new_doc
+         AND NOT EXISTS (SELECT 1 FROM app.pago WHERE id_documento = v_new_doc AND id <> NEW.id) THEN
+        PERFORM app.fn_ventas_diarias_sumar(
+          app.fn_ventas_dia(d.fecha), d.id_tipo_documento, d.estado, 0, 0, 0, -d.total, 0
+        );
+      END IF;
+      PERFORM app.fn_ventas_diarias_sumar(
+        app.fn_ventas_dia(d.fecha), d.id_tipo_documento, d.estado, NEW.id_forma_pago, 1, 0, 0, NEW.monto
+      );
+    END IF;
+  END IF;
+
+  IF TG_OP = 'DELETE' THEN
+    RETURN OLD;
+  END IF;
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_ventas_diarias_pago ON app.pago;
+CREATE TRIGGER trg_ventas_diarias_pago
+BEFORE INSERT OR UPDATE OR DELETE ON app.pago
+FOR EACH ROW EXECUTE FUNCTION app.fn_trg_ventas_diarias_pago();
+
+-- app.documento_detalle: per-article quantities and amounts
+CREATE OR REPLACE FUNCTION app.fn_trg_ventas_diarias_detalle()
+RETURNS TRIGGER AS $$
+DECLARE
+  d RECORD;
+BEGIN
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    SELECT fecha, id_tipo_documento, estado INTO d FROM app.documento WHERE id = OLD.id_documento;
+    IF FOUND THEN
+      PERFORM app.fn_ventas_diarias_articulo_sumar(
+        app.fn_ventas_dia(d.fecha), d.id_tipo_documento, d.estado, OLD.id_articulo,
+        -OLD.cantidad, -OLD.total_linea, -1
+      );
+    END IF;
+  END IF;
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    SELECT fecha, id_tipo_documento, estado INTO d FROM app.documento WHERE id = NEW.id_documento;
+    IF FOUND THEN
+      PERFORM app.fn_ventas_diarias_articulo_sumar(
+        app.fn_ventas_dia(d.fecha), d.id_tipo_documento, d.estado, NEW.id_articulo,
+        NEW.cantidad, NEW.total_linea, 1
+      );
+    END IF;
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_ventas_diarias_detalle ON app.documento_detalle;
+CREATE TRIGGER trg_ventas_diarias_detalle
+AFTER INSERT OR UPDATE OR DELETE ON app.documento_detalle
+FOR EACH ROW EXECUTE FUNCTION app.fn_trg_ventas_diarias_detalle();
+
+-- Full rebuild from the source tables (initial backfill and manual repair).
+-- p_zona buckets the days; the triggers use app.fn_zona_negocio(), so any other
+-- zone only stays consistent once fn_zona_negocio returns it as well.
+DROP FUNCTION IF EXISTS app.fn_ventas_diarias_rebuild();
+CREATE OR REPLACE FUNCTION app.fn_ventas_diarias_rebuild(p_zona TEXT DEFAULT app.fn_zona_negocio())
+RETURNS VOID AS $$
+BEGIN
+  LOCK TABLE app.documento, app.pago, app.documento_detalle IN SHARE MODE;
+  DELETE FROM app.ventas_diarias;
+  DELETE FROM app.ventas_diarias_articulo;
+
+  INSERT INTO app.ventas_diarias (dia, id_tipo_documento, estado, id_forma_pago, cantidad, total, total_sin_pago, monto_pagado)
+  SELECT
+    (d.fecha AT TIME ZONE p_zona)::date, d.id_tipo_documento, d.estado, 0,
+    COUNT(*), SUM(d.total),
+    COALESCE(SUM(d.total) FILTER (WHERE NOT EXISTS (SELECT 1 FROM app.pago p WHERE p.id_documento = d.id)), 0),
+    0
+  FROM app.documento d
+  GROUP BY 1, 2, 3;
+
+  INSERT INTO app.ventas_diarias (dia, id_tipo_documento, estado, id_forma_pago, cantidad, total, total_sin_pago, monto_pagado)
+  SELECT (d.fecha AT TIME ZONE p_zona)::date, d.id_tipo_documento, d.estado, p.id_forma_pago, COUNT(*), 0, 0, SUM(p.monto)
+  FROM app.pago p
+  JOIN app.documento d ON d.id = p.id_documento
+  GROUP BY 1, 2, 3, 4;
+
+  INSERT INTO app.ventas_diarias_articulo (dia, id_tipo_documento, estado, id_articulo, cantidad, total, lineas)
+  SELECT (d.fecha AT TIME ZONE p_zona)::date, d.id_tipo_documento, d.estado, dd.id_articulo,
+         SUM(dd.cantidad), SUM(dd.total_linea), COUNT(*)
+  FROM app.documento_detalle dd
+  JOIN app.documento d ON d.id = dd.id_documento
+  GROUP BY 1, 2, 3, 4;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Backfill once when the fact tables are new
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM app.ventas_diarias) AND EXISTS (SELECT 1 FROM app.documento) THEN
+    PERFORM app.fn_ventas_diarias_rebuild();
+  END IF;
+END $$;
+
+-- ============================================================================
+-- DOCUMENT PAYMENT SUMMARY (app.documento.forma_pago / monto_pagado)
+-- ============================================================================
+-- First payment method and paid amount of each document, kept by statement-level
+-- triggers on app.pago so comprobante lists, counts and sorts read plain columns
+-- instead of a correlated subquery per row. saldo_pendiente is generated.
+CREATE OR REPLACE FUNCTION app.fn_documento_pago_refresh(p_ids BIGINT[])
+RETURNS VOID AS $$
+  UPDATE app.documento d
+  SET id_forma_pago = s.id_forma_pago,
+      forma_pago = fp.descripcion,
+      monto_pagado = COALESCE(s.monto_pagado, 0)
+  FROM (SELECT DISTINCT unnest(p_ids) AS id) ids
+  LEFT JOIN (
+    SELECT DISTINCT ON (p.id_documento)
+           p.id_documento, p.id_forma_pago,
+           SUM(p.monto) OVER (PARTITION BY p.id_documento) AS monto_pagado
+    FROM app.pago p
+    WHERE p.id_documento IN (SELECT unnest(p_ids))
+    ORDER BY p.id_documento, p.id
+  ) s ON s.id_documento = ids.id
+  LEFT JOIN ref.forma_pago fp ON fp.id = s.id_forma_pago
+  WHERE d.id = ids.id
+    AND (d.id_forma_pago IS DISTINCT FROM s.id_forma_pago
+      OR d.forma_pago IS DISTINCT FROM fp.descripcion
+      OR d.monto_pagado IS DISTINCT FROM COALESCE(s.monto_pagado, 0));
+$$ LANGUAGE sql;
+
+CREATE OR REPLACE FUNCTION app.fn_sync_documento_pago()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'INSERT' THEN
+    PERFORM app.fn_documento_pago_refresh(ARRAY(
+      SELECT id_documento FROM new_rows WHERE id_documento IS NOT NULL
+    ));
+  ELSIF TG_OP = 'UPDATE' THEN
+    PERFORM app.fn_documento_pago_refresh(ARRAY(
+      SELECT id_documento FROM old_rows WHERE id_documento IS NOT NULL
+      UNION
+      SELECT id_documento FROM new_rows WHERE id_documento IS NOT NULL
+    ));
+  ELSIF TG_OP = 'DELETE' THEN
+    PERFORM app.fn_documento_pago_refresh(ARRAY(
+      SELECT id_documento FROM old_rows WHERE id_documento IS NOT NULL
+    ));
+  END IF;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_documento_pago_ins ON app.pago;
+CREATE TRIGGER trg_documento_pago_ins
+AFTER INSERT ON app.pago
+REFERENCING NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION app.fn_sync_documento_pago();
+
+DROP TRIGGER IF EXISTS trg_documento_pago_upd ON app.pago;
+CREATE TRIGGER trg_documento_pago_upd
+AFTER UPDATE ON app.pago
+REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+FOR EACH STATEMENT EXECUTE FUNCTION app.fn_sync_documento_pago();
+
+DROP TRIGGER IF EXISTS trg_documento_pago_del ON app.pago;
+CREATE TRIGGER trg_documento_pago_del
+AFTER DELETE ON app.pago
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION app.fn_sync_documento_pago();
+
+-- Renamed payment methods
+CREATE OR REPLACE FUNCTION app.fn_trg_documento_forma_pago_lookup()
+RETURNS TRIGGER AS $$
+BEGIN
+  UPDATE app.documento SET forma_pago = NEW.descripcion WHERE id_forma_pago = NEW.id;
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_documento_forma_pago ON ref.forma_pago;
+CREATE TRIGGER trg_documento_forma_pago
+AFTER UPDATE OF descripcion ON ref.forma_pago
+FOR EACH ROW EXECUTE FUNCTION app.fn_trg_documento_forma_pago_lookup();
+
+-- Full rebuild from app.pago (initial backfill and manual repair)
+CREATE OR REPLACE FUNCTION app.fn_documento_pago_rebuild()
+RETURNS VOID AS $$
+  UPDATE app.documento d
+  SET id_forma_pago = s.id_forma_pago,
+      forma_pago = fp.descripcion,
+      monto_pagado = s.monto_pagado
+  FROM (
+    SELECT DISTINCT ON (p.id_documento)
+           p.id_documento, p.id_forma_pago,
+           SUM(p.monto) OVER (PARTITION BY p.id_documento) AS monto_pagado
+    FROM app.pago p
+    WHERE p.id_documento IS NOT NULL
+    ORDER BY p.id_documento, p.id
+  ) s
+  LEFT JOIN ref.forma_pago fp ON fp.id = s.id_forma_pago
+  WHERE d.id = s.id_documento
+    AND (d.id_forma_pago IS DISTINCT FROM s.id_forma_pago
+      OR d.forma_pago IS DISTINCT FROM fp.descripcion
+      OR d.monto_pagado IS DISTINCT FROM s.monto_pagado);
+
+  UPDATE app.documento d
+  SET id_forma_pago = NULL, forma_pago = NULL, monto_pagado = 0
+  WHERE (d.id_forma_pago IS NOT NULL OR d.monto_pagado <> 0)
+    AND NOT EXISTS (SELECT 1 FROM app.pago p WHERE p.id_documento = d.id);
+$$ LANGUAGE sql;
+
+-- Backfill once when the columns are new (no document has a payment method yet)
+DO $$
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM app.documento WHERE id_forma_pago IS NOT NULL)
+     AND EXISTS (SELECT 1 FROM app.pago WHERE id_documento IS NOT NULL) THEN
+    PERFORM app.fn_documento_pago_rebuild();
+  END IF;
+END $$;
+
+-- ============================================================================
+-- DOCUMENT NUMBERING (app.numeracion_documento)
+-- ============================================================================
+-- Per-type counter taken in a short transaction of its own (Database.allocate_document_number)
+-- instead of a per-type lock held for the whole document save. Numbers that end up unused
+-- (failed saves, cancelled draft reservations) are recorded in
+-- app.numeracion_documento_pendiente: with politica_huecos = 'REUTILIZAR' they are issued
+-- again before the counter advances, with 'OMITIR' they stay as gaps.
+CREATE TABLE IF NOT EXISTS app.numeracion_documento (
+  id_tipo_documento    BIGINT PRIMARY KEY REFERENCES ref.tipo_documento(id) ON UPDATE CASCADE ON DELETE CASCADE,
+  ultimo_numero        BIGINT NOT NULL DEFAULT 0,
+  politica_huecos      VARCHAR(10) NOT NULL DEFAULT 'REUTILIZAR',
+  fecha_actualizacion  TIMESTAMPTZ NOT NULL DEFAULT now(),
+  CONSTRAINT ck_numeracion_politica CHECK (politica_huecos IN ('REUTILIZAR', 'OMITIR'))
+);
+
+CREATE TABLE IF NOT EXISTS app.numeracion_documento_pendiente (
+  id_tipo_documento  BIGINT NOT NULL REFERENCES ref.tipo_documento(id) ON UPDATE CASCADE ON DELETE CASCADE,
+  numero             BIGINT NOT NULL,
+  estado             VARCHAR(10) NOT NULL,
+  id_usuario         BIGINT REFERENCES seguridad.usuario(id) ON UPDATE CASCADE ON DELETE SET NULL,
+  fecha              TIMESTAMPTZ NOT NULL DEFAULT now(),
+  PRIMARY KEY (id_tipo_documento, numero),
+  CONSTRAINT ck_numeracion_pendiente_estado CHECK (estado IN ('RESERVADO', 'LIBERADO'))
+);
+CREATE INDEX IF NOT EXISTS idx_numeracion_liberado ON app.numeracion_documento_pendiente(id_tipo_documento, numero)
+  WHERE estado = 'LIBERADO';
+CREATE INDEX IF NOT EXISTS idx_numeracion_reservado_fecha ON app.numeracion_documento_pendiente(fecha)
+  WHERE estado = 'RESERVADO';
+
+-- Takes the next number of a document type: the lowest released one (REUTILIZAR) or
+-- counter + 1, skipping numbers typed by hand. The counter row stays locked until the
+-- caller commits, so call it in its own transaction.
+CREATE OR REPLACE FUNCTION app.fn_numero_documento_siguiente(p_tipo BIGINT)
+RETURNS BIGINT AS $$
+DECLARE
+  v_numero BIGINT;
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM app.numeracion_documento WHERE id_tipo_documento = p_tipo) THEN
+    INSERT INTO app.numeracion_documento (id_tipo_documento, ultimo_numero)
+    SELECT p_tipo, COALESCE(MAX(numero_serie::bigint), 0)
+    FROM app.documento
+    WHERE id_tipo_documento = p_tipo AND numero_serie ~ '^[0-9]+$'
+    ON CONFLICT (id_tipo_documento) DO NOTHING;
+  END IF;
+
+  LOOP
+    DELETE FROM app.numeracion_documento_pendiente p
+    WHERE (p.id_tipo_documento, p.numero) = (
+      SELECT l.id_tipo_documento, l.numero
+      FROM app.numeracion_documento_pendiente l
+      JOIN app.numeracion_documento n ON n.id_tipo_documento = l.id_tipo_documento
+      WHERE l.id_tipo_documento = p_tipo
+        AND l.estado = 'LIBERADO'
+        AND n.politica_huecos = 'REUTILIZAR'
+      ORDER BY l.numero
+      LIMIT 1
+      FOR UPDATE OF l SKIP LOCKED
+    )
+    RETURNING p.numero INTO v_numero;
+
+    IF v_numero IS NULL THEN
+      UPDATE app.numeracion_documento
+      SET ultimo_numero = ultimo_numero + 1,
+          fecha_actualizacion = now()
+      WHERE id_tipo_documento = p_tipo
+      RETURNING ultimo_numero INTO v_numero;
+    END IF;
+
+    EXIT WHEN NOT EXISTS (
+      SELECT 1 FROM app.documento
+      WHERE id_tipo_documento = p_tipo AND numero_serie = v_numero::text
+    );
+  END LOOP;
+  RETURN v_numero;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Number fn_numero_documento_siguiente would issue now (read-only preview)
+CREATE OR REPLACE FUNCTION app.fn_numero_documento_proximo(p_tipo BIGINT)
+RETURNS BIGINT AS $$
+  SELECT COALESCE(
+    (SELECT MIN(p.numero)
+     FROM app.numeracion_documento_pendiente p
+     JOIN app.numeracion_documento n ON n.id_tipo_documento = p.id_tipo_documento
+     WHERE p.id_tipo_documento = p_tipo AND p.estado = 'LIBERADO' AND n.politica_huecos = 'REUTILIZAR'),
+    (SELECT ultimo_numero + 1 FROM app.numeracion_documento WHERE id_tipo_documento = p_tipo),
+    (SELECT COALESCE(MAX(numero_serie::bigint), 0) + 1
+     FROM app.documento
+     WHERE id_tipo_documento = p_tipo AND numero_serie ~ '^[0-9]+$')
+  );
+$$ LANGUAGE sql STABLE;
+
+-- Hands back a number that was taken but not used (unless a document has it by now)
+CREATE OR REPLACE FUNCTION app.fn_numero_documento_liberar(p_tipo BIGINT, p_numero BIGINT)
+RETURNS VOID AS $$
+  INSERT INTO app.numeracion_documento_pendiente (id_tipo_documento, numero, estado, id_usuario)
+  SELECT p_tipo, p_numero, 'LIBERADO', NULLIF(current_setting('app.user_id', true), '')::BIGINT
+  WHERE NOT EXISTS (
+    SELECT 1 FROM app.documento WHERE id_tipo_documento = p_tipo AND numero_serie = p_numero::text
+  )
+  ON CONFLICT (id_tipo_documento, numero) DO UPDATE SET estado = 'LIBERADO', fecha = now();
+$$ LANGUAGE sql;
+
 -- ============================================================================
 -- INDEXES
 -- ============================================================================
@@ -753,6 +1734,9 @@ CREATE INDEX IF NOT EXISTS idx_doc_usuario ON app.documento(id_usuario);
 CREATE INDEX IF NOT EXISTS idx_doc_lista_precio ON app.documento(id_lista_precio);
 CREATE INDEX IF NOT EXISTS idx_doc_deposito ON app.documento(id_deposito);
 CREATE INDEX IF NOT EXISTS idx_doc_cae ON app.documento(cae) WHERE cae IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_doc_forma_pago ON app.documento(forma_pago, id);
+CREATE INDEX IF NOT EXISTS idx_doc_id_forma_pago_fecha ON app.documento(id_forma_pago, fecha DESC);
+CREATE INDEX IF NOT EXISTS idx_doc_saldo_pendiente ON app.documento(saldo_pendiente, id) WHERE saldo_pendiente > 0;
 
 -- Document detail indexes
 CREATE INDEX IF NOT EXISTS idx_det_articulo ON app.documento_detalle(id_articulo);
@@ -937,13 +1921,13 @@ ON CONFLICT (clave) DO NOTHING;
 DROP VIEW IF EXISTS app.v_reporte_ventas_mensual CASCADE;
 CREATE OR REPLACE VIEW app.v_reporte_ventas_mensual AS
 SELECT
-  date_trunc('month', d.fecha) AS mes,
-  SUM(d.total) AS total_ventas,
-  COUNT(d.id) AS cantidad_operaciones,
-  AVG(d.total) AS ticket_promedio
-FROM app.documento d
-JOIN ref.tipo_documento td ON d.id_tipo_documento = td.id
-WHERE td.clase = 'VENTA' AND d.estado IN ('CONFIRMADO', 'PAGADO')
+  date_trunc('month', vd.dia::timestamp) AS mes,
+  SUM(vd.total) AS total_ventas,
+  SUM(vd.cantidad)::bigint AS cantidad_operaciones,
+  SUM(vd.total) / NULLIF(SUM(vd.cantidad), 0) AS ticket_promedio
+FROM app.ventas_diarias vd
+JOIN ref.tipo_documento td ON vd.id_tipo_documento = td.id
+WHERE td.clase = 'VENTA' AND vd.estado IN ('CONFIRMADO', 'PAGADO') AND vd.id_forma_pago = 0
 GROUP BY 1
 ORDER BY 1 DESC;
 
@@ -953,31 +1937,20 @@ SELECT
   a.id AS id,
   a.nombre,
   r.nombre AS rubro,
-  SUM(dd.cantidad) AS cantidad_vendida,
-  SUM(dd.total_linea) AS total_facturado
-FROM app.documento_detalle dd
-JOIN app.documento d ON dd.id_documento = d.id
-JOIN app.articulo a ON dd.id_articulo = a.id
+  SUM(va.cantidad) AS cantidad_vendida,
+  SUM(va.total) AS total_facturado
+FROM app.ventas_diarias_articulo va
+JOIN app.articulo a ON va.id_articulo = a.id
 JOIN ref.rubro r ON a.id_rubro = r.id
-JOIN ref.tipo_documento td ON d.id_tipo_documento = td.id
+JOIN ref.tipo_documento td ON va.id_tipo_documento = td.id
 WHERE td.clase = 'VENTA' 
-  AND d.estado IN ('CONFIRMADO', 'PAGADO')
-  AND d.fecha >= date_trunc('month', now())
+  AND va.estado IN ('CONFIRMADO', 'PAGADO')
+  AND va.dia >= date_trunc('month', app.fn_ventas_dia(now())::timestamp)::date
 GROUP BY a.id, a.nombre, r.nombre
 ORDER BY total_facturado DESC
 LIMIT 20;
 
-DROP VIEW IF EXISTS app.v_deudores CASCADE;
-CREATE OR REPLACE VIEW app.v_deudores AS
-SELECT
-  ec.id,
-  COALESCE(ec.razon_social, ec.apellido || ' ' || ec.nombre) AS entidad,
-  ec.telefono,
-  lc.saldo_cuenta
-FROM app.lista_cliente lc
-JOIN app.entidad_comercial ec ON lc.id_entidad_comercial = ec.id
-WHERE lc.saldo_cuenta > 0
-ORDER BY lc.saldo_cuenta DESC;
+-- app.v_deudores se define con las cuentas corrientes (lee app.saldo_cuenta_corriente)
 
 -- ============================================================================
 -- ROW LEVEL SECURITY (RLS) POLICIES
@@ -1352,11 +2325,33 @@ CREATE TABLE IF NOT EXISTS app.saldo_cuenta_corriente (
     ultimo_movimiento     TIMESTAMPTZ,
     tipo_entidad          VARCHAR(10) NOT NULL,
     fecha_creacion        TIMESTAMPTZ NOT NULL DEFAULT now(),
+    total_movimientos     INTEGER NOT NULL DEFAULT 0,
+    fecha_ultimo_debito   TIMESTAMPTZ,
+    fecha_ultimo_credito  TIMESTAMPTZ,
+    saldo_0_30            NUMERIC(14,2) NOT NULL DEFAULT 0,
+    saldo_31_60           NUMERIC(14,2) NOT NULL DEFAULT 0,
+    saldo_61_90           NUMERIC(14,2) NOT NULL DEFAULT 0,
+    saldo_mas_90          NUMERIC(14,2) NOT NULL DEFAULT 0,
+    fecha_antiguedad      DATE,
     CONSTRAINT ck_saldo_tipo CHECK (tipo_entidad IN ('CLIENTE', 'PROVEEDOR'))
 );
 
+-- Contadores y antigüedad de deuda (bases existentes)
+ALTER TABLE app.saldo_cuenta_corriente
+    ADD COLUMN IF NOT EXISTS total_movimientos INTEGER NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS fecha_ultimo_debito TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS fecha_ultimo_credito TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS saldo_0_30 NUMERIC(14,2) NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS saldo_31_60 NUMERIC(14,2) NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS saldo_61_90 NUMERIC(14,2) NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS saldo_mas_90 NUMERIC(14,2) NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS fecha_antiguedad DATE;
+
 COMMENT ON TABLE app.saldo_cuenta_corriente IS 'Saldos de cuenta corriente unificados para clientes y proveedores';
 COMMENT ON COLUMN app.saldo_cuenta_corriente.saldo_actual IS 'Positivo = entidad debe dinero. Negativo = entidad tiene saldo a favor';
+COMMENT ON COLUMN app.saldo_cuenta_corriente.total_movimientos IS 'Cantidad de movimientos (mantenido por trg_sync_saldo_cc)';
+COMMENT ON COLUMN app.saldo_cuenta_corriente.saldo_mas_90 IS 'Saldo deudor con más de 90 días; los tramos suman el saldo deudor a la fecha_antiguedad';
+COMMENT ON COLUMN app.saldo_cuenta_corriente.fecha_antiguedad IS 'Día al que están calculados los tramos de antigüedad (fn_cuenta_corriente_conciliar)';
 
 -- Tabla de movimientos de cuenta corriente (auditoría completa)
 CREATE TABLE IF NOT EXISTS app.movimiento_cuenta_corriente (
@@ -1382,7 +2377,10 @@ COMMENT ON COLUMN app.movimiento_cuenta_corriente.tipo_movimiento IS 'DEBITO=aum
 
 -- Índices para movimientos de cuenta corriente
 CREATE INDEX IF NOT EXISTS idx_mov_cc_entidad ON app.movimiento_cuenta_corriente(id_entidad_comercial);
-CREATE INDEX IF NOT EXISTS idx_mov_cc_fecha ON app.movimiento_cuenta_corriente(fecha DESC);
+-- Cubre los totales del día de v_stats_cuenta_corriente (index-only scan)
+DROP INDEX IF EXISTS app.idx_mov_cc_fecha;
+CREATE INDEX IF NOT EXISTS idx_mov_cc_fecha_montos ON app.movimiento_cuenta_corriente(fecha DESC)
+    INCLUDE (tipo_movimiento, monto, anulado);
 CREATE INDEX IF NOT EXISTS idx_mov_cc_entidad_fecha ON app.movimiento_cuenta_corriente(id_entidad_comercial, fecha DESC);
 CREATE INDEX IF NOT EXISTS idx_mov_cc_documento ON app.movimiento_cuenta_corriente(id_documento) WHERE id_documento IS NOT NULL;
 CREATE INDEX IF NOT EXISTS idx_mov_cc_pago ON app.movimiento_cuenta_corriente(id_pago) WHERE id_pago IS NOT NULL;
@@ -1392,15 +2390,34 @@ CREATE INDEX IF NOT EXISTS idx_mov_cc_anulado ON app.movimiento_cuenta_corriente
 -- Índices para saldo_cuenta_corriente
 CREATE INDEX IF NOT EXISTS idx_saldo_cc_tipo ON app.saldo_cuenta_corriente(tipo_entidad);
 CREATE INDEX IF NOT EXISTS idx_saldo_cc_saldo ON app.saldo_cuenta_corriente(saldo_actual) WHERE saldo_actual != 0;
-CREATE INDEX IF NOT EXISTS idx_saldo_cc_deudores ON app.saldo_cuenta_corriente(saldo_actual DESC) WHERE saldo_actual > 0 AND tipo_entidad = 'CLIENTE';
+DROP INDEX IF EXISTS app.idx_saldo_cc_deudores;
+CREATE INDEX IF NOT EXISTS idx_saldo_cc_deudores_antiguedad ON app.saldo_cuenta_corriente(saldo_actual DESC)
+    INCLUDE (id_entidad_comercial, saldo_0_30, saldo_31_60, saldo_61_90, saldo_mas_90)
+    WHERE saldo_actual > 0 AND tipo_entidad = 'CLIENTE';
 CREATE INDEX IF NOT EXISTS idx_saldo_cc_acreedores ON app.saldo_cuenta_corriente(saldo_actual DESC) WHERE saldo_actual > 0 AND tipo_entidad = 'PROVEEDOR';
-
--- Trigger para mantener sincronizado el saldo
+CREATE INDEX IF NOT EXISTS idx_saldo_cc_mas_90 ON app.saldo_cuenta_corriente(saldo_mas_90 DESC) WHERE saldo_mas_90 > 0;
+CREATE INDEX IF NOT EXISTS idx_saldo_cc_ultimo_mov ON app.saldo_cuenta_corriente(ultimo_movimiento DESC NULLS LAST);
+CREATE INDEX IF NOT EXISTS idx_saldo_cc_total_mov ON app.saldo_cuenta_corriente(total_movimientos DESC);
+
+-- Trigger para mantener sincronizado el saldo, los contadores y la antigüedad de la deuda.
+-- La deuda nueva entra en el tramo de la fecha del movimiento; lo que baja el saldo
+-- deudor cancela primero los tramos más viejos. El paso de los días lo aplica
+-- fn_cuenta_corriente_conciliar (job nocturno).
 CREATE OR REPLACE FUNCTION app.fn_sync_saldo_cuenta_corriente()
 RETURNS TRIGGER AS $$
 DECLARE
-    v_saldo NUMERIC(14,2);
     v_tipo_entidad VARCHAR(10);
+    v_hoy DATE := app.fn_ventas_dia(now());
+    v_dias INTEGER := v_hoy - app.fn_ventas_dia(NEW.fecha);
+    v_es_debito BOOLEAN := NEW.tipo_movimiento IN ('DEBITO', 'AJUSTE_DEBITO');
+    v_es_credito BOOLEAN := NEW.tipo_movimiento IN ('CREDITO', 'AJUSTE_CREDITO');
+    -- Variación de la deuda (un saldo a favor no envejece)
+    v_delta NUMERIC(14,2) := GREATEST(NEW.saldo_nuevo, 0) - GREATEST(NEW.saldo_anterior, 0);
+    v_resto NUMERIC(14,2);
+    v_0_30 NUMERIC(14,2);
+    v_31_60 NUMERIC(14,2);
+    v_61_90 NUMERIC(14,2);
+    v_mas_90 NUMERIC(14,2);
 BEGIN
     -- Obtener tipo de entidad
     SELECT tipo INTO v_tipo_entidad FROM app.entidad_comercial WHERE id = NEW.id_entidad_comercial;
@@ -1409,11 +2426,46 @@ BEGIN
     END IF;
 
     -- Upsert en saldo_cuenta_corriente
-    INSERT INTO app.saldo_cuenta_corriente (id_entidad_comercial, saldo_actual, tipo_entidad, ultimo_movimiento)
-    VALUES (NEW.id_entidad_comercial, NEW.saldo_nuevo, v_tipo_entidad, NEW.fecha)
+    INSERT INTO app.saldo_cuenta_corriente AS s (
+        id_entidad_comercial, saldo_actual, tipo_entidad, ultimo_movimiento,
+        total_movimientos, fecha_ultimo_debito, fecha_ultimo_credito, fecha_antiguedad
+    )
+    VALUES (
+        NEW.id_entidad_comercial, NEW.saldo_nuevo, v_tipo_entidad, NEW.fecha,
+        1, CASE WHEN v_es_debito THEN NEW.fecha END, CASE WHEN v_es_credito THEN NEW.fecha END, v_hoy
+    )
     ON CONFLICT (id_entidad_comercial) DO UPDATE SET
         saldo_actual = EXCLUDED.saldo_actual,
-        ultimo_movimiento = EXCLUDED.ultimo_movimiento;
+        ultimo_movimiento = EXCLUDED.ultimo_movimiento,
+        total_movimientos = s.total_movimientos + 1,
+        fecha_ultimo_debito = GREATEST(s.fecha_ultimo_debito, EXCLUDED.fecha_ultimo_debito),
+        fecha_ultimo_credito = GREATEST(s.fecha_ultimo_credito, EXCLUDED.fecha_ultimo_credito)
+    RETURNING s.saldo_0_30, s.saldo_31_60, s.saldo_61_90, s.saldo_mas_90
+    INTO v_0_30, v_31_60, v_61_90, v_mas_90;
+
+    IF v_delta > 0 THEN
+        UPDATE app.saldo_cuenta_corriente SET
+            saldo_0_30 = saldo_0_30 + CASE WHEN v_dias <= 30 THEN v_delta ELSE 0 END,
+            saldo_31_60 = saldo_31_60 + CASE WHEN v_dias BETWEEN 31 AND 60 THEN v_delta ELSE 0 END,
+            saldo_61_90 = saldo_61_90 + CASE WHEN v_dias BETWEEN 61 AND 90 THEN v_delta ELSE 0 END,
+            saldo_mas_90 = saldo_mas_90 + CASE WHEN v_dias > 90 THEN v_delta ELSE 0 END
+        WHERE id_entidad_comercial = NEW.id_entidad_comercial;
+    ELSIF v_delta < 0 THEN
+        v_resto := -v_delta;
+        v_mas_90 := LEAST(v_mas_90, v_resto);
+        v_resto := v_resto - v_mas_90;
+        v_61_90 := LEAST(v_61_90, v_resto);
+        v_resto := v_resto - v_61_90;
+        v_31_60 := LEAST(v_31_60, v_resto);
+        v_resto := v_resto - v_31_60;
+        v_0_30 := LEAST(v_0_30, v_resto);
+        UPDATE app.saldo_cuenta_corriente SET
+            saldo_0_30 = saldo_0_30 - v_0_30,
+            saldo_31_60 = saldo_31_60 - v_31_60,
+            saldo_61_90 = saldo_61_90 - v_61_90,
+            saldo_mas_90 = saldo_mas_90 - v_mas_90
+        WHERE id_entidad_comercial = NEW.id_entidad_comercial;
+    END IF;
 
     -- También sincronizar con app.lista_cliente si existe
     UPDATE app.lista_cliente 
@@ -1424,12 +2476,94 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Recalcula contadores y tramos de antigüedad desde los movimientos (job nocturno y
+-- reparación manual). El saldo deudor se asigna a los débitos no anulados más recientes
+-- (los pagos cancelan primero lo más viejo); lo que no cubren (saldos migrados sin
+-- movimientos) queda en +90. Solo escribe las cuentas que cambian; devuelve cuántas.
+CREATE OR REPLACE FUNCTION app.fn_cuenta_corriente_conciliar(p_hoy DATE DEFAULT NULL)
+RETURNS INTEGER AS $$
+DECLARE
+    v_hoy DATE := COALESCE(p_hoy, app.fn_ventas_dia(now()));
+    v_filas INTEGER;
+BEGIN
+    WITH mov AS (
+        SELECT m.id_entidad_comercial,
+               COUNT(*)::INTEGER AS total_movimientos,
+               MAX(m.fecha) FILTER (WHERE m.tipo_movimiento IN ('DEBITO', 'AJUSTE_DEBITO')) AS fecha_ultimo_debito,
+               MAX(m.fecha) FILTER (WHERE m.tipo_movimiento IN ('CREDITO', 'AJUSTE_CREDITO')) AS fecha_ultimo_credito
+        FROM app.movimiento_cuenta_corriente m
+        GROUP BY m.id_entidad_comercial
+    ),
+    deb AS (
+        SELECT m.id_entidad_comercial,
+               v_hoy - app.fn_ventas_dia(m.fecha) AS dias,
+               LEAST(m.monto, GREATEST(s.saldo_actual - COALESCE(SUM(m.monto) OVER (
+                   PARTITION BY m.id_entidad_comercial ORDER BY m.fecha DESC, m.id DESC
+                   ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+               ), 0), 0)) AS pendiente
+        FROM app.movimiento_cuenta_corriente m
+        JOIN app.saldo_cuenta_corriente s ON s.id_entidad_comercial = m.id_entidad_comercial
+        WHERE s.saldo_actual > 0
+          AND NOT m.anulado
+          AND m.tipo_movimiento IN ('DEBITO', 'AJUSTE_DEBITO')
+    ),
+    tramos AS (
+        SELECT id_entidad_comercial,
+               SUM(pendiente) FILTER (WHERE dias <= 30) AS saldo_0_30,
+               SUM(pendiente) FILTER (WHERE dias BETWEEN 31 AND 60) AS saldo_31_60,
+               SUM(pendiente) FILTER (WHERE dias BETWEEN 61 AND 90) AS saldo_61_90,
+               SUM(pendiente) FILTER (WHERE dias > 90) AS saldo_mas_90,
+               SUM(pendiente) AS asignado
+        FROM deb
+        GROUP BY id_entidad_comercial
+    ),
+    calc AS (
+        SELECT s.id_entidad_comercial,
+               COALESCE(mv.total_movimientos, 0) AS total_movimientos,
+               mv.fecha_ultimo_debito,
+               mv.fecha_ultimo_credito,
+               ROUND(COALESCE(t.saldo_0_30, 0), 2) AS saldo_0_30,
+               ROUND(COALESCE(t.saldo_31_60, 0), 2) AS saldo_31_60,
+               ROUND(COALESCE(t.saldo_61_90, 0), 2) AS saldo_61_90,
+               ROUND(COALESCE(t.saldo_mas_90, 0) + GREATEST(s.saldo_actual - COALESCE(t.asignado, 0), 0), 2) AS saldo_mas_90
+        FROM app.saldo_cuenta_corriente s
+        LEFT JOIN mov mv ON mv.id_entidad_comercial = s.id_entidad_comercial
+        LEFT JOIN tramos t ON t.id_entidad_comercial = s.id_entidad_comercial
+    )
+    UPDATE app.saldo_cuenta_corriente s
+    SET total_movimientos = c.total_movimientos,
+        fecha_ultimo_debito = c.fecha_ultimo_debito,
+        fecha_ultimo_credito = c.fecha_ultimo_credito,
+        saldo_0_30 = c.saldo_0_30,
+        saldo_31_60 = c.saldo_31_60,
+        saldo_61_90 = c.saldo_61_90,
+        saldo_mas_90 = c.saldo_mas_90,
+        fecha_antiguedad = v_hoy
+    FROM calc c
+    WHERE s.id_entidad_comercial = c.id_entidad_comercial
+      AND (s.total_movimientos, s.fecha_ultimo_debito, s.fecha_ultimo_credito,
+           s.saldo_0_30, s.saldo_31_60, s.saldo_61_90, s.saldo_mas_90, s.fecha_antiguedad)
+          IS DISTINCT FROM
+          (c.total_movimientos, c.fecha_ultimo_debito, c.fecha_ultimo_credito,
+           c.saldo_0_30, c.saldo_31_60, c.saldo_61_90, c.saldo_mas_90, v_hoy);
+    GET DIAGNOSTICS v_filas = ROW_COUNT;
+    RETURN v_filas;
+END;
+$$ LANGUAGE plpgsql;
+
 DROP TRIGGER IF EXISTS trg_sync_saldo_cc ON app.movimiento_cuenta_corriente;
 CREATE TRIGGER trg_sync_saldo_cc
     AFTER INSERT ON app.movimiento_cuenta_corriente
     FOR EACH ROW
     EXECUTE FUNCTION app.fn_sync_saldo_cuenta_corriente();
 
+-- Change notifications (table is created after the generic TRIGGERS section)
+DROP TRIGGER IF EXISTS trg_notify_data_change ON app.movimiento_cuenta_corriente;
+CREATE TRIGGER trg_notify_data_change
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON app.movimiento_cuenta_corriente
+    FOR EACH STATEMENT
+    EXECUTE FUNCTION app.fn_notify_data_change();
+
 -- Función para registrar movimiento de cuenta corriente
 CREATE OR REPLACE FUNCTION app.registrar_movimiento_cc(
     p_id_entidad BIGINT,
@@ -1446,10 +2580,11 @@ DECLARE
     v_saldo_nuevo NUMERIC(14,4);
     v_mov_id BIGINT;
 BEGIN
-    -- Obtener saldo actual
+    -- Obtener saldo actual (bloqueado hasta el fin de la transacción: cajas concurrentes)
     SELECT COALESCE(saldo_actual, 0) INTO v_saldo_anterior
     FROM app.saldo_cuenta_corriente
-    WHERE id_entidad_comercial = p_id_entidad;
+    WHERE id_entidad_comercial = p_id_entidad
+    FOR UPDATE;
     
     IF NOT FOUND THEN
         v_saldo_anterior := 0;
@@ -1496,8 +2631,15 @@ SELECT
         ELSE 'AL_DIA'
     END AS estado_cuenta,
     s.ultimo_movimiento,
-    (SELECT COUNT(*) FROM app.movimiento_cuenta_corriente m WHERE m.id_entidad_comercial = s.id_entidad_comercial) AS total_movimientos,
-    e.activo
+    s.total_movimientos::BIGINT AS total_movimientos,
+    e.activo,
+    s.fecha_ultimo_debito,
+    s.fecha_ultimo_credito,
+    s.saldo_0_30,
+    s.saldo_31_60,
+    s.saldo_61_90,
+    s.saldo_mas_90,
+    s.fecha_antiguedad
 FROM app.saldo_cuenta_corriente s
 JOIN app.entidad_comercial e ON e.id = s.id_entidad_comercial;
 
@@ -1541,7 +2683,38 @@ SELECT
     (SELECT COALESCE(SUM(CASE WHEN tipo_movimiento IN ('CREDITO', 'AJUSTE_CREDITO') THEN monto ELSE 0 END), 0) 
      FROM app.movimiento_cuenta_corriente WHERE fecha >= CURRENT_DATE AND anulado = FALSE) AS cobros_hoy,
     (SELECT COALESCE(SUM(CASE WHEN tipo_movimiento IN ('DEBITO', 'AJUSTE_DEBITO') THEN monto ELSE 0 END), 0) 
-     FROM app.movimiento_cuenta_corriente WHERE fecha >= CURRENT_DATE AND anulado = FALSE) AS facturacion_hoy;
+     FROM app.movimiento_cuenta_corriente WHERE fecha >= CURRENT_DATE AND anulado = FALSE) AS facturacion_hoy,
+    d.deuda_0_30,
+    d.deuda_31_60,
+    d.deuda_61_90,
+    d.deuda_mas_90
+FROM (
+    SELECT
+        COALESCE(SUM(saldo_0_30), 0) AS deuda_0_30,
+        COALESCE(SUM(saldo_31_60), 0) AS deuda_31_60,
+        COALESCE(SUM(saldo_61_90), 0) AS deuda_61_90,
+        COALESCE(SUM(saldo_mas_90), 0) AS deuda_mas_90
+    FROM app.saldo_cuenta_corriente
+    WHERE saldo_actual > 0 AND tipo_entidad = 'CLIENTE'
+) d;
+
+-- Deudores del dashboard (lee el saldo mantenido, con antigüedad)
+DROP VIEW IF EXISTS app.v_deudores CASCADE;
+CREATE OR REPLACE VIEW app.v_deudores AS
+SELECT
+  ec.id,
+  COALESCE(ec.razon_social, ec.apellido || ' ' || ec.nombre) AS entidad,
+  ec.telefono,
+  s.saldo_actual AS saldo_cuenta,
+  s.saldo_0_30,
+  s.saldo_31_60,
+  s.saldo_61_90,
+  s.saldo_mas_90,
+  s.ultimo_movimiento
+FROM app.saldo_cuenta_corriente s
+JOIN app.entidad_comercial ec ON ec.id = s.id_entidad_comercial
+WHERE s.saldo_actual > 0 AND s.tipo_entidad = 'CLIENTE'
+ORDER BY s.saldo_actual DESC;
 
 -- Migrate existing saldo_cuenta from lista_cliente to new unified table
 INSERT INTO app.saldo_cuenta_corriente (id_entidad_comercial, saldo_actual, limite_credito, tipo_entidad)
@@ -1556,6 +2729,9 @@ ON CONFLICT (id_entidad_comercial) DO UPDATE SET
     saldo_actual = EXCLUDED.saldo_actual,
     limite_credito = EXCLUDED.limite_credito;
 
+-- Contadores y antigüedad de las cuentas existentes (idempotente)
+SELECT app.fn_cuenta_corriente_conciliar();
+
 -- Trigger auditoría para movimientos de cuenta corriente
 DROP TRIGGER IF EXISTS tr_audit_mov_cc ON app.movimiento_cuenta_corriente;
 
@@ -1598,9 +2774,9 @@ WHERE clave IN ('log_retencion_dias', 'log_directorio_archivo');
 -- VERSION STAMP
 -- ============================================================================
 INSERT INTO seguridad.config_sistema (clave, valor, tipo, descripcion)
-VALUES ('db_version', '2.7', 'TEXT', 'Versión actual de la base de datos')
+VALUES ('db_version', '3.4', 'TEXT', 'Versión actual de la base de datos')
 ON CONFLICT (clave) DO UPDATE 
-SET valor = '2.7';
+SET valor = '3.4';
 
 -- Release advisory lock
 SELECT pg_advisory_unlock(543210);
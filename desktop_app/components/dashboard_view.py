@@ -51,6 +51,18 @@ class DashboardView(ft.Container):
     
     VALID_ROLES = {"ADMIN", "GERENTE", "EMPLEADO"}
     
+    # Tables whose changes (from any terminal) trigger a refresh while mounted
+    WATCHED_TABLES = (
+        "app.documento",
+        "app.articulo",
+        "app.movimiento_articulo",
+        "app.pago",
+        "app.movimiento_cuenta_corriente",
+        "app.entidad_comercial",
+    )
+    # Minimum seconds between change-triggered refreshes (bursts are coalesced)
+    CHANGE_REFRESH_MIN_INTERVAL = 5.0
+    
     def __init__(self, database: Database, user_role: str = "EMPLEADO"):
         super().__init__()
         self.db = database
@@ -115,6 +127,8 @@ class DashboardView(ft.Container):
         self._stop_event = threading.Event()
         self._refresh_thread = None
         self._last_refresh_ts = 0.0
+        self._change_timer: Optional[threading.Timer] = None
+        self._unsubscribe_changes: Optional[Callable[[], None]] = None
         
         # Set lifecycle hooks
         self.on_mount = self._handle_mount
@@ -161,9 +175,36 @@ class DashboardView(ft.Container):
         self.load_data()
         if not self._refresh_thread or not self._refresh_thread.is_alive():
             self._start_refresh_thread()
+        if self._unsubscribe_changes is None and hasattr(self.db, "subscribe_changes"):
+            self._unsubscribe_changes = self.db.subscribe_changes(self.WATCHED_TABLES, self._on_tables_changed)
 
     def _handle_unmount(self, e):
         self._stop_event.set()
+        if self._unsubscribe_changes is not None:
+            self._unsubscribe_changes()
+            self._unsubscribe_changes = None
+        with self._request_lock:
+            if self._change_timer is not None:
+                self._change_timer.cancel()
+                self._change_timer = None
+
+    def _on_tables_changed(self, tables) -> None:
+        """Refresh after data changed in another view/terminal, at most every few seconds."""
+        if self._stop_event.is_set() or self.current_interval <= 0:
+            return
+        delay = self.CHANGE_REFRESH_MIN_INTERVAL - (time.monotonic() - self._last_refresh_ts)
+        with self._request_lock:
+            if self._change_timer is not None:
+                return
+            self._change_timer = threading.Timer(max(0.0, delay), self._refresh_after_change)
+            self._change_timer.daemon = True
+            self._change_timer.start()
+
+    def _refresh_after_change(self) -> None:
+        with self._request_lock:
+            self._change_timer = None
+        if not self._stop_event.is_set():
+            self.load_data(silent=True, force_refresh=True)
 
     def _start_refresh_thread(self):
         """Start the auto-refresh thread with configurable interval."""
@@ -201,7 +242,7 @@ class DashboardView(ft.Container):
         self._refresh_thread = threading.Thread(target=refresh_loop, daemon=True)
         self._refresh_thread.start()
 
-    def load_data(self, silent: bool = False):
+    def load_data(self, silent: bool = False, force_refresh: bool = False):
         """Load dashboard data. Uses background thread to avoid blocking UI."""
         
         with self._request_lock:
@@ -215,9 +256,16 @@ class DashboardView(ft.Container):
             self._show_skeleton()
         
         def fetch_in_background(req_id, period):
+            def on_refresh(fresh_stats):
+                # Cached data was stale: the background recompute finished
+                if not self._stop_event.is_set():
+                    self._on_data_loaded(fresh_stats, req_id)
+
             try:
                 # Pass current period to backend
-                stats = self.db.get_full_dashboard_stats(self.role, period=period)
+                stats = self.db.get_full_dashboard_stats(
+                    self.role, period=period, force_refresh=force_refresh, on_refresh=on_refresh
+                )
                 
                 # Check if this request is still valid
                 with self._request_lock:
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass, field
 from math import ceil
-from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
 
 import flet as ft
 import logging
@@ -23,6 +23,11 @@ DataProvider = Callable[
     [int, int, Optional[str], Optional[str], Dict[str, Any], SortSpec],
     Tuple[List[Dict[str, Any]], int],
 ]
+# Providers of tables built with keyset_pagination=True additionally accept the
+# keyword arguments `after` / `before` (opaque cursors taken from the
+# `next_cursor` / `prev_cursor` attributes of the rows they previously returned).
+# Database.subscribe_changes-compatible: (tables, callback(changed_tables)) -> unsubscribe
+ChangeSubscriber = Callable[[Sequence[str], Callable[[Set[str]], None]], Callable[[], None]]
 InlineEditCallback = Callable[[Any, Dict[str, Any]], None]
 MassEditCallback = Callable[[List[Any], Dict[str, Any]], None]
 MassDeleteCallback = Callable[[List[Any]], None]
@@ -56,6 +61,16 @@ def _expander(label: str, content: ft.Control) -> ft.Control:
     return ft.Column([header, body], spacing=0)
 
 
+def _format_total(total: int, estimated: bool = False) -> str:
+    if not estimated:
+        return str(total)
+    if total >= 1_000_000:
+        return f"~{total / 1_000_000:.1f}M"
+    if total >= 1_000:
+        return f"~{total / 1_000:.0f}k"
+    return f"~{total}"
+
+
 def _scroll_auto():
     scroll_mode = getattr(ft, "ScrollMode", None)
     if scroll_mode is not None and hasattr(scroll_mode, "AUTO"):
@@ -218,6 +233,7 @@ class GenericTable:
         page_size_options: Sequence[int] = (10, 25, 50),
         show_export_button: bool = False,
         show_export_scope: bool = False,
+        keyset_pagination: bool = False,
     ) -> None:
         super().__init__()
         self.columns = list(columns)
@@ -236,6 +252,10 @@ class GenericTable:
         self.auto_load = auto_load
         self.show_export_button = show_export_button
         self.show_export_scope = show_export_scope
+        self.keyset_pagination = keyset_pagination
+        self._next_cursor: Optional[str] = None
+        self._prev_cursor: Optional[str] = None
+        self._pending_cursor: Dict[str, str] = {}
         self.page = 1
         self.page_size = page_size
         self.page_size_options = list(page_size_options)
@@ -558,6 +578,7 @@ class GenericTable:
             border_radius=12,
         )
         self._loaded_once = False
+        self._unsubscribe_changes: Optional[Callable[[], None]] = None
         self.root: Optional[ft.Control] = None
         self._confirm_dialog = ft.AlertDialog(modal=True)
         self._edit_dialog = ft.AlertDialog(modal=True)
@@ -872,6 +893,40 @@ class GenericTable:
         self._refresh_data(silent=silent)
         self._loaded_once = True
 
+    def watch_changes(
+        self,
+        subscribe: ChangeSubscriber,
+        tables: Sequence[str],
+        *,
+        is_active: Optional[Callable[[], bool]] = None,
+        dispatch: Optional[Callable[..., Any]] = None,
+    ) -> None:
+        """
+        Silently refresh the current page when any of `tables` changes.
+
+        `is_active` lets the owner skip tables that are not on screen (they
+        reload when shown); `dispatch(fn, **kwargs)` runs the refresh on the UI
+        thread when the notification arrives from a background thread.
+        """
+        self.unwatch_changes()
+
+        def on_change(_tables: Set[str]) -> None:
+            if not self._loaded_once or self.edit_buffers:
+                return
+            if is_active is not None and not is_active():
+                return
+            if dispatch is not None:
+                dispatch(self.refresh, silent=True)
+            else:
+                self.refresh(silent=True)
+
+        self._unsubscribe_changes = subscribe(list(tables), on_change)
+
+    def unwatch_changes(self) -> None:
+        if self._unsubscribe_changes is not None:
+            self._unsubscribe_changes()
+            self._unsubscribe_changes = None
+
     def trigger_refresh(self) -> None:
         if self._search_timer:
             self._search_timer.cancel()
@@ -932,9 +987,43 @@ class GenericTable:
     def _goto_page(self, target: int) -> None:
         if target < 1 or target > self.total_pages:
             return
+        # Adjacent pages seek from the current page boundary; any other jump uses OFFSET.
+        self._pending_cursor = {}
+        if self.keyset_pagination:
+            if target == self.page + 1 and self._next_cursor:
+                self._pending_cursor = {"after": self._next_cursor}
+            elif target == self.page - 1 and self._prev_cursor:
+                self._pending_cursor = {"before": self._prev_cursor}
         self.page = target
         self._refresh_data()
 
+    def _fetch_page(
+        self,
+        offset: int,
+        search: Optional[str],
+        simple_value: Optional[str],
+        advanced_payload: Dict[str, Any],
+        cursor: Optional[Dict[str, str]] = None,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        if self.keyset_pagination and cursor:
+            return self.data_provider(
+                offset,
+                self.page_size,
+                search,
+                simple_value,
+                advanced_payload,
+                list(self.sorts),
+                **cursor,
+            )
+        return self.data_provider(
+            offset,
+            self.page_size,
+            search,
+            simple_value,
+            advanced_payload,
+            list(self.sorts),
+        )
+
     def _clear_search(self) -> None:
         self.search_field.value = ""
         self.page = 1
@@ -1243,6 +1332,8 @@ class GenericTable:
             flt.name: flt.getter(flt.control) for flt in self.advanced_filters
         }
         offset = (self.page - 1) * self.page_size
+        cursor = self._pending_cursor
+        self._pending_cursor = {}
         self._last_error = None
         if not silent:
             self._set_loading(True)
@@ -1254,14 +1345,10 @@ class GenericTable:
             self.selection_bar.visible = False
 
         try:
-            rows, total = self.data_provider(
-                offset,
-                self.page_size,
-                search,
-                simple_value,
-                advanced_payload,
-                list(self.sorts),
-            )
+            rows, total = self._fetch_page(offset, search, simple_value, advanced_payload, cursor)
+            if cursor and not rows and total:
+                # The boundary row vanished (concurrent delete); fall back to OFFSET.
+                rows, total = self._fetch_page(offset, search, simple_value, advanced_payload)
         except Exception as exc:
             self._last_error = str(exc)
             self._set_status(f"Error: {exc}", kind="error")
@@ -1276,14 +1363,7 @@ class GenericTable:
                 self.page = self.total_pages
                 offset = (self.page - 1) * self.page_size
                 try:
-                    rows, total = self.data_provider(
-                        offset,
-                        self.page_size,
-                        search,
-                        simple_value,
-                        advanced_payload,
-                        list(self.sorts),
-                    )
+                    rows, total = self._fetch_page(offset, search, simple_value, advanced_payload)
                 except Exception as exc:
                     self._last_error = str(exc)
                     self._set_status(f"Error: {exc}", kind="error")
@@ -1291,6 +1371,10 @@ class GenericTable:
                 self.current_rows = rows
                 self.total_rows = total
 
+            total_is_estimate = bool(getattr(rows, "total_is_estimate", False))
+            total_text = _format_total(total, total_is_estimate)
+            self._next_cursor = getattr(rows, "next_cursor", None)
+            self._prev_cursor = getattr(rows, "prev_cursor", None)
             self._current_page_ids = [row.get(self.id_field) for row in rows if row.get(self.id_field) is not None]
             self._update_selected_label()
             self.current_rows_by_id = {
@@ -1307,7 +1391,7 @@ class GenericTable:
             self.pagination_label.value = f"de {self.total_pages}"
             start = offset + 1 if total else 0
             end = offset + len(rows) if total else 0
-            self.range_label.value = f"Mostrando {start}-{end} de {total}"
+            self.range_label.value = f"Mostrando {start}-{end} de {total_text}"
             self.first_button.disabled = self.page <= 1
             self.prev_button.disabled = self.page <= 1
             self.next_button.disabled = self.page >= self.total_pages
@@ -1320,7 +1404,7 @@ class GenericTable:
                 self._empty_overlay.visible = True
                 self._table_viewport.visible = False
             else:
-                self.results_label.value = f"{total} resultados"
+                self.results_label.value = f"{total_text} resultados"
                 self._empty_title.value = "Sin resultados"
                 self._empty_message.value = "Ajustá el buscador o filtros."
                 self._empty_overlay.visible = total == 0
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import asyncio
+import threading
 from typing import Any, Callable, Dict, List, Optional
 
 import flet as ft
@@ -96,9 +97,52 @@ class MassUpdateView(ft.Container):
         self._preview_selected_list_label: str = "Lista Seleccionada"
         self._preview_skipped_invalid_factor: int = 0
 
+        # Batched apply state (see Database.mass_update_articles)
+        self._cancel_event: Optional[threading.Event] = None
+        self._pending_job: Optional[Dict[str, Any]] = None
+
         # Loader
         self.loader = ft.ProgressBar(width=None, color="#6366F1", visible=False)
 
+        # Apply progress (one step per committed batch)
+        self.apply_progress = ft.ProgressBar(value=0, color="#4F46E5", bgcolor="#E2E8F0", expand=True)
+        self.apply_progress_text = ft.Text("", size=12, color="#64748B")
+        self.btn_cancel_apply = cancel_button("Detener", on_click=self._cancel_apply, icon=ft.icons.STOP_ROUNDED)
+        self.apply_progress_row = ft.Row(
+            [self.apply_progress, self.apply_progress_text, self.btn_cancel_apply],
+            vertical_alignment=ft.CrossAxisAlignment.CENTER,
+            visible=False,
+        )
+
+        # Unfinished job banner
+        self.resume_text = ft.Text("", size=13, color="#92400E")
+        self.resume_banner = ft.Container(
+            visible=False,
+            padding=ft.padding.symmetric(horizontal=16, vertical=10),
+            border=ft.border.all(1, "#FCD34D"),
+            border_radius=8,
+            bgcolor="#FFFBEB",
+            content=ft.Row(
+                [
+                    ft.Row(
+                        [ft.Icon(ft.icons.HISTORY_ROUNDED, color="#D97706", size=20), self.resume_text],
+                        spacing=10,
+                        expand=True,
+                    ),
+                    ft.TextButton("Descartar", on_click=self._discard_pending_job),
+                    ft.ElevatedButton(
+                        "Reanudar",
+                        icon=ft.icons.PLAY_ARROW_ROUNDED,
+                        on_click=self._resume_pending_job,
+                        bgcolor="#D97706",
+                        color="white",
+                        style=ft.ButtonStyle(shape=ft.RoundedRectangleBorder(radius=4)),
+                    ),
+                ],
+                vertical_alignment=ft.CrossAxisAlignment.CENTER,
+            ),
+        )
+
         # UI Components - Filters
         self.filter_nombre = ft.TextField(
             label="Nombre contiene",
@@ -157,6 +201,9 @@ class MassUpdateView(ft.Container):
         # Count Label
         self.count_label = ft.Text("0 artículos seleccionados", weight=ft.FontWeight.BOLD, color="#64748B")
 
+        # Aggregate preview (Database.preview_mass_update_stats)
+        self.preview_summary = ft.Text("", size=12, color="#475569", visible=False)
+
         # Preview Table
         self.preview_table = SafeDataTable(
             columns=[],
@@ -245,8 +292,10 @@ class MassUpdateView(ft.Container):
                         ],
                         alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
                     ),
+                    self.preview_summary,
                     self.scroll_container,
                     self.preview_empty,
+                    self.apply_progress_row,
                     ft.Row([self.btn_apply], alignment=ft.MainAxisAlignment.END),
                 ],
                 spacing=15,
@@ -276,6 +325,7 @@ class MassUpdateView(ft.Container):
                     color="#64748B",
                 ),
                 ft.Divider(),
+                self.resume_banner,
                 # Filters Section
                 ft.Container(
                     padding=20,
@@ -381,6 +431,8 @@ class MassUpdateView(ft.Container):
         self._clear_preview_state()
         # Trigger initial count now that page is available
         self._schedule_initial_count()
+        if self.page:
+            self.page.run_task(self._load_pending_job)
     
     def _clear_preview_state(self):
         """Reset all preview-related state."""
@@ -419,6 +471,7 @@ class MassUpdateView(ft.Container):
         self.preview_empty_message.value = message
         self.preview_empty.visible = True
         self.scroll_container.visible = False
+        self.preview_summary.visible = False
         
         # Ensure section is not expanded
         self.preview_section_container.expand = False
@@ -428,6 +481,7 @@ class MassUpdateView(ft.Container):
         
         self.preview_empty.update()
         self.scroll_container.update()
+        self.preview_summary.update()
         self.preview_section_container.update()
 
     def _show_preview_table(self) -> None:
@@ -444,6 +498,41 @@ class MassUpdateView(ft.Container):
         self.scroll_container.update()
         self.preview_section_container.update()
 
+    def _format_pct_range(self, entry: Dict[str, Any]) -> str:
+        if entry.get("avg_pct") is None:
+            return "sin variación calculable"
+        return (
+            f"prom. {self._format_variation_text(entry.get('avg_pct'))} "
+            f"(mín. {self._format_variation_text(entry.get('min_pct'))}, "
+            f"máx. {self._format_variation_text(entry.get('max_pct'))})"
+        )
+
+    def _show_preview_summary(self, stats: Optional[Dict[str, Any]]) -> None:
+        """One line per affected value: % change range and rows floored at 0 or skipped."""
+        if not stats or not stats.get("articles"):
+            self.preview_summary.visible = False
+            self.preview_summary.value = ""
+        else:
+            lines = [f"Resumen: {stats['articles']} artículos afectados."]
+            cost = stats.get("cost") or {}
+            if cost:
+                lines.append(f"Costo: {self._format_pct_range(cost)}.")
+                if cost.get("floored"):
+                    lines.append(f"  {cost['floored']} costos quedarían en 0.")
+            for lp in stats.get("lists") or []:
+                line = f"{lp.get('nombre') or 'Lista'} ({lp.get('rows', 0)} precios): {self._format_pct_range(lp)}."
+                if lp.get("floored"):
+                    line += f" {lp['floored']} quedarían en 0."
+                lines.append(line)
+            if stats.get("skipped_invalid_factor"):
+                lines.append(f"Omitidos por factor inválido: {stats['skipped_invalid_factor']}.")
+            self.preview_summary.value = "\n".join(lines)
+            self.preview_summary.visible = True
+        try:
+            self.preview_summary.update()
+        except Exception:
+            pass
+
     def _format_variation_text(self, diff_pct: Any) -> str:
         try:
             pct = float(diff_pct or 0)
@@ -769,9 +858,20 @@ class MassUpdateView(ft.Container):
             self._set_loading(True)
             self.show_toast("Generando vista previa…", "info")
 
+            filters = self._get_filters()
+            stats_task = asyncio.ensure_future(
+                asyncio.to_thread(
+                    self.db.preview_mass_update_stats,
+                    filters=filters,
+                    target=target,
+                    operation=self.op_selector.value,
+                    value=val,
+                    list_id=list_id,
+                )
+            )
             preview_payload = await asyncio.to_thread(
                 self.db.preview_mass_update,
-                filters=self._get_filters(),
+                filters=filters,
                 target=target,
                 operation=self.op_selector.value,
                 value=val,
@@ -780,6 +880,11 @@ class MassUpdateView(ft.Container):
             )
             if not isinstance(preview_payload, dict):
                 raise ValueError("Formato de vista previa inválido.")
+            try:
+                self._show_preview_summary(await stats_task)
+            except Exception as e:
+                print(f"Error preview stats: {e}")
+                self._show_preview_summary(None)
             rows = preview_payload.get("rows", []) or []
             meta = preview_payload.get("meta", {}) or {}
             self._preview_mode = str(meta.get("target_mode") or target)
@@ -951,28 +1056,41 @@ class MassUpdateView(ft.Container):
         # Snapshot de IDs para que no cambien mientras aplicamos
         ids_snapshot = list(self.selected_ids)
 
-        try:
-            target, list_id = self._parse_target()
-            val = self._parse_value()
+        target, list_id = self._parse_target()
+        val = self._parse_value()
+        self.show_toast(f"Aplicando cambios a {len(ids_snapshot)} artículos…", "info")
+        await self._run_mass_update(
+            self.db.mass_update_articles,
+            filters={},  # ignorado si ids viene cargado
+            target=target,
+            operation=self.op_selector.value,
+            value=val,
+            list_id=list_id,
+            ids=ids_snapshot,
+        )
 
+    async def _run_mass_update(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> None:
+        """Run a (new or resumed) mass update in a worker thread with progress and cancellation."""
+        self._cancel_event = threading.Event()
+        try:
             self._set_loading(True)
-            self.show_toast(f"Aplicando cambios a {len(ids_snapshot)} artículos…", "info")
+            self._show_apply_progress(None)
 
             result = await asyncio.to_thread(
-                self.db.mass_update_articles,
-                filters={},  # ignorado si ids viene cargado
-                target=target,
-                operation=self.op_selector.value,
-                value=val,
-                list_id=list_id,
-                ids=ids_snapshot,
+                func,
+                *args,
+                on_progress=self._show_apply_progress,
+                cancel_event=self._cancel_event,
+                **kwargs,
             )
             if isinstance(result, dict):
                 affected = int(result.get("updated_count") or 0)
                 skipped_invalid = int(result.get("skipped_invalid_factor") or 0)
+                estado = result.get("estado")
             else:
                 affected = int(result or 0)
                 skipped_invalid = 0
+                estado = None
 
             # UI cleanup
             self.preview_table.rows.clear()
@@ -984,7 +1102,13 @@ class MassUpdateView(ft.Container):
             self.btn_apply.update()
             self._show_preview_placeholder("Sin vista previa", "Genera la vista previa para ver articulos.")
 
-            if affected > 0 and skipped_invalid > 0:
+            if estado == "DETENIDO":
+                self.show_toast(
+                    f"Actualización detenida: {result.get('processed', 0)} de {result.get('total', 0)} artículos procesados "
+                    f"({affected} modificados). Puede reanudarla desde el aviso superior.",
+                    "warning",
+                )
+            elif affected > 0 and skipped_invalid > 0:
                 self.show_toast(
                     f"Actualización completada. {affected} artículos modificados. Omitidos por factor inválido: {skipped_invalid}.",
                     "success",
@@ -1015,4 +1139,79 @@ class MassUpdateView(ft.Container):
             print(f"Error applying: {e}")
             self.show_toast(f"Error aplicando cambios: {e}", "error")
         finally:
+            self._cancel_event = None
+            self.apply_progress_row.visible = False
             self._set_loading(False)
+            await self._load_pending_job()
+
+    def _show_apply_progress(self, progress: Optional[Dict[str, Any]]) -> None:
+        # Called from the worker thread after each committed batch
+        total = int((progress or {}).get("total") or 0)
+        processed = int((progress or {}).get("processed") or 0)
+        self.apply_progress.value = (processed / total) if total else None
+        if progress is None:
+            self.apply_progress_text.value = "Preparando…"
+        else:
+            self.apply_progress_text.value = f"{processed} / {total} artículos"
+        self.btn_cancel_apply.disabled = False
+        self.apply_progress_row.visible = True
+        try:
+            self.apply_progress_row.update()
+        except Exception:
+            pass
+
+    def _cancel_apply(self, _=None) -> None:
+        if self._cancel_event is None:
+            return
+        # The current batch is committed; the job stays resumable
+        self._cancel_event.set()
+        self.btn_cancel_apply.disabled = True
+        self.apply_progress_text.value = "Deteniendo…"
+        try:
+            self.apply_progress_row.update()
+        except Exception:
+            pass
+
+    async def _load_pending_job(self) -> None:
+        try:
+            jobs = await asyncio.to_thread(self.db.fetch_mass_update_jobs, only_unfinished=True, limit=1)
+        except Exception as e:
+            print(f"Error loading pending mass updates: {e}")
+            jobs = []
+        self._pending_job = jobs[0] if jobs else None
+        job = self._pending_job
+        if job:
+            when = job.get("fecha_actualizacion")
+            when_txt = when.strftime("%d/%m/%Y %H:%M") if hasattr(when, "strftime") else str(when or "")
+            estado = {"FALLIDO": "falló", "DETENIDO": "fue detenida"}.get(job.get("estado"), "quedó sin terminar")
+            self.resume_text.value = (
+                f"La actualización masiva #{job['id']} ({when_txt}) {estado}: "
+                f"{job.get('procesados') or 0} de {job.get('total') or 0} artículos procesados."
+            )
+        self.resume_banner.visible = job is not None
+        try:
+            self.resume_banner.update()
+        except Exception:
+            pass
+
+    def _resume_pending_job(self, _=None) -> None:
+        job = self._pending_job
+        if not self.page or not job or self._loading:
+            return
+        self.resume_banner.visible = False
+        self.resume_banner.update()
+        self.page.run_task(self._run_mass_update, self.db.resume_mass_update, job["id"])
+
+    def _discard_pending_job(self, _=None) -> None:
+        job = self._pending_job
+        if not self.page or not job or self._loading:
+            return
+
+        async def _discard():
+            try:
+                await asyncio.to_thread(self.db.discard_mass_update, job["id"])
+            except Exception as e:
+                self.show_toast(f"Error descartando la actualización: {e}", "error")
+            await self._load_pending_job()
+
+        self.page.run_task(_discard)
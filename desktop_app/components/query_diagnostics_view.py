@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+from typing import Any, Callable, Dict, List
+
+import flet as ft
+from desktop_app.database import Database
+
+COLOR_TEXT = "#0F172A"
+COLOR_TEXT_MUTED = "#64748B"
+COLOR_BORDER = "#E2E8F0"
+COLOR_ACCENT = "#4F46E5"
+COLOR_ERROR = "#EF4444"
+COLOR_WARNING = "#F59E0B"
+
+_TOP_ROWS = 25
+
+
+def _ms(value: Any) -> str:
+    try:
+        number = float(value or 0)
+    except (TypeError, ValueError):
+        return "—"
+    if number >= 1000:
+        return f"{number / 1000:.2f} s"
+    return f"{number:.1f} ms"
+
+
+def _metric_card(title: str, value: ft.Text) -> ft.Container:
+    return ft.Container(
+        content=ft.Column(
+            [ft.Text(title, size=12, color=COLOR_TEXT_MUTED, weight=ft.FontWeight.W_600), value],
+            spacing=4,
+        ),
+        padding=12,
+        border=ft.border.all(1, COLOR_BORDER),
+        border_radius=8,
+        width=180,
+    )
+
+
+class QueryDiagnosticsView(ft.Container):
+    """Diagnostics panel: slowest Database methods and statements, pool waits and slow queries."""
+
+    def __init__(self, db: Database, on_show_toast: Callable[[str, str], None]):
+        super().__init__(expand=True, padding=ft.padding.only(left=10, right=10))
+        self.db = db
+        self.show_toast = on_show_toast
+
+        self.total_queries = ft.Text("—", size=20, weight=ft.FontWeight.BOLD, color=COLOR_TEXT)
+        self.total_errors = ft.Text("—", size=20, weight=ft.FontWeight.BOLD, color=COLOR_ERROR)
+        self.pool_wait = ft.Text("—", size=20, weight=ft.FontWeight.BOLD, color=COLOR_TEXT)
+        self.slow_count = ft.Text("—", size=20, weight=ft.FontWeight.BOLD, color=COLOR_WARNING)
+        self.pool_in_use = ft.Text("—", size=20, weight=ft.FontWeight.BOLD, color=COLOR_TEXT)
+        self.pool_waiting = ft.Text("—", size=20, weight=ft.FontWeight.BOLD, color=COLOR_TEXT)
+        self.pool_errors = ft.Text("—", size=20, weight=ft.FontWeight.BOLD, color=COLOR_ERROR)
+        self.since_text = ft.Text("", size=12, color=COLOR_TEXT_MUTED)
+
+        self.methods_table = self._table(["Método", "Llamadas", "Total", "Prom.", "p95", "Máx.", "Filas", "Errores"])
+        self.statements_table = self._table(["Consulta", "Llamadas", "Total", "p95", "Máx.", "Métodos"])
+        self.slow_table = self._table(["Hora", "Método", "Duración", "Filas", "Consulta"])
+        self.plans_column = ft.Column(spacing=10)
+
+        self.content = ft.Column(
+            [
+                ft.Row(
+                    [
+                        ft.ElevatedButton("Actualizar", icon=ft.icons.REFRESH_ROUNDED, on_click=lambda _: self.refresh()),
+                        ft.OutlinedButton("Exportar JSON", icon=ft.icons.DOWNLOAD_ROUNDED, on_click=self._export),
+                        ft.TextButton("Reiniciar contadores", icon=ft.icons.RESTART_ALT_ROUNDED, on_click=self._reset),
+                        self.since_text,
+                    ],
+                    spacing=10,
+                    vertical_alignment=ft.CrossAxisAlignment.CENTER,
+                ),
+                ft.Row(
+                    [
+                        _metric_card("Consultas", self.total_queries),
+                        _metric_card("Errores", self.total_errors),
+                        _metric_card("Espera de conexión p95", self.pool_wait),
+                        _metric_card("Consultas lentas", self.slow_count),
+                        _metric_card("Conexiones en uso", self.pool_in_use),
+                        _metric_card("Esperando conexión", self.pool_waiting),
+                        _metric_card("Timeouts / descartadas", self.pool_errors),
+                    ],
+                    spacing=10,
+                    wrap=True,
+                ),
+                ft.Text("Métodos por tiempo total", size=16, weight=ft.FontWeight.BOLD, color=COLOR_TEXT),
+                ft.Row([self.methods_table], scroll=ft.ScrollMode.AUTO),
+                ft.Text("Consultas por tiempo total", size=16, weight=ft.FontWeight.BOLD, color=COLOR_TEXT),
+                ft.Row([self.statements_table], scroll=ft.ScrollMode.AUTO),
+                ft.Text("Últimas consultas lentas", size=16, weight=ft.FontWeight.BOLD, color=COLOR_TEXT),
+                ft.Row([self.slow_table], scroll=ft.ScrollMode.AUTO),
+                ft.Text("Planes (EXPLAIN ANALYZE)", size=16, weight=ft.FontWeight.BOLD, color=COLOR_TEXT),
+                self.plans_column,
+                ft.Container(height=30),
+            ],
+            spacing=12,
+            scroll=ft.ScrollMode.AUTO,
+            expand=True,
+        )
+
+    @staticmethod
+    def _table(headers: List[str]) -> ft.DataTable:
+        return ft.DataTable(
+            columns=[ft.DataColumn(ft.Text(header, weight=ft.FontWeight.BOLD, size=12)) for header in headers],
+            rows=[],
+            column_spacing=18,
+            heading_row_height=36,
+            data_row_min_height=32,
+            border=ft.border.all(1, COLOR_BORDER),
+            border_radius=8,
+        )
+
+    @staticmethod
+    def _cells(values: List[Any]) -> ft.DataRow:
+        cells = []
+        for value in values:
+            text = str(value)
+            cells.append(ft.DataCell(ft.Text(text if len(text) <= 120 else f"{text[:117]}...", size=12, tooltip=text if len(text) > 120 else None)))
+        return ft.DataRow(cells=cells)
+
+    def refresh(self) -> None:
+        metrics: Dict[str, Any] = self.db.get_query_metrics()
+        totals = metrics.get("totals") or {}
+        self.total_queries.value = f"{totals.get('queries', 0):,}".replace(",", ".")
+        self.total_errors.value = str(totals.get("errors", 0))
+        self.pool_wait.value = _ms((metrics.get("pool_wait") or {}).get("p95_ms"))
+        slow = metrics.get("slow_queries") or []
+        self.slow_count.value = str(len(slow))
+        pool = metrics.get("pool") or {}
+        sync_pool = pool.get("sync") or {}
+        async_pool = pool.get("async") or {}
+        in_use = sync_pool.get("in_use", 0) + async_pool.get("in_use", 0)
+        self.pool_in_use.value = f"{in_use} / {pool.get('budget', 0)}"
+        self.pool_waiting.value = str(sync_pool.get("requests_waiting", 0) + async_pool.get("requests_waiting", 0))
+        discarded = (pool.get("health_checks") or {}).get("discarded", 0)
+        self.pool_errors.value = f"{sync_pool.get('requests_errors', 0) + async_pool.get('requests_errors', 0)} / {discarded}"
+        threshold = metrics.get("slow_query_ms") or 0
+        self.since_text.value = (
+            f"Desde {metrics.get('since', '')} · umbral lento {_ms(threshold)}" if threshold else f"Desde {metrics.get('since', '')}"
+        )
+
+        self.methods_table.rows = [
+            self._cells([
+                item["method"], item["count"], _ms(item["total_ms"]), _ms(item["avg_ms"]),
+                _ms(item["p95_ms"]), _ms(item["max_ms"]), item["rows"], item["errors"],
+            ])
+            for item in (metrics.get("methods") or [])[:_TOP_ROWS]
+        ]
+        self.statements_table.rows = [
+            self._cells([
+                item["sql"], item["count"], _ms(item["total_ms"]), _ms(item["p95_ms"]),
+                _ms(item["max_ms"]), ", ".join(item.get("methods") or []),
+            ])
+            for item in (metrics.get("statements") or [])[:_TOP_ROWS]
+        ]
+        self.slow_table.rows = [
+            self._cells([item["at"], item["method"], _ms(item["elapsed_ms"]), item["rows"], item["sql"]])
+            for item in reversed(slow)
+        ]
+        plans = metrics.get("plans") or {}
+        self.plans_column.controls = [
+            ft.Container(
+                content=ft.Column(
+                    [
+                        ft.Text(f"{plan['method']} · {_ms(plan['elapsed_ms'])} · {plan['at']}", size=12, weight=ft.FontWeight.BOLD),
+                        ft.Text(sql[:300], size=11, color=COLOR_TEXT_MUTED),
+                        ft.Text(plan["plan"], size=11, font_family="monospace", selectable=True),
+                    ],
+                    spacing=4,
+                ),
+                padding=10,
+                border=ft.border.all(1, COLOR_BORDER),
+                border_radius=8,
+            )
+            for sql, plan in plans.items()
+        ] or [ft.Text(
+            "Sin planes registrados (activar con DB_EXPLAIN_SLOW_QUERIES=1).",
+            size=12,
+            color=COLOR_TEXT_MUTED,
+        )]
+        if self.page:
+            self.update()
+
+    def _export(self, _: Any = None) -> None:
+        try:
+            path = self.db.dump_query_metrics()
+        except Exception as exc:
+            self.show_toast(f"Error al exportar métricas: {exc}", "error")
+            return
+        self.show_toast(f"Métricas exportadas en {path}", "success")
+
+    def _reset(self, _: Any = None) -> None:
+        self.db.reset_query_metrics()
+        self.refresh()
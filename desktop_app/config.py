@@ -14,6 +14,18 @@ class AppConfig:
     database_url: str
     db_pool_min: int = 1
     db_pool_max: int = 4
+    db_pool_async_max: int = 1
+    db_pool_timeout: int = 30
+    db_pool_max_idle: int = 600
+    db_pool_max_lifetime: int = 3600
+    db_pool_check: bool = True
+    db_pool_check_idle: int = 30
+    db_prepared_statements: bool = True
+    db_prepare_threshold: int = 5
+    db_mass_update_batch: int = 500
+    db_approx_count_threshold: int = 200_000
+    db_slow_query_ms: int = 500
+    db_explain_slow_queries: bool = False
     afip_cuit: str = None
     afip_cert: str = None
     afip_key: str = None
@@ -219,6 +231,23 @@ def load_config() -> AppConfig:
     db_pool_max = _read_int_env("DB_POOL_MAX", 4, min_value=1)
     if db_pool_max < db_pool_min:
         db_pool_max = db_pool_min
+    # DB_POOL_MAX is the terminal's total budget; AsyncDatabase borrows up to DB_POOL_ASYNC_MAX of it
+    db_pool_async_max = _read_int_env("DB_POOL_ASYNC_MAX", 1, min_value=0)
+    db_pool_timeout = _read_int_env("DB_POOL_TIMEOUT", 30, min_value=1)
+    db_pool_max_idle = _read_int_env("DB_POOL_MAX_IDLE", 600, min_value=10)
+    db_pool_max_lifetime = _read_int_env("DB_POOL_MAX_LIFETIME", 3600, min_value=60)
+    db_pool_check = _read_bool_env("DB_POOL_CHECK", True)
+    db_pool_check_idle = _read_int_env("DB_POOL_CHECK_IDLE", 30, min_value=0)
+    # Disable behind PgBouncer in transaction mode (prepared statements are per server connection)
+    db_prepared_statements = _read_bool_env("DB_PREPARED_STATEMENTS", True)
+    db_prepare_threshold = _read_int_env("DB_PREPARE_THRESHOLD", 5, min_value=0)
+    # Articles per transaction in mass price updates; 0 = whole selection in one transaction
+    db_mass_update_batch = _read_int_env("DB_MASS_UPDATE_BATCH", 500, min_value=0)
+    # 0 disables approximate totals (always COUNT exactly)
+    db_approx_count_threshold = _read_int_env("DB_APPROX_COUNT_THRESHOLD", 200_000, min_value=0)
+    # 0 disables the slow query log (and the EXPLAIN of slow queries)
+    db_slow_query_ms = _read_int_env("DB_SLOW_QUERY_MS", 500, min_value=0)
+    db_explain_slow_queries = _read_bool_env("DB_EXPLAIN_SLOW_QUERIES", False)
 
     afip_prod = _read_afip_production_flag()
     afip_cuit, afip_cert, afip_key = _select_afip_credentials(afip_prod, config_source)
@@ -228,6 +257,18 @@ def load_config() -> AppConfig:
         database_url=database_url,
         db_pool_min=db_pool_min,
         db_pool_max=db_pool_max,
+        db_pool_async_max=db_pool_async_max,
+        db_pool_timeout=db_pool_timeout,
+        db_pool_max_idle=db_pool_max_idle,
+        db_pool_max_lifetime=db_pool_max_lifetime,
+        db_pool_check=db_pool_check,
+        db_pool_check_idle=db_pool_check_idle,
+        db_prepared_statements=db_prepared_statements,
+        db_prepare_threshold=db_prepare_threshold,
+        db_mass_update_batch=db_mass_update_batch,
+        db_approx_count_threshold=db_approx_count_threshold,
+        db_slow_query_ms=db_slow_query_ms,
+        db_explain_slow_queries=db_explain_slow_queries,
         afip_cuit=afip_cuit,
         afip_cert=afip_cert,
         afip_key=afip_key,
@@ -1,34 +1,54 @@
-import csv
+import base64
+import hashlib
 import json
 import logging
 import re
 import threading
 import time
 import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from decimal import Decimal
 from contextlib import contextmanager
 from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Sequence, Tuple
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
 from psycopg.errors import ForeignKeyViolation, IntegrityError
 from psycopg_pool import ConnectionPool
 
 try:
     from desktop_app.enums import (
-        DocumentoEstado, RemotoEstado, BackupEstado, ClaseDocumento,
+        DocumentoEstado, RemotoEstado, BackupEstado, ClaseDocumento, ActualizacionMasivaEstado,
         DOCUMENTO_ESTADOS_CONFIRMADOS, DOCUMENTO_ESTADOS_PENDIENTES, DOCUMENTO_ESTADOS_ACTIVOS
     )
 except ImportError:
     from enums import (  # type: ignore
-        DocumentoEstado, RemotoEstado, BackupEstado, ClaseDocumento,
+        DocumentoEstado, RemotoEstado, BackupEstado, ClaseDocumento, ActualizacionMasivaEstado,
         DOCUMENTO_ESTADOS_CONFIRMADOS, DOCUMENTO_ESTADOS_PENDIENTES, DOCUMENTO_ESTADOS_ACTIVOS
     )
 
 try:
     from desktop_app.services.document_pricing import calculate_document_totals
+    from desktop_app.services.catalog_cache import CatalogCache
+    from desktop_app.services.change_listener import ChangeListener
+    from desktop_app.services.activity_log_writer import ActivityLogWriter
+    from desktop_app.services.activity_log_index import ActivityLogIndex, LogFilter
+    from desktop_app.services.query_plan import Plan, Query, get_query_plan, query_plan, run_plan
+    from desktop_app.services.query_metrics import InstrumentedPool, QueryMetrics, attribute_operations
+    from desktop_app.services.pool_policy import IdleChecker, PoolPolicy, pool_stats
+    from desktop_app.services.prepared_statements import PreparedStatements
+    from desktop_app.services import mass_update_math, pricing_engine
 except ImportError:
     from services.document_pricing import calculate_document_totals  # type: ignore
+    from services.catalog_cache import CatalogCache  # type: ignore
+    from services.change_listener import ChangeListener  # type: ignore
+    from services.activity_log_writer import ActivityLogWriter  # type: ignore
+    from services.activity_log_index import ActivityLogIndex, LogFilter  # type: ignore
+    from services.query_plan import Plan, Query, get_query_plan, query_plan, run_plan  # type: ignore
+    from services.query_metrics import InstrumentedPool, QueryMetrics, attribute_operations  # type: ignore
+    from services.pool_policy import IdleChecker, PoolPolicy, pool_stats  # type: ignore
+    from services.prepared_statements import PreparedStatements  # type: ignore
+    from services import mass_update_math, pricing_engine  # type: ignore
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +56,83 @@ _DATE_ONLY_RE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
 GUEST_USER_NAME = "Invitado"
 GUEST_USER_EMAIL = "invitado@nexoryn.local"
 GUEST_USER_ROLE = "GERENTE"
+CATALOG_NOTIFY_CHANNEL = "nexoryn_catalog"
+DATA_NOTIFY_CHANNEL = "nexoryn_changes"
+# Catalog cache keys and the tables they are read from (drives invalidation).
+_CATALOG_CACHE_TABLES: Dict[str, Tuple[str, ...]] = {
+    "marcas": ("ref.marca",),
+    "marcas_full": ("ref.marca",),
+    "rubros": ("ref.rubro",),
+    "rubros_full": ("ref.rubro",),
+    "proveedores": ("app.entidad_comercial",),
+    "unidades": ("ref.unidad_medida",),
+}
+# Tables the dashboard reads (directly or through app.ventas_diarias / app.articulo_listado).
+_DASHBOARD_SOURCE_TABLES = frozenset({
+    "app.documento",
+    "app.pago",
+    "app.articulo",
+    "app.movimiento_articulo",
+    "app.movimiento_cuenta_corriente",
+    "app.remito",
+    "app.entidad_comercial",
+    "ref.rubro",
+    "ref.forma_pago",
+    "ref.tipo_documento",
+})
+# First day of each dashboard period, bucketed like app.ventas_diarias (app.fn_ventas_dia).
+_VENTAS_TIME_ZONE_SQL = "app.fn_zona_negocio()"
+_VENTAS_HOY_SQL = "app.fn_ventas_dia(now())"
+_VENTAS_PERIOD_START_SQL: Dict[str, str] = {
+    "Hoy": _VENTAS_HOY_SQL,
+    "Semana": f"date_trunc('week', {_VENTAS_HOY_SQL}::timestamp)::date",
+    "Mes": f"date_trunc('month', {_VENTAS_HOY_SQL}::timestamp)::date",
+    "Año": f"date_trunc('year', {_VENTAS_HOY_SQL}::timestamp)::date",
+}
+# Mass update jobs that resume_mass_update continues (and the resume banner offers)
+_MASS_UPDATE_RESUMABLE = (
+    ActualizacionMasivaEstado.EN_CURSO.value,
+    ActualizacionMasivaEstado.DETENIDO.value,
+    ActualizacionMasivaEstado.FALLIDO.value,
+)
+# Lookups repeated on every keystroke/line while an invoice is keyed in: always
+# sent as server-side prepared statements (see services/prepared_statements.py).
+_HOT_STATEMENTS: Dict[str, str] = {
+    "config_value": "SELECT valor FROM seguridad.config_sistema WHERE clave = %s",
+    "article_simple": """
+        SELECT
+            id_articulo,
+            id_articulo AS id,
+            nombre,
+            codigo,
+            costo,
+            porcentaje_iva,
+            unidad_medida,
+            unidad_abreviatura,
+            unidades_por_bulto,
+            activo
+        FROM app.articulo_listado
+        WHERE id = %s
+    """,
+    "entity_simple": """
+        SELECT id, nombre_completo, tipo, activo, domicilio
+        FROM app.v_entidad_detallada
+        WHERE id = %s
+    """,
+    "article_prices": """
+        SELECT lp.id as id_lista_precio, lp.nombre as lista_nombre,
+               ap.precio, ap.porcentaje, ap.id_tipo_porcentaje
+        FROM ref.lista_precio lp
+        LEFT JOIN app.articulo_precio ap ON lp.id = ap.id_lista_precio AND ap.id_articulo = %s
+        WHERE lp.activa = True
+        ORDER BY lp.orden ASC
+    """,
+    "article_stock": "SELECT stock_total FROM app.v_stock_total WHERE id_articulo = %s",
+    "article_stock_deposito": (
+        "SELECT stock_actual FROM app.articulo_stock_deposito WHERE id_articulo = %s AND id_deposito = %s"
+    ),
+    "next_document_number": "SELECT app.fn_numero_documento_proximo(%s)",
+}
 _ACTIVITY_LOG_COLUMNS = [
     "id",
     "fecha_hora",
@@ -216,8 +313,206 @@ def _build_article_order_by_clause(
     return order_by
 
 
+# =========================================================================
+# Keyset (seek) pagination helpers
+# =========================================================================
+_ORDER_CLAUSE_RE = re.compile(
+    r"^(?P<expr>.+?)\s+(?P<dir>ASC|DESC)(?:\s+NULLS\s+(?P<nulls>FIRST|LAST))?$",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+class ResultPage(list):
+    """
+    Rows returned by a paginated fetch in keyset or total mode.
+
+    Behaves like the plain list returned by the fetch_* methods and carries the
+    opaque cursors needed to request the neighbouring pages, plus the total of
+    the filtered set when it was requested.
+    """
+
+    def __init__(
+        self,
+        rows: Sequence[Dict[str, Any]] = (),
+        next_cursor: Optional[str] = None,
+        prev_cursor: Optional[str] = None,
+        total: Optional[int] = None,
+        total_is_estimate: bool = False,
+    ) -> None:
+        super().__init__(rows)
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.total = total
+        self.total_is_estimate = total_is_estimate
+
+
+def _split_order_by(order_by: str) -> List[str]:
+    """Split an ORDER BY list on top-level commas (ignores commas inside parentheses or quotes)."""
+    parts: List[str] = []
+    depth = 0
+    in_quote = False
+    current: List[str] = []
+    for ch in order_by:
+        if ch == "'":
+            in_quote = not in_quote
+        elif not in_quote:
+            if ch == "(":
+                depth += 1
+            elif ch == ")":
+                depth -= 1
+            elif ch == "," and depth == 0:
+                parts.append("".join(current).strip())
+                current = []
+                continue
+        current.append(ch)
+    if "".join(current).strip():
+        parts.append("".join(current).strip())
+    return parts
+
+
+def _parse_order_terms(order_by: str, tiebreaker: str = "id") -> List[Tuple[str, bool, bool]]:
+    """
+    Parse an ORDER BY list into (expr, descending, nulls_last) terms.
+
+    PostgreSQL defaults (NULLS LAST for ASC, NULLS FIRST for DESC) are made
+    explicit, and the unique tiebreaker is appended when it is missing so the
+    ordering is total, which keyset pagination requires.
+    """
+    terms: List[Tuple[str, bool, bool]] = []
+    for clause in _split_order_by(order_by):
+        match = _ORDER_CLAUSE_RE.match(clause)
+        if match:
+            expr = match.group("expr").strip()
+            desc = match.group("dir").upper() == "DESC"
+            nulls = (match.group("nulls") or "").upper()
+        else:
+            expr, desc, nulls = clause.strip(), False, ""
+        nulls_last = (nulls == "LAST") if nulls else not desc
+        terms.append((expr, desc, nulls_last))
+    if not any(expr == tiebreaker for expr, _, _ in terms):
+        terms.append((tiebreaker, False, True))
+    return terms
+
+
+def _render_order_terms(terms: Sequence[Tuple[str, bool, bool]]) -> str:
+    return ", ".join(
+        f"{expr} {'DESC' if desc else 'ASC'} NULLS {'LAST' if nulls_last else 'FIRST'}"
+        for expr, desc, nulls_last in terms
+    )
+
+
+def _encode_keyset_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"t": "dt", "v": value.isoformat()}
+    if isinstance(value, date):
+        return {"t": "d", "v": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"t": "n", "v": str(value)}
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return str(value)
+
+
+def _decode_keyset_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        kind, raw = value.get("t"), value.get("v")
+        if kind == "dt":
+            return datetime.fromisoformat(raw)
+        if kind == "d":
+            return date.fromisoformat(raw)
+        if kind == "n":
+            return Decimal(raw)
+        return raw
+    return value
+
+
+def _keyset_signature(terms: Sequence[Tuple[str, bool, bool]]) -> str:
+    return hashlib.sha1(_render_order_terms(terms).encode("utf-8")).hexdigest()[:12]
+
+
+def _encode_keyset_cursor(terms: Sequence[Tuple[str, bool, bool]], values: Sequence[Any]) -> str:
+    payload = {"o": _keyset_signature(terms), "v": [_encode_keyset_value(v) for v in values]}
+    raw = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_keyset_cursor(token: Optional[str], terms: Sequence[Tuple[str, bool, bool]]) -> Optional[List[Any]]:
+    """Return the seek values of a cursor, or None when it is invalid or was built for another ordering."""
+    if not token:
+        return None
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode("ascii")).decode("utf-8"))
+        if payload.get("o") != _keyset_signature(terms):
+            return None
+        values = [_decode_keyset_value(v) for v in payload.get("v") or []]
+    except Exception:
+        return None
+    if len(values) != len(terms):
+        return None
+    return values
+
+
+def _build_keyset_predicate(
+    terms: Sequence[Tuple[str, bool, bool]],
+    values: Sequence[Any],
+    non_null: Sequence[str] = (),
+) -> Tuple[str, List[Any]]:
+    """
+    Build the row-comparison predicate selecting rows strictly after `values`
+    in the order described by `terms`, honouring per-term direction and NULL
+    placement (row-value comparison cannot express mixed directions).
+    Expressions listed in `non_null` skip the IS NULL branches so the
+    primary-key tiebreaker stays index friendly.
+    """
+    disjuncts: List[str] = []
+    params: List[Any] = []
+    equal_sql: List[str] = []
+    equal_params: List[Any] = []
+    for (expr, desc, nulls_last), value in zip(terms, values):
+        if value is None:
+            after_sql = None if nulls_last else f"{expr} IS NOT NULL"
+            after_params: List[Any] = []
+        else:
+            after_sql = f"{expr} {'<' if desc else '>'} %s"
+            if nulls_last and expr not in non_null:
+                after_sql = f"({after_sql} OR {expr} IS NULL)"
+            after_params = [value]
+        if after_sql is not None:
+            disjuncts.append("(" + " AND ".join(equal_sql + [after_sql]) + ")")
+            params.extend(equal_params + after_params)
+        if value is None:
+            equal_sql.append(f"{expr} IS NULL")
+        else:
+            equal_sql.append(f"{expr} = %s")
+            equal_params.append(value)
+    if not disjuncts:
+        return "FALSE", []
+    return "(" + " OR ".join(disjuncts) + ")", params
+
+
+@attribute_operations
 class Database:
-    def __init__(self, dsn: str, *, pool_min_size: int = 1, pool_max_size: int = 4):
+    def __init__(
+        self,
+        dsn: str,
+        *,
+        pool_min_size: int = 1,
+        pool_max_size: int = 4,
+        approx_count_threshold: int = 200_000,
+        catalog_cache_size: int = 64,
+        listen_for_changes: bool = True,
+        slow_query_ms: float = 500.0,
+        explain_slow_queries: bool = False,
+        pool_async_max: int = 1,
+        pool_timeout: float = 30.0,
+        pool_max_idle: float = 600.0,
+        pool_max_lifetime: float = 3600.0,
+        pool_check: bool = True,
+        pool_check_idle: float = 30.0,
+        prepared_statements: bool = True,
+        prepare_threshold: int = 5,
+        mass_update_batch_size: int = 500,
+    ):
         self.dsn = dsn
         try:
             pool_min = int(pool_min_size)
@@ -231,36 +526,88 @@ class Database:
             pool_min = 1
         if pool_max < pool_min:
             pool_max = pool_min
-        
-        self.pool_min = pool_min
-        self.pool_max = pool_max
-        self.pool = ConnectionPool(conninfo=dsn, min_size=pool_min, max_size=pool_max)
+
+        # pool_max is the terminal's whole connection budget; an AsyncDatabase borrows part of it
+        self.pool_policy = PoolPolicy(
+            min_size=pool_min,
+            max_size=pool_max,
+            async_max=pool_async_max,
+            timeout=pool_timeout,
+            max_idle=pool_max_idle,
+            max_lifetime=pool_max_lifetime,
+            check=pool_check,
+            check_idle=pool_check_idle,
+        )
+        self._pool_checker = IdleChecker(ConnectionPool, pool_check_idle) if pool_check else None
+        self._pool_lock = threading.Lock()
+        self._async_reserved = 0
+        self.async_pool: Any = None
+        self.pool_min, self.pool_max = self.pool_policy.sync_sizes()
+        self.prepared_statements = PreparedStatements(
+            _HOT_STATEMENTS,
+            enabled=prepared_statements,
+            threshold=prepare_threshold,
+        )
+        self.query_metrics = QueryMetrics(slow_query_ms=slow_query_ms, explain_slow=explain_slow_queries)
+        self.pool = self._create_pool()
+        try:
+            self.approx_count_threshold = max(0, int(approx_count_threshold))
+        except (TypeError, ValueError):
+            self.approx_count_threshold = 200_000
+        try:
+            self.mass_update_batch_size = max(0, int(mass_update_batch_size))
+        except (TypeError, ValueError):
+            self.mass_update_batch_size = 500
         self.current_user_id: Optional[int] = None
         self.current_ip: Optional[str] = None
         self.is_closing = False
-        self._dashboard_stats_cache: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+        self._dashboard_stats_cache: Dict[str, Dict[str, Any]] = {}
         self._dashboard_cache_lock = threading.RLock()
+        self._dashboard_data_version = 0
+        self._dashboard_executor: Optional[ThreadPoolExecutor] = None
+        self._dashboard_executor_workers = 0
         self._activity_state_lock = threading.RLock()
-        self._file_log_lock = threading.RLock()
         self._entity_last_activity: Dict[str, float] = {}
         self._last_activity_ts = 0.0
         self._file_log_seq = int(time.time() * 1000)
         self._logs_dir = Path.cwd() / "logs"
+        self._activity_index = ActivityLogIndex(self._logs_dir, _ACTIVITY_LOG_COLUMNS)
+        self._activity_writer = ActivityLogWriter(
+            self._daily_activity_log_path,
+            _ACTIVITY_LOG_COLUMNS,
+            on_batch_written=self._activity_index.note_appended,
+        )
+        self._activity_writer.start()
+        self._catalog_cache = CatalogCache(max_entries=catalog_cache_size, ttl=self._CACHE_TTL)
+        self._change_lock = threading.RLock()
+        self._change_subscribers: Dict[int, Tuple[frozenset, Callable[[Set[str]], None]]] = {}
+        self._change_subscriber_seq = 0
+        self._pending_changes: Set[str] = set()
+        self._change_flush_timer: Optional[threading.Timer] = None
+        self._listener_connected_once = False
         
         # Apply necessary schema patches automatically
         self._run_migrations()
 
+        # Cross-terminal change notifications (LISTEN/NOTIFY fed by triggers)
+        self._change_listener: Optional[ChangeListener] = None
+        if listen_for_changes:
+            self._change_listener = ChangeListener(
+                dsn,
+                [CATALOG_NOTIFY_CHANNEL, DATA_NOTIFY_CHANNEL],
+                self._on_db_notification,
+                on_state=self._on_change_listener_state,
+            )
+            self._change_listener.start()
+
+    @query_plan
     def get_config(self, key: str, default: Any = None) -> Any:
         """Fetch a configuration value from seguridad.config_sistema."""
-        query = "SELECT valor FROM seguridad.config_sistema WHERE clave = %s"
         try:
-            with self.pool.connection() as conn:
-                with conn.cursor() as cur:
-                    cur.execute(query, (key,))
-                    row = cur.fetchone()
-                    if row:
-                        return row.get("valor") if isinstance(row, dict) else row[0]
-                    return default
+            row = yield self.prepared_statements.query("config_value", (key,), fetch="row")
+            if row:
+                return row.get("valor") if isinstance(row, dict) else row[0]
+            return default
         except Exception as e:
             logger.error(f"Error fetching config for key {key}: {e}")
             return default
@@ -456,51 +803,168 @@ class Database:
                         LEFT JOIN app.articulo_precio ap ON ap.id_articulo = a.id AND ap.id_lista_precio = 1;
                     """)
 
-                    # 7. Update trigger to save stock_resultante on INSERT
+                    # 7. Stock per deposit (one-time backfill) and statement-level stock trigger,
+                    #    which also saves stock_resultante on INSERT
+                    cur.execute("SELECT to_regclass('app.articulo_stock_deposito') AS rel")
+                    rel = cur.fetchone()
+                    if (rel.get("rel") if isinstance(rel, dict) else rel[0]) is None:
+                        logger.info("Creating app.articulo_stock_deposito (one-time backfill)...")
+                        cur.execute("""
+                        CREATE TABLE IF NOT EXISTS app.articulo_stock_deposito (
+                          id_articulo          BIGINT NOT NULL REFERENCES app.articulo(id) ON DELETE CASCADE,
+                          id_deposito          BIGINT NOT NULL REFERENCES ref.deposito(id) ON DELETE CASCADE,
+                          stock_actual         NUMERIC(14,4) NOT NULL DEFAULT 0,
+                          ultima_actualizacion TIMESTAMPTZ DEFAULT now(),
+                          PRIMARY KEY (id_articulo, id_deposito)
+                        );
+                        CREATE INDEX IF NOT EXISTS idx_stock_deposito_deposito ON app.articulo_stock_deposito (id_deposito, id_articulo);
+
+                        LOCK TABLE app.movimiento_articulo IN SHARE MODE;
+                        INSERT INTO app.articulo_stock_deposito (id_articulo, id_deposito, stock_actual)
+                        SELECT ma.id_articulo, ma.id_deposito, SUM(ma.cantidad * tma.signo_stock)
+                        FROM app.movimiento_articulo ma
+                        JOIN ref.tipo_movimiento_articulo tma ON tma.id = ma.id_tipo_movimiento
+                        GROUP BY ma.id_articulo, ma.id_deposito;
+
+                        CREATE OR REPLACE VIEW app.v_stock_actual AS
+                        SELECT
+                          sd.id_articulo,
+                          a.nombre AS articulo,
+                          sd.id_deposito,
+                          d.nombre AS deposito,
+                          sd.stock_actual::numeric AS stock_actual
+                        FROM app.articulo_stock_deposito sd
+                        JOIN app.articulo a ON a.id = sd.id_articulo
+                        JOIN ref.deposito d ON d.id = sd.id_deposito;
+                        """)
+
                     cur.execute("""
                         CREATE OR REPLACE FUNCTION app.fn_sync_stock_resumen()
                         RETURNS TRIGGER AS $fn$
-                        DECLARE
-                          v_signo INTEGER;
-                          v_new_stock NUMERIC(14,4);
                         BEGIN
-                          -- Get the sign from the movement type
-                          SELECT signo_stock INTO v_signo 
-                          FROM ref.tipo_movimiento_articulo 
-                          WHERE id = COALESCE(NEW.id_tipo_movimiento, OLD.id_tipo_movimiento);
-
-                          IF (TG_OP = 'INSERT') THEN
+                          IF TG_OP = 'INSERT' THEN
+                            -- One upsert per article and per (article, deposit), then stock_resultante
+                            -- of every new movement in a single UPDATE
+                            WITH mov AS (
+                              SELECT n.id, n.id_articulo, n.id_deposito, n.cantidad * tm.signo_stock AS cambio
+                              FROM new_rows n
+                              JOIN ref.tipo_movimiento_articulo tm ON tm.id = n.id_tipo_movimiento
+                            ),
+                            delta AS (
+                              SELECT id_articulo, SUM(cambio) AS cambio
+                              FROM mov
+                              GROUP BY id_articulo
+                            ),
+                            deposito AS (
+                              INSERT INTO app.articulo_stock_deposito (id_articulo, id_deposito, stock_actual)
+                              SELECT id_articulo, id_deposito, SUM(cambio) FROM mov GROUP BY id_articulo, id_deposito
+                              ON CONFLICT (id_articulo, id_deposito) DO UPDATE
+                              SET stock_actual = app.articulo_stock_deposito.stock_actual + EXCLUDED.stock_actual,
+                                  ultima_actualizacion = now()
+                            ),
+                            resumen AS (
+                              INSERT INTO app.articulo_stock_resumen (id_articulo, stock_total)
+                              SELECT id_articulo, cambio FROM delta
+                              ON CONFLICT (id_articulo) DO UPDATE
+                              SET stock_total = app.articulo_stock_resumen.stock_total + EXCLUDED.stock_total,
+                                  ultima_actualizacion = now()
+                              RETURNING id_articulo, stock_total
+                            ),
+                            resultante AS (
+                              SELECT mov.id,
+                                     r.stock_total - d.cambio
+                                       + SUM(mov.cambio) OVER (PARTITION BY mov.id_articulo ORDER BY mov.id) AS stock_resultante
+                              FROM mov
+                              JOIN delta d ON d.id_articulo = mov.id_articulo
+                              JOIN resumen r ON r.id_articulo = mov.id_articulo
+                            )
+                            UPDATE app.movimiento_articulo m
+                            SET stock_resultante = resultante.stock_resultante
+                            FROM resultante
+                            WHERE m.id = resultante.id;
+
+                          ELSIF TG_OP = 'UPDATE' THEN
+                            -- Net change per article/deposit (also when a movement moves to another one);
+                            -- the stock_resultante UPDATE of the INSERT branch nets to zero and is skipped
+                            WITH cambios AS (
+                              SELECT o.id_articulo, o.id_deposito, -(o.cantidad * tm.signo_stock) AS cambio
+                              FROM old_rows o
+                              JOIN ref.tipo_movimiento_articulo tm ON tm.id = o.id_tipo_movimiento
+                              UNION ALL
+                              SELECT n.id_articulo, n.id_deposito, n.cantidad * tm.signo_stock
+                              FROM new_rows n
+                              JOIN ref.tipo_movimiento_articulo tm ON tm.id = n.id_tipo_movimiento
+                            ),
+                            deposito AS (
+                              INSERT INTO app.articulo_stock_deposito (id_articulo, id_deposito, stock_actual)
+                              SELECT id_articulo, id_deposito, SUM(cambio)
+                              FROM cambios
+                              GROUP BY id_articulo, id_deposito
+                              HAVING SUM(cambio) <> 0
+                              ON CONFLICT (id_articulo, id_deposito) DO UPDATE
+                              SET stock_actual = app.articulo_stock_deposito.stock_actual + EXCLUDED.stock_actual,
+                                  ultima_actualizacion = now()
+                            )
                             INSERT INTO app.articulo_stock_resumen (id_articulo, stock_total)
-                            VALUES (NEW.id_articulo, NEW.cantidad * v_signo)
-                            ON CONFLICT (id_articulo) DO UPDATE 
-                            SET stock_total = app.articulo_stock_resumen.stock_total + (NEW.cantidad * v_signo),
+                            SELECT id_articulo, SUM(cambio)
+                            FROM cambios
+                            GROUP BY id_articulo
+                            HAVING SUM(cambio) <> 0
+                            ON CONFLICT (id_articulo) DO UPDATE
+                            SET stock_total = app.articulo_stock_resumen.stock_total + EXCLUDED.stock_total,
                                 ultima_actualizacion = now();
-                            
-                            -- Get the new stock total and save it to the movement
-                            SELECT stock_total INTO v_new_stock 
-                            FROM app.articulo_stock_resumen 
-                            WHERE id_articulo = NEW.id_articulo;
-                            
-                            UPDATE app.movimiento_articulo 
-                            SET stock_resultante = v_new_stock 
-                            WHERE id = NEW.id;
-                                    
-                          ELSIF (TG_OP = 'UPDATE') THEN
-                            UPDATE app.articulo_stock_resumen 
-                            SET stock_total = stock_total - (OLD.cantidad * v_signo) + (NEW.cantidad * v_signo),
-                                ultima_actualizacion = now()
-                            WHERE id_articulo = NEW.id_articulo;
-                                
-                          ELSIF (TG_OP = 'DELETE') THEN
-                            UPDATE app.articulo_stock_resumen 
-                            SET stock_total = stock_total - (OLD.cantidad * v_signo),
+
+                          ELSIF TG_OP = 'DELETE' THEN
+                            WITH cambios AS (
+                              SELECT o.id_articulo, o.id_deposito, o.cantidad * tm.signo_stock AS cambio
+                              FROM old_rows o
+                              JOIN ref.tipo_movimiento_articulo tm ON tm.id = o.id_tipo_movimiento
+                            ),
+                            deposito AS (
+                              UPDATE app.articulo_stock_deposito sd
+                              SET stock_actual = sd.stock_actual - d.cambio,
+                                  ultima_actualizacion = now()
+                              FROM (
+                                SELECT id_articulo, id_deposito, SUM(cambio) AS cambio
+                                FROM cambios
+                                GROUP BY id_articulo, id_deposito
+                              ) d
+                              WHERE sd.id_articulo = d.id_articulo AND sd.id_deposito = d.id_deposito
+                            )
+                            UPDATE app.articulo_stock_resumen sr
+                            SET stock_total = sr.stock_total - d.cambio,
                                 ultima_actualizacion = now()
-                            WHERE id_articulo = OLD.id_articulo;
+                            FROM (
+                              SELECT id_articulo, SUM(cambio) AS cambio
+                              FROM cambios
+                              GROUP BY id_articulo
+                            ) d
+                            WHERE sr.id_articulo = d.id_articulo;
                           END IF;
-                            
+
                           RETURN NULL;
                         END;
                         $fn$ LANGUAGE plpgsql;
+
+                        DROP TRIGGER IF EXISTS trg_sync_stock_resumen ON app.movimiento_articulo;
+
+                        DROP TRIGGER IF EXISTS trg_sync_stock_resumen_ins ON app.movimiento_articulo;
+                        CREATE TRIGGER trg_sync_stock_resumen_ins
+                        AFTER INSERT ON app.movimiento_articulo
+                        REFERENCING NEW TABLE AS new_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION app.fn_sync_stock_resumen();
+
+                        DROP TRIGGER IF EXISTS trg_sync_stock_resumen_upd ON app.movimiento_articulo;
+                        CREATE TRIGGER trg_sync_stock_resumen_upd
+                        AFTER UPDATE ON app.movimiento_articulo
+                        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION app.fn_sync_stock_resumen();
+
+                        DROP TRIGGER IF EXISTS trg_sync_stock_resumen_del ON app.movimiento_articulo;
+                        CREATE TRIGGER trg_sync_stock_resumen_del
+                        AFTER DELETE ON app.movimiento_articulo
+                        REFERENCING OLD TABLE AS old_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION app.fn_sync_stock_resumen();
                     """)
 
                     # 8. Ensure the default guest account exists for quick access.
@@ -509,6 +973,1266 @@ class Database:
                             "Could not provision guest user because role %s was not found.",
                             GUEST_USER_ROLE,
                         )
+
+                    # 9. Notify catalog changes so every terminal can drop its cached copy
+                    cur.execute("""
+                        CREATE OR REPLACE FUNCTION ref.fn_notify_catalog_change()
+                        RETURNS TRIGGER AS $fn$
+                        BEGIN
+                          PERFORM pg_notify('nexoryn_catalog', TG_TABLE_SCHEMA || '.' || TG_TABLE_NAME);
+                          RETURN NULL;
+                        END;
+                        $fn$ LANGUAGE plpgsql;
+
+                        DO $do$
+                        DECLARE
+                          t RECORD;
+                        BEGIN
+                          FOR t IN
+                            SELECT schemaname, tablename FROM pg_tables
+                            WHERE schemaname = 'ref'
+                               OR (schemaname = 'app' AND tablename = 'entidad_comercial')
+                          LOOP
+                            IF NOT EXISTS (
+                              SELECT 1 FROM pg_trigger
+                              WHERE tgname = 'trg_notify_catalog_change'
+                                AND tgrelid = format('%I.%I', t.schemaname, t.tablename)::regclass
+                            ) THEN
+                              EXECUTE format(
+                                'CREATE TRIGGER trg_notify_catalog_change '
+                                'AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON %I.%I '
+                                'FOR EACH STATEMENT EXECUTE FUNCTION ref.fn_notify_catalog_change()',
+                                t.schemaname, t.tablename
+                              );
+                            END IF;
+                          END LOOP;
+                        END $do$;
+                    """)
+
+                    # 10. Notify writes on transactional tables (cross-terminal refresh)
+                    cur.execute("""
+                        CREATE OR REPLACE FUNCTION app.fn_notify_data_change()
+                        RETURNS TRIGGER AS $fn$
+                        BEGIN
+                          PERFORM pg_notify('nexoryn_changes', TG_TABLE_SCHEMA || '.' || TG_TABLE_NAME);
+                          RETURN NULL;
+                        END;
+                        $fn$ LANGUAGE plpgsql;
+
+                        DO $do$
+                        DECLARE
+                          t TEXT;
+                        BEGIN
+                          FOREACH t IN ARRAY ARRAY[
+                            'documento', 'articulo', 'movimiento_articulo', 'pago',
+                            'movimiento_cuenta_corriente', 'remito'
+                          ]
+                          LOOP
+                            IF to_regclass('app.' || t) IS NOT NULL AND NOT EXISTS (
+                              SELECT 1 FROM pg_trigger
+                              WHERE tgname = 'trg_notify_data_change'
+                                AND tgrelid = to_regclass('app.' || t)
+                            ) THEN
+                              EXECUTE format(
+                                'CREATE TRIGGER trg_notify_data_change '
+                                'AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON app.%I '
+                                'FOR EACH STATEMENT EXECUTE FUNCTION app.fn_notify_data_change()',
+                                t
+                              );
+                            END IF;
+                          END LOOP;
+                        END $do$;
+                    """)
+
+                    # 11. Article list projection (denormalized v_articulo_detallado kept by triggers)
+                    cur.execute("SELECT to_regclass('app.articulo_listado') AS rel")
+                    rel = cur.fetchone()
+                    if (rel.get("rel") if isinstance(rel, dict) else rel[0]) is None:
+                        logger.info("Creating app.articulo_listado projection (one-time backfill)...")
+                        cur.execute("""
+                        CREATE TABLE IF NOT EXISTS app.articulo_listado (
+                          id                     BIGINT PRIMARY KEY REFERENCES app.articulo(id) ON DELETE CASCADE,
+                          id_articulo            BIGINT NOT NULL,
+                          nombre                 VARCHAR(200) NOT NULL,
+                          id_marca               BIGINT,
+                          marca                  VARCHAR(100),
+                          id_rubro               BIGINT,
+                          rubro                  VARCHAR(100),
+                          costo                  NUMERIC(14,4) NOT NULL DEFAULT 0,
+                          id_tipo_iva            BIGINT,
+                          porcentaje_iva         DECIMAL(6,2),
+                          id_unidad_medida       BIGINT,
+                          unidad_medida          VARCHAR(30),
+                          unidad_abreviatura     VARCHAR(10),
+                          id_proveedor           BIGINT,
+                          proveedor              TEXT,
+                          stock_minimo           NUMERIC(14,4) NOT NULL DEFAULT 0,
+                          descuento_base         NUMERIC(6,2) NOT NULL DEFAULT 0,
+                          redondeo               BOOLEAN NOT NULL DEFAULT FALSE,
+                          porcentaje_ganancia_2  NUMERIC(6,2),
+                          unidades_por_bulto     INTEGER,
+                          activo                 BOOLEAN NOT NULL DEFAULT TRUE,
+                          observacion            TEXT,
+                          ubicacion              VARCHAR(100),
+                          stock_actual           NUMERIC(14,4) NOT NULL DEFAULT 0,
+                          precio_lista           NUMERIC(14,4),
+                          codigo                 VARCHAR(80)
+                        );
+
+                        CREATE INDEX IF NOT EXISTS idx_art_listado_nombre ON app.articulo_listado (nombre, id);
+                        CREATE INDEX IF NOT EXISTS idx_art_listado_activo_nombre ON app.articulo_listado (activo, nombre, id);
+                        CREATE INDEX IF NOT EXISTS idx_art_listado_marca_nombre ON app.articulo_listado (id_marca, nombre, id);
+                        CREATE INDEX IF NOT EXISTS idx_art_listado_rubro_nombre ON app.articulo_listado (id_rubro, nombre, id);
+                        CREATE INDEX IF NOT EXISTS idx_art_listado_proveedor_nombre ON app.articulo_listado (id_proveedor, nombre, id);
+                        CREATE INDEX IF NOT EXISTS idx_art_listado_codigo ON app.articulo_listado (codigo);
+                        CREATE INDEX IF NOT EXISTS idx_art_listado_nombre_trgm ON app.articulo_listado USING gin (nombre gin_trgm_ops);
+                        CREATE INDEX IF NOT EXISTS idx_art_listado_codigo_trgm ON app.articulo_listado USING gin (codigo gin_trgm_ops);
+                        CREATE INDEX IF NOT EXISTS idx_art_listado_marca_trgm ON app.articulo_listado USING gin (marca gin_trgm_ops);
+                        CREATE INDEX IF NOT EXISTS idx_art_listado_rubro_trgm ON app.articulo_listado USING gin (rubro gin_trgm_ops);
+                        CREATE INDEX IF NOT EXISTS idx_art_listado_proveedor_trgm ON app.articulo_listado USING gin (proveedor gin_trgm_ops);
+                        CREATE INDEX IF NOT EXISTS idx_art_listado_bajo_minimo ON app.articulo_listado (nombre, id)
+                          WHERE COALESCE(stock_actual, 0) < COALESCE(stock_minimo, 0);
+
+                        CREATE OR REPLACE FUNCTION app.fn_articulo_listado_refresh(p_ids BIGINT[])
+                        RETURNS VOID AS $fn$
+                        BEGIN
+                          INSERT INTO app.articulo_listado (
+                            id, id_articulo, nombre, id_marca, marca, id_rubro, rubro, costo, id_tipo_iva,
+                            porcentaje_iva, id_unidad_medida, unidad_medida, unidad_abreviatura, id_proveedor,
+                            proveedor, stock_minimo, descuento_base, redondeo, porcentaje_ganancia_2,
+                            unidades_por_bulto, activo, observacion, ubicacion, stock_actual, precio_lista, codigo
+                          )
+                          SELECT
+                            a.id, a.id, a.nombre, a.id_marca, m.nombre, a.id_rubro, r.nombre, a.costo, a.id_tipo_iva,
+                            ti.porcentaje, a.id_unidad_medida, um.nombre, um.abreviatura, a.id_proveedor,
+                            COALESCE(prov.razon_social, TRIM(COALESCE(prov.apellido, '') || ' ' || COALESCE(prov.nombre, ''))),
+                            a.stock_minimo, a.descuento_base, a.redondeo, a.porcentaje_ganancia_2,
+                            a.unidades_por_bulto, a.activo, a.observacion, a.ubicacion,
+                            COALESCE(sr.stock_total, 0), ap.precio, a.codigo
+                          FROM app.articulo a
+                          LEFT JOIN ref.marca m ON m.id = a.id_marca
+                          LEFT JOIN ref.rubro r ON r.id = a.id_rubro
+                          LEFT JOIN ref.tipo_iva ti ON ti.id = a.id_tipo_iva
+                          LEFT JOIN ref.unidad_medida um ON um.id = a.id_unidad_medida
+                          LEFT JOIN app.entidad_comercial prov ON prov.id = a.id_proveedor
+                          LEFT JOIN app.articulo_stock_resumen sr ON sr.id_articulo = a.id
+                          LEFT JOIN app.articulo_precio ap ON ap.id_articulo = a.id AND ap.id_lista_precio = 1
+                          WHERE a.id = ANY(p_ids)
+                          ON CONFLICT (id) DO UPDATE SET
+                            nombre = EXCLUDED.nombre,
+                            id_marca = EXCLUDED.id_marca,
+                            marca = EXCLUDED.marca,
+                            id_rubro = EXCLUDED.id_rubro,
+                            rubro = EXCLUDED.rubro,
+                            costo = EXCLUDED.costo,
+                            id_tipo_iva = EXCLUDED.id_tipo_iva,
+                            porcentaje_iva = EXCLUDED.porcentaje_iva,
+                            id_unidad_medida = EXCLUDED.id_unidad_medida,
+                            unidad_medida = EXCLUDED.unidad_medida,
+                            unidad_abreviatura = EXCLUDED.unidad_abreviatura,
+                            id_proveedor = EXCLUDED.id_proveedor,
+                            proveedor = EXCLUDED.proveedor,
+                            stock_minimo = EXCLUDED.stock_minimo,
+                            descuento_base = EXCLUDED.descuento_base,
+                            redondeo = EXCLUDED.redondeo,
+                            porcentaje_ganancia_2 = EXCLUDED.porcentaje_ganancia_2,
+                            unidades_por_bulto = EXCLUDED.unidades_por_bulto,
+                            activo = EXCLUDED.activo,
+                            observacion = EXCLUDED.observacion,
+                            ubicacion = EXCLUDED.ubicacion,
+                            stock_actual = EXCLUDED.stock_actual,
+                            precio_lista = EXCLUDED.precio_lista,
+                            codigo = EXCLUDED.codigo;
+                        END;
+                        $fn$ LANGUAGE plpgsql;
+
+                        -- app.articulo: statement-level so mass updates refresh the projection in one pass
+                        CREATE OR REPLACE FUNCTION app.fn_trg_articulo_listado_articulo()
+                        RETURNS TRIGGER AS $fn$
+                        BEGIN
+                          PERFORM app.fn_articulo_listado_refresh(ARRAY(SELECT id FROM new_rows));
+                          RETURN NULL;
+                        END;
+                        $fn$ LANGUAGE plpgsql;
+
+                        DROP TRIGGER IF EXISTS trg_articulo_listado_ins ON app.articulo;
+                        CREATE TRIGGER trg_articulo_listado_ins
+                        AFTER INSERT ON app.articulo
+                        REFERENCING NEW TABLE AS new_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION app.fn_trg_articulo_listado_articulo();
+
+                        DROP TRIGGER IF EXISTS trg_articulo_listado_upd ON app.articulo;
+                        CREATE TRIGGER trg_articulo_listado_upd
+                        AFTER UPDATE ON app.articulo
+                        REFERENCING NEW TABLE AS new_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION app.fn_trg_articulo_listado_articulo();
+
+                        -- app.articulo_precio: only the base list (id 1) is projected
+                        CREATE OR REPLACE FUNCTION app.fn_trg_articulo_listado_precio()
+                        RETURNS TRIGGER AS $fn$
+                        BEGIN
+                          IF TG_OP = 'DELETE' THEN
+                            UPDATE app.articulo_listado al
+                            SET precio_lista = NULL
+                            FROM old_rows o
+                            WHERE o.id_lista_precio = 1 AND al.id = o.id_articulo;
+                          ELSE
+                            UPDATE app.articulo_listado al
+                            SET precio_lista = n.precio
+                            FROM new_rows n
+                            WHERE n.id_lista_precio = 1 AND al.id = n.id_articulo
+                              AND al.precio_lista IS DISTINCT FROM n.precio;
+                          END IF;
+                          RETURN NULL;
+                        END;
+                        $fn$ LANGUAGE plpgsql;
+
+                        DROP TRIGGER IF EXISTS trg_articulo_listado_precio_ins ON app.articulo_precio;
+                        CREATE TRIGGER trg_articulo_listado_precio_ins
+                        AFTER INSERT ON app.articulo_precio
+                        REFERENCING NEW TABLE AS new_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION app.fn_trg_articulo_listado_precio();
+
+                        DROP TRIGGER IF EXISTS trg_articulo_listado_precio_upd ON app.articulo_precio;
+                        CREATE TRIGGER trg_articulo_listado_precio_upd
+                        AFTER UPDATE ON app.articulo_precio
+                        REFERENCING NEW TABLE AS new_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION app.fn_trg_articulo_listado_precio();
+
+                        DROP TRIGGER IF EXISTS trg_articulo_listado_precio_del ON app.articulo_precio;
+                        CREATE TRIGGER trg_articulo_listado_precio_del
+                        AFTER DELETE ON app.articulo_precio
+                        REFERENCING OLD TABLE AS old_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION app.fn_trg_articulo_listado_precio();
+
+                        -- app.articulo_stock_resumen: written once per article and statement from fn_sync_stock_resumen
+                        CREATE OR REPLACE FUNCTION app.fn_trg_articulo_listado_stock()
+                        RETURNS TRIGGER AS $fn$
+                        BEGIN
+                          IF TG_OP = 'DELETE' THEN
+                            UPDATE app.articulo_listado SET stock_actual = 0 WHERE id = OLD.id_articulo;
+                          ELSE
+                            UPDATE app.articulo_listado
+                            SET stock_actual = NEW.stock_total
+                            WHERE id = NEW.id_articulo AND stock_actual IS DISTINCT FROM NEW.stock_total;
+                          END IF;
+                          RETURN NULL;
+                        END;
+                        $fn$ LANGUAGE plpgsql;
+
+                        DROP TRIGGER IF EXISTS trg_articulo_listado_stock ON app.articulo_stock_resumen;
+                        CREATE TRIGGER trg_articulo_listado_stock
+                        AFTER INSERT OR UPDATE OR DELETE ON app.articulo_stock_resumen
+                        FOR EACH ROW EXECUTE FUNCTION app.fn_trg_articulo_listado_stock();
+
+                        -- Lookup tables: propagate renames to the denormalized columns
+                        CREATE OR REPLACE FUNCTION app.fn_trg_articulo_listado_lookup()
+                        RETURNS TRIGGER AS $fn$
+                        BEGIN
+                          IF TG_TABLE_NAME = 'marca' THEN
+                            UPDATE app.articulo_listado SET marca = NEW.nombre WHERE id_marca = NEW.id;
+                          ELSIF TG_TABLE_NAME = 'rubro' THEN
+                            UPDATE app.articulo_listado SET rubro = NEW.nombre WHERE id_rubro = NEW.id;
+                          ELSIF TG_TABLE_NAME = 'tipo_iva' THEN
+                            UPDATE app.articulo_listado SET porcentaje_iva = NEW.porcentaje WHERE id_tipo_iva = NEW.id;
+                          ELSIF TG_TABLE_NAME = 'unidad_medida' THEN
+                            UPDATE app.articulo_listado
+                            SET unidad_medida = NEW.nombre, unidad_abreviatura = NEW.abreviatura
+                            WHERE id_unidad_medida = NEW.id;
+                          ELSIF TG_TABLE_NAME = 'entidad_comercial' THEN
+                            UPDATE app.articulo_listado
+                            SET proveedor = COALESCE(NEW.razon_social, TRIM(COALESCE(NEW.apellido, '') || ' ' || COALESCE(NEW.nombre, '')))
+                            WHERE id_proveedor = NEW.id;
+                          END IF;
+                          RETURN NULL;
+                        END;
+                        $fn$ LANGUAGE plpgsql;
+
+                        DROP TRIGGER IF EXISTS trg_articulo_listado_marca ON ref.marca;
+                        CREATE TRIGGER trg_articulo_listado_marca
+                        AFTER UPDATE OF nombre ON ref.marca
+                        FOR EACH ROW EXECUTE FUNCTION app.fn_trg_articulo_listado_lookup();
+
+                        DROP TRIGGER IF EXISTS trg_articulo_listado_rubro ON ref.rubro;
+                        CREATE TRIGGER trg_articulo_listado_rubro
+                        AFTER UPDATE OF nombre ON ref.rubro
+                        FOR EACH ROW EXECUTE FUNCTION app.fn_trg_articulo_listado_lookup();
+
+                        DROP TRIGGER IF EXISTS trg_articulo_listado_tipo_iva ON ref.tipo_iva;
+                        CREATE TRIGGER trg_articulo_listado_tipo_iva
+                        AFTER UPDATE OF porcentaje ON ref.tipo_iva
+                        FOR EACH ROW EXECUTE FUNCTION app.fn_trg_articulo_listado_lookup();
+
+                        DROP TRIGGER IF EXISTS trg_articulo_listado_unidad ON ref.unidad_medida;
+                        CREATE TRIGGER trg_articulo_listado_unidad
+                        AFTER UPDATE OF nombre, abreviatura ON ref.unidad_medida
+                        FOR EACH ROW EXECUTE FUNCTION app.fn_trg_articulo_listado_lookup();
+
+                        DROP TRIGGER IF EXISTS trg_articulo_listado_proveedor ON app.entidad_comercial;
+                        CREATE TRIGGER trg_articulo_listado_proveedor
+                        AFTER UPDATE OF razon_social, apellido, nombre ON app.entidad_comercial
+                        FOR EACH ROW EXECUTE FUNCTION app.fn_trg_articulo_listado_lookup();
+
+                        -- Backfill (also repairs rows missing after a partial restore)
+                        SELECT app.fn_articulo_listado_refresh(ARRAY(
+                          SELECT a.id FROM app.articulo a
+                          WHERE NOT EXISTS (SELECT 1 FROM app.articulo_listado al WHERE al.id = a.id)
+                        ));
+                        """)
+
+                    # Dashboard bajo_stock / sin_stock counters: index-only scans of small partial indexes
+                    cur.execute("""
+                        CREATE INDEX IF NOT EXISTS idx_art_listado_stock_bajo ON app.articulo_listado (id)
+                          WHERE stock_actual <= stock_minimo;
+                        CREATE INDEX IF NOT EXISTS idx_art_listado_sin_stock ON app.articulo_listado (id)
+                          WHERE stock_actual <= 0;
+                    """)
+
+                    # 12. Daily sales fact tables for the dashboard (kept by triggers).
+                    # Business time zone and day bucketing: same definitions as database.sql,
+                    # where the IMMUTABLE assumption is documented.
+                    cur.execute("""
+                        CREATE OR REPLACE FUNCTION app.fn_zona_negocio()
+                        RETURNS TEXT AS $fn$
+                          SELECT 'America/Argentina/Buenos_Aires'::text;
+                        $fn$ LANGUAGE sql IMMUTABLE;
+
+                        CREATE OR REPLACE FUNCTION app.fn_ventas_dia(p_fecha TIMESTAMPTZ)
+                        RETURNS DATE AS $fn$
+                          SELECT (p_fecha AT TIME ZONE app.fn_zona_negocio())::date;
+                        $fn$ LANGUAGE sql IMMUTABLE;
+                    """)
+                    cur.execute("SELECT to_regclass('app.ventas_diarias') AS rel")
+                    rel = cur.fetchone()
+                    if (rel.get("rel") if isinstance(rel, dict) else rel[0]) is None:
+                        logger.info("Creating app.ventas_diarias fact tables (one-time backfill)...")
+                        cur.execute("""
+                        -- id_forma_pago = 0: one row per document (cantidad = documentos, total, total_sin_pago).
+                        -- id_forma_pago > 0: payments of the documents in the bucket (cantidad = pagos, monto_pagado).
+                        CREATE TABLE IF NOT EXISTS app.ventas_diarias (
+                          dia                DATE NOT NULL,
+                          id_tipo_documento  BIGINT NOT NULL,
+                          estado             VARCHAR(12) NOT NULL,
+                          id_forma_pago      BIGINT NOT NULL DEFAULT 0,
+                          cantidad           INTEGER NOT NULL DEFAULT 0,
+                          total              NUMERIC(18,4) NOT NULL DEFAULT 0,
+                          total_sin_pago     NUMERIC(18,4) NOT NULL DEFAULT 0,
+                          monto_pagado       NUMERIC(18,4) NOT NULL DEFAULT 0,
+                          PRIMARY KEY (dia, id_tipo_documento, estado, id_forma_pago)
+                        );
+
+                        CREATE TABLE IF NOT EXISTS app.ventas_diarias_articulo (
+                          dia                DATE NOT NULL,
+                          id_tipo_documento  BIGINT NOT NULL,
+                          estado             VARCHAR(12) NOT NULL,
+                          id_articulo        BIGINT NOT NULL,
+                          cantidad           NUMERIC(18,4) NOT NULL DEFAULT 0,
+                          total              NUMERIC(18,4) NOT NULL DEFAULT 0,
+                          lineas             INTEGER NOT NULL DEFAULT 0,
+                          PRIMARY KEY (dia, id_tipo_documento, estado, id_articulo)
+                        );
+
+                        CREATE INDEX IF NOT EXISTS idx_ventas_diarias_art_articulo ON app.ventas_diarias_articulo (id_articulo, dia);
+
+                        CREATE OR REPLACE FUNCTION app.fn_ventas_diarias_sumar(
+                          p_dia DATE, p_tipo BIGINT, p_estado VARCHAR, p_forma BIGINT,
+                          p_cantidad INTEGER, p_total NUMERIC, p_sin_pago NUMERIC, p_pagado NUMERIC
+                        )
+                        RETURNS VOID AS $fn$
+                        BEGIN
+                          INSERT INTO app.ventas_diarias AS v (
+                            dia, id_tipo_documento, estado, id_forma_pago, cantidad, total, total_sin_pago, monto_pagado
+                          )
+                          VALUES (p_dia, p_tipo, p_estado, p_forma, p_cantidad, p_total, p_sin_pago, p_pagado)
+                          ON CONFLICT (dia, id_tipo_documento, estado, id_forma_pago) DO UPDATE SET
+                            cantidad = v.cantidad + EXCLUDED.cantidad,
+                            total = v.total + EXCLUDED.total,
+                            total_sin_pago = v.total_sin_pago + EXCLUDED.total_sin_pago,
+                            monto_pagado = v.monto_pagado + EXCLUDED.monto_pagado;
+                          IF p_cantidad < 0 THEN
+                            DELETE FROM app.ventas_diarias
+                            WHERE dia = p_dia AND id_tipo_documento = p_tipo AND estado = p_estado
+                              AND id_forma_pago = p_forma AND cantidad = 0;
+                          END IF;
+                        END;
+                        $fn$ LANGUAGE plpgsql;
+
+                        CREATE OR REPLACE FUNCTION app.fn_ventas_diarias_articulo_sumar(
+                          p_dia DATE, p_tipo BIGINT, p_estado VARCHAR, p_articulo BIGINT,
+                          p_cantidad NUMERIC, p_total NUMERIC, p_lineas INTEGER
+                        )
+                        RETURNS VOID AS $fn$
+                        BEGIN
+                          INSERT INTO app.ventas_diarias_articulo AS v (
+                            dia, id_tipo_documento, estado, id_articulo, cantidad, total, lineas
+                          )
+                          VALUES (p_dia, p_tipo, p_estado, p_articulo, p_cantidad, p_total, p_lineas)
+                          ON CONFLICT (dia, id_tipo_documento, estado, id_articulo) DO UPDATE SET
+                            cantidad = v.cantidad + EXCLUDED.cantidad,
+                            total = v.total + EXCLUDED.total,
+                            lineas = v.lineas + EXCLUDED.lineas;
+                          IF p_lineas < 0 THEN
+                            DELETE FROM app.ventas_diarias_articulo
+                            WHERE dia = p_dia AND id_tipo_documento = p_tipo AND estado = p_estado
+                              AND id_articulo = p_articulo AND lineas = 0;
+                          END IF;
+                        END;
+                        $fn$ LANGUAGE plpgsql;
+
+                        -- Adds (p_signo = 1) or removes (p_signo = -1) a whole document, with its
+                        -- current payments and lines, from the buckets of the given header values.
+                        CREATE OR REPLACE FUNCTION app.fn_ventas_diarias_documento(
+                          p_id BIGINT, p_fecha TIMESTAMPTZ, p_tipo BIGINT, p_estado VARCHAR, p_total NUMERIC, p_signo INTEGER
+                        )
+                        RETURNS VOID AS $fn$
+                        DECLARE
+                          v_dia DATE := app.fn_ventas_dia(p_fecha);
+                          v_pagado BOOLEAN := EXISTS (SELECT 1 FROM app.pago WHERE id_documento = p_id);
+                          r RECORD;
+                        BEGIN
+                          PERFORM app.fn_ventas_diarias_sumar(
+                            v_dia, p_tipo, p_estado, 0, p_signo, p_signo * p_total,
+                            CASE WHEN v_pagado THEN 0 ELSE p_signo * p_total END, 0
+                          );
+                          FOR r IN
+                            SELECT id_forma_pago, COUNT(*)::int AS n, SUM(monto) AS monto
+                            FROM app.pago WHERE id_documento = p_id
+                            GROUP BY id_forma_pago
+                          LOOP
+                            PERFORM app.fn_ventas_diarias_sumar(v_dia, p_tipo, p_estado, r.id_forma_pago, p_signo * r.n, 0, 0, p_signo * r.monto);
+                          END LOOP;
+                          FOR r IN
+                            SELECT id_articulo, SUM(cantidad) AS cantidad, SUM(total_linea) AS total, COUNT(*)::int AS n
+                            FROM app.documento_detalle WHERE id_documento = p_id
+                            GROUP BY id_articulo
+                          LOOP
+                            PERFORM app.fn_ventas_diarias_articulo_sumar(
+                              v_dia, p_tipo, p_estado, r.id_articulo, p_signo * r.cantidad, p_signo * r.total, p_signo * r.n
+                            );
+                          END LOOP;
+                        END;
+                        $fn$ LANGUAGE plpgsql;
+
+                        -- app.documento: move the document between buckets when a grouped column changes.
+                        -- DELETE runs BEFORE so payments and lines are still there (they cascade afterwards
+                        -- and their own triggers skip documents that no longer exist).
+                        CREATE OR REPLACE FUNCTION app.fn_trg_ventas_diarias_documento()
+                        RETURNS TRIGGER AS $fn$
+                        BEGIN
+                          IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                            PERFORM app.fn_ventas_diarias_documento(OLD.id, OLD.fecha, OLD.id_tipo_documento, OLD.estado, OLD.total, -1);
+                          END IF;
+                          IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                            PERFORM app.fn_ventas_diarias_documento(NEW.id, NEW.fecha, NEW.id_tipo_documento, NEW.estado, NEW.total, 1);
+                          END IF;
+                          IF TG_OP = 'DELETE' THEN
+                            RETURN OLD;
+                          END IF;
+                          RETURN NULL;
+                        END;
+                        $fn$ LANGUAGE plpgsql;
+
+                        DROP TRIGGER IF EXISTS trg_ventas_diarias_documento_ins ON app.documento;
+                        CREATE TRIGGER trg_ventas_diarias_documento_ins
+                        AFTER INSERT ON app.documento
+                        FOR EACH ROW EXECUTE FUNCTION app.fn_trg_ventas_diarias_documento();
+
+                        DROP TRIGGER IF EXISTS trg_ventas_diarias_documento_upd ON app.documento;
+                        CREATE TRIGGER trg_ventas_diarias_documento_upd
+                        AFTER UPDATE OF fecha, id_tipo_documento, estado, total ON app.documento
+                        FOR EACH ROW
+                        WHEN (OLD.fecha IS DISTINCT FROM NEW.fecha
+                           OR OLD.id_tipo_documento IS DISTINCT FROM NEW.id_tipo_documento
+                           OR OLD.estado IS DISTINCT FROM NEW.estado
+                           OR OLD.total IS DISTINCT FROM NEW.total)
+                        EXECUTE FUNCTION app.fn_trg_ventas_diarias_documento();
+
+                        DROP TRIGGER IF EXISTS trg_ventas_diarias_documento_del ON app.documento;
+                        CREATE TRIGGER trg_ventas_diarias_documento_del
+                        BEFORE DELETE ON app.documento
+                        FOR EACH ROW EXECUTE FUNCTION app.fn_trg_ventas_diarias_documento();
+
+                        -- app.pago: BEFORE so "first/last payment of the document" is checked against
+                        -- the rows that existed before this one (the document moves in/out of total_sin_pago).
+                        CREATE OR REPLACE FUNCTION app.fn_trg_ventas_diarias_pago()
+                        RETURNS TRIGGER AS $fn$
+                        DECLARE
+                          d RECORD;
+                          v_old_doc BIGINT;
+                          v_new_doc BIGINT;
+                        BEGIN
+                          IF TG_OP <> 'INSERT' THEN
+                            v_old_doc := OLD.id_documento;
+                          END IF;
+                          IF TG_OP <> 'DELETE' THEN
+                            v_new_doc := NEW.id_documento;
+                          END IF;
+                          IF TG_OP = 'UPDATE' THEN
+                            IF v_old_doc IS NOT DISTINCT FROM v_new_doc
+                               AND OLD.id_forma_pago = NEW.id_forma_pago AND OLD.monto = NEW.monto THEN
+                              RETURN NEW;
+                            END IF;
+                          END IF;
+
+                          IF v_old_doc IS NOT NULL THEN
+                            SELECT id, fecha, id_tipo_documento, estado, total INTO d FROM app.documento WHERE id = v_old_doc;
+                            IF FOUND THEN
+                              PERFORM app.fn_ventas_diarias_sumar(
+                                app.fn_ventas_dia(d.fecha), d.id_tipo_documento, d.estado, OLD.id_forma_pago, -1, 0, 0, -OLD.monto
+                              );
+                              IF v_old_doc IS DISTINCT FROM v_new_doc
+                                 AND NOT EXISTS (SELECT 1 FROM app.pago WHERE id_documento = v_old_doc AND id <> OLD.id) THEN
+                                PERFORM app.fn_ventas_diarias_sumar(
+                                  app.fn_ventas_dia(d.fecha), d.id_tipo_documento, d.estado, 0, 0, 0, d.total, 0
+                                );
+                              END IF;
+                            END IF;
+                          END IF;
+
+                          IF v_new_doc IS NOT NULL THEN
+                            SELECT id, fecha, id_tipo_documento, estado, total INTO d FROM app.documento WHERE id = v_new_doc;
+                            IF FOUND THEN
+                              IF v_old_doc IS DISTINCT FROM v_new_doc
+                                 AND NOT EXISTS (SELECT 1 FROM app.pago WHERE id_documento = v_new_doc AND id <> NEW.id) THEN
+                                PERFORM app.fn_ventas_diarias_sumar(
+                                  app.fn_ventas_dia(d.fecha), d.id_tipo_documento, d.estado, 0, 0, 0, -d.total, 0
+                                );
+                              END IF;
+                              PERFORM app.fn_ventas_diarias_sumar(
+                                app.fn_ventas_dia(d.fecha), d.id_tipo_documento, d.estado, NEW.id_forma_pago, 1, 0, 0, NEW.monto
+                              );
+                            END IF;
+                          END IF;
+
+                          IF TG_OP = 'DELETE' THEN
+                            RETURN OLD;
+                          END IF;
+                          RETURN NEW;
+                        END;
+                        $fn$ LANGUAGE plpgsql;
+
+                        DROP TRIGGER IF EXISTS trg_ventas_diarias_pago ON app.pago;
+                        CREATE TRIGGER trg_ventas_diarias_pago
+                        BEFORE INSERT OR UPDATE OR DELETE ON app.pago
+                        FOR EACH ROW EXECUTE FUNCTION app.fn_trg_ventas_diarias_pago();
+
+                        -- app.documento_detalle: per-article quantities and amounts
+                        CREATE OR REPLACE FUNCTION app.fn_trg_ventas_diarias_detalle()
+                        RETURNS TRIGGER AS $fn$
+                        DECLARE
+                          d RECORD;
+                        BEGIN
+                          IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                            SELECT fecha, id_tipo_documento, estado INTO d FROM app.documento WHERE id = OLD.id_documento;
+                            IF FOUND THEN
+                              PERFORM app.fn_ventas_diarias_articulo_sumar(
+                                app.fn_ventas_dia(d.fecha), d.id_tipo_documento, d.estado, OLD.id_articulo,
+                                -OLD.cantidad, -OLD.total_linea, -1
+                              );
+                            END IF;
+                          END IF;
+                          IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                            SELECT fecha, id_tipo_documento, estado INTO d FROM app.documento WHERE id = NEW.id_documento;
+                            IF FOUND THEN
+                              PERFORM app.fn_ventas_diarias_articulo_sumar(
+                                app.fn_ventas_dia(d.fecha), d.id_tipo_documento, d.estado, NEW.id_articulo,
+                                NEW.cantidad, NEW.total_linea, 1
+                              );
+                            END IF;
+                          END IF;
+                          RETURN NULL;
+                        END;
+                        $fn$ LANGUAGE plpgsql;
+
+                        DROP TRIGGER IF EXISTS trg_ventas_diarias_detalle ON app.documento_detalle;
+                        CREATE TRIGGER trg_ventas_diarias_detalle
+                        AFTER INSERT OR UPDATE OR DELETE ON app.documento_detalle
+                        FOR EACH ROW EXECUTE FUNCTION app.fn_trg_ventas_diarias_detalle();
+
+                        -- Full rebuild from the source tables (initial backfill and manual repair)
+                        DROP FUNCTION IF EXISTS app.fn_ventas_diarias_rebuild();
+                        CREATE OR REPLACE FUNCTION app.fn_ventas_diarias_rebuild(p_zona TEXT DEFAULT app.fn_zona_negocio())
+                        RETURNS VOID AS $fn$
+                        BEGIN
+                          LOCK TABLE app.documento, app.pago, app.documento_detalle IN SHARE MODE;
+                          DELETE FROM app.ventas_diarias;
+                          DELETE FROM app.ventas_diarias_articulo;
+
+                          INSERT INTO app.ventas_diarias (dia, id_tipo_documento, estado, id_forma_pago, cantidad, total, total_sin_pago, monto_pagado)
+                          SELECT
+                            (d.fecha AT TIME ZONE p_zona)::date, d.id_tipo_documento, d.estado, 0,
+                            COUNT(*), SUM(d.total),
+                            COALESCE(SUM(d.total) FILTER (WHERE NOT EXISTS (SELECT 1 FROM app.pago p WHERE p.id_documento = d.id)), 0),
+                            0
+                          FROM app.documento d
+                          GROUP BY 1, 2, 3;
+
+                          INSERT INTO app.ventas_diarias (dia, id_tipo_documento, estado, id_forma_pago, cantidad, total, total_sin_pago, monto_pagado)
+                          SELECT (d.fecha AT TIME ZONE p_zona)::date, d.id_tipo_documento, d.estado, p.id_forma_pago, COUNT(*), 0, 0, SUM(p.monto)
+                          FROM app.pago p
+                          JOIN app.documento d ON d.id = p.id_documento
+                          GROUP BY 1, 2, 3, 4;
+
+                          INSERT INTO app.ventas_diarias_articulo (dia, id_tipo_documento, estado, id_articulo, cantidad, total, lineas)
+                          SELECT (d.fecha AT TIME ZONE p_zona)::date, d.id_tipo_documento, d.estado, dd.id_articulo,
+                                 SUM(dd.cantidad), SUM(dd.total_linea), COUNT(*)
+                          FROM app.documento_detalle dd
+                          JOIN app.documento d ON d.id = dd.id_documento
+                          GROUP BY 1, 2, 3, 4;
+                        END;
+                        $fn$ LANGUAGE plpgsql;
+
+                        -- Backfill once when the fact tables are new
+                        DO $do$
+                        BEGIN
+                          IF NOT EXISTS (SELECT 1 FROM app.ventas_diarias) AND EXISTS (SELECT 1 FROM app.documento) THEN
+                            PERFORM app.fn_ventas_diarias_rebuild();
+                          END IF;
+                        END $do$;
+
+                        -- Dashboard report views now read the fact tables
+                        DROP VIEW IF EXISTS app.v_reporte_ventas_mensual CASCADE;
+                        CREATE OR REPLACE VIEW app.v_reporte_ventas_mensual AS
+                        SELECT
+                          date_trunc('month', vd.dia::timestamp) AS mes,
+                          SUM(vd.total) AS total_ventas,
+                          SUM(vd.cantidad)::bigint AS cantidad_operaciones,
+                          SUM(vd.total) / NULLIF(SUM(vd.cantidad), 0) AS ticket_promedio
+                        FROM app.ventas_diarias vd
+                        JOIN ref.tipo_documento td ON vd.id_tipo_documento = td.id
+                        WHERE td.clase = 'VENTA' AND vd.estado IN ('CONFIRMADO', 'PAGADO') AND vd.id_forma_pago = 0
+                        GROUP BY 1
+                        ORDER BY 1 DESC;
+
+                        DROP VIEW IF EXISTS app.v_top_articulos_mes CASCADE;
+                        CREATE OR REPLACE VIEW app.v_top_articulos_mes AS
+                        SELECT
+                          a.id AS id,
+                          a.nombre,
+                          r.nombre AS rubro,
+                          SUM(va.cantidad) AS cantidad_vendida,
+                          SUM(va.total) AS total_facturado
+                        FROM app.ventas_diarias_articulo va
+                        JOIN app.articulo a ON va.id_articulo = a.id
+                        JOIN ref.rubro r ON a.id_rubro = r.id
+                        JOIN ref.tipo_documento td ON va.id_tipo_documento = td.id
+                        WHERE td.clase = 'VENTA' 
+                          AND va.estado IN ('CONFIRMADO', 'PAGADO')
+                          AND va.dia >= date_trunc('month', app.fn_ventas_dia(now())::timestamp)::date
+                        GROUP BY a.id, a.nombre, r.nombre
+                        ORDER BY total_facturado DESC
+                        LIMIT 20;
+                        """)
+
+                    # 13. Job record of the batched mass price updates (resumable)
+                    cur.execute("""
+                        CREATE TABLE IF NOT EXISTS app.actualizacion_masiva (
+                          id                   BIGINT GENERATED ALWAYS AS IDENTITY PRIMARY KEY,
+                          estado               VARCHAR(12) NOT NULL DEFAULT 'EN_CURSO',
+                          objetivo             VARCHAR(20) NOT NULL,
+                          operacion            VARCHAR(20) NOT NULL,
+                          valor                NUMERIC(14,4) NOT NULL,
+                          id_lista_precio      BIGINT REFERENCES ref.lista_precio(id) ON DELETE SET NULL,
+                          filtros              JSONB NOT NULL DEFAULT '{}'::jsonb,
+                          ids                  BIGINT[],
+                          tamano_lote          INTEGER NOT NULL,
+                          total                INTEGER NOT NULL DEFAULT 0,
+                          procesados           INTEGER NOT NULL DEFAULT 0,
+                          actualizados         INTEGER NOT NULL DEFAULT 0,
+                          omitidos             INTEGER NOT NULL DEFAULT 0,
+                          ultimo_id            BIGINT NOT NULL DEFAULT 0,
+                          error                TEXT,
+                          id_usuario           BIGINT REFERENCES seguridad.usuario(id) ON DELETE SET NULL,
+                          fecha_inicio         TIMESTAMPTZ NOT NULL DEFAULT now(),
+                          fecha_actualizacion  TIMESTAMPTZ NOT NULL DEFAULT now(),
+                          fecha_fin            TIMESTAMPTZ,
+                          CONSTRAINT ck_actualizacion_masiva_estado CHECK (estado IN ('EN_CURSO', 'DETENIDO', 'CANCELADO', 'FALLIDO', 'COMPLETADO'))
+                        );
+                        -- DETENIDO (stopped by the user, resumable) came after the first version of the table
+                        DO $do$
+                        BEGIN
+                          IF NOT EXISTS (
+                            SELECT 1 FROM pg_constraint
+                            WHERE conname = 'ck_actualizacion_masiva_estado'
+                              AND pg_get_constraintdef(oid) LIKE '%DETENIDO%'
+                          ) THEN
+                            ALTER TABLE app.actualizacion_masiva DROP CONSTRAINT IF EXISTS ck_actualizacion_masiva_estado;
+                            ALTER TABLE app.actualizacion_masiva ADD CONSTRAINT ck_actualizacion_masiva_estado
+                              CHECK (estado IN ('EN_CURSO', 'DETENIDO', 'CANCELADO', 'FALLIDO', 'COMPLETADO'));
+                            DROP INDEX IF EXISTS app.idx_actualizacion_masiva_pendiente;
+                          END IF;
+                        END $do$;
+                        CREATE INDEX IF NOT EXISTS idx_actualizacion_masiva_pendiente ON app.actualizacion_masiva (id DESC)
+                          WHERE estado IN ('EN_CURSO', 'DETENIDO', 'FALLIDO');
+                    """)
+
+                    # 14. Payment summary on app.documento (kept by triggers on app.pago), so
+                    # v_documento_resumen no longer runs a correlated subquery per row
+                    cur.execute("""
+                        SELECT 1 FROM information_schema.columns
+                        WHERE table_schema = 'app' AND table_name = 'documento' AND column_name = 'monto_pagado'
+                    """)
+                    if cur.fetchone() is None:
+                        logger.info("Adding payment summary columns to app.documento (one-time backfill)...")
+                        cur.execute("""
+                        ALTER TABLE app.documento
+                          ADD COLUMN IF NOT EXISTS id_forma_pago BIGINT REFERENCES ref.forma_pago(id) ON UPDATE CASCADE ON DELETE RESTRICT,
+                          ADD COLUMN IF NOT EXISTS forma_pago VARCHAR(50),
+                          ADD COLUMN IF NOT EXISTS monto_pagado NUMERIC(14,4) NOT NULL DEFAULT 0,
+                          ADD COLUMN IF NOT EXISTS saldo_pendiente NUMERIC(14,4) GENERATED ALWAYS AS (total - monto_pagado) STORED;
+
+                        CREATE OR REPLACE FUNCTION app.fn_documento_pago_refresh(p_ids BIGINT[])
+                        RETURNS VOID AS $fn$
+                          UPDATE app.documento d
+                          SET id_forma_pago = s.id_forma_pago,
+                              forma_pago = fp.descripcion,
+                              monto_pagado = COALESCE(s.monto_pagado, 0)
+                          FROM (SELECT DISTINCT unnest(p_ids) AS id) ids
+                          LEFT JOIN (
+                            SELECT DISTINCT ON (p.id_documento)
+                                   p.id_documento, p.id_forma_pago,
+                                   SUM(p.monto) OVER (PARTITION BY p.id_documento) AS monto_pagado
+                            FROM app.pago p
+                            WHERE p.id_documento IN (SELECT unnest(p_ids))
+                            ORDER BY p.id_documento, p.id
+                          ) s ON s.id_documento = ids.id
+                          LEFT JOIN ref.forma_pago fp ON fp.id = s.id_forma_pago
+                          WHERE d.id = ids.id
+                            AND (d.id_forma_pago IS DISTINCT FROM s.id_forma_pago
+                              OR d.forma_pago IS DISTINCT FROM fp.descripcion
+                              OR d.monto_pagado IS DISTINCT FROM COALESCE(s.monto_pagado, 0));
+                        $fn$ LANGUAGE sql;
+
+                        CREATE OR REPLACE FUNCTION app.fn_sync_documento_pago()
+                        RETURNS TRIGGER AS $fn$
+                        BEGIN
+                          IF TG_OP = 'INSERT' THEN
+                            PERFORM app.fn_documento_pago_refresh(ARRAY(
+                              SELECT id_documento FROM new_rows WHERE id_documento IS NOT NULL
+                            ));
+                          ELSIF TG_OP = 'UPDATE' THEN
+                            PERFORM app.fn_documento_pago_refresh(ARRAY(
+                              SELECT id_documento FROM old_rows WHERE id_documento IS NOT NULL
+                              UNION
+                              SELECT id_documento FROM new_rows WHERE id_documento IS NOT NULL
+                            ));
+                          ELSIF TG_OP = 'DELETE' THEN
+                            PERFORM app.fn_documento_pago_refresh(ARRAY(
+                              SELECT id_documento FROM old_rows WHERE id_documento IS NOT NULL
+                            ));
+                          END IF;
+                          RETURN NULL;
+                        END;
+                        $fn$ LANGUAGE plpgsql;
+
+                        DROP TRIGGER IF EXISTS trg_documento_pago_ins ON app.pago;
+                        CREATE TRIGGER trg_documento_pago_ins
+                        AFTER INSERT ON app.pago
+                        REFERENCING NEW TABLE AS new_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION app.fn_sync_documento_pago();
+
+                        DROP TRIGGER IF EXISTS trg_documento_pago_upd ON app.pago;
+                        CREATE TRIGGER trg_documento_pago_upd
+                        AFTER UPDATE ON app.pago
+                        REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION app.fn_sync_documento_pago();
+
+                        DROP TRIGGER IF EXISTS trg_documento_pago_del ON app.pago;
+                        CREATE TRIGGER trg_documento_pago_del
+                        AFTER DELETE ON app.pago
+                        REFERENCING OLD TABLE AS old_rows
+                        FOR EACH STATEMENT EXECUTE FUNCTION app.fn_sync_documento_pago();
+
+                        CREATE OR REPLACE FUNCTION app.fn_trg_documento_forma_pago_lookup()
+                        RETURNS TRIGGER AS $fn$
+                        BEGIN
+                          UPDATE app.documento SET forma_pago = NEW.descripcion WHERE id_forma_pago = NEW.id;
+                          RETURN NULL;
+                        END;
+                        $fn$ LANGUAGE plpgsql;
+
+                        DROP TRIGGER IF EXISTS trg_documento_forma_pago ON ref.forma_pago;
+                        CREATE TRIGGER trg_documento_forma_pago
+                        AFTER UPDATE OF descripcion ON ref.forma_pago
+                        FOR EACH ROW EXECUTE FUNCTION app.fn_trg_documento_forma_pago_lookup();
+
+                        -- Full rebuild from app.pago (initial backfill and manual repair)
+                        CREATE OR REPLACE FUNCTION app.fn_documento_pago_rebuild()
+                        RETURNS VOID AS $fn$
+                          UPDATE app.documento d
+                          SET id_forma_pago = s.id_forma_pago,
+                              forma_pago = fp.descripcion,
+                              monto_pagado = s.monto_pagado
+                          FROM (
+                            SELECT DISTINCT ON (p.id_documento)
+                                   p.id_documento, p.id_forma_pago,
+                                   SUM(p.monto) OVER (PARTITION BY p.id_documento) AS monto_pagado
+                            FROM app.pago p
+                            WHERE p.id_documento IS NOT NULL
+                            ORDER BY p.id_documento, p.id
+                          ) s
+                          LEFT JOIN ref.forma_pago fp ON fp.id = s.id_forma_pago
+                          WHERE d.id = s.id_documento
+                            AND (d.id_forma_pago IS DISTINCT FROM s.id_forma_pago
+                              OR d.forma_pago IS DISTINCT FROM fp.descripcion
+                              OR d.monto_pagado IS DISTINCT FROM s.monto_pagado);
+
+                          UPDATE app.documento d
+                          SET id_forma_pago = NULL, forma_pago = NULL, monto_pagado = 0
+                          WHERE (d.id_forma_pago IS NOT NULL OR d.monto_pagado <> 0)
+                            AND NOT EXISTS (SELECT 1 FROM app.pago p WHERE p.id_documento = d.id);
+                        $fn$ LANGUAGE sql;
+
+                        SELECT app.fn_documento_pago_rebuild();
+
+                        CREATE INDEX IF NOT EXISTS idx_doc_forma_pago ON app.documento(forma_pago, id);
+                        CREATE INDEX IF NOT EXISTS idx_doc_id_forma_pago_fecha ON app.documento(id_forma_pago, fecha DESC);
+                        CREATE INDEX IF NOT EXISTS idx_doc_saldo_pendiente ON app.documento(saldo_pendiente, id) WHERE saldo_pendiente > 0;
+
+                        DROP VIEW IF EXISTS app.v_documento_resumen CASCADE;
+                        CREATE OR REPLACE VIEW app.v_documento_resumen AS
+                        SELECT
+                          doc.id,
+                          td.nombre AS tipo_documento,
+                          td.clase,
+                          td.letra,
+                          td.codigo_afip,
+                          doc.fecha,
+                          doc.numero_serie,
+                          doc.estado,
+                          doc.total,
+                          doc.neto,
+                          doc.subtotal,
+                          doc.iva_total,
+                          doc.sena,
+                          doc.descuento_porcentaje,
+                          doc.descuento_importe,
+                          doc.cae,
+                          doc.cae_vencimiento,
+                          doc.observacion,
+                          doc.controlado_por,
+                          ec.id AS id_entidad,
+                          COALESCE(ec.razon_social, TRIM(COALESCE(ec.apellido, '') || ' ' || COALESCE(ec.nombre, ''))) AS entidad,
+                          ec.cuit AS cuit_receptor,
+                          u.nombre AS usuario,
+                          doc.id_usuario,
+                          doc.forma_pago,
+                          doc.id_forma_pago,
+                          doc.monto_pagado,
+                          doc.saldo_pendiente
+                        FROM app.documento doc
+                        JOIN ref.tipo_documento td ON td.id = doc.id_tipo_documento
+                        JOIN app.entidad_comercial ec ON ec.id = doc.id_entidad_comercial
+                        LEFT JOIN seguridad.usuario u ON u.id = doc.id_usuario;
+                        """)
+
+                    # 15. Current account counters and debt aging on app.saldo_cuenta_corriente
+                    # (kept by trg_sync_saldo_cc, aged nightly), so the CC list, deudores and
+                    # v_stats_cuenta_corriente no longer count movements per entity
+                    cur.execute("""
+                        SELECT 1 FROM information_schema.columns
+                        WHERE table_schema = 'app' AND table_name = 'saldo_cuenta_corriente' AND column_name = 'saldo_mas_90'
+                    """)
+                    if cur.fetchone() is None:
+                        logger.info("Adding counters and aging to app.saldo_cuenta_corriente (one-time backfill)...")
+                        cur.execute("""
+                        ALTER TABLE app.saldo_cuenta_corriente
+                            ADD COLUMN IF NOT EXISTS total_movimientos INTEGER NOT NULL DEFAULT 0,
+                            ADD COLUMN IF NOT EXISTS fecha_ultimo_debito TIMESTAMPTZ,
+                            ADD COLUMN IF NOT EXISTS fecha_ultimo_credito TIMESTAMPTZ,
+                            ADD COLUMN IF NOT EXISTS saldo_0_30 NUMERIC(14,2) NOT NULL DEFAULT 0,
+                            ADD COLUMN IF NOT EXISTS saldo_31_60 NUMERIC(14,2) NOT NULL DEFAULT 0,
+                            ADD COLUMN IF NOT EXISTS saldo_61_90 NUMERIC(14,2) NOT NULL DEFAULT 0,
+                            ADD COLUMN IF NOT EXISTS saldo_mas_90 NUMERIC(14,2) NOT NULL DEFAULT 0,
+                            ADD COLUMN IF NOT EXISTS fecha_antiguedad DATE;
+
+                        CREATE OR REPLACE FUNCTION app.fn_sync_saldo_cuenta_corriente()
+                        RETURNS TRIGGER AS $fn$
+                        DECLARE
+                            v_tipo_entidad VARCHAR(10);
+                            v_hoy DATE := app.fn_ventas_dia(now());
+                            v_dias INTEGER := v_hoy - app.fn_ventas_dia(NEW.fecha);
+                            v_es_debito BOOLEAN := NEW.tipo_movimiento IN ('DEBITO', 'AJUSTE_DEBITO');
+                            v_es_credito BOOLEAN := NEW.tipo_movimiento IN ('CREDITO', 'AJUSTE_CREDITO');
+                            -- Variación de la deuda (un saldo a favor no envejece)
+                            v_delta NUMERIC(14,2) := GREATEST(NEW.saldo_nuevo, 0) - GREATEST(NEW.saldo_anterior, 0);
+                            v_resto NUMERIC(14,2);
+                            v_0_30 NUMERIC(14,2);
+                            v_31_60 NUMERIC(14,2);
+                            v_61_90 NUMERIC(14,2);
+                            v_mas_90 NUMERIC(14,2);
+                        BEGIN
+                            -- Obtener tipo de entidad
+                            SELECT tipo INTO v_tipo_entidad FROM app.entidad_comercial WHERE id = NEW.id_entidad_comercial;
+                            IF v_tipo_entidad IS NULL OR v_tipo_entidad = 'AMBOS' THEN
+                                v_tipo_entidad := 'CLIENTE';
+                            END IF;
+
+                            -- Upsert en saldo_cuenta_corriente
+                            INSERT INTO app.saldo_cuenta_corriente AS s (
+                                id_entidad_comercial, saldo_actual, tipo_entidad, ultimo_movimiento,
+                                total_movimientos, fecha_ultimo_debito, fecha_ultimo_credito, fecha_antiguedad
+                            )
+                            VALUES (
+                                NEW.id_entidad_comercial, NEW.saldo_nuevo, v_tipo_entidad, NEW.fecha,
+                                1, CASE WHEN v_es_debito THEN NEW.fecha END, CASE WHEN v_es_credito THEN NEW.fecha END, v_hoy
+                            )
+                            ON CONFLICT (id_entidad_comercial) DO UPDATE SET
+                                saldo_actual = EXCLUDED.saldo_actual,
+                                ultimo_movimiento = EXCLUDED.ultimo_movimiento,
+                                total_movimientos = s.total_movimientos + 1,
+                                fecha_ultimo_debito = GREATEST(s.fecha_ultimo_debito, EXCLUDED.fecha_ultimo_debito),
+                                fecha_ultimo_credito = GREATEST(s.fecha_ultimo_credito, EXCLUDED.fecha_ultimo_credito)
+                            RETURNING s.saldo_0_30, s.saldo_31_60, s.saldo_61_90, s.saldo_mas_90
+                            INTO v_0_30, v_31_60, v_61_90, v_mas_90;
+
+                            IF v_delta > 0 THEN
+                                UPDATE app.saldo_cuenta_corriente SET
+                                    saldo_0_30 = saldo_0_30 + CASE WHEN v_dias <= 30 THEN v_delta ELSE 0 END,
+                                    saldo_31_60 = saldo_31_60 + CASE WHEN v_dias BETWEEN 31 AND 60 THEN v_delta ELSE 0 END,
+                                    saldo_61_90 = saldo_61_90 + CASE WHEN v_dias BETWEEN 61 AND 90 THEN v_delta ELSE 0 END,
+                                    saldo_mas_90 = saldo_mas_90 + CASE WHEN v_dias > 90 THEN v_delta ELSE 0 END
+                                WHERE id_entidad_comercial = NEW.id_entidad_comercial;
+                            ELSIF v_delta < 0 THEN
+                                v_resto := -v_delta;
+                                v_mas_90 := LEAST(v_mas_90, v_resto);
+                                v_resto := v_resto - v_mas_90;
+                                v_61_90 := LEAST(v_61_90, v_resto);
+                                v_resto := v_resto - v_61_90;
+                                v_31_60 := LEAST(v_31_60, v_resto);
+                                v_resto := v_resto - v_31_60;
+                                v_0_30 := LEAST(v_0_30, v_resto);
+                                UPDATE app.saldo_cuenta_corriente SET
+                                    saldo_0_30 = saldo_0_30 - v_0_30,
+                                    saldo_31_60 = saldo_31_60 - v_31_60,
+                                    saldo_61_90 = saldo_61_90 - v_61_90,
+                                    saldo_mas_90 = saldo_mas_90 - v_mas_90
+                                WHERE id_entidad_comercial = NEW.id_entidad_comercial;
+                            END IF;
+
+                            -- También sincronizar con app.lista_cliente si existe
+                            UPDATE app.lista_cliente 
+                            SET saldo_cuenta = NEW.saldo_nuevo 
+                            WHERE id_entidad_comercial = NEW.id_entidad_comercial;
+
+                            RETURN NEW;
+                        END;
+                        $fn$ LANGUAGE plpgsql;
+
+                        -- Recalcula contadores y tramos de antigüedad desde los movimientos (job nocturno y
+                        -- reparación manual). El saldo deudor se asigna a los débitos no anulados más recientes
+                        -- (los pagos cancelan primero lo más viejo); lo que no cubren (saldos migrados sin
+                        -- movimientos) queda en +90. Solo escribe las cuentas que cambian; devuelve cuántas.
+                        CREATE OR REPLACE FUNCTION app.fn_cuenta_corriente_conciliar(p_hoy DATE DEFAULT NULL)
+                        RETURNS INTEGER AS $fn$
+                        DECLARE
+                            v_hoy DATE := COALESCE(p_hoy, app.fn_ventas_dia(now()));
+                            v_filas INTEGER;
+                        BEGIN
+                            WITH mov AS (
+                                SELECT m.id_entidad_comercial,
+                                       COUNT(*)::INTEGER AS total_movimientos,
+                                       MAX(m.fecha) FILTER (WHERE m.tipo_movimiento IN ('DEBITO', 'AJUSTE_DEBITO')) AS fecha_ultimo_debito,
+                                       MAX(m.fecha) FILTER (WHERE m.tipo_movimiento IN ('CREDITO', 'AJUSTE_CREDITO')) AS fecha_ultimo_credito
+                                FROM app.movimiento_cuenta_corriente m
+                                GROUP BY m.id_entidad_comercial
+                            ),
+                            deb AS (
+                                SELECT m.id_entidad_comercial,
+                                       v_hoy - app.fn_ventas_dia(m.fecha) AS dias,
+                                       LEAST(m.monto, GREATEST(s.saldo_actual - COALESCE(SUM(m.monto) OVER (
+                                           PARTITION BY m.id_entidad_comercial ORDER BY m.fecha DESC, m.id DESC
+                                           ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING
+                                       ), 0), 0)) AS pendiente
+                                FROM app.movimiento_cuenta_corriente m
+                                JOIN app.saldo_cuenta_corriente s ON s.id_entidad_comercial = m.id_entidad_comercial
+                                WHERE s.saldo_actual > 0
+                                  AND NOT m.anulado
+                                  AND m.tipo_movimiento IN ('DEBITO', 'AJUSTE_DEBITO')
+                            ),
+                            tramos AS (
+                                SELECT id_entidad_comercial,
+                                       SUM(pendiente) FILTER (WHERE dias <= 30) AS saldo_0_30,
+                                       SUM(pendiente) FILTER (WHERE dias BETWEEN 31 AND 60) AS saldo_31_60,
+                                       SUM(pendiente) FILTER (WHERE dias BETWEEN 61 AND 90) AS saldo_61_90,
+                                       SUM(pendiente) FILTER (WHERE dias > 90) AS saldo_mas_90,
+                                       SUM(pendiente) AS asignado
+                                FROM deb
+                                GROUP BY id_entidad_comercial
+                            ),
+                            calc AS (
+                                SELECT s.id_entidad_comercial,
+                                       COALESCE(mv.total_movimientos, 0) AS total_movimientos,
+                                       mv.fecha_ultimo_debito,
+                                       mv.fecha_ultimo_credito,
+                                       ROUND(COALESCE(t.saldo_0_30, 0), 2) AS saldo_0_30,
+                                       ROUND(COALESCE(t.saldo_31_60, 0), 2) AS saldo_31_60,
+                                       ROUND(COALESCE(t.saldo_61_90, 0), 2) AS saldo_61_90,
+                                       ROUND(COALESCE(t.saldo_mas_90, 0) + GREATEST(s.saldo_actual - COALESCE(t.asignado, 0), 0), 2) AS saldo_mas_90
+                                FROM app.saldo_cuenta_corriente s
+                                LEFT JOIN mov mv ON mv.id_entidad_comercial = s.id_entidad_comercial
+                                LEFT JOIN tramos t ON t.id_entidad_comercial = s.id_entidad_comercial
+                            )
+                            UPDATE app.saldo_cuenta_corriente s
+                            SET total_movimientos = c.total_movimientos,
+                                fecha_ultimo_debito = c.fecha_ultimo_debito,
+                                fecha_ultimo_credito = c.fecha_ultimo_credito,
+                                saldo_0_30 = c.saldo_0_30,
+                                saldo_31_60 = c.saldo_31_60,
+                                saldo_61_90 = c.saldo_61_90,
+                                saldo_mas_90 = c.saldo_mas_90,
+                                fecha_antiguedad = v_hoy
+                            FROM calc c
+                            WHERE s.id_entidad_comercial = c.id_entidad_comercial
+                              AND (s.total_movimientos, s.fecha_ultimo_debito, s.fecha_ultimo_credito,
+                                   s.saldo_0_30, s.saldo_31_60, s.saldo_61_90, s.saldo_mas_90, s.fecha_antiguedad)
+                                  IS DISTINCT FROM
+                                  (c.total_movimientos, c.fecha_ultimo_debito, c.fecha_ultimo_credito,
+                                   c.saldo_0_30, c.saldo_31_60, c.saldo_61_90, c.saldo_mas_90, v_hoy);
+                            GET DIAGNOSTICS v_filas = ROW_COUNT;
+                            RETURN v_filas;
+                        END;
+                        $fn$ LANGUAGE plpgsql;
+
+                        SELECT app.fn_cuenta_corriente_conciliar();
+
+                        DROP INDEX IF EXISTS app.idx_mov_cc_fecha;
+                        CREATE INDEX IF NOT EXISTS idx_mov_cc_fecha_montos ON app.movimiento_cuenta_corriente(fecha DESC)
+                            INCLUDE (tipo_movimiento, monto, anulado);
+                        DROP INDEX IF EXISTS app.idx_saldo_cc_deudores;
+                        CREATE INDEX IF NOT EXISTS idx_saldo_cc_deudores_antiguedad ON app.saldo_cuenta_corriente(saldo_actual DESC)
+                            INCLUDE (id_entidad_comercial, saldo_0_30, saldo_31_60, saldo_61_90, saldo_mas_90)
+                            WHERE saldo_actual > 0 AND tipo_entidad = 'CLIENTE';
+                        CREATE INDEX IF NOT EXISTS idx_saldo_cc_mas_90 ON app.saldo_cuenta_corriente(saldo_mas_90 DESC) WHERE saldo_mas_90 > 0;
+                        CREATE INDEX IF NOT EXISTS idx_saldo_cc_ultimo_mov ON app.saldo_cuenta_corriente(ultimo_movimiento DESC NULLS LAST);
+                        CREATE INDEX IF NOT EXISTS idx_saldo_cc_total_mov ON app.saldo_cuenta_corriente(total_movimientos DESC);
+
+                        CREATE OR REPLACE VIEW app.v_cuenta_corriente_resumen AS
+                        SELECT
+                            s.id_entidad_comercial,
+                            COALESCE(e.razon_social, TRIM(COALESCE(e.apellido, '') || ' ' || COALESCE(e.nombre, ''))) AS entidad,
+                            e.cuit,
+                            e.telefono,
+                            e.email,
+                            s.tipo_entidad,
+                            s.saldo_actual,
+                            s.limite_credito,
+                            CASE 
+                                WHEN s.saldo_actual > 0 THEN 'DEUDOR'
+                                WHEN s.saldo_actual < 0 THEN 'A_FAVOR'
+                                ELSE 'AL_DIA'
+                            END AS estado_cuenta,
+                            s.ultimo_movimiento,
+                            s.total_movimientos::BIGINT AS total_movimientos,
+                            e.activo,
+                            s.fecha_ultimo_debito,
+                            s.fecha_ultimo_credito,
+                            s.saldo_0_30,
+                            s.saldo_31_60,
+                            s.saldo_61_90,
+                            s.saldo_mas_90,
+                            s.fecha_antiguedad
+                        FROM app.saldo_cuenta_corriente s
+                        JOIN app.entidad_comercial e ON e.id = s.id_entidad_comercial;
+
+                        CREATE OR REPLACE VIEW app.v_stats_cuenta_corriente AS
+                        SELECT
+                            (SELECT COALESCE(SUM(saldo_actual), 0) FROM app.saldo_cuenta_corriente WHERE saldo_actual > 0 AND tipo_entidad = 'CLIENTE') AS deuda_clientes,
+                            (SELECT COUNT(*) FROM app.saldo_cuenta_corriente WHERE saldo_actual > 0 AND tipo_entidad = 'CLIENTE') AS clientes_deudores,
+                            (SELECT COALESCE(SUM(saldo_actual), 0) FROM app.saldo_cuenta_corriente WHERE saldo_actual > 0 AND tipo_entidad = 'PROVEEDOR') AS deuda_proveedores,
+                            (SELECT COUNT(*) FROM app.saldo_cuenta_corriente WHERE saldo_actual > 0 AND tipo_entidad = 'PROVEEDOR') AS proveedores_acreedores,
+                            (SELECT COUNT(*) FROM app.movimiento_cuenta_corriente WHERE fecha >= CURRENT_DATE) AS movimientos_hoy,
+                            (SELECT COALESCE(SUM(CASE WHEN tipo_movimiento IN ('CREDITO', 'AJUSTE_CREDITO') THEN monto ELSE 0 END), 0) 
+                             FROM app.movimiento_cuenta_corriente WHERE fecha >= CURRENT_DATE AND anulado = FALSE) AS cobros_hoy,
+                            (SELECT COALESCE(SUM(CASE WHEN tipo_movimiento IN ('DEBITO', 'AJUSTE_DEBITO') THEN monto ELSE 0 END), 0) 
+                             FROM app.movimiento_cuenta_corriente WHERE fecha >= CURRENT_DATE AND anulado = FALSE) AS facturacion_hoy,
+                            d.deuda_0_30,
+                            d.deuda_31_60,
+                            d.deuda_61_90,
+                            d.deuda_mas_90
+                        FROM (
+                            SELECT
+                                COALESCE(SUM(saldo_0_30), 0) AS deuda_0_30,
+                                COALESCE(SUM(saldo_31_60), 0) AS deuda_31_60,
+                                COALESCE(SUM(saldo_61_90), 0) AS deuda_61_90,
+                                COALESCE(SUM(saldo_mas_90), 0) AS deuda_mas_90
+                            FROM app.saldo_cuenta_corriente
+                            WHERE saldo_actual > 0 AND tipo_entidad = 'CLIENTE'
+                        ) d;
+
+                        DROP VIEW IF EXISTS app.v_deudores CASCADE;
+                        CREATE OR REPLACE VIEW app.v_deudores AS
+                        SELECT
+                          ec.id,
+                          COALESCE(ec.razon_social, ec.apellido || ' ' || ec.nombre) AS entidad,
+                          ec.telefono,
+                          s.saldo_actual AS saldo_cuenta,
+                          s.saldo_0_30,
+                          s.saldo_31_60,
+                          s.saldo_61_90,
+                          s.saldo_mas_90,
+                          s.ultimo_movimiento
+                        FROM app.saldo_cuenta_corriente s
+                        JOIN app.entidad_comercial ec ON ec.id = s.id_entidad_comercial
+                        WHERE s.saldo_actual > 0 AND s.tipo_entidad = 'CLIENTE'
+                        ORDER BY s.saldo_actual DESC;
+                        """)
+
+                    # 16. app.registrar_movimiento_cc locks the balance it reads (concurrent cashiers
+                    # and Database.apply_payments_bulk)
+                    cur.execute("""
+                        CREATE OR REPLACE FUNCTION app.registrar_movimiento_cc(
+                            p_id_entidad BIGINT,
+                            p_tipo VARCHAR(20),
+                            p_concepto VARCHAR(150),
+                            p_monto NUMERIC(14,4),
+                            p_id_documento BIGINT DEFAULT NULL,
+                            p_id_pago BIGINT DEFAULT NULL,
+                            p_observacion TEXT DEFAULT NULL,
+                            p_id_usuario BIGINT DEFAULT NULL
+                        ) RETURNS BIGINT AS $fn$
+                        DECLARE
+                            v_saldo_anterior NUMERIC(14,4);
+                            v_saldo_nuevo NUMERIC(14,4);
+                            v_mov_id BIGINT;
+                        BEGIN
+                            -- Obtener saldo actual (bloqueado hasta el fin de la transacción: cajas concurrentes)
+                            SELECT COALESCE(saldo_actual, 0) INTO v_saldo_anterior
+                            FROM app.saldo_cuenta_corriente
+                            WHERE id_entidad_comercial = p_id_entidad
+                            FOR UPDATE;
+
+                            IF NOT FOUND THEN
+                                v_saldo_anterior := 0;
+                            END IF;
+
+                            -- Calcular nuevo saldo
+                            IF p_tipo IN ('DEBITO', 'AJUSTE_DEBITO') THEN
+                                v_saldo_nuevo := v_saldo_anterior + p_monto;
+                            ELSIF p_tipo IN ('CREDITO', 'AJUSTE_CREDITO', 'ANULACION') THEN
+                                v_saldo_nuevo := v_saldo_anterior - p_monto;
+                            ELSE
+                                RAISE EXCEPTION 'Tipo de movimiento no válido: %', p_tipo;
+                            END IF;
+
+                            -- Insertar movimiento
+                            INSERT INTO app.movimiento_cuenta_corriente (
+                                id_entidad_comercial, tipo_movimiento, concepto, monto,
+                                saldo_anterior, saldo_nuevo, id_documento, id_pago,
+                                observacion, id_usuario
+                            ) VALUES (
+                                p_id_entidad, p_tipo, p_concepto, p_monto,
+                                v_saldo_anterior, v_saldo_nuevo, p_id_documento, p_id_pago,
+                                p_observacion, COALESCE(p_id_usuario, NULLIF(current_setting('app.user_id', true), '')::BIGINT)
+                            ) RETURNING id INTO v_mov_id;
+
+                            RETURN v_mov_id;
+                        END;
+                        $fn$ LANGUAGE plpgsql;
+                    """)
+
+                    # 17. Document numbering: per-type counter taken in a short transaction of its
+                    # own, released numbers and draft reservations (Database.allocate_document_number)
+                    cur.execute("""
+                        CREATE TABLE IF NOT EXISTS app.numeracion_documento (
+                          id_tipo_documento    BIGINT PRIMARY KEY REFERENCES ref.tipo_documento(id) ON UPDATE CASCADE ON DELETE CASCADE,
+                          ultimo_numero        BIGINT NOT NULL DEFAULT 0,
+                          politica_huecos      VARCHAR(10) NOT NULL DEFAULT 'REUTILIZAR',
+                          fecha_actualizacion  TIMESTAMPTZ NOT NULL DEFAULT now(),
+                          CONSTRAINT ck_numeracion_politica CHECK (politica_huecos IN ('REUTILIZAR', 'OMITIR'))
+                        );
+
+                        CREATE TABLE IF NOT EXISTS app.numeracion_documento_pendiente (
+                          id_tipo_documento  BIGINT NOT NULL REFERENCES ref.tipo_documento(id) ON UPDATE CASCADE ON DELETE CASCADE,
+                          numero             BIGINT NOT NULL,
+                          estado             VARCHAR(10) NOT NULL,
+                          id_usuario         BIGINT REFERENCES seguridad.usuario(id) ON UPDATE CASCADE ON DELETE SET NULL,
+                          fecha              TIMESTAMPTZ NOT NULL DEFAULT now(),
+                          PRIMARY KEY (id_tipo_documento, numero),
+                          CONSTRAINT ck_numeracion_pendiente_estado CHECK (estado IN ('RESERVADO', 'LIBERADO'))
+                        );
+                        CREATE INDEX IF NOT EXISTS idx_numeracion_liberado ON app.numeracion_documento_pendiente(id_tipo_documento, numero)
+                          WHERE estado = 'LIBERADO';
+                        CREATE INDEX IF NOT EXISTS idx_numeracion_reservado_fecha ON app.numeracion_documento_pendiente(fecha)
+                          WHERE estado = 'RESERVADO';
+
+                        -- Takes the next number of a document type: the lowest released one (REUTILIZAR) or
+                        -- counter + 1, skipping numbers typed by hand. The counter row stays locked until the
+                        -- caller commits, so call it in its own transaction.
+                        CREATE OR REPLACE FUNCTION app.fn_numero_documento_siguiente(p_tipo BIGINT)
+                        RETURNS BIGINT AS $fn$
+                        DECLARE
+                          v_numero BIGINT;
+                        BEGIN
+                          IF NOT EXISTS (SELECT 1 FROM app.numeracion_documento WHERE id_tipo_documento = p_tipo) THEN
+                            INSERT INTO app.numeracion_documento (id_tipo_documento, ultimo_numero)
+                            SELECT p_tipo, COALESCE(MAX(numero_serie::bigint), 0)
+                            FROM app.documento
+                            WHERE id_tipo_documento = p_tipo AND numero_serie ~ '^[0-9]+$'
+                            ON CONFLICT (id_tipo_documento) DO NOTHING;
+                          END IF;
+
+                          LOOP
+                            DELETE FROM app.numeracion_documento_pendiente p
+                            WHERE (p.id_tipo_documento, p.numero) = (
+                              SELECT l.id_tipo_documento, l.numero
+                              FROM app.numeracion_documento_pendiente l
+                              JOIN app.numeracion_documento n ON n.id_tipo_documento = l.id_tipo_documento
+                              WHERE l.id_tipo_documento = p_tipo
+                                AND l.estado = 'LIBERADO'
+                                AND n.politica_huecos = 'REUTILIZAR'
+                              ORDER BY l.numero
+                              LIMIT 1
+                              FOR UPDATE OF l SKIP LOCKED
+                            )
+                            RETURNING p.numero INTO v_numero;
+
+                            IF v_numero IS NULL THEN
+                              UPDATE app.numeracion_documento
+                              SET ultimo_numero = ultimo_numero + 1,
+                                  fecha_actualizacion = now()
+                              WHERE id_tipo_documento = p_tipo
+                              RETURNING ultimo_numero INTO v_numero;
+                            END IF;
+
+                            EXIT WHEN NOT EXISTS (
+                              SELECT 1 FROM app.documento
+                              WHERE id_tipo_documento = p_tipo AND numero_serie = v_numero::text
+                            );
+                          END LOOP;
+                          RETURN v_numero;
+                        END;
+                        $fn$ LANGUAGE plpgsql;
+
+                        -- Number fn_numero_documento_siguiente would issue now (read-only preview)
+                        CREATE OR REPLACE FUNCTION app.fn_numero_documento_proximo(p_tipo BIGINT)
+                        RETURNS BIGINT AS $fn$
+                          SELECT COALESCE(
+                            (SELECT MIN(p.numero)
+                             FROM app.numeracion_documento_pendiente p
+                             JOIN app.numeracion_documento n ON n.id_tipo_documento = p.id_tipo_documento
+                             WHERE p.id_tipo_documento = p_tipo AND p.estado = 'LIBERADO' AND n.politica_huecos = 'REUTILIZAR'),
+                            (SELECT ultimo_numero + 1 FROM app.numeracion_documento WHERE id_tipo_documento = p_tipo),
+                            (SELECT COALESCE(MAX(numero_serie::bigint), 0) + 1
+                             FROM app.documento
+                             WHERE id_tipo_documento = p_tipo AND numero_serie ~ '^[0-9]+$')
+                          );
+                        $fn$ LANGUAGE sql STABLE;
+
+                        -- Hands back a number that was taken but not used (unless a document has it by now)
+                        CREATE OR REPLACE FUNCTION app.fn_numero_documento_liberar(p_tipo BIGINT, p_numero BIGINT)
+                        RETURNS VOID AS $fn$
+                          INSERT INTO app.numeracion_documento_pendiente (id_tipo_documento, numero, estado, id_usuario)
+                          SELECT p_tipo, p_numero, 'LIBERADO', NULLIF(current_setting('app.user_id', true), '')::BIGINT
+                          WHERE NOT EXISTS (
+                            SELECT 1 FROM app.documento WHERE id_tipo_documento = p_tipo AND numero_serie = p_numero::text
+                          )
+                          ON CONFLICT (id_tipo_documento, numero) DO UPDATE SET estado = 'LIBERADO', fecha = now();
+                        $fn$ LANGUAGE sql;
+                    """)
+
+                    # Stock movements view, refreshed once per start instead of on every confirmation
+                    cur.execute(f"CREATE OR REPLACE VIEW app.v_movimientos_full AS {self._movimientos_base_query()}")
                     conn.commit()
                     logger.info("Database schema updates applied successfully.")
         except Exception as e:
@@ -530,22 +2254,116 @@ class Database:
         """Reinitialize the connection pool."""
         if self.pool:
             return
-        self.pool = ConnectionPool(
-            conninfo=self.dsn, 
-            min_size=self.pool_min, 
-            max_size=self.pool_max
+        self.pool = self._create_pool()
+
+    def _create_pool(self) -> InstrumentedPool:
+        """Connection pool whose checkouts and statements feed `self.query_metrics`."""
+        pool = ConnectionPool(
+            conninfo=self.dsn,
+            min_size=self.pool_min,
+            max_size=self.pool_max,
+            **self.pool_policy.pool_kwargs(
+                ConnectionPool,
+                name="nexoryn-sync",
+                checker=self._pool_checker,
+                configure=self.prepared_statements.configure,
+            ),
         )
+        return InstrumentedPool(pool, self.query_metrics, source_file=__file__)
+
+    def reserve_async_connections(self) -> int:
+        """
+        Move part of the connection budget to an async pool: returns how many
+        connections it may open (0 = none, run async reads on the sync pool)
+        and shrinks the sync pool accordingly.
+        """
+        with self._pool_lock:
+            if self._async_reserved:
+                return self._async_reserved
+            reserved = self.pool_policy.async_max
+            if reserved <= 0:
+                return 0
+            self._resize_sync_pool(reserved)
+            self._async_reserved = reserved
+            return reserved
+
+    def release_async_connections(self) -> None:
+        """Give the connections borrowed by the async pool back to the sync pool."""
+        with self._pool_lock:
+            if not self._async_reserved:
+                return
+            self._async_reserved = 0
+            self.async_pool = None
+            self._resize_sync_pool(0)
+
+    def _resize_sync_pool(self, async_reserved: int) -> None:
+        self.pool_min, self.pool_max = self.pool_policy.sync_sizes(async_reserved)
+        resize = getattr(self.pool, "resize", None) if self.pool else None
+        if resize is None:
+            return
+        try:
+            resize(min_size=self.pool_min, max_size=self.pool_max)
+        except Exception:
+            logger.exception("Could not resize the connection pool to %s-%s", self.pool_min, self.pool_max)
+
+    def _check_pool_connections(self) -> None:
+        """Test the idle pooled connections (after a network blip) and replace the broken ones."""
+        check = getattr(self.pool, "check", None) if self.pool else None
+        if check is None:
+            return
+        try:
+            check()
+        except Exception:
+            logger.exception("Connection pool check failed")
+
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Budget, usage/saturation and wait counters of the sync and async pools."""
+        policy = self.pool_policy
+        stats: Dict[str, Any] = {
+            "budget": policy.max_size,
+            "async_reserved": self._async_reserved,
+            "timeout_s": policy.timeout,
+            "max_idle_s": policy.max_idle,
+            "max_lifetime_s": policy.max_lifetime,
+            "sync": pool_stats(self.pool) if self.pool else {},
+            "async": pool_stats(self.async_pool) if self.async_pool is not None else {},
+        }
+        if self._pool_checker is not None:
+            stats["health_checks"] = self._pool_checker.stats()
+        return stats
+
+    # =========================================================================
+    # Query diagnostics
+    # =========================================================================
+    def get_query_metrics(self) -> Dict[str, Any]:
+        """Latency/rows/errors per method and per statement, pool waits/usage and slow queries."""
+        snapshot = self.query_metrics.snapshot()
+        snapshot["pool"] = self.get_pool_stats()
+        snapshot["prepared_statements"] = self.prepared_statements.stats()
+        return snapshot
+
+    def dump_query_metrics(self, path: Optional[Path] = None) -> Path:
+        """Write the query metrics as JSON (default: logs/query_metrics_<timestamp>.json)."""
+        if path is None:
+            path = self._ensure_logs_dir() / f"query_metrics_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        return self.query_metrics.dump_json(path, self.get_query_metrics())
+
+    def reset_query_metrics(self) -> None:
+        self.query_metrics.reset()
 
     def set_context(self, user_id: Optional[int], ip: Optional[str] = None) -> None:
         self.current_user_id = user_id
         self.current_ip = ip
 
+    def _run_query_plan(self, plan: Plan, setup: Optional[Callable[[Any], Any]] = None) -> Any:
+        """Run a read path written as a query plan (see `services.query_plan`) on the sync pool."""
+        with self.query_metrics.operation(getattr(plan, "__name__", None)):
+            return run_plan(plan, self.pool, setup=setup)
+
+    @query_plan
     def fetch_depositos(self, limit: int = 100) -> List[Dict[str, Any]]:
         query = "SELECT id, nombre, ubicacion FROM ref.deposito WHERE activo = TRUE ORDER BY nombre LIMIT %s"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (limit,))
-                return _rows_to_dicts(cur)
+        return (yield Query(query, (limit,)))
 
     def _setup_session(self, cur: Any) -> None:
         if self.current_user_id:
@@ -571,7 +2389,7 @@ class Database:
         self._logs_dir.mkdir(parents=True, exist_ok=True)
         return self._logs_dir
 
-    def _daily_activity_log_path(self, when: datetime) -> Path:
+    def _daily_activity_log_path(self, when: date) -> Path:
         return self._ensure_logs_dir() / f"activity_{when.strftime('%Y-%m-%d')}.txt"
 
     def _next_activity_id(self) -> int:
@@ -684,26 +2502,24 @@ class Database:
             "session_id": (str(session_id).strip() if session_id is not None else "") or "",
             "detalle": self._serialize_activity_detail(detalle),
         }
-        filepath = self._daily_activity_log_path(now)
-        try:
-            with self._file_log_lock:
-                file_exists = filepath.exists()
-                with filepath.open("a", encoding="utf-8", newline="") as fh:
-                    writer = csv.DictWriter(fh, fieldnames=_ACTIVITY_LOG_COLUMNS, delimiter=",")
-                    if not file_exists or filepath.stat().st_size == 0:
-                        writer.writeheader()
-                    writer.writerow(row)
-            if self._should_track_runtime_activity(row.get("accion")):
-                self._record_runtime_activity(row.get("entidad"), ts)
-            return True
-        except Exception:
-            logger.exception(
-                "Error writing activity file log (entidad=%s, accion=%s, id_entidad=%s)",
+        # Written by the background ActivityLogWriter; only write actions may
+        # wait (briefly) for room when the queue is full, reads are dropped.
+        is_write = self._should_track_runtime_activity(row.get("accion"))
+        if not self._activity_writer.submit(row, critical=is_write):
+            logger.warning(
+                "Activity log queue full, row dropped (entidad=%s, accion=%s, id_entidad=%s)",
                 entidad,
                 accion,
                 id_entidad,
             )
             return False
+        if is_write:
+            self._record_runtime_activity(row.get("entidad"), ts)
+        return True
+
+    def flush_activity_log(self, timeout: float = 5.0) -> bool:
+        """Wait until queued activity rows are written to the daily file."""
+        return self._activity_writer.flush(timeout)
 
     def log_activity(self, entidad: str, accion: str, id_entidad: Optional[int] = None, resultado: str = "OK", detalle: Optional[Dict[str, Any]] = None) -> None:
         if self.is_closing:
@@ -737,7 +2553,8 @@ class Database:
             ip=self.current_ip,
             detalle=detalle,
         )
-        return logged
+        # Usually followed by close()/exit: make sure the row reaches the file.
+        return logged and self.flush_activity_log()
 
     def check_recent_activity(self, since_timestamp: float, tables: List[str] = None) -> bool:
         """
@@ -764,85 +2581,322 @@ class Database:
     # =========================================================================
     # In-Memory Catalog Cache (reduces DB hits for frequently accessed data)
     # =========================================================================
-    _catalog_cache: Dict[str, Tuple[float, List[str]]] = {}  # {key: (timestamp, data)}
-    _CACHE_TTL = 300  # 5 minutes
-    _DASHBOARD_STATS_CACHE_TTL = 60.0  # seconds - aligned with default refresh interval
+    _CACHE_TTL = 300  # 5 minutes, only while change notifications are unavailable
+    _DASHBOARD_STATS_CACHE_TTL = 60.0  # seconds - only while change notifications are unavailable
+    _DASHBOARD_STATS_MAX_AGE = 600.0  # seconds - recompute even without changes (date-based metrics)
+    _DASHBOARD_SECTION_TIMEOUT = 8.0  # seconds per dashboard section before it is reported as pending
 
     def _get_cached_catalog(self, cache_key: str, query: str) -> List[str]:
-        """Get catalog from cache or fetch from DB if expired."""
-        import time
-        now = time.time()
-        if cache_key in self._catalog_cache:
-            cached_time, cached_data = self._catalog_cache[cache_key]
-            if now - cached_time < self._CACHE_TTL:
-                return cached_data
-        
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query)
-                rows = cur.fetchall()
-                result = [row[0] if isinstance(row, (list, tuple)) else row.get("nombre", "") for row in rows]
-                self._catalog_cache[cache_key] = (now, result)
-                return result
+        """Get catalog names from cache or fetch them from DB on a miss."""
+        def load() -> List[str]:
+            with self.pool.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(query)
+                    rows = cur.fetchall()
+                    return [row[0] if isinstance(row, (list, tuple)) else row.get("nombre", "") for row in rows]
+
+        return self._catalog_cache.get_or_load(cache_key, load, _CATALOG_CACHE_TABLES.get(cache_key, ()))
 
     def _get_cached_catalog_raw(self, cache_key: str, query: str) -> List[Dict[str, Any]]:
-        """Get raw catalog (dicts) from cache or fetch from DB if expired."""
-        import time
-        now = time.time()
-        if cache_key in self._catalog_cache:
-            cached_time, cached_data = self._catalog_cache[cache_key]
-            if now - cached_time < self._CACHE_TTL:
-                return cached_data # type: ignore
-        
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query)
-                result = _rows_to_dicts(cur)
-                self._catalog_cache[cache_key] = (now, result) # type: ignore
-                return result
+        """Get raw catalog (dicts) from cache or fetch it from DB on a miss."""
+        def load() -> List[Dict[str, Any]]:
+            with self.pool.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(query)
+                    return _rows_to_dicts(cur)
+
+        return self._catalog_cache.get_or_load(cache_key, load, _CATALOG_CACHE_TABLES.get(cache_key, ()))
 
     def invalidate_catalog_cache(self, cache_key: Optional[str] = None) -> None:
         """Invalidate catalog cache. Call after modifying catalogs."""
         if cache_key:
-            self._catalog_cache.pop(cache_key, None)
+            # Drop every entry read from the same tables (e.g. "marcas" also drops "marcas_full").
+            tables = _CATALOG_CACHE_TABLES.get(cache_key)
+            if tables:
+                self._catalog_cache.invalidate_tables(tables)
+            else:
+                self._catalog_cache.invalidate(cache_key)
         else:
-            self._catalog_cache.clear()
+            self._catalog_cache.invalidate()
+
+    def get_catalog_cache_stats(self) -> Dict[str, Any]:
+        stats = self._catalog_cache.stats()
+        stats["listener_connected"] = bool(self._change_listener and self._change_listener.connected)
+        return stats
+
+    def _on_db_notification(self, channel: str, payload: str) -> None:
+        table = (payload or "").strip().lower()
+        if not table:
+            return
+        if channel == CATALOG_NOTIFY_CHANNEL:
+            self._catalog_cache.invalidate_tables([table])
+        if table in _DASHBOARD_SOURCE_TABLES:
+            self._bump_dashboard_data_version()
+        self._queue_table_changes([table])
+
+    def _on_change_listener_state(self, connected: bool) -> None:
+        # While listening, entries live until a NOTIFY drops them. Changes made
+        # while disconnected were missed, so start over on every (re)connect.
+        if connected:
+            self._catalog_cache.ttl = None
+            self._catalog_cache.invalidate()
+            self._bump_dashboard_data_version()
+            if self._listener_connected_once:
+                # The connection dropped: pooled connections may be dead too
+                self._check_pool_connections()
+                self._queue_table_changes(["*"])
+            self._listener_connected_once = True
+        else:
+            self._catalog_cache.ttl = self._CACHE_TTL
+
+    # =========================================================================
+    # Change Notification Bus (cross-terminal, fed by LISTEN/NOTIFY)
+    # =========================================================================
+    _CHANGE_DISPATCH_DELAY = 0.3  # seconds - coalesces bursts of statements
+
+    @property
+    def change_notifications_available(self) -> bool:
+        """True while the background listener is connected and delivering changes."""
+        return bool(self._change_listener and self._change_listener.connected)
+
+    def subscribe_changes(
+        self,
+        tables: Iterable[str],
+        callback: Callable[[Set[str]], None],
+    ) -> Callable[[], None]:
+        """
+        Call `callback(changed_tables)` whenever any of `tables` ("schema.table")
+        changes, from this or any other terminal. An empty `tables` watches
+        everything. The callback runs on a background thread; it also receives
+        the watched tables after a listener reconnect, since changes may have
+        been missed. Returns a function that cancels the subscription.
+        """
+        watched = frozenset(str(t).strip().lower() for t in tables if t)
+        with self._change_lock:
+            self._change_subscriber_seq += 1
+            token = self._change_subscriber_seq
+            self._change_subscribers[token] = (watched, callback)
+
+        def unsubscribe() -> None:
+            with self._change_lock:
+                self._change_subscribers.pop(token, None)
+
+        return unsubscribe
+
+    def _queue_table_changes(self, tables: Iterable[str]) -> None:
+        with self._change_lock:
+            self._pending_changes.update(tables)
+            if self._change_flush_timer is not None or self.is_closing:
+                return
+            timer = threading.Timer(self._CHANGE_DISPATCH_DELAY, self._flush_table_changes)
+            timer.daemon = True
+            self._change_flush_timer = timer
+        timer.start()
+
+    def _flush_table_changes(self) -> None:
+        with self._change_lock:
+            changed = self._pending_changes
+            self._pending_changes = set()
+            self._change_flush_timer = None
+            subscribers = list(self._change_subscribers.values())
+        if not changed or self.is_closing:
+            return
+
+        ts = time.time()
+        missed_changes = "*" in changed
+        for table in changed - {"*"}:
+            # Keeps check_recent_activity aware of writes made by other terminals.
+            self._record_runtime_activity(table, ts)
+        if missed_changes:
+            with self._activity_state_lock:
+                self._last_activity_ts = max(self._last_activity_ts, ts)
+
+        for watched, callback in subscribers:
+            if missed_changes:
+                hits = set(watched) or {"*"}
+            else:
+                hits = set(changed & watched) if watched else set(changed)
+            if not hits:
+                continue
+            try:
+                callback(hits)
+            except Exception:
+                logger.exception("Change subscriber failed (tables=%s)", sorted(hits))
 
     def invalidate_dashboard_stats_cache(self, role: Optional[str] = None) -> None:
-        """Clear cached dashboard statistics for a specific role or all roles."""
+        """Clear cached dashboard statistics (shared by all roles; `role` is kept for compatibility)."""
         with self._dashboard_cache_lock:
-            if role:
-                self._dashboard_stats_cache.pop(role.upper(), None)
-            else:
-                self._dashboard_stats_cache.clear()
+            self._dashboard_stats_cache.clear()
+
+    def _bump_dashboard_data_version(self) -> None:
+        with self._dashboard_cache_lock:
+            self._dashboard_data_version += 1
 
     # =========================================================================
-    # Batch Dashboard Statistics (single connection, fewer round-trips)
+    # Batch Dashboard Statistics (parallel sections, cache shared by roles)
     # =========================================================================
-    def get_full_dashboard_stats(self, role: str = "EMPLEADO", period: str = "Mes", *, force_refresh: bool = False) -> Dict[str, Any]:
+    def get_full_dashboard_stats(
+        self,
+        role: str = "EMPLEADO",
+        period: str = "Mes",
+        *,
+        force_refresh: bool = False,
+        on_refresh: Optional[Callable[[Dict[str, Any]], None]] = None,
+    ) -> Dict[str, Any]:
         """
         Fetch 100+ dashboard statistics filtered by user role and time period.
         Roles: 'ADMIN', 'GERENTE', 'EMPLEADO'
         Period: 'Hoy', 'Semana', 'Mes', 'Año'
+
+        The raw metrics are computed once per period and masked per role. A
+        stale entry is returned right away while it is recomputed in the
+        background; `on_refresh` then receives the fresh stats for `role`.
         """
         role_key = (role or "EMPLEADO").upper()
         period_key = (period or "Mes").capitalize()
-        cache_key = f"{role_key}_{period_key}"
-        now = time.time()
+        # "mis_operaciones_hoy" depends on the logged-in user
+        cache_key = f"{period_key}_{self.current_user_id or 0}"
 
         if not force_refresh:
+            start_refresh = False
             with self._dashboard_cache_lock:
-                cache_entry = self._dashboard_stats_cache.get(cache_key)
-                if cache_entry and now - cache_entry[0] < self._DASHBOARD_STATS_CACHE_TTL:
-                    return cache_entry[1]
-
-        stats = self._fetch_full_dashboard_stats(role_key, period_key)
+                entry = self._dashboard_stats_cache.get(cache_key)
+                if entry is not None:
+                    if self._is_dashboard_entry_fresh(entry):
+                        return self._mask_dashboard_stats(entry["stats"], role_key)
+                    if on_refresh is not None:
+                        entry["waiters"].append((role_key, on_refresh))
+                    if not entry["refreshing"]:
+                        entry["refreshing"] = True
+                        start_refresh = True
+                    stale = entry["stats"]
+            if entry is not None:
+                if start_refresh:
+                    threading.Thread(
+                        target=self._revalidate_dashboard_stats,
+                        args=(cache_key, period_key),
+                        name="dashboard-revalidate",
+                        daemon=True,
+                    ).start()
+                return self._mask_dashboard_stats(stale, role_key)
+
+        raw, _ = self._compute_dashboard_stats(cache_key, period_key)
+        return self._mask_dashboard_stats(raw, role_key)
+
+    def _is_dashboard_entry_fresh(self, entry: Dict[str, Any]) -> bool:
+        age = time.monotonic() - entry["at"]
+        if self.change_notifications_available:
+            # Unchanged tables: keep serving it, but let date-based metrics (hoy, últimos 7 días) roll over
+            return entry["version"] == self._dashboard_data_version and age < self._DASHBOARD_STATS_MAX_AGE
+        return age < self._DASHBOARD_STATS_CACHE_TTL
+
+    def _compute_dashboard_stats(
+        self, cache_key: str, period: str
+    ) -> Tuple[Dict[str, Any], List[Tuple[str, Callable[[Dict[str, Any]], None]]]]:
+        """Compute the raw (ADMIN-level) stats and store them unless they are partial."""
+        with self._dashboard_cache_lock:
+            version = self._dashboard_data_version
+        try:
+            raw = self._fetch_full_dashboard_stats("ADMIN", period)
+        except Exception:
+            with self._dashboard_cache_lock:
+                entry = self._dashboard_stats_cache.get(cache_key)
+                if entry is not None:
+                    entry["refreshing"] = False
+                    entry["waiters"] = []
+            raise
 
         with self._dashboard_cache_lock:
-            self._dashboard_stats_cache[cache_key] = (now, stats)
+            entry = self._dashboard_stats_cache.get(cache_key)
+            waiters = entry["waiters"] if entry is not None else []
+            if raw.get("secciones_pendientes"):
+                # Partial results (some section timed out or failed) are not cached
+                if entry is not None:
+                    entry["refreshing"] = False
+                    entry["waiters"] = []
+                return raw, []
+            self._dashboard_stats_cache[cache_key] = {
+                "stats": raw,
+                "at": time.monotonic(),
+                "version": version,
+                "refreshing": False,
+                "waiters": [],
+            }
+        return raw, waiters
 
+    def _revalidate_dashboard_stats(self, cache_key: str, period: str) -> None:
+        try:
+            raw, waiters = self._compute_dashboard_stats(cache_key, period)
+        except Exception:
+            logger.exception("Background dashboard refresh failed (%s)", cache_key)
+            return
+        for role_key, callback in waiters:
+            try:
+                callback(self._mask_dashboard_stats(raw, role_key))
+            except Exception:
+                logger.exception("Dashboard refresh callback failed")
+
+    @staticmethod
+    def _mask_dashboard_stats(raw: Dict[str, Any], role: str) -> Dict[str, Any]:
+        """Role view of the raw dashboard stats (same visibility rules as the `_get_stats_*` helpers)."""
+        is_manager = role in ("ADMIN", "GERENTE")
+        stats = {key: (dict(value) if isinstance(value, dict) else value) for key, value in raw.items()}
+        charts = stats.setdefault("charts", {})
+        ventas = stats.get("ventas") or {}
+        if not is_manager:
+            for key in ("hoy_total", "hoy_ticket_prom", "semana_total", "mes_total"):
+                if key in ventas:
+                    ventas[key] = "—"
+            if "tendencia_mes_pct" in ventas:
+                ventas["tendencia_mes_pct"] = 0.0
+            ventas.pop("por_tipo", None)
+            ventas.pop("por_forma_pago", None)
+            stock = stats.get("stock") or {}
+            if "valor_costo" in stock:
+                stock["valor_costo"] = "—"
+            if "valor_inventario" in stock:
+                stock["valor_inventario"] = 0
+            entidades = stats.get("entidades") or {}
+            if "deuda_clientes" in entidades:
+                entidades["deuda_clientes"] = "—"
+            stats.pop("finanzas", None)
+            for key in ("ventas_mensuales", "top_articulos", "bottom_articulos"):
+                charts[key] = []
+        if role != "ADMIN":
+            if "anio_total" in ventas:
+                ventas["anio_total"] = "—"
+            stats.pop("sistema", None)
         return stats
 
+    def _get_dashboard_executor(self, sections: int) -> ThreadPoolExecutor:
+        # One worker per section, but leave one pooled connection free for interactive queries
+        workers = max(1, min(sections, self.pool_max - 1))
+        with self._dashboard_cache_lock:
+            if self._dashboard_executor is None or self._dashboard_executor_workers < workers:
+                if self._dashboard_executor is not None:
+                    self._dashboard_executor.shutdown(wait=False)
+                self._dashboard_executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="dashboard")
+                self._dashboard_executor_workers = workers
+            return self._dashboard_executor
+
+    def _set_dashboard_statement_timeout(self, cur: Any) -> None:
+        # The server gives up too, so a slow section does not keep its connection busy
+        timeout_ms = int(self._DASHBOARD_SECTION_TIMEOUT * 1000)
+        cur.execute("SELECT set_config('statement_timeout', %s, true)", (str(timeout_ms),))
+
+    def _run_dashboard_section(self, section: Callable[..., Any], *args: Any) -> Any:
+        """Run a dashboard section on its own pooled connection under the section timeout.
+
+        `section` is either a `_get_stats_*` method (takes the cursor first) or a query plan method.
+        """
+        plan = get_query_plan(section)
+        if plan is not None:
+            return self._run_query_plan(plan(self, *args), setup=self._set_dashboard_statement_timeout)
+        with self.pool.connection() as conn:
+            with conn.cursor() as cur:
+                self._set_dashboard_statement_timeout(cur)
+                return section(cur, *args)
+
     def _fetch_full_dashboard_stats(self, role: str, period: str) -> Dict[str, Any]:
         role = (role or "EMPLEADO").upper()
         stats: Dict[str, Any] = {}
@@ -856,72 +2910,122 @@ class Database:
         elif period == "Año":
             start_date_sql = "date_trunc('year', now())"
 
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                # 1. Basic Operating Stats (Accessible to all)
-                stats["operativas"] = self._get_stats_operativas(cur, role, start_date_sql)
-
-                # 2. Sales Stats (Always includes Hoy/Mes/Total columns, so keeping it generic but potentially could filter "metrics" if needed)
-                # For now, we keep the global "boxes" as fixed (Hoy/Mes/Año) but we could filter the breakdowns.
-                stats["ventas"] = self._get_stats_ventas_extended(cur, role, start_date_sql, period)
-
-                # 3. Stock Stats
-                stats["stock"] = self._get_stats_stock_extended(cur, role, start_date_sql)
-
-                # 5. Entities (Clients/Providers)
-                stats["entidades"] = self._get_stats_entidades_extended(cur, role, start_date_sql)
-
-                # 6. Movement Stats (Today summary - maybe should also respect period? Kept as today for specific box)
-                stats["movimientos"] = self._get_stats_movimientos_extended(cur, role)
-
+        is_manager = role in ("ADMIN", "GERENTE")
+
+        # Independent sections: (result path, callable, args, fallback). Each one checks out its
+        # own connection, so the wall time is the slowest section instead of the sum.
+        tasks: List[Tuple[Tuple[str, ...], Callable[..., Any], Tuple[Any, ...], Any]] = [
+            # 1. Basic Operating Stats (Accessible to all)
+            (("operativas",), self._run_dashboard_section, (self._get_stats_operativas, role, start_date_sql), {}),
+            # 2. Sales Stats (global "boxes" are fixed Hoy/Mes/Año, breakdowns follow the period)
+            (("ventas",), self._run_dashboard_section, (self._get_stats_ventas_extended, role, start_date_sql, period), {}),
+            # 3. Stock Stats
+            (("stock",), self._run_dashboard_section, (self._get_stats_stock_extended, role, start_date_sql), {}),
+            # 5. Entities (Clients/Providers)
+            (("entidades",), self._run_dashboard_section, (self._get_stats_entidades_extended, role, start_date_sql), {}),
+            # 6. Movement Stats (today summary)
+            (("movimientos",), self._run_dashboard_section, (self._get_stats_movimientos_extended, role), {}),
+            # 9. Extended Chart Data
+            (("charts", "alertas_stock"), self._run_dashboard_section, (self.get_alertas_stock, 5), []),
+            (("charts", "stock_por_rubro"), self._run_dashboard_section, (self.get_stock_by_rubro, 8), []),
+            (("charts", "entidades_por_tipo"), self._run_dashboard_section, (self.get_entidades_by_tipo,), []),
+        ]
+        if is_manager:
+            tasks += [
                 # 7. Financial Stats (Restricted)
-                if role in ("ADMIN", "GERENTE"):
-                    stats["finanzas"] = self._get_stats_finanzas_extended(cur, role, start_date_sql)
-
-                # 8. Technical/System Stats (Admin only)
-                if role == "ADMIN":
-                    stats["sistema"] = self._get_stats_sistema_extended(cur, role)
-
-                # 9. Extended Chart Data
-                stats["charts"] = {
-                    "ventas_mensuales": self.get_reporte_ventas_dinamico(period, limit=12) if role in ("ADMIN", "GERENTE") else [],
-                    "top_articulos": self.get_top_articulos_dinamico(start_date_sql, limit=5) if role in ("ADMIN", "GERENTE") else [],
-                    "bottom_articulos": self.get_bottom_articulos_dinamico(start_date_sql, limit=5) if role in ("ADMIN", "GERENTE") else [],
-                    "alertas_stock": self.get_alertas_stock(limit=5),
-                    "stock_por_rubro": self.get_stock_by_rubro(limit=8),
-                    "entidades_por_tipo": self.get_entidades_by_tipo()
-                }
+                (("finanzas",), self._run_dashboard_section, (self._get_stats_finanzas_extended, role, start_date_sql), {}),
+                (("charts", "ventas_mensuales"), self._run_dashboard_section, (self.get_reporte_ventas_dinamico, period, 12), []),
+                (("charts", "top_articulos"), self._run_dashboard_section, (self.get_top_articulos_dinamico, start_date_sql, 5), []),
+                (("charts", "bottom_articulos"), self._run_dashboard_section, (self.get_bottom_articulos_dinamico, start_date_sql, 5), []),
+            ]
+        if role == "ADMIN":
+            # 8. Technical/System Stats (Admin only)
+            tasks.append((("sistema",), self._run_dashboard_section, (self._get_stats_sistema_extended, role), {}))
+
+        stats["charts"] = {
+            "ventas_mensuales": [],
+            "top_articulos": [],
+            "bottom_articulos": [],
+        }
+        executor = self._get_dashboard_executor(len(tasks))
+        # A section's timeout runs from when a worker picks it up, not from submission:
+        # sections still queued behind busy workers are not reported as timed out
+        started: Dict[str, float] = {}
+
+        def run_section(name: str, fn: Callable[..., Any], args: Tuple[Any, ...]) -> Any:
+            started[name] = time.monotonic()
+            return fn(*args)
+
+        submitted: List[Tuple[Tuple[str, ...], "Future[Any]", Any]] = [
+            (path, executor.submit(run_section, ".".join(path), fn, args), fallback)
+            for path, fn, args, fallback in tasks
+        ]
+        pending: List[str] = []
+        for path, future, fallback in submitted:
+            name = ".".join(path)
+            try:
+                value = self._wait_dashboard_section(future, lambda: started.get(name))
+            except Exception as exc:
+                if not future.done():
+                    future.cancel()
+                    logger.warning("Dashboard section %s timed out after %.1fs", name, self._DASHBOARD_SECTION_TIMEOUT)
+                else:
+                    logger.warning("Dashboard section %s failed: %s", name, exc)
+                pending.append(name)
+                value = fallback
+            target = stats
+            for key in path[:-1]:
+                target = target.setdefault(key, {})
+            target[path[-1]] = value
+
+        if pending:
+            stats["secciones_pendientes"] = pending
         return stats
 
+    def _wait_dashboard_section(self, future: "Future[Any]", started: Callable[[], Optional[float]]) -> Any:
+        """Result of a dashboard section, raising TimeoutError once it ran for longer than the section timeout."""
+        while True:
+            start = started()
+            remaining = self._DASHBOARD_SECTION_TIMEOUT
+            if start is not None:
+                remaining -= time.monotonic() - start
+            try:
+                return future.result(timeout=max(0.0, remaining))
+            except FuturesTimeoutError:
+                start = started()
+                if start is not None and time.monotonic() - start >= self._DASHBOARD_SECTION_TIMEOUT:
+                    raise
+
     def _get_stats_ventas_extended(self, cur, role, start_date_sql: str, period: str) -> Dict[str, Any]:
         """Sales statistics (25 metrics)"""
         # EMPLEADO has restricted access to some financial values
         show_money = role in ("ADMIN", "GERENTE")
         
-        # Main KPI query (Hoy, Mes, Sem) - keeps fixed logic for KPI cards
-        cur.execute("""
+        # Main KPI query (Hoy, Mes, Sem) - keeps fixed logic for KPI cards.
+        # Reads the daily fact table (one row per day/type/state), not every document.
+        hoy = _VENTAS_HOY_SQL
+        semana = _VENTAS_PERIOD_START_SQL["Semana"]
+        mes = _VENTAS_PERIOD_START_SQL["Mes"]
+        anio = _VENTAS_PERIOD_START_SQL["Año"]
+        cur.execute(f"""
             WITH base_ventas AS (
-                SELECT 
-                    total, fecha, estado,
-                    CASE WHEN fecha >= current_date THEN 1 ELSE 0 END as es_hoy,
-                    CASE WHEN fecha >= date_trunc('week', now()) THEN 1 ELSE 0 END as es_semana,
-                    CASE WHEN fecha >= date_trunc('month', now()) THEN 1 ELSE 0 END as es_mes,
-                    CASE WHEN fecha >= date_trunc('year', now()) THEN 1 ELSE 0 END as es_anio,
-                    CASE WHEN fecha >= date_trunc('month', now() - interval '1 month') 
-                          AND fecha < date_trunc('month', now()) THEN 1 ELSE 0 END as es_mes_ant
-                FROM app.v_documento_resumen 
-                WHERE clase = 'VENTA'
+                SELECT vd.dia, vd.estado, vd.cantidad, vd.total
+                FROM app.ventas_diarias vd
+                JOIN ref.tipo_documento td ON td.id = vd.id_tipo_documento
+                WHERE td.clase = 'VENTA' AND vd.id_forma_pago = 0
             )
             SELECT 
-                SUM(total) FILTER (WHERE es_hoy = 1 AND estado != 'ANULADO') as hoy_total,
-                COUNT(*) FILTER (WHERE es_hoy = 1 AND estado != 'ANULADO') as hoy_cant,
-                AVG(total) FILTER (WHERE es_hoy = 1 AND estado != 'ANULADO') as hoy_ticket_prom,
-                SUM(total) FILTER (WHERE es_semana = 1 AND estado != 'ANULADO') as semana_total,
-                SUM(total) FILTER (WHERE es_mes = 1 AND estado != 'ANULADO') as mes_total,
-                SUM(total) FILTER (WHERE es_anio = 1 AND estado != 'ANULADO') as anio_total,
-                COUNT(*) FILTER (WHERE estado = 'CONFIRMADO') as docs_pendientes,
-                COUNT(*) FILTER (WHERE estado = 'ANULADO' AND es_mes = 1) as anulados_mes,
-                SUM(total) FILTER (WHERE es_mes_ant = 1 AND estado != 'ANULADO') as mes_ant_total
+                SUM(total) FILTER (WHERE dia >= {hoy} AND estado != 'ANULADO') as hoy_total,
+                SUM(cantidad) FILTER (WHERE dia >= {hoy} AND estado != 'ANULADO') as hoy_cant,
+                SUM(total) FILTER (WHERE dia >= {hoy} AND estado != 'ANULADO')
+                    / NULLIF(SUM(cantidad) FILTER (WHERE dia >= {hoy} AND estado != 'ANULADO'), 0) as hoy_ticket_prom,
+                SUM(total) FILTER (WHERE dia >= {semana} AND estado != 'ANULADO') as semana_total,
+                SUM(total) FILTER (WHERE dia >= {mes} AND estado != 'ANULADO') as mes_total,
+                SUM(total) FILTER (WHERE dia >= {anio} AND estado != 'ANULADO') as anio_total,
+                SUM(cantidad) FILTER (WHERE estado = 'CONFIRMADO') as docs_pendientes,
+                SUM(cantidad) FILTER (WHERE estado = 'ANULADO' AND dia >= {mes}) as anulados_mes,
+                SUM(total) FILTER (WHERE dia >= ({mes} - interval '1 month')::date
+                                     AND dia < {mes} AND estado != 'ANULADO') as mes_ant_total
             FROM base_ventas
         """)
 
@@ -950,37 +3054,32 @@ class Database:
         # Add filtered stats if Gerente/Admin
         if role in ("ADMIN", "GERENTE"):
             # Determine date filter as SQL literal expression (safe from injection)
-            date_expr_map = {
-                "Hoy": "current_date",
-                "Semana": "date_trunc('week', now())",
-                "Mes": "date_trunc('month', now())",
-                "Año": "date_trunc('year', now())"
-            }
-            # Use literal expression or fall back to month
-            date_expr = date_expr_map.get(period, "date_trunc('month', now())")
+            date_expr = _VENTAS_PERIOD_START_SQL.get(period, _VENTAS_PERIOD_START_SQL["Mes"])
             
             # Query 1: Documents by type (using literal date expression)
             query_tipo = f"""
                 SELECT 
-                    tipo_documento, COUNT(*) 
-                FROM app.v_documento_resumen
-                WHERE clase = 'VENTA' AND fecha >= {date_expr}
-                GROUP BY tipo_documento
+                    td.nombre, SUM(vd.cantidad)
+                FROM app.ventas_diarias vd
+                JOIN ref.tipo_documento td ON td.id = vd.id_tipo_documento
+                WHERE td.clase = 'VENTA' AND vd.id_forma_pago = 0 AND vd.dia >= {date_expr}
+                GROUP BY td.nombre
             """
             cur.execute(query_tipo)
             res["por_tipo"] = {r[0]: r[1] for r in cur.fetchall()}
             
-            # Query 2: Payment methods (using literal date expression)
+            # Query 2: Payment methods (using literal date expression).
+            # Documents without payments count as 'Efectivo' (total_sin_pago on the document row).
             query_fp = f"""
                 SELECT 
                     COALESCE(fp.descripcion, 'Efectivo'), 
-                    SUM(COALESCE(p.monto, d.total))
-                FROM app.v_documento_resumen d
-                LEFT JOIN app.pago p ON p.id_documento = d.id
-                LEFT JOIN ref.forma_pago fp ON p.id_forma_pago = fp.id
-                WHERE d.clase = 'VENTA' 
-                  AND d.estado != 'ANULADO'
-                  AND d.fecha >= {date_expr}
+                    SUM(CASE WHEN vd.id_forma_pago = 0 THEN vd.total_sin_pago ELSE vd.monto_pagado END)
+                FROM app.ventas_diarias vd
+                JOIN ref.tipo_documento td ON td.id = vd.id_tipo_documento
+                LEFT JOIN ref.forma_pago fp ON fp.id = vd.id_forma_pago
+                WHERE td.clase = 'VENTA' 
+                  AND vd.estado != 'ANULADO'
+                  AND vd.dia >= {date_expr}
                 GROUP BY COALESCE(fp.descripcion, 'Efectivo')
             """
             cur.execute(query_fp)
@@ -1013,12 +3112,12 @@ class Database:
             SELECT 
                 (SELECT COUNT(*) FROM app.articulo) as total,
                 (SELECT COUNT(*) FROM app.articulo WHERE activo = true) as activos,
-                (SELECT COUNT(*) FROM app.v_articulo_detallado WHERE stock_actual <= stock_minimo) as bajo_stock,
-                (SELECT COUNT(*) FROM app.v_articulo_detallado WHERE stock_actual <= 0) as sin_stock,
-                (SELECT COALESCE(SUM(costo * stock_actual), 0) FROM app.v_articulo_detallado) as valor_costo,
+                (SELECT COUNT(*) FROM app.articulo_listado WHERE stock_actual <= stock_minimo) as bajo_stock,
+                (SELECT COUNT(*) FROM app.articulo_listado WHERE stock_actual <= 0) as sin_stock,
+                (SELECT COALESCE(SUM(costo * stock_actual), 0) FROM app.articulo_listado) as valor_costo,
                 (SELECT COUNT(*) FROM app.movimiento_articulo WHERE fecha >= {date_expr} AND cantidad > 0) as entradas_mes,
                 (SELECT COUNT(*) FROM app.movimiento_articulo WHERE fecha >= {date_expr} AND cantidad < 0) as salidas_mes,
-                (SELECT COALESCE(SUM(stock_actual), 0) FROM app.v_articulo_detallado) as stock_total_unidades
+                (SELECT COALESCE(SUM(stock_actual), 0) FROM app.articulo_listado) as stock_total_unidades
         """
         cur.execute(query)
         row = cur.fetchone()
@@ -1070,8 +3169,8 @@ class Database:
                 (SELECT COUNT(*) FROM app.entidad_comercial WHERE tipo IN ('CLIENTE', 'AMBOS')) as clientes_total,
                 (SELECT COUNT(*) FROM app.entidad_comercial WHERE tipo IN ('PROVEEDOR', 'AMBOS')) as prov_total,
                 (SELECT COUNT(*) FROM app.entidad_comercial WHERE fecha_creacion >= {date_expr}) as nuevos_mes,
-                (SELECT COALESCE(SUM(saldo_cuenta), 0) FROM app.lista_cliente WHERE saldo_cuenta > 0) as deuda_clientes_total,
-                (SELECT COUNT(*) FROM app.lista_cliente WHERE saldo_cuenta > 0) as deudores_cant
+                (SELECT COALESCE(SUM(saldo_actual), 0) FROM app.saldo_cuenta_corriente WHERE saldo_actual > 0 AND tipo_entidad = 'CLIENTE') as deuda_clientes_total,
+                (SELECT COUNT(*) FROM app.saldo_cuenta_corriente WHERE saldo_actual > 0 AND tipo_entidad = 'CLIENTE') as deudores_cant
         """
         cur.execute(query)
         row = cur.fetchone()
@@ -1096,13 +3195,21 @@ class Database:
             date_expr = "date_trunc('week', now())"
         elif "'year'" in start_date_sql:
             date_expr = "date_trunc('year', now())"
+        dia_expr = _VENTAS_PERIOD_START_SQL[self._ventas_period_from_start_sql(start_date_sql)]
         
         query = f"""
+            WITH periodo AS (
+                SELECT td.clase, SUM(vd.total) AS total
+                FROM app.ventas_diarias vd
+                JOIN ref.tipo_documento td ON td.id = vd.id_tipo_documento
+                WHERE vd.id_forma_pago = 0 AND vd.dia >= {dia_expr}
+                GROUP BY td.clase
+            )
             SELECT 
                 (SELECT COALESCE(SUM(monto), 0) FROM app.pago WHERE fecha >= current_date) as ingresos_hoy,
-                (SELECT COALESCE(SUM(total), 0) FROM app.v_documento_resumen WHERE clase = 'COMPRA' AND fecha >= {date_expr}) as egresos_mes,
-                (SELECT COALESCE(SUM(p.monto), 0) FROM app.pago p JOIN app.v_documento_resumen d ON p.id_documento = d.id WHERE d.clase = 'VENTA' AND p.fecha >= {date_expr}) as ingresos_mes,
-                (SELECT COALESCE(SUM(total * 0.21), 0) FROM app.v_documento_resumen WHERE clase = 'VENTA' AND fecha >= {date_expr}) as iva_estimado_mes,
+                (SELECT COALESCE(SUM(total), 0) FROM periodo WHERE clase = 'COMPRA') as egresos_mes,
+                (SELECT COALESCE(SUM(p.monto), 0) FROM app.pago p JOIN app.documento d ON p.id_documento = d.id JOIN ref.tipo_documento td ON td.id = d.id_tipo_documento WHERE td.clase = 'VENTA' AND p.fecha >= {date_expr}) as ingresos_mes,
+                (SELECT COALESCE(SUM(total * 0.21), 0) FROM periodo WHERE clase = 'VENTA') as iva_estimado_mes,
                 (SELECT COUNT(*) FROM app.pago WHERE fecha >= now() - interval '7 days') as pagos_recientes
         """
         cur.execute(query)
@@ -1159,74 +3266,65 @@ class Database:
     def get_reporte_ventas_dinamico(self, period: str, limit: int = 12) -> List[Dict[str, Any]]:
         """
         Dynamic sales report based on period.
-        - Hoy/Semana: Group by day
-        - Mes: Group by day
-        - Año: Group by month
+        - Hoy: Group by hour (today's documents only)
+        - Semana/Mes: Group by day (app.ventas_diarias)
+        - Año: Group by month (app.ventas_diarias)
         """
-        trunc = 'month'
         limit_clause = "LIMIT %s"
         
         # Construct query based on period
         if period == "Hoy":
-            # Hourly grouping for today
-            query = """
+            # Hourly grouping for today: the fact table is per day, today's documents are few
+            query = f"""
                 SELECT 
-                    to_char(fecha, 'HH24:00') as label,
-                    SUM(total) as total_ventas,
+                    to_char(d.fecha AT TIME ZONE {_VENTAS_TIME_ZONE_SQL}, 'HH24:00') as label,
+                    SUM(d.total) as total_ventas,
                     COUNT(*) as cantidad_ventas
-                FROM app.v_documento_resumen
-                WHERE clase = %s AND estado IN (%s, %s)
-                  AND fecha >= current_date
+                FROM app.documento d
+                JOIN ref.tipo_documento td ON td.id = d.id_tipo_documento
+                WHERE td.clase = %s AND d.estado IN (%s, %s)
+                  AND d.fecha >= ({_VENTAS_HOY_SQL}::timestamp AT TIME ZONE {_VENTAS_TIME_ZONE_SQL})
                 GROUP BY 1
                 ORDER BY 1 ASC
             """
             limit_clause = ""
-        elif period == "Semana":
-            # Daily grouping for this week
-            query = """
-                SELECT 
-                    to_char(fecha, 'Dy DD') as label,
-                    SUM(total) as total_ventas,
-                    COUNT(*) as cantidad_ventas
-                FROM app.v_documento_resumen
-                WHERE clase = %s AND estado IN (%s, %s)
-                  AND fecha >= date_trunc('week', now())
-                GROUP BY 1, date_trunc('day', fecha)
-                ORDER BY date_trunc('day', fecha) ASC
-            """
-            limit_clause = ""
-        elif period == "Mes":
-             # Daily grouping for this month
-            query = """
+        elif period in ("Semana", "Mes"):
+            # Daily grouping for this week / month
+            label_fmt = "Dy DD" if period == "Semana" else "DD/MM"
+            query = f"""
                 SELECT 
-                    to_char(fecha, 'DD/MM') as label,
-                    SUM(total) as total_ventas,
-                    COUNT(*) as cantidad_ventas
-                FROM app.v_documento_resumen
-                WHERE clase = %s AND estado IN (%s, %s)
-                  AND fecha >= date_trunc('month', now())
-                GROUP BY 1, date_trunc('day', fecha)
-                ORDER BY date_trunc('day', fecha) ASC
+                    to_char(vd.dia, '{label_fmt}') as label,
+                    SUM(vd.total) as total_ventas,
+                    SUM(vd.cantidad) as cantidad_ventas
+                FROM app.ventas_diarias vd
+                JOIN ref.tipo_documento td ON td.id = vd.id_tipo_documento
+                WHERE td.clase = %s AND vd.estado IN (%s, %s)
+                  AND vd.id_forma_pago = 0
+                  AND vd.dia >= {_VENTAS_PERIOD_START_SQL[period]}
+                GROUP BY vd.dia
+                ORDER BY vd.dia ASC
             """
             limit_clause = ""
         else: # Año or fallback
             # Monthly grouping for this year
-            query = """
+            query = f"""
                 SELECT 
-                    to_char(fecha, 'Mon') as label,
-                    SUM(total) as total_ventas,
-                    COUNT(*) as cantidad_ventas
-                FROM app.v_documento_resumen
-                WHERE clase = %s AND estado IN (%s, %s)
-                  AND fecha >= date_trunc('year', now())
-                GROUP BY 1, date_trunc('month', fecha)
-                ORDER BY date_trunc('month', fecha) ASC
-                LIMIT %s
+                    to_char(date_trunc('month', vd.dia::timestamp), 'Mon') as label,
+                    SUM(vd.total) as total_ventas,
+                    SUM(vd.cantidad) as cantidad_ventas
+                FROM app.ventas_diarias vd
+                JOIN ref.tipo_documento td ON td.id = vd.id_tipo_documento
+                WHERE td.clase = %s AND vd.estado IN (%s, %s)
+                  AND vd.id_forma_pago = 0
+                  AND vd.dia >= {_VENTAS_PERIOD_START_SQL["Año"]}
+                GROUP BY date_trunc('month', vd.dia::timestamp)
+                ORDER BY date_trunc('month', vd.dia::timestamp) ASC
+                {limit_clause}
             """
 
         with self.pool.connection() as conn:
             with conn.cursor() as cur:
-                if period not in ("Hoy", "Semana", "Mes"):
+                if limit_clause:
                      cur.execute(query, (ClaseDocumento.VENTA.value, DocumentoEstado.CONFIRMADO.value, 
                                        DocumentoEstado.PAGADO.value, limit))
                 else:
@@ -1237,66 +3335,52 @@ class Database:
                 # Map to list of dicts. Note: "mes" key used by dashboard_view for label
                 return [{"mes": r[0], "total_ventas": float(r[1] or 0), "cantidad_ventas": r[2]} for r in rows]
 
-    def get_top_articulos_dinamico(self, start_date_sql: str, limit: int = 10) -> List[Dict[str, Any]]:
-        # Use literal date expression map to safely determine the date filter
-        date_expr = "date_trunc('month', now())"
+    @staticmethod
+    def _ventas_period_from_start_sql(start_date_sql: str) -> str:
+        # Map the legacy start-date expression to a literal period key (never interpolated)
         if "current_date" in start_date_sql:
-            date_expr = "current_date"
-        elif "'week'" in start_date_sql:
-            date_expr = "date_trunc('week', now())"
-        elif "'year'" in start_date_sql:
-            date_expr = "date_trunc('year', now())"
-        
+            return "Hoy"
+        if "'week'" in start_date_sql:
+            return "Semana"
+        if "'year'" in start_date_sql:
+            return "Año"
+        return "Mes"
+
+    def _articulos_vendidos_plan(self, period: str, limit: int, ascending: bool) -> Plan:
+        """Articles ranked by billed amount in the period, from app.ventas_diarias_articulo."""
+        date_expr = _VENTAS_PERIOD_START_SQL.get(period, _VENTAS_PERIOD_START_SQL["Mes"])
+        order = "total_facturado ASC, cantidad_vendida ASC" if ascending else "total_facturado DESC"
+        having = "HAVING COALESCE(SUM(va.total), 0) > 0" if ascending else ""
         query = f"""
             SELECT 
                 a.id, a.nombre,
-                COALESCE(SUM(dd.cantidad), 0) as cantidad_vendida,
-                COALESCE(SUM(dd.total_linea), 0) as total_facturado
-            FROM app.articulo a
-            JOIN app.documento_detalle dd ON a.id = dd.id_articulo
-            JOIN app.v_documento_resumen d ON dd.id_documento = d.id
+                COALESCE(SUM(va.cantidad), 0) as cantidad_vendida,
+                COALESCE(SUM(va.total), 0) as total_facturado
+            FROM app.ventas_diarias_articulo va
+            JOIN ref.tipo_documento td ON td.id = va.id_tipo_documento
+            JOIN app.articulo a ON a.id = va.id_articulo
             WHERE a.activo = true
-              AND d.clase = 'VENTA'
-              AND d.estado IN ('CONFIRMADO', 'PAGADO')
-              AND d.fecha >= {date_expr}
+              AND td.clase = 'VENTA'
+              AND va.estado IN ('CONFIRMADO', 'PAGADO')
+              AND va.dia >= {date_expr}
             GROUP BY a.id, a.nombre
-            ORDER BY total_facturado DESC
+            {having}
+            ORDER BY {order}
             LIMIT %s
         """
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (limit,))
-                return _rows_to_dicts(cur)
+        return (yield Query(query, (limit,)))
+
+    @query_plan
+    def get_top_articulos_dinamico(self, start_date_sql: str, limit: int = 10) -> List[Dict[str, Any]]:
+        return (yield from self._articulos_vendidos_plan(
+            self._ventas_period_from_start_sql(start_date_sql), limit, ascending=False
+        ))
 
+    @query_plan
     def get_bottom_articulos_dinamico(self, start_date_sql: str, limit: int = 10) -> List[Dict[str, Any]]:
-        # Use literal date expression map to safely determine the date filter
-        date_expr = "date_trunc('month', now())"
-        if "current_date" in start_date_sql:
-            date_expr = "current_date"
-        elif "'week'" in start_date_sql:
-            date_expr = "date_trunc('week', now())"
-        elif "'year'" in start_date_sql:
-            date_expr = "date_trunc('year', now())"
-        
-        query = f"""
-            SELECT 
-                a.id, a.nombre,
-                COALESCE(SUM(dd.cantidad), 0) as cantidad_vendida,
-                COALESCE(SUM(dd.total_linea), 0) as total_facturado
-            FROM app.articulo a
-            LEFT JOIN app.documento_detalle dd ON a.id = dd.id_articulo
-            LEFT JOIN app.v_documento_resumen d ON dd.id_documento = d.id
-            WHERE a.activo = true
-              AND (d.id IS NULL OR (d.fecha >= {date_expr} AND d.estado IN ('CONFIRMADO', 'PAGADO') AND d.clase = 'VENTA'))
-            GROUP BY a.id, a.nombre
-            HAVING COALESCE(SUM(dd.total_linea), 0) > 0
-            ORDER BY total_facturado ASC, cantidad_vendida ASC
-            LIMIT %s
-        """
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (limit,))
-                return _rows_to_dicts(cur)
+        return (yield from self._articulos_vendidos_plan(
+            self._ventas_period_from_start_sql(start_date_sql), limit, ascending=True
+        ))
 
     # Dashboard Statistics (individual methods kept for backwards compatibility)
     def get_stats_entidades(self) -> Dict[str, Any]:
@@ -1313,67 +3397,50 @@ class Database:
                     "activos": active
                 }
 
+    @query_plan
     def get_stats_articulos(self) -> Dict[str, Any]:
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT COUNT(*) FROM app.articulo")
-                total = cur.fetchone()[0]
-                cur.execute("SELECT COUNT(*) FROM app.v_articulo_detallado WHERE stock_actual <= stock_minimo")
-                low_stock = cur.fetchone()[0]
-                cur.execute("SELECT SUM(costo * stock_actual) FROM app.v_articulo_detallado")
-                val = cur.fetchone()[0] or 0
-                return {"total": total, "bajo_stock": low_stock, "valorizacion": float(val)}
+        total = yield Query("SELECT COUNT(*) FROM app.articulo", fetch="value")
+        low_stock = yield Query("SELECT COUNT(*) FROM app.articulo_listado WHERE stock_actual <= stock_minimo", fetch="value")
+        val = (yield Query("SELECT SUM(costo * stock_actual) FROM app.articulo_listado", fetch="value")) or 0
+        return {"total": total, "bajo_stock": low_stock, "valorizacion": float(val)}
 
+    @query_plan
     def get_stats_facturacion(self) -> Dict[str, Any]:
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT SUM(total) FROM app.v_documento_resumen 
-                    WHERE clase = %s AND fecha >= date_trunc('month', now())
-                """, (ClaseDocumento.VENTA.value,))
-                ventas = cur.fetchone()[0] or 0
-                cur.execute("""
-                    SELECT SUM(total) FROM app.v_documento_resumen 
-                    WHERE clase = %s AND fecha >= date_trunc('month', now())
-                """, (ClaseDocumento.COMPRA.value,))
-                compras = cur.fetchone()[0] or 0
-                cur.execute("SELECT COUNT(*) FROM app.documento WHERE estado IN (%s, %s)", 
-                           (DocumentoEstado.BORRADOR.value, DocumentoEstado.CONFIRMADO.value))
-                pend = cur.fetchone()[0]
-                return {"ventas_mes": float(ventas), "compras_mes": float(compras), "pendientes": pend}
+        query = f"""
+            SELECT SUM(vd.total) FROM app.ventas_diarias vd
+            JOIN ref.tipo_documento td ON td.id = vd.id_tipo_documento
+            WHERE td.clase = %s AND vd.id_forma_pago = 0
+              AND vd.dia >= {_VENTAS_PERIOD_START_SQL["Mes"]}
+        """
+        ventas = (yield Query(query, (ClaseDocumento.VENTA.value,), fetch="value")) or 0
+        compras = (yield Query(query, (ClaseDocumento.COMPRA.value,), fetch="value")) or 0
+        pend = yield Query("SELECT COUNT(*) FROM app.documento WHERE estado IN (%s, %s)", 
+                   (DocumentoEstado.BORRADOR.value, DocumentoEstado.CONFIRMADO.value), fetch="value")
+        return {"ventas_mes": float(ventas), "compras_mes": float(compras), "pendientes": pend}
 
+    @query_plan
     def get_stats_movimientos(self) -> Dict[str, Any]:
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("""
-                    SELECT 
-                        SUM(CASE WHEN signo_stock > 0 THEN 1 ELSE 0 END) as ingresos,
-                        SUM(CASE WHEN signo_stock < 0 THEN 1 ELSE 0 END) as salidas
-                    FROM app.v_movimientos_full 
-                    WHERE fecha >= current_date
-                """)
-                res = cur.fetchone()
-                cur.execute("SELECT COUNT(*) FROM app.movimiento_articulo WHERE id_documento IS NULL AND fecha >= current_date")
-                ajustes = cur.fetchone()[0]
-                return {"ingresos": res[0] or 0, "salidas": res[1] or 0, "ajustes": ajustes}
+        res = yield Query("""
+            SELECT 
+                SUM(CASE WHEN signo_stock > 0 THEN 1 ELSE 0 END) as ingresos,
+                SUM(CASE WHEN signo_stock < 0 THEN 1 ELSE 0 END) as salidas
+            FROM app.v_movimientos_full 
+            WHERE fecha >= current_date
+        """, fetch="row")
+        ajustes = yield Query("SELECT COUNT(*) FROM app.movimiento_articulo WHERE id_documento IS NULL AND fecha >= current_date", fetch="value")
+        return {"ingresos": res[0] or 0, "salidas": res[1] or 0, "ajustes": ajustes}
 
+    @query_plan
     def get_stats_pagos(self) -> Dict[str, Any]:
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT SUM(monto) FROM app.pago WHERE fecha >= current_date")
-                cobrado = cur.fetchone()[0] or 0
-                cur.execute("SELECT COUNT(*) FROM app.pago WHERE fecha >= now() - interval '7 days'")
-                recientes = cur.fetchone()[0]
-                return {"hoy": float(cobrado), "recientes": recientes}
+        cobrado = (yield Query("SELECT SUM(monto) FROM app.pago WHERE fecha >= current_date", fetch="value")) or 0
+        recientes = yield Query("SELECT COUNT(*) FROM app.pago WHERE fecha >= now() - interval '7 days'", fetch="value")
+        return {"hoy": float(cobrado), "recientes": recientes}
     
+    @query_plan
     def get_stats_usuarios(self) -> Dict[str, Any]:
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT COUNT(*) FROM seguridad.usuario WHERE activo = true")
-                active = cur.fetchone()[0]
-                cur.execute("SELECT MAX(ultimo_login) FROM seguridad.usuario")
-                last = cur.fetchone()[0]
-                return {"activos": active, "ultimo_login": last.strftime("%H:%M") if last else "N/A"}
+        active = yield Query("SELECT COUNT(*) FROM seguridad.usuario WHERE activo = true", fetch="value")
+        last = yield Query("SELECT MAX(ultimo_login) FROM seguridad.usuario", fetch="value")
+        return {"activos": active, "ultimo_login": last.strftime("%H:%M") if last else "N/A"}
 
     # =========================================================================
     # Authentication
@@ -1618,55 +3685,33 @@ class Database:
             logger.error("Error logging login attempt", exc_info=e)
 
 
+    @query_plan
     def get_reporte_ventas(self, limit: int = 12) -> List[Dict[str, Any]]:
         query = "SELECT * FROM app.v_reporte_ventas_mensual LIMIT %s"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (limit,))
-                return _rows_to_dicts(cur)
+        return (yield Query(query, (limit,)))
 
+    @query_plan
     def get_top_articulos(self, limit: int = 10) -> List[Dict[str, Any]]:
         query = "SELECT * FROM app.v_top_articulos_mes WHERE total_facturado > 0 LIMIT %s"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (limit,))
-                return _rows_to_dicts(cur)
+        return (yield Query(query, (limit,)))
 
+    @query_plan
     def get_bottom_articulos(self, limit: int = 10) -> List[Dict[str, Any]]:
-        query = """
-            SELECT 
-                a.id, a.nombre,
-                COALESCE(SUM(dd.cantidad), 0) as cantidad_vendida,
-                COALESCE(SUM(dd.total_linea), 0) as total_facturado
-            FROM app.articulo a
-            LEFT JOIN app.documento_detalle dd ON a.id = dd.id_articulo
-            LEFT JOIN app.documento d ON dd.id_documento = d.id
-            WHERE a.activo = true
-              AND (d.id IS NULL OR (d.fecha >= date_trunc('month', now()) AND d.estado IN ('CONFIRMADO', 'PAGADO')))
-            GROUP BY a.id, a.nombre
-            HAVING COALESCE(SUM(dd.total_linea), 0) > 0
-            ORDER BY total_facturado ASC, cantidad_vendida ASC
-            LIMIT %s
-        """
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (limit,))
-                return _rows_to_dicts(cur)
+        return (yield from self._articulos_vendidos_plan("Mes", limit, ascending=True))
 
+    @query_plan
     def get_alertas_stock(self, limit: int = 10) -> List[Dict[str, Any]]:
         query = """
             SELECT id, nombre, stock_actual, stock_minimo, 
                    (stock_minimo - stock_actual) as faltante
-            FROM app.v_articulo_detallado
+            FROM app.articulo_listado
             WHERE stock_actual <= stock_minimo AND activo = true
             ORDER BY faltante DESC
             LIMIT %s
         """
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (limit,))
-                return _rows_to_dicts(cur)
+        return (yield Query(query, (limit,)))
 
+    @query_plan
     def get_stock_by_rubro(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Returns stock count grouped by rubro."""
         query = """
@@ -1678,11 +3723,9 @@ class Database:
             ORDER BY cantidad DESC
             LIMIT %s
         """
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (limit,))
-                return _rows_to_dicts(cur)
+        return (yield Query(query, (limit,)))
 
+    @query_plan
     def get_entidades_by_tipo(self) -> List[Dict[str, Any]]:
         """Returns entity count grouped by type."""
         query = """
@@ -1690,30 +3733,33 @@ class Database:
             FROM app.entidad_comercial
             GROUP BY tipo
         """
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query)
-                return _rows_to_dicts(cur)
+        return (yield Query(query))
 
+    @query_plan
     def get_deudores(self, limit: int = 50) -> List[Dict[str, Any]]:
         query = "SELECT * FROM app.v_deudores LIMIT %s"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (limit,))
-                return _rows_to_dicts(cur)
+        return (yield Query(query, (limit,)))
 
+    @query_plan
     def get_max_cost(self) -> float:
         query = "SELECT MAX(costo) FROM app.articulo"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query)
-                res = cur.fetchone()
-                val = res.get("max") if isinstance(res, dict) else (res[0] if res else None)
-                return float(val) if val is not None else 1000.0
+        res = yield Query(query, fetch="row")
+        val = res.get("max") if isinstance(res, dict) else (res[0] if res else None)
+        return float(val) if val is not None else 1000.0
 
     def close(self) -> None:
         """Gracefully close the connection pool and join worker threads."""
         self.is_closing = True
+        if getattr(self, "_change_listener", None):
+            self._change_listener.stop()
+            self._change_listener = None
+        if getattr(self, "_activity_writer", None):
+            self._activity_writer.close()
+        if getattr(self, "_activity_index", None):
+            self._activity_index.save_dirty()
+        if getattr(self, "_dashboard_executor", None):
+            self._dashboard_executor.shutdown(wait=False, cancel_futures=True)
+            self._dashboard_executor = None
         if hasattr(self, 'pool') and self.pool:
             try:
                 # Explicitly close the pool to join worker threads.
@@ -1757,6 +3803,146 @@ class Database:
             deduped.append(clause)
         return ", ".join(deduped)
 
+    def _paginated_plan(
+        self,
+        *,
+        select_sql: str,
+        from_sql: str,
+        where_clause: str,
+        params: Sequence[Any],
+        order_by: str,
+        limit: int,
+        offset: int,
+        keyset: bool = False,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        tiebreaker: str = "id",
+        with_total: bool = False,
+        estimate_table: Optional[str] = None,
+    ) -> Plan:
+        """
+        Query plan of a paginated list query (used with `yield from`).
+
+        By default this is the classic LIMIT/OFFSET page. With `keyset=True` (or
+        an `after`/`before` cursor) the page is located by seeking past the
+        cursor values instead of scanning and discarding `offset` rows; OFFSET
+        is still honoured when no usable cursor is given (direct page jumps, or
+        a cursor built for a different ordering).
+
+        With `with_total=True` the total of the filtered set is computed in the
+        same round trip (COUNT(*) OVER()). When no filter is active and
+        `estimate_table` holds more than `approx_count_threshold` rows, the
+        planner estimate (pg_class.reltuples) is used instead of counting.
+
+        Keyset or total requests return a ResultPage carrying the cursors and
+        the total; otherwise a plain list is returned.
+        """
+        params = list(params)
+        where_params = list(params)
+        keyset = keyset or bool(after) or bool(before)
+        page_offset = offset
+
+        terms: List[Tuple[str, bool, bool]] = []
+        query_terms: List[Tuple[str, bool, bool]] = []
+        seek_values: Optional[List[Any]] = None
+        backwards = False
+        filters = where_clause
+        order_sql = order_by
+        extra_columns: List[str] = []
+        if keyset:
+            terms = _parse_order_terms(order_by, tiebreaker)
+            seek_values = _decode_keyset_cursor(after, terms)
+            if seek_values is None and before:
+                seek_values = _decode_keyset_cursor(before, terms)
+                backwards = seek_values is not None
+            query_terms = (
+                [(expr, not desc, not nulls_last) for expr, desc, nulls_last in terms]
+                if backwards
+                else list(terms)
+            )
+            if seek_values is not None:
+                seek_sql, seek_params = _build_keyset_predicate(query_terms, seek_values, non_null=(tiebreaker,))
+                filters = f"({where_clause}) AND {seek_sql}"
+                params.extend(seek_params)
+                offset = 0
+            order_sql = _render_order_terms(query_terms)
+            extra_columns.extend(f"{expr} AS _seek_{idx}" for idx, (expr, _, _) in enumerate(terms))
+
+        total: Optional[int] = None
+        total_is_estimate = False
+        if with_total and estimate_table and where_clause.strip() == "1=1":
+            estimate = yield from self._estimate_table_rows(estimate_table)
+            if estimate is not None and 0 < self.approx_count_threshold <= estimate:
+                total = estimate
+                total_is_estimate = True
+        # Behind a "before" cursor the window only sees the rows preceding it.
+        count_inline = with_total and total is None and not backwards
+        if count_inline:
+            extra_columns.append("COUNT(*) OVER() AS _total_count")
+
+        select_list = f"{select_sql}, {', '.join(extra_columns)}" if extra_columns else select_sql
+        query = (
+            f"SELECT {select_list} FROM {from_sql} WHERE {filters} "
+            f"ORDER BY {order_sql} LIMIT %s OFFSET %s"
+        )
+        rows = yield Query(query, params + [limit, offset])
+
+        if count_inline and rows:
+            # After a seek the window counts only the rows from this page onwards.
+            remaining = int(rows[0].get("_total_count") or 0)
+            total = remaining + (page_offset if seek_values is not None else 0)
+        elif with_total and total is None:
+            count = yield Query(
+                f"SELECT COUNT(*) AS total FROM {from_sql} WHERE {where_clause}", where_params, fetch="value"
+            )
+            total = int(count or 0)
+
+        if not keyset and not with_total:
+            return rows
+        if backwards:
+            rows.reverse()
+
+        seek_keys = [f"_seek_{idx}" for idx in range(len(terms))]
+        seek_rows = [[row.pop(key, None) for key in seek_keys] for row in rows]
+        for row in rows:
+            row.pop("_total_count", None)
+        page = ResultPage(rows, total=total, total_is_estimate=total_is_estimate)
+        if keyset and seek_rows:
+            page.prev_cursor = _encode_keyset_cursor(terms, seek_rows[0])
+            page.next_cursor = _encode_keyset_cursor(terms, seek_rows[-1])
+        return page
+
+    def _estimate_table_rows(self, table: str) -> Plan:
+        """Planner row estimate for a table (None when it was never analyzed)."""
+        value = yield Query(
+            "SELECT reltuples::bigint AS estimate FROM pg_class WHERE oid = %s::regclass", (table,), fetch="value"
+        )
+        if value is None or int(value) < 0:
+            return None
+        return int(value)
+
+    _PAGED_FETCHERS = (
+        "fetch_entities",
+        "fetch_articles",
+        "fetch_documentos_resumen",
+        "fetch_movimientos_stock",
+        "fetch_pagos",
+    )
+
+    def fetch_page(self, fetcher: str, **kwargs: Any) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Fetch one page of a list screen and its total in a single round trip.
+
+        `fetcher` names one of the paginated fetch_* methods; the remaining
+        keyword arguments are forwarded to it. The returned rows are a
+        ResultPage: check `total_is_estimate` before presenting the total as
+        exact.
+        """
+        if fetcher not in self._PAGED_FETCHERS:
+            raise ValueError(f"Listado no paginable: {fetcher}")
+        rows = getattr(self, fetcher)(with_total=True, **kwargs)
+        return rows, int(rows.total or 0)
+
     def _build_entity_filters(
         self,
         search: Optional[str],
@@ -1889,6 +4075,7 @@ class Database:
 
         return " AND ".join(filters), params
 
+    @query_plan
     def fetch_entities(
         self,
         search: Optional[str] = None,
@@ -1899,6 +4086,10 @@ class Database:
         limit: int = 60,
         offset: int = 0,
         search_by_cuit: bool = True,
+        keyset: bool = False,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        with_total: bool = False,
     ) -> List[Dict[str, Any]]:
         where_clause, params = self._build_entity_filters(
             search,
@@ -1933,8 +4124,7 @@ class Database:
         }
         order_by = self._build_order_by(sorts, sort_columns, default="nombre_completo ASC", tiebreaker="id ASC")
 
-        query = f"""
-            SELECT
+        select_sql = """
                 id,
                 id::text AS codigo,
                 tipo,
@@ -1958,27 +4148,30 @@ class Database:
                 descuento,
                 saldo_cuenta,
                 activo
-            FROM app.v_entidad_detallada
-            WHERE {where_clause}
-            ORDER BY {order_by}
-            LIMIT %s
-            OFFSET %s
         """
-        params.extend([limit, offset])
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
-
+        return (yield from self._paginated_plan(
+            select_sql=select_sql,
+            from_sql="app.v_entidad_detallada",
+            where_clause=where_clause,
+            params=params,
+            order_by=order_by,
+            limit=limit,
+            offset=offset,
+            keyset=keyset,
+            after=after,
+            before=before,
+            with_total=with_total,
+            estimate_table="app.entidad_comercial",
+        ))
+
+    @query_plan
     def fetch_entity_by_id(self, entity_id: int) -> Optional[Dict[str, Any]]:
         """Fetch full details for an entity by ID from the detailed view."""
         query = "SELECT * FROM app.v_entidad_detallada WHERE id = %s"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (int(entity_id),))
-                rows = _rows_to_dicts(cur)
-                return rows[0] if rows else None
+        rows = yield Query(query, (int(entity_id),))
+        return rows[0] if rows else None
 
+    @query_plan
     def count_entities(
         self,
         search: Optional[str] = None,
@@ -1988,27 +4181,20 @@ class Database:
     ) -> int:
         where_clause, params = self._build_entity_filters(search, tipo, advanced)
         query = f"SELECT COUNT(*) AS total FROM app.v_entidad_detallada WHERE {where_clause}"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                result = cur.fetchone()
-                return result.get("total", 0) if isinstance(result, dict) else result[0]
+        result = yield Query(query, params, fetch="row")
+        return result.get("total", 0) if isinstance(result, dict) else result[0]
 
+    @query_plan
     def count_entities_active(self, activo: bool = True) -> int:
         query = "SELECT COUNT(*) AS total FROM app.entidad_comercial WHERE activo = %s"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (activo,))
-                result = cur.fetchone()
-                return result.get("total", 0) if isinstance(result, dict) else result[0]
+        result = yield Query(query, (activo,), fetch="row")
+        return result.get("total", 0) if isinstance(result, dict) else result[0]
 
+    @query_plan
     def count_entities_by_type(self, tipo: str) -> int:
         query = "SELECT COUNT(*) AS total FROM app.entidad_comercial WHERE tipo = %s"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (tipo,))
-                result = cur.fetchone()
-                return result.get("total", 0) if isinstance(result, dict) else result[0]
+        result = yield Query(query, (tipo,), fetch="row")
+        return result.get("total", 0) if isinstance(result, dict) else result[0]
 
     def _build_article_filters(
         self,
@@ -2251,7 +4437,7 @@ class Database:
                     payload["meta"]["active_lists"] = active_lists
 
                     query = f"""
-                        SELECT a.id, a.nombre, a.costo
+                        SELECT a.id, a.nombre, a.costo, a.redondeo
                         FROM app.articulo a
                         WHERE {where_clause}
                         ORDER BY a.nombre ASC, a.id ASC
@@ -2263,11 +4449,10 @@ class Database:
 
                     article_ids = [int(r[0]) for r in article_rows]
                     active_list_ids = [int(lp["id"]) for lp in active_lists]
-                    prices_by_article: Dict[int, Dict[int, Dict[str, Any]]] = {}
+                    price_rows: List[Any] = []
                     if article_ids and active_list_ids:
-                        article_placeholders = ",".join(["%s"] * len(article_ids))
-                        list_placeholders = ",".join(["%s"] * len(active_list_ids))
-                        prices_sql = f"""
+                        cur.execute(
+                            """
                             SELECT
                                 ap.id_articulo,
                                 ap.id_lista_precio,
@@ -2276,57 +4461,52 @@ class Database:
                                 tp.tipo
                             FROM app.articulo_precio ap
                             LEFT JOIN ref.tipo_porcentaje tp ON tp.id = ap.id_tipo_porcentaje
-                            WHERE ap.id_articulo IN ({article_placeholders})
-                              AND ap.id_lista_precio IN ({list_placeholders})
-                        """
-                        cur.execute(prices_sql, article_ids + active_list_ids)
-                        for p_row in cur.fetchall():
-                            art_id = int(p_row[0])
-                            lp_id = int(p_row[1])
-                            prices_by_article.setdefault(art_id, {})[lp_id] = {
-                                "precio": float(p_row[2] or 0),
-                                "porcentaje": float(p_row[3] or 0),
-                                "tipo": p_row[4],
-                            }
+                            WHERE ap.id_articulo = ANY(%s)
+                              AND ap.id_lista_precio = ANY(%s)
+                            """,
+                            (article_ids, active_list_ids),
+                        )
+                        price_rows = cur.fetchall()
+
+                    # Whole columns at once (NumPy when available) instead of per-row helpers
+                    current_costs = [float(r[2] or 0) for r in article_rows]
+                    new_costs = mass_update_math.apply_operation(current_costs, operation, value)
+                    cost_diffs = mass_update_math.diff_pcts(current_costs, new_costs)
+
+                    position = {art_id: idx for idx, art_id in enumerate(article_ids)}
+                    price_positions = [position[int(p[0])] for p in price_rows]
+                    current_prices = [float(p[2] or 0) for p in price_rows]
+                    factors = pricing_engine.price_factors([p[4] for p in price_rows], [p[3] for p in price_rows])
+                    new_prices = pricing_engine.prices_from_costs(
+                        [new_costs[i] for i in price_positions],
+                        factors,
+                        [article_rows[i][3] for i in price_positions],
+                    )
+                    # Prices entered by hand (no percentage) do not follow the cost
+                    new_prices = [
+                        current if p[3] is None else new
+                        for p, current, new in zip(price_rows, current_prices, new_prices)
+                    ]
+                    price_diffs = mass_update_math.diff_pcts(current_prices, new_prices)
 
                     rows: List[Dict[str, Any]] = []
-                    for art_row in article_rows:
-                        art_id = int(art_row[0])
-                        name = art_row[1]
-                        current_cost = float(art_row[2] or 0)
-                        new_cost = self._apply_mass_update_operation(current_cost, operation, value)
-                        list_changes: Dict[int, Optional[Dict[str, float]]] = {}
-                        article_prices = prices_by_article.get(art_id, {})
-
-                        for lp in active_lists:
-                            lp_id = int(lp["id"])
-                            price_info = article_prices.get(lp_id)
-                            if not price_info:
-                                list_changes[lp_id] = None
-                                continue
-
-                            current_price = float(price_info.get("precio") or 0)
-                            factor = self._price_factor_from_tipo(
-                                price_info.get("tipo"),
-                                price_info.get("porcentaje"),
-                            )
-                            new_price = self._calc_price_from_cost_factor(new_cost, factor)
-                            list_changes[lp_id] = {
-                                "current": current_price,
-                                "new": new_price,
-                                "diff_pct": self._calc_diff_pct(current_price, new_price),
-                            }
-
+                    for idx, art_row in enumerate(article_rows):
                         rows.append(
                             {
-                                "id": art_id,
-                                "nombre": name,
-                                "costo_current": current_cost,
-                                "costo_new": new_cost,
-                                "costo_diff_pct": self._calc_diff_pct(current_cost, new_cost),
-                                "list_changes": list_changes,
+                                "id": article_ids[idx],
+                                "nombre": art_row[1],
+                                "costo_current": current_costs[idx],
+                                "costo_new": new_costs[idx],
+                                "costo_diff_pct": cost_diffs[idx],
+                                "list_changes": {lp_id: None for lp_id in active_list_ids},
                             }
                         )
+                    for p_idx, p_row in enumerate(price_rows):
+                        rows[price_positions[p_idx]]["list_changes"][int(p_row[1])] = {
+                            "current": current_prices[p_idx],
+                            "new": new_prices[p_idx],
+                            "diff_pct": price_diffs[p_idx],
+                        }
 
                     payload["rows"] = rows
                     return payload
@@ -2351,7 +4531,8 @@ class Database:
                             a.costo,
                             ap.precio,
                             ap.porcentaje,
-                            tp.tipo
+                            tp.tipo,
+                            a.redondeo
                         FROM app.articulo a
                         JOIN app.articulo_precio ap
                           ON ap.id_articulo = a.id
@@ -2363,41 +4544,280 @@ class Database:
                     """
                     query_params = [list_id_int] + params + paging_params
                     cur.execute(query, query_params)
-                    rows: List[Dict[str, Any]] = []
-                    skipped_invalid_factor = 0
-
-                    for r in cur.fetchall():
-                        art_id = int(r[0])
-                        name = r[1]
-                        current_cost = float(r[2] or 0)
-                        current_price = float(r[3] or 0)
-                        factor = self._price_factor_from_tipo(r[5], r[4])
-
-                        new_selected_price = self._apply_mass_update_operation(current_price, operation, value)
-                        if factor <= 0:
-                            skipped_invalid_factor += 1
-                            continue
-
-                        new_cost = max(0.0, new_selected_price / factor)
-                        rows.append(
-                            {
-                                "id": art_id,
-                                "nombre": name,
-                                "costo_current": current_cost,
-                                "costo_new": new_cost,
-                                "costo_diff_pct": self._calc_diff_pct(current_cost, new_cost),
-                                "selected_current": current_price,
-                                "selected_new": new_selected_price,
-                                "selected_diff_pct": self._calc_diff_pct(current_price, new_selected_price),
-                            }
-                        )
+                    fetched = cur.fetchall()
+
+                    current_costs = [float(r[2] or 0) for r in fetched]
+                    current_prices = [float(r[3] or 0) for r in fetched]
+                    factors = pricing_engine.price_factors([r[5] for r in fetched], [r[4] for r in fetched])
+                    new_prices = mass_update_math.apply_operation(current_prices, operation, value)
+                    valid = [idx for idx, factor in enumerate(factors) if factor > 0]
+                    new_costs = [max(0.0, new_prices[idx] / factors[idx]) for idx in valid]
+                    valid_costs = [current_costs[idx] for idx in valid]
+                    valid_prices = [current_prices[idx] for idx in valid]
+                    # The list price is recomputed from the new cost (rounded when `redondeo`)
+                    selected_new = pricing_engine.prices_from_costs(
+                        new_costs, [factors[idx] for idx in valid], [fetched[idx][6] for idx in valid]
+                    )
+                    cost_diffs = mass_update_math.diff_pcts(valid_costs, new_costs)
+                    price_diffs = mass_update_math.diff_pcts(valid_prices, selected_new)
+
+                    rows = [
+                        {
+                            "id": int(fetched[idx][0]),
+                            "nombre": fetched[idx][1],
+                            "costo_current": valid_costs[pos],
+                            "costo_new": new_costs[pos],
+                            "costo_diff_pct": cost_diffs[pos],
+                            "selected_current": valid_prices[pos],
+                            "selected_new": selected_new[pos],
+                            "selected_diff_pct": price_diffs[pos],
+                        }
+                        for pos, idx in enumerate(valid)
+                    ]
 
                     payload["rows"] = rows
-                    payload["meta"]["skipped_invalid_factor"] = skipped_invalid_factor
+                    payload["meta"]["skipped_invalid_factor"] = len(fetched) - len(valid)
                     return payload
 
         return payload
 
+    @query_plan
+    def preview_mass_update_stats(
+        self,
+        filters: Dict[str, Any],
+        target: str,
+        operation: str,
+        value: float,
+        list_id: Optional[int] = None,
+        ids: Optional[List[int]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Aggregate preview of a mass update computed in one SQL pass, with the
+        same arithmetic as mass_update_articles: affected articles, min/max/avg
+        % change of the cost and of each price list, rows that end at the
+        `GREATEST(0, ...)` floor and rows skipped for an invalid factor.
+        """
+        stats: Dict[str, Any] = {
+            "target_mode": target,
+            "articles": 0,
+            "skipped_invalid_factor": 0,
+            "cost": None,
+            "lists": [],
+        }
+        expr = self._build_mass_update_sql_expr("current_val", operation, value)
+        if not expr:
+            return stats
+        where_clause, params = self._mass_update_where(filters, ids)
+        factor_sql = pricing_engine.factor_sql()
+        list_id_int = int(list_id) if list_id is not None else None
+
+        if target == "COSTO":
+            expr_cost = expr.replace("current_val", "a.costo")
+            # Cost row (id_lista_precio NULL) plus one row per active list, same scan
+            query = f"""
+                WITH target_articles AS (
+                    SELECT a.id, a.costo AS actual, a.redondeo, ({expr_cost}) AS crudo
+                    FROM app.articulo a
+                    WHERE {where_clause}
+                ),
+                changes AS (
+                    SELECT NULL::bigint AS id_lista_precio, t.actual, GREATEST(0, t.crudo) AS nuevo, t.crudo < 0 AS piso, FALSE AS invalido
+                    FROM target_articles t
+                    UNION ALL
+                    SELECT ap.id_lista_precio, ap.precio,
+                           CASE WHEN ap.porcentaje IS NULL THEN ap.precio
+                                ELSE {pricing_engine.price_sql(cost="t.crudo", redondeo="t.redondeo")} END,
+                           ap.porcentaje IS NOT NULL AND GREATEST(0, t.crudo) * {factor_sql} < 0, FALSE
+                    FROM target_articles t
+                    JOIN app.articulo_precio ap ON ap.id_articulo = t.id
+                    JOIN ref.lista_precio lp ON lp.id = ap.id_lista_precio AND lp.activa = TRUE
+                    LEFT JOIN ref.tipo_porcentaje tp ON tp.id = ap.id_tipo_porcentaje
+                )
+            """
+            query_params = list(params)
+        elif target == "LISTA_PRECIO" and list_id_int:
+            expr_selected = expr.replace("current_val", "ap.precio")
+            # Cost row (new cost = new price / factor) plus the selected list row
+            query = f"""
+                WITH target_articles AS (
+                    SELECT a.id, a.costo, a.redondeo, ap.precio, ap.porcentaje, tp.tipo,
+                           ({expr_selected}) AS crudo, {factor_sql} AS factor
+                    FROM app.articulo a
+                    JOIN app.articulo_precio ap ON ap.id_articulo = a.id AND ap.id_lista_precio = %s
+                    LEFT JOIN ref.tipo_porcentaje tp ON tp.id = ap.id_tipo_porcentaje
+                    WHERE {where_clause}
+                ),
+                changes AS (
+                    SELECT NULL::bigint AS id_lista_precio, t.costo AS actual,
+                           CASE WHEN t.factor > 0 THEN GREATEST(0, GREATEST(0, t.crudo) / t.factor) END AS nuevo,
+                           FALSE AS piso, t.factor <= 0 AS invalido
+                    FROM target_articles t
+                    UNION ALL
+                    -- The list price is recomputed from the new cost (rounded when `redondeo`)
+                    SELECT %s::bigint, t.precio,
+                           CASE WHEN t.factor > 0 THEN {pricing_engine.price_sql(
+                               cost="GREATEST(0, t.crudo) / t.factor", pct="t.porcentaje", tipo="t.tipo", redondeo="t.redondeo"
+                           )} END,
+                           t.crudo < 0, t.factor <= 0
+                    FROM target_articles t
+                )
+            """
+            query_params = [list_id_int] + list(params) + [list_id_int]
+        else:
+            return stats
+
+        query += """
+            SELECT
+                c.id_lista_precio,
+                lp.nombre,
+                COUNT(*) FILTER (WHERE NOT c.invalido)::int AS filas,
+                COUNT(*) FILTER (WHERE c.invalido)::int AS invalidos,
+                COUNT(*) FILTER (WHERE c.piso AND NOT c.invalido)::int AS en_cero,
+                MIN(d.pct) AS min_pct,
+                MAX(d.pct) AS max_pct,
+                AVG(d.pct) AS avg_pct,
+                SUM(c.actual) FILTER (WHERE NOT c.invalido) AS total_actual,
+                SUM(c.nuevo) FILTER (WHERE NOT c.invalido) AS total_nuevo
+            FROM changes c
+            CROSS JOIN LATERAL (
+                SELECT CASE WHEN c.actual > 0 AND NOT c.invalido THEN (c.nuevo - c.actual) / c.actual * 100.0 END AS pct
+            ) d
+            LEFT JOIN ref.lista_precio lp ON lp.id = c.id_lista_precio
+            GROUP BY c.id_lista_precio, lp.nombre, lp.orden
+            ORDER BY c.id_lista_precio IS NOT NULL, lp.orden, c.id_lista_precio
+        """
+        rows = yield Query(query, query_params)
+
+        for row in rows:
+            entry = {
+                "rows": int(row.get("filas") or 0),
+                "floored": int(row.get("en_cero") or 0),
+                "min_pct": float(row["min_pct"]) if row.get("min_pct") is not None else None,
+                "max_pct": float(row["max_pct"]) if row.get("max_pct") is not None else None,
+                "avg_pct": float(row["avg_pct"]) if row.get("avg_pct") is not None else None,
+                "total_current": float(row.get("total_actual") or 0),
+                "total_new": float(row.get("total_nuevo") or 0),
+            }
+            if row.get("id_lista_precio") is None:
+                stats["cost"] = entry
+                stats["articles"] = entry["rows"]
+                stats["skipped_invalid_factor"] = int(row.get("invalidos") or 0)
+            else:
+                stats["lists"].append({"id": int(row["id_lista_precio"]), "nombre": row.get("nombre"), **entry})
+        return stats
+
+    def _mass_update_where(self, filters: Dict[str, Any], ids: Optional[Sequence[int]]) -> Tuple[str, List[Any]]:
+        if ids:
+            return "a.id = ANY(%s)", [sorted({int(i) for i in ids})]
+        return self._build_article_filters(
+            search=filters.get("search"),
+            activo_only=filters.get("activo_only"),
+            advanced=filters,
+            article_id_expr="a.id",
+        )
+
+    def _apply_mass_update(
+        self,
+        cur: Any,
+        target: str,
+        expr: str,
+        where_clause: str,
+        params: List[Any],
+        list_id_int: Optional[int],
+    ) -> Tuple[int, int]:
+        """Run the cost/price updates for the articles matching `where_clause`; returns (updated, skipped_invalid_factor)."""
+        if target == "COSTO":
+            expr_cost = expr.replace("current_val", "previo.costo_previo")
+            sql = f"""
+                WITH previo AS (
+                    SELECT a.id AS id_previo, a.costo AS costo_previo
+                    FROM app.articulo a
+                    WHERE {where_clause}
+                )
+                UPDATE app.articulo a
+                SET costo = GREATEST(0, {expr_cost})
+                FROM previo
+                WHERE a.id = previo.id_previo
+                RETURNING a.id, a.costo IS DISTINCT FROM previo.costo_previo AS costo_cambio
+            """
+            cur.execute(sql, params)
+            rows = cur.fetchall()
+            changed_ids = [int(r[0]) for r in rows if r[1]]
+
+            if changed_ids:
+                pricing_engine.recompute_prices(cur, "SELECT unnest(%s::bigint[])", [changed_ids])
+            return len(rows), 0
+
+        if target != "LISTA_PRECIO" or not list_id_int:
+            return 0, 0
+
+        expr_selected = expr.replace("current_val", "ap.precio")
+        sql_cost = f"""
+            WITH target_articles AS (
+                SELECT a.id
+                FROM app.articulo a
+                WHERE {where_clause}
+            ),
+            selected_base AS (
+                SELECT
+                    a.id AS id_articulo,
+                    GREATEST(0, {expr_selected}) AS selected_new_price,
+                    {pricing_engine.factor_sql()} AS factor
+                FROM app.articulo a
+                JOIN target_articles ta ON ta.id = a.id
+                JOIN app.articulo_precio ap
+                  ON ap.id_articulo = a.id
+                 AND ap.id_lista_precio = %s
+                LEFT JOIN ref.tipo_porcentaje tp ON tp.id = ap.id_tipo_porcentaje
+            ),
+            invalid AS (
+                SELECT id_articulo
+                FROM selected_base
+                WHERE factor <= 0
+            ),
+            valid AS (
+                SELECT id_articulo, selected_new_price, factor
+                FROM selected_base
+                WHERE factor > 0
+            ),
+            updated_cost AS (
+                UPDATE app.articulo a
+                SET costo = GREATEST(0, v.selected_new_price / v.factor)
+                FROM valid v
+                WHERE a.id = v.id_articulo
+                RETURNING a.id
+            )
+            SELECT
+                (SELECT COUNT(*)::int FROM updated_cost) AS updated_count,
+                (SELECT COUNT(*)::int FROM invalid) AS skipped_invalid_factor
+        """
+        cur.execute(sql_cost, params + [list_id_int])
+        stats_row = cur.fetchone()
+        updated = skipped = 0
+        if isinstance(stats_row, dict):
+            updated = int(stats_row.get("updated_count") or 0)
+            skipped = int(stats_row.get("skipped_invalid_factor") or 0)
+        elif stats_row:
+            updated = int(stats_row[0] or 0)
+            skipped = int(stats_row[1] or 0)
+
+        # Every list of the articles whose cost changed, from the new cost
+        valid_articles_sql = f"""
+            SELECT ta.id
+            FROM (SELECT a.id FROM app.articulo a WHERE {where_clause}) ta
+            JOIN app.articulo_precio ap
+              ON ap.id_articulo = ta.id
+             AND ap.id_lista_precio = %s
+            LEFT JOIN ref.tipo_porcentaje tp ON tp.id = ap.id_tipo_porcentaje
+            WHERE {pricing_engine.factor_sql()} > 0
+        """
+        pricing_engine.recompute_prices(cur, valid_articles_sql, params + [list_id_int])
+        # The selected list is the one being set, also where its price was entered by hand
+        pricing_engine.recompute_prices(
+            cur, valid_articles_sql, params + [list_id_int], list_ids=[list_id_int], include_manual=True
+        )
+        return updated, skipped
+
     def mass_update_articles(
         self,
         filters: Dict[str, Any],
@@ -2405,168 +4825,40 @@ class Database:
         operation: str,
         value: float,
         list_id: Optional[int] = None,
-        ids: Optional[List[int]] = None
-    ) -> Dict[str, int]:
+        ids: Optional[List[int]] = None,
+        *,
+        batch_size: Optional[int] = None,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> Dict[str, Any]:
+        """
+        Apply a cost/price adjustment to the selected articles.
+
+        With `batch_size` > 0 (default: `mass_update_batch_size`) the articles
+        are processed in id order, `batch_size` per transaction, and progress
+        is kept in an app.actualizacion_masiva job so cashiers only wait on the
+        rows of the current batch. `on_progress` receives the job counters
+        after every committed batch; setting `cancel_event` stops after the
+        current one. A stopped or failed job continues with resume_mass_update.
+        `batch_size=0` runs everything in a single transaction.
+        """
         list_id_int = int(list_id) if list_id is not None else None
-        summary = {"updated_count": 0, "skipped_invalid_factor": 0}
+        summary: Dict[str, Any] = {"updated_count": 0, "skipped_invalid_factor": 0}
 
         expr = self._build_mass_update_sql_expr("current_val", operation, value)
         if not expr:
             return summary
 
-        if ids:
-            id_placeholders = ",".join(["%s"] * len(ids))
-            where_clause = f"id IN ({id_placeholders})"
-            params = list(ids)
-        else:
-            where_clause, params = self._build_article_filters(
-                search=filters.get("search"),
-                activo_only=filters.get("activo_only"),
-                advanced=filters,
-                article_id_expr="a.id",
-            )
-        with self._transaction() as cur:
-            if target == "COSTO":
-                expr_cost = expr.replace("current_val", "costo")
-                sql = f"""
-                    UPDATE app.articulo a
-                    SET costo = GREATEST(0, {expr_cost})
-                    WHERE {where_clause}
-                """
-                cur.execute(sql, params)
-                summary["updated_count"] = cur.rowcount
-
-                sql_prices = f"""
-                    WITH target_articles AS (
-                        SELECT a.id
-                        FROM app.articulo a
-                        WHERE {where_clause}
-                    )
-                    UPDATE app.articulo_precio ap
-                    SET precio = GREATEST(
-                            0,
-                            CASE
-                                WHEN COALESCE(
-                                    (
-                                        SELECT tp.tipo
-                                        FROM ref.tipo_porcentaje tp
-                                        WHERE tp.id = ap.id_tipo_porcentaje
-                                    ),
-                                    'MARGEN'
-                                ) = 'DESCUENTO'
-                                    THEN a.costo * (1 - COALESCE(ap.porcentaje, 0) / 100.0)
-                                ELSE
-                                    a.costo * (1 + COALESCE(ap.porcentaje, 0) / 100.0)
-                            END
-                        ),
-                        fecha_actualizacion = now()
-                    FROM app.articulo a
-                    WHERE ap.id_articulo = a.id
-                      AND a.id IN (SELECT id FROM target_articles)
-                """
-                cur.execute(sql_prices, params)
+        size = self.mass_update_batch_size if batch_size is None else max(0, int(batch_size))
+        if size > 0:
+            job_id = self._create_mass_update_job(filters, target, operation, value, list_id_int, ids, size)
+            return self._run_mass_update_job(job_id, on_progress=on_progress, cancel_event=cancel_event)
 
-            elif target == "LISTA_PRECIO" and list_id_int:
-                expr_selected = expr.replace("current_val", "ap.precio")
-                sql_cost = f"""
-                    WITH target_articles AS (
-                        SELECT a.id
-                        FROM app.articulo a
-                        WHERE {where_clause}
-                    ),
-                    selected_base AS (
-                        SELECT
-                            a.id AS id_articulo,
-                            GREATEST(0, {expr_selected}) AS selected_new_price,
-                            CASE
-                                WHEN COALESCE(tp.tipo, 'MARGEN') = 'DESCUENTO'
-                                    THEN 1 - COALESCE(ap.porcentaje, 0) / 100.0
-                                ELSE
-                                    1 + COALESCE(ap.porcentaje, 0) / 100.0
-                            END AS factor
-                        FROM app.articulo a
-                        JOIN target_articles ta ON ta.id = a.id
-                        JOIN app.articulo_precio ap
-                          ON ap.id_articulo = a.id
-                         AND ap.id_lista_precio = %s
-                        LEFT JOIN ref.tipo_porcentaje tp ON tp.id = ap.id_tipo_porcentaje
-                    ),
-                    invalid AS (
-                        SELECT id_articulo
-                        FROM selected_base
-                        WHERE factor <= 0
-                    ),
-                    valid AS (
-                        SELECT id_articulo, selected_new_price, factor
-                        FROM selected_base
-                        WHERE factor > 0
-                    ),
-                    updated_cost AS (
-                        UPDATE app.articulo a
-                        SET costo = GREATEST(0, v.selected_new_price / v.factor)
-                        FROM valid v
-                        WHERE a.id = v.id_articulo
-                        RETURNING a.id
-                    )
-                    SELECT
-                        (SELECT COUNT(*)::int FROM updated_cost) AS updated_count,
-                        (SELECT COUNT(*)::int FROM invalid) AS skipped_invalid_factor
-                """
-                cur.execute(sql_cost, params + [list_id_int])
-                stats_row = cur.fetchone()
-                if isinstance(stats_row, dict):
-                    summary["updated_count"] = int(stats_row.get("updated_count") or 0)
-                    summary["skipped_invalid_factor"] = int(stats_row.get("skipped_invalid_factor") or 0)
-                elif stats_row:
-                    summary["updated_count"] = int(stats_row[0] or 0)
-                    summary["skipped_invalid_factor"] = int(stats_row[1] or 0)
-
-                sql_prices = f"""
-                    WITH target_articles AS (
-                        SELECT a.id
-                        FROM app.articulo a
-                        WHERE {where_clause}
-                    ),
-                    valid_articles AS (
-                        SELECT a.id
-                        FROM app.articulo a
-                        JOIN target_articles ta ON ta.id = a.id
-                        JOIN app.articulo_precio ap_sel
-                          ON ap_sel.id_articulo = a.id
-                         AND ap_sel.id_lista_precio = %s
-                        LEFT JOIN ref.tipo_porcentaje tp_sel ON tp_sel.id = ap_sel.id_tipo_porcentaje
-                        WHERE (
-                            CASE
-                                WHEN COALESCE(tp_sel.tipo, 'MARGEN') = 'DESCUENTO'
-                                    THEN 1 - COALESCE(ap_sel.porcentaje, 0) / 100.0
-                                ELSE
-                                    1 + COALESCE(ap_sel.porcentaje, 0) / 100.0
-                            END
-                        ) > 0
-                    )
-                    UPDATE app.articulo_precio ap
-                    SET precio = GREATEST(
-                            0,
-                            CASE
-                                WHEN COALESCE(
-                                    (
-                                        SELECT tp.tipo
-                                        FROM ref.tipo_porcentaje tp
-                                        WHERE tp.id = ap.id_tipo_porcentaje
-                                    ),
-                                    'MARGEN'
-                                ) = 'DESCUENTO'
-                                    THEN a.costo * (1 - COALESCE(ap.porcentaje, 0) / 100.0)
-                                ELSE
-                                    a.costo * (1 + COALESCE(ap.porcentaje, 0) / 100.0)
-                            END
-                        ),
-                        fecha_actualizacion = now()
-                    FROM app.articulo a
-                    WHERE ap.id_articulo = a.id
-                      AND a.id IN (SELECT id FROM valid_articles)
-                """
-                cur.execute(sql_prices, params + [list_id_int])
+        where_clause, params = self._mass_update_where(filters, ids)
+        with self._transaction() as cur:
+            updated, skipped = self._apply_mass_update(cur, target, expr, where_clause, params, list_id_int)
+            summary["updated_count"] = updated
+            summary["skipped_invalid_factor"] = skipped
 
             self.log_activity("ARTICULO", "MASS_UPDATE", detalle={
                 "target": target,
@@ -2579,6 +4871,243 @@ class Database:
 
         return summary
 
+    def _create_mass_update_job(
+        self,
+        filters: Dict[str, Any],
+        target: str,
+        operation: str,
+        value: float,
+        list_id_int: Optional[int],
+        ids: Optional[Sequence[int]],
+        batch_size: int,
+    ) -> int:
+        where_clause, params = self._mass_update_where(filters, ids)
+        with self._transaction() as cur:
+            cur.execute(f"SELECT COUNT(*) AS total FROM app.articulo a WHERE {where_clause}", params)
+            row = cur.fetchone()
+            total = int((row.get("total") if isinstance(row, dict) else row[0]) or 0)
+            cur.execute(
+                """
+                INSERT INTO app.actualizacion_masiva (
+                    estado, objetivo, operacion, valor, id_lista_precio, filtros, ids,
+                    tamano_lote, total, id_usuario
+                )
+                VALUES (%s, %s, %s, %s, %s, %s::jsonb, %s, %s, %s, %s)
+                RETURNING id
+                """,
+                (
+                    ActualizacionMasivaEstado.EN_CURSO.value,
+                    target,
+                    operation,
+                    value,
+                    list_id_int,
+                    json.dumps({} if ids else (filters or {}), default=str),
+                    sorted({int(i) for i in ids}) if ids else None,
+                    batch_size,
+                    total,
+                    self.current_user_id,
+                ),
+            )
+            row = cur.fetchone()
+            return int(row.get("id") if isinstance(row, dict) else row[0])
+
+    def _run_mass_update_job(
+        self,
+        job_id: int,
+        *,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> Dict[str, Any]:
+        """Process the pending batches of a job; each batch commits together with the job counters."""
+        job = self.get_mass_update_job(job_id)
+        if not job:
+            raise ValueError(f"Actualización masiva {job_id} no encontrada.")
+        list_id_int = _to_id(job.get("id_lista_precio"))
+        expr = self._build_mass_update_sql_expr("current_val", job["operacion"], float(job["valor"]))
+        if not expr:
+            raise ValueError(f"Operación inválida en la actualización masiva {job_id}.")
+        where_clause, params = self._mass_update_where(job.get("filtros") or {}, job.get("ids"))
+        batch_size = max(1, int(job.get("tamano_lote") or self.mass_update_batch_size or 500))
+
+        try:
+            while True:
+                if cancel_event is not None and cancel_event.is_set():
+                    self.stop_mass_update(job_id)
+                    job = self.get_mass_update_job(job_id) or job
+                    break
+                with self._transaction() as cur:
+                    # The row lock keeps two terminals resuming the same job from applying a batch twice
+                    cur.execute(
+                        """
+                        SELECT estado, ultimo_id, procesados, actualizados, omitidos, total
+                        FROM app.actualizacion_masiva
+                        WHERE id = %s
+                        FOR UPDATE
+                        """,
+                        (job_id,),
+                    )
+                    job.update(next(iter(_rows_to_dicts(cur)), {}))
+                    if job.get("estado") != ActualizacionMasivaEstado.EN_CURSO.value:
+                        break
+                    cur.execute(
+                        f"""
+                        SELECT a.id
+                        FROM app.articulo a
+                        WHERE {where_clause} AND a.id > %s
+                        ORDER BY a.id
+                        LIMIT %s
+                        """,
+                        params + [int(job.get("ultimo_id") or 0), batch_size],
+                    )
+                    chunk = [int(row.get("id") if isinstance(row, dict) else row[0]) for row in cur.fetchall()]
+                    updated = skipped = 0
+                    if chunk:
+                        updated, skipped = self._apply_mass_update(
+                            cur, job["objetivo"], expr, "a.id = ANY(%s)", [chunk], list_id_int
+                        )
+                    cur.execute(
+                        """
+                        UPDATE app.actualizacion_masiva
+                        SET procesados = procesados + %s,
+                            actualizados = actualizados + %s,
+                            omitidos = omitidos + %s,
+                            ultimo_id = COALESCE(%s, ultimo_id),
+                            estado = CASE WHEN %s THEN estado ELSE %s END,
+                            fecha_actualizacion = now(),
+                            fecha_fin = CASE WHEN %s THEN NULL ELSE now() END
+                        WHERE id = %s
+                        RETURNING estado, ultimo_id, procesados, actualizados, omitidos, total
+                        """,
+                        (
+                            len(chunk),
+                            updated,
+                            skipped,
+                            chunk[-1] if chunk else None,
+                            bool(chunk),
+                            ActualizacionMasivaEstado.COMPLETADO.value,
+                            bool(chunk),
+                            job_id,
+                        ),
+                    )
+                    job.update(next(iter(_rows_to_dicts(cur)), {}))
+                if on_progress is not None:
+                    try:
+                        on_progress(self._mass_update_progress(job_id, job))
+                    except Exception:
+                        logger.debug("Mass update progress callback failed", exc_info=True)
+                if not chunk:
+                    break
+        except Exception as exc:
+            with self._transaction() as cur:
+                cur.execute(
+                    """
+                    UPDATE app.actualizacion_masiva
+                    SET estado = %s, error = %s, fecha_actualizacion = now()
+                    WHERE id = %s AND estado = %s
+                    """,
+                    (ActualizacionMasivaEstado.FALLIDO.value, str(exc)[:1000], job_id, ActualizacionMasivaEstado.EN_CURSO.value),
+                )
+            raise
+
+        progress = self._mass_update_progress(job_id, job)
+        self.log_activity("ARTICULO", "MASS_UPDATE", detalle={
+            "job_id": job_id,
+            "estado": progress["estado"],
+            "target": job.get("objetivo"),
+            "operation": job.get("operacion"),
+            "value": float(job.get("valor") or 0),
+            "count": progress["updated_count"],
+            "list_id": list_id_int,
+            "skipped_invalid_factor": progress["skipped_invalid_factor"],
+        })
+        return progress
+
+    @staticmethod
+    def _mass_update_progress(job_id: int, job: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "job_id": job_id,
+            "estado": job.get("estado"),
+            "total": int(job.get("total") or 0),
+            "processed": int(job.get("procesados") or 0),
+            "updated_count": int(job.get("actualizados") or 0),
+            "skipped_invalid_factor": int(job.get("omitidos") or 0),
+        }
+
+    def resume_mass_update(
+        self,
+        job_id: int,
+        *,
+        on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+        cancel_event: Optional[threading.Event] = None,
+    ) -> Dict[str, Any]:
+        """Continue a stopped, failed or interrupted job after its last committed batch."""
+        with self._transaction() as cur:
+            cur.execute(
+                """
+                UPDATE app.actualizacion_masiva
+                SET estado = %s, error = NULL, fecha_actualizacion = now()
+                WHERE id = %s AND estado = ANY(%s)
+                RETURNING id
+                """,
+                (ActualizacionMasivaEstado.EN_CURSO.value, int(job_id), list(_MASS_UPDATE_RESUMABLE)),
+            )
+            if not cur.fetchone():
+                raise ValueError("La actualización masiva no existe, ya fue completada o fue descartada.")
+        return self._run_mass_update_job(int(job_id), on_progress=on_progress, cancel_event=cancel_event)
+
+    def stop_mass_update(self, job_id: int) -> bool:
+        """Stop a running job after its current batch (also from another terminal); it stays resumable."""
+        with self._transaction() as cur:
+            cur.execute(
+                """
+                UPDATE app.actualizacion_masiva
+                SET estado = %s, fecha_actualizacion = now()
+                WHERE id = %s AND estado = %s
+                """,
+                (ActualizacionMasivaEstado.DETENIDO.value, int(job_id), ActualizacionMasivaEstado.EN_CURSO.value),
+            )
+            return cur.rowcount > 0
+
+    def discard_mass_update(self, job_id: int) -> bool:
+        """Give up an unfinished job: it is no longer offered for resuming (applied batches stay)."""
+        with self._transaction() as cur:
+            cur.execute(
+                """
+                UPDATE app.actualizacion_masiva
+                SET estado = %s, fecha_actualizacion = now(), fecha_fin = now()
+                WHERE id = %s AND estado = ANY(%s)
+                """,
+                (ActualizacionMasivaEstado.CANCELADO.value, int(job_id), list(_MASS_UPDATE_RESUMABLE)),
+            )
+            return cur.rowcount > 0
+
+    @query_plan
+    def get_mass_update_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        return (yield Query("SELECT * FROM app.actualizacion_masiva WHERE id = %s", (int(job_id),), fetch="one"))
+
+    @query_plan
+    def fetch_mass_update_jobs(self, *, only_unfinished: bool = False, limit: int = 20) -> List[Dict[str, Any]]:
+        """Latest jobs; `only_unfinished` keeps the resumable ones (not completed nor discarded)."""
+        filters = ["1=1"]
+        params: List[Any] = []
+        if only_unfinished:
+            filters.append("m.estado = ANY(%s)")
+            params.append(list(_MASS_UPDATE_RESUMABLE))
+        query = f"""
+            SELECT m.id, m.estado, m.objetivo, m.operacion, m.valor, m.id_lista_precio,
+                   m.total, m.procesados, m.actualizados, m.omitidos, m.error,
+                   m.fecha_inicio, m.fecha_actualizacion, m.fecha_fin,
+                   u.nombre AS usuario
+            FROM app.actualizacion_masiva m
+            LEFT JOIN seguridad.usuario u ON u.id = m.id_usuario
+            WHERE {" AND ".join(filters)}
+            ORDER BY m.id DESC
+            LIMIT %s
+        """
+        params.append(max(1, int(limit)))
+        return (yield Query(query, params))
+
+    @query_plan
     def fetch_articles(
         self,
         search: Optional[str] = None,
@@ -2588,6 +5117,10 @@ class Database:
         sorts: Optional[Sequence[Tuple[str, str]]] = None,
         limit: int = 40,
         offset: int = 0,
+        keyset: bool = False,
+        after: Optional[str] = None,
+        before: Optional[str] = None,
+        with_total: bool = False,
     ) -> List[Dict[str, Any]]:
         where_clause, params = self._build_article_filters(
             search,
@@ -2599,28 +5132,34 @@ class Database:
 
         lp_id = _to_id((advanced or {}).get("id_lista_precio"))
         if lp_id is not None:
-            query = f"""
-                SELECT ad.*, ap.precio as precio_lista
-                FROM app.v_articulo_detallado ad
+            select_sql = "ad.*, ap.precio as precio_lista"
+            from_sql = """
+                app.articulo_listado ad
                 LEFT JOIN app.articulo_precio ap ON ad.id = ap.id_articulo AND ap.id_lista_precio = %s
             """
             params.insert(0, lp_id)
         else:
-            query = f"""
-                SELECT ad.*
-                FROM app.v_articulo_detallado ad
-            """
+            select_sql = "ad.*"
+            from_sql = "app.articulo_listado ad"
 
-        # Build complete query with WHERE and ORDER BY clauses
         # where_clause is safe (from _build_article_filters)
         # order_by is safe (built from validated sort_columns mapping)
-        query = f"{query} WHERE {where_clause} ORDER BY {order_by} LIMIT %s OFFSET %s"
-        params.extend([limit, offset])
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
-
+        return (yield from self._paginated_plan(
+            select_sql=select_sql,
+            from_sql=from_sql,
+            where_clause=where_clause,
+            params=params,
+            order_by=order_by,
+            limit=limit,
+            offset=offset,
+            keyset=keyset,
+            after=after,
+            before=before,
+            with_total=with_total,
+            estimate_table="app.articulo",
+        ))
+
+    @query_plan
     def count_articles(
         self,
         search: Optional[str] = None,
@@ -2635,19 +5174,16 @@ class Database:
             article_id_expr="ad.id",
         )
         # where_clause is safe (from _build_article_filters with parametrized conditions)
-        query = f"SELECT COUNT(*) AS total FROM app.v_articulo_detallado ad WHERE {where_clause}"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                result = cur.fetchone()
-                return result.get("total", 0) if isinstance(result, dict) else result[0]
+        query = f"SELECT COUNT(*) AS total FROM app.articulo_listado ad WHERE {where_clause}"
+        result = yield Query(query, params, fetch="row")
+        return result.get("total", 0) if isinstance(result, dict) else result[0]
 
     def get_article_details(self, article_id: int) -> Dict[str, Any]:
         """Fetch full details for an article including all price lists."""
         with self.pool.connection() as conn:
             with conn.cursor() as cur:
                 # 1. Basic Info
-                cur.execute("SELECT * FROM app.v_articulo_detallado WHERE id_articulo = %s", (article_id,))
+                cur.execute("SELECT * FROM app.articulo_listado WHERE id = %s", (article_id,))
                 basic_info = _rows_to_dicts(cur)
                 if not basic_info:
                     return {}
@@ -2687,6 +5223,7 @@ class Database:
             logger.error("Error updating article status", exc_info=e)
             return False
 
+    @query_plan
     def fetch_stock_alerts(
         self,
         search: Optional[str] = None,
@@ -2715,17 +5252,14 @@ class Database:
                 COALESCE(stock_actual, 0) AS stock_actual,
                 stock_minimo,
                 COALESCE(stock_actual, 0) - COALESCE(stock_minimo, 0) AS diferencia
-            FROM app.v_articulo_detallado
+            FROM app.articulo_listado
             WHERE {where_clause}
             ORDER BY {order_by}
             LIMIT %s
             OFFSET %s
         """
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                params.extend([limit, offset])
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        params.extend([limit, offset])
+        return (yield Query(query, params))
 
     def list_marcas(self) -> List[str]:
         return self._get_cached_catalog("marcas", "SELECT nombre FROM ref.marca ORDER BY nombre")
@@ -2741,36 +5275,16 @@ class Database:
 
     def list_proveedores(self) -> List[Dict[str, Any]]:
         """Special case: list providers for dropdowns (id + name)."""
-        # We don't use _get_cached_catalog here because it expects List[str], but we want List[Dict]
-        import time
-        cache_key = "proveedores"
-        now = time.time()
-        if cache_key in self._catalog_cache:
-            cached_time, cached_data = self._catalog_cache[cache_key]
-            if now - cached_time < self._CACHE_TTL:
-                return cached_data # type: ignore
-        
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT id, nombre_completo as nombre FROM app.v_entidad_detallada WHERE tipo IN ('PROVEEDOR', 'AMBOS') ORDER BY nombre")
-                result = _rows_to_dicts(cur)
-                self._catalog_cache[cache_key] = (now, result) # type: ignore
-                return result
+        return self._get_cached_catalog_raw(
+            "proveedores",
+            "SELECT id, nombre_completo as nombre FROM app.v_entidad_detallada WHERE tipo IN ('PROVEEDOR', 'AMBOS') ORDER BY nombre",
+        )
 
     def list_unidades_medida(self) -> List[Dict[str, Any]]:
-        import time
-        cache_key = "unidades"
-        now = time.time()
-        if cache_key in self._catalog_cache:
-            cached_time, cached_data = self._catalog_cache[cache_key]
-            if now - cached_time < self._CACHE_TTL:
-                return cached_data # type: ignore
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute("SELECT id, nombre, abreviatura FROM ref.unidad_medida ORDER BY nombre")
-                result = _rows_to_dicts(cur)
-                self._catalog_cache[cache_key] = (now, result) # type: ignore
-                return result
+        return self._get_cached_catalog_raw(
+            "unidades",
+            "SELECT id, nombre, abreviatura FROM ref.unidad_medida ORDER BY nombre",
+        )
 
 
     def _build_catalog_filters(
@@ -2791,6 +5305,7 @@ class Database:
                 params.extend([pattern] * len(cols))
         return " AND ".join(filters), params
 
+    @query_plan
     def fetch_marcas(
         self,
         search: Optional[str] = None,
@@ -2812,19 +5327,14 @@ class Database:
             OFFSET %s
         """
         params.extend([limit, offset])
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        return (yield Query(query, params))
 
+    @query_plan
     def count_marcas(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None) -> int:
         where_clause, params = self._build_catalog_filters(search, columns=("nombre",))
         query = f"SELECT COUNT(*) AS total FROM ref.marca WHERE {where_clause}"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                result = cur.fetchone()
-                return result.get("total", 0) if isinstance(result, dict) else result[0]
+        result = yield Query(query, params, fetch="row")
+        return result.get("total", 0) if isinstance(result, dict) else result[0]
 
     def create_marca(self, nombre: str) -> int:
         if not isinstance(nombre, str) or not nombre.strip():
@@ -2870,6 +5380,7 @@ class Database:
                 "Primero reasigná los artículos a otra marca."
             )
 
+    @query_plan
     def fetch_rubros(
         self,
         search: Optional[str] = None,
@@ -2891,19 +5402,14 @@ class Database:
             OFFSET %s
         """
         params.extend([limit, offset])
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        return (yield Query(query, params))
 
+    @query_plan
     def count_rubros(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None) -> int:
         where_clause, params = self._build_catalog_filters(search, columns=("nombre",))
         query = f"SELECT COUNT(*) AS total FROM ref.rubro WHERE {where_clause}"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                result = cur.fetchone()
-                return result.get("total", 0) if isinstance(result, dict) else result[0]
+        result = yield Query(query, params, fetch="row")
+        return result.get("total", 0) if isinstance(result, dict) else result[0]
 
     def create_rubro(self, nombre: str) -> int:
         if not isinstance(nombre, str) or not nombre.strip():
@@ -2949,6 +5455,7 @@ class Database:
                 "Primero reasigná los artículos a otro rubro."
             )
 
+    @query_plan
     def count_stock_alerts(self, search: Optional[str] = None) -> int:
         filters: List[str] = ["COALESCE(stock_actual, 0) < COALESCE(stock_minimo, 0)"]
         params: List[Any] = []
@@ -2956,12 +5463,9 @@ class Database:
             filters.append("nombre ILIKE %s")
             params.append(f"%{search.strip()}%")
         where_clause = " AND ".join(filters)
-        query = f"SELECT COUNT(*) AS total FROM app.v_articulo_detallado WHERE {where_clause}"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                result = cur.fetchone()
-                return result.get("total", 0) if isinstance(result, dict) else result[0]
+        query = f"SELECT COUNT(*) AS total FROM app.articulo_listado WHERE {where_clause}"
+        result = yield Query(query, params, fetch="row")
+        return result.get("total", 0) if isinstance(result, dict) else result[0]
 
     def create_entity_full(
         self,
@@ -3612,11 +6116,22 @@ class Database:
         if not assignments:
             return
         params.append(article_id)
-        query = f"UPDATE app.articulo SET {', '.join(assignments)} WHERE id = %s"
+        # `previo` is the row before this UPDATE: lists are repriced only when cost or rounding really change
+        query = f"""
+            UPDATE app.articulo a SET {', '.join(assignments)}
+            FROM app.articulo previo
+            WHERE a.id = %s AND previo.id = a.id
+            RETURNING (a.costo IS DISTINCT FROM previo.costo OR a.redondeo IS DISTINCT FROM previo.redondeo) AS reprecio
+        """
         with self.pool.connection() as conn:
             with conn.cursor() as cur:
                 self._setup_session(cur)
                 cur.execute(query, params)
+                row = cur.fetchone()
+                reprice = bool(row and row[0])
+                if reprice:
+                    # Lists follow the cost (and rounding) like in a mass update
+                    pricing_engine.recompute_prices(cur, "SELECT %s::bigint", [int(article_id)])
                 conn.commit()
                 
                 self.log_activity(
@@ -3626,6 +6141,7 @@ class Database:
                     detalle={"updates": updates}
                 )
 
+    @query_plan
     def fetch_article_by_id(self, article_id: int) -> Optional[Dict[str, Any]]:
         query = """
             SELECT 
@@ -3642,25 +6158,12 @@ class Database:
             LEFT JOIN app.articulo_stock_resumen sr ON a.id = sr.id_articulo
             WHERE a.id = %s
         """
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (int(article_id),))
-                rows = _rows_to_dicts(cur)
-                return rows[0] if rows else None
+        rows = yield Query(query, (int(article_id),))
+        return rows[0] if rows else None
 
+    @query_plan
     def fetch_article_prices(self, article_id: int) -> List[Dict[str, Any]]:
-        query = """
-            SELECT lp.id as id_lista_precio, lp.nombre as lista_nombre,
-                   ap.precio, ap.porcentaje, ap.id_tipo_porcentaje
-            FROM ref.lista_precio lp
-            LEFT JOIN app.articulo_precio ap ON lp.id = ap.id_lista_precio AND ap.id_articulo = %s
-            WHERE lp.activa = True
-            ORDER BY lp.orden ASC
-        """
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (article_id,))
-                return _rows_to_dicts(cur)
+        return (yield self.prepared_statements.query("article_prices", (article_id,)))
 
     def update_article_prices(self, article_id: int, prices: List[Dict[str, Any]]) -> None:
         """
@@ -3690,7 +6193,121 @@ class Database:
         with self._transaction() as cur:
             cur.executemany(query, params)
 
-
+    def recompute_article_prices(
+        self,
+        article_ids: Optional[Sequence[int]] = None,
+        list_ids: Optional[Sequence[int]] = None,
+    ) -> int:
+        """
+        Recompute the list prices of the given articles (all when None) from
+        their cost, percentage and `redondeo` in one set-based UPDATE; only
+        prices that change are written. Returns how many changed.
+        """
+        if article_ids is not None:
+            articles_sql, params = "SELECT unnest(%s::bigint[])", [[int(i) for i in article_ids]]
+        else:
+            articles_sql, params = "SELECT id FROM app.articulo", []
+        with self._transaction() as cur:
+            changed = pricing_engine.recompute_prices(cur, articles_sql, params, list_ids=list_ids)
+        self.log_activity("ARTICULO", "RECALCULO_PRECIOS", detalle={
+            "articulos": len(article_ids) if article_ids is not None else "TODOS",
+            "listas": list(list_ids) if list_ids is not None else "TODAS",
+            "precios_modificados": changed,
+        })
+        return changed
+
+    def update_article_costs(self, costs: Dict[int, Any]) -> Dict[str, int]:
+        """
+        Set the cost of many articles (e.g. a supplier price list, {id_articulo: costo})
+        and recompute their list prices, in one transaction.
+        """
+        ids: List[int] = []
+        values: List[float] = []
+        for art_id, cost in costs.items():
+            try:
+                value = float(str(cost).replace(",", ".")) if isinstance(cost, str) else float(cost)
+            except (TypeError, ValueError) as exc:
+                raise ValueError(f"Costo inválido para el artículo {art_id}: {cost!r}") from exc
+            if value < 0:
+                raise ValueError(f"Costo inválido para el artículo {art_id}: {cost!r}")
+            ids.append(int(art_id))
+            values.append(value)
+        if not ids:
+            return {"updated_count": 0, "prices_changed": 0}
+        with self._transaction() as cur:
+            cur.execute(
+                """
+                UPDATE app.articulo a
+                SET costo = c.costo
+                FROM unnest(%s::bigint[], %s::numeric[]) AS c(id, costo)
+                WHERE a.id = c.id
+                  AND a.costo IS DISTINCT FROM c.costo
+                RETURNING a.id
+                """,
+                (ids, values),
+            )
+            changed_ids = [int(r[0] if isinstance(r, (list, tuple)) else r["id"]) for r in cur.fetchall()]
+            updated = len(changed_ids)
+            changed = 0
+            if changed_ids:
+                changed = pricing_engine.recompute_prices(cur, "SELECT unnest(%s::bigint[])", [changed_ids])
+        self.log_activity("ARTICULO", "ACTUALIZACION_COSTOS", detalle={
+            "articulos": len(ids),
+            "costos_modificados": updated,
+            "precios_modificados": changed,
+        })
+        return {"updated_count": updated, "prices_changed": changed}
+
+    @query_plan
+    def verify_article_prices(
+        self,
+        article_ids: Optional[Sequence[int]] = None,
+        *,
+        tolerance: float = 0.005,
+        max_mismatches: int = 100,
+    ) -> Dict[str, Any]:
+        """
+        Compare stored list prices with the engine's reference implementation
+        (pricing_engine.reference_prices); returns the rows that differ by more
+        than `tolerance`.
+        """
+        # Prices without a percentage were entered by hand: nothing to compare with
+        where = "WHERE ap.porcentaje IS NOT NULL"
+        if article_ids is not None:
+            where += " AND ap.id_articulo = ANY(%s)"
+        params: List[Any] = [[int(i) for i in article_ids]] if article_ids is not None else []
+        rows = yield Query(
+            f"""
+            SELECT ap.id_articulo, ap.id_lista_precio, ap.precio, ap.porcentaje, tp.tipo, a.costo, a.redondeo
+            FROM app.articulo_precio ap
+            JOIN app.articulo a ON a.id = ap.id_articulo
+            LEFT JOIN ref.tipo_porcentaje tp ON tp.id = ap.id_tipo_porcentaje
+            {where}
+            ORDER BY ap.id_articulo, ap.id_lista_precio
+            """,
+            params,
+        )
+        expected = pricing_engine.reference_prices(
+            [r["costo"] for r in rows],
+            [r["porcentaje"] for r in rows],
+            [r["tipo"] for r in rows],
+            [r["redondeo"] for r in rows],
+        )
+        mismatches: List[Dict[str, Any]] = []
+        count = 0
+        for row, price in zip(rows, expected):
+            stored = float(row["precio"]) if row["precio"] is not None else None
+            if stored is not None and abs(stored - price) <= tolerance:
+                continue
+            count += 1
+            if len(mismatches) < max_mismatches:
+                mismatches.append({
+                    "id_articulo": row["id_articulo"],
+                    "id_lista_precio": row["id_lista_precio"],
+                    "precio": stored,
+                    "esperado": round(price, pricing_engine.PRICE_SCALE),
+                })
+        return {"checked": len(rows), "mismatch_count": count, "mismatches": mismatches}
 
     def bulk_update_articles(self, ids: Sequence[int], updates: Dict[str, Any]) -> None:
         if not ids or not updates: return
@@ -3722,25 +6339,21 @@ class Database:
                 conn.commit()
 
     # Provinces
+    @query_plan
     def fetch_provincias(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None, sorts: Optional[Sequence[Tuple[str, str]]] = None, limit: int = 80, offset: int = 0) -> List[Dict[str, Any]]:
         where_clause, params = self._build_catalog_filters(search)
         sort_columns = {"id": "id", "nombre": "nombre"}
         order_by = self._build_order_by(sorts, sort_columns, default="nombre ASC", tiebreaker="id ASC")
         query = f"SELECT id, nombre FROM ref.provincia WHERE {where_clause} ORDER BY {order_by} LIMIT %s OFFSET %s"
         params.extend([limit, offset])
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        return (yield Query(query, params))
 
+    @query_plan
     def count_provincias(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None) -> int:
         where_clause, params = self._build_catalog_filters(search)
         query = f"SELECT COUNT(*) AS total FROM ref.provincia WHERE {where_clause}"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                result = cur.fetchone()
-                return result.get("total", 0) if isinstance(result, dict) else result[0]
+        result = yield Query(query, params, fetch="row")
+        return result.get("total", 0) if isinstance(result, dict) else result[0]
 
     def create_provincia(self, nombre: str) -> int:
         query = "INSERT INTO ref.provincia (nombre) VALUES (%s) RETURNING id"
@@ -3775,14 +6388,13 @@ class Database:
                 "Primero eliminá o reasigná las localidades."
             )
 
+    @query_plan
     def list_provincias(self) -> List[Dict[str, Any]]:
         query = "SELECT id, nombre FROM ref.provincia ORDER BY nombre"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query)
-                return _rows_to_dicts(cur)
+        return (yield Query(query))
 
     # Localities
+    @query_plan
     def fetch_localidades(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None, sorts: Optional[Sequence[Tuple[str, str]]] = None, limit: int = 80, offset: int = 0) -> List[Dict[str, Any]]:
         """Fetch localities with filtering support."""
         filters = ["1=1"]
@@ -3800,13 +6412,11 @@ class Database:
             WHERE {where_clause}
             ORDER BY {order_by}
             LIMIT %s OFFSET %s
-        """
-        params.extend([limit, offset])
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        """
+        params.extend([limit, offset])
+        return (yield Query(query, params))
 
+    @query_plan
     def fetch_localidades_by_provincia(
         self,
         id_provincia: int,
@@ -3832,11 +6442,9 @@ class Database:
             LIMIT %s OFFSET %s
         """
         params.extend([int(limit), int(offset)])
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        return (yield Query(query, params))
 
+    @query_plan
     def count_localidades(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None) -> int:
         filters = ["1=1"]
         params = []
@@ -3845,11 +6453,8 @@ class Database:
             params.extend([f"%{search.strip()}%"] * 2)
         where_clause = " AND ".join(filters)
         query = f"SELECT COUNT(*) AS total FROM ref.localidad l JOIN ref.provincia p ON l.id_provincia = p.id WHERE {where_clause}"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                result = cur.fetchone()
-                return result.get("total", 0) if isinstance(result, dict) else result[0]
+        result = yield Query(query, params, fetch="row")
+        return result.get("total", 0) if isinstance(result, dict) else result[0]
 
     def create_localidad(self, nombre: str, id_provincia: int) -> int:
         query = "INSERT INTO ref.localidad (nombre, id_provincia) VALUES (%s, %s) RETURNING id"
@@ -3993,25 +6598,21 @@ class Database:
             )
 
     # Units of Measure
+    @query_plan
     def fetch_unidades_medida(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None, sorts: Optional[Sequence[Tuple[str, str]]] = None, limit: int = 80, offset: int = 0) -> List[Dict[str, Any]]:
         where_clause, params = self._build_catalog_filters(search)
         sort_columns = {"id": "id", "nombre": "nombre", "abreviatura": "abreviatura"}
         order_by = self._build_order_by(sorts, sort_columns, default="nombre ASC", tiebreaker="id ASC")
         query = f"SELECT id, nombre, abreviatura FROM ref.unidad_medida WHERE {where_clause} ORDER BY {order_by} LIMIT %s OFFSET %s"
         params.extend([limit, offset])
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        return (yield Query(query, params))
 
+    @query_plan
     def count_unidades_medida(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None) -> int:
         where_clause, params = self._build_catalog_filters(search)
         query = f"SELECT COUNT(*) AS total FROM ref.unidad_medida WHERE {where_clause}"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                result = cur.fetchone()
-                return result.get("total", 0) if isinstance(result, dict) else result[0]
+        result = yield Query(query, params, fetch="row")
+        return result.get("total", 0) if isinstance(result, dict) else result[0]
 
     def create_unidad_medida(self, nombre: str, abreviatura: str) -> int:
         query = "INSERT INTO ref.unidad_medida (nombre, abreviatura) VALUES (%s, %s) RETURNING id"
@@ -4055,25 +6656,21 @@ class Database:
             )
 
     # IVA Conditions
+    @query_plan
     def fetch_condiciones_iva(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None, sorts: Optional[Sequence[Tuple[str, str]]] = None, limit: int = 80, offset: int = 0) -> List[Dict[str, Any]]:
         where_clause, params = self._build_catalog_filters(search)
         sort_columns = {"id": "id", "nombre": "nombre"}
         order_by = self._build_order_by(sorts, sort_columns, default="nombre ASC", tiebreaker="id ASC")
         query = f"SELECT id, nombre FROM ref.condicion_iva WHERE {where_clause} ORDER BY {order_by} LIMIT %s OFFSET %s"
         params.extend([limit, offset])
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        return (yield Query(query, params))
 
+    @query_plan
     def count_condiciones_iva(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None) -> int:
         where_clause, params = self._build_catalog_filters(search)
         query = f"SELECT COUNT(*) AS total FROM ref.condicion_iva WHERE {where_clause}"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                result = cur.fetchone()
-                return result.get("total", 0) if isinstance(result, dict) else result[0]
+        result = yield Query(query, params, fetch="row")
+        return result.get("total", 0) if isinstance(result, dict) else result[0]
 
     def create_condicion_iva(self, nombre: str) -> int:
         query = "INSERT INTO ref.condicion_iva (nombre) VALUES (%s) RETURNING id"
@@ -4106,25 +6703,21 @@ class Database:
             )
 
     # IVA Types
+    @query_plan
     def fetch_tipos_iva(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None, sorts: Optional[Sequence[Tuple[str, str]]] = None, limit: int = 80, offset: int = 0) -> List[Dict[str, Any]]:
         where_clause, params = self._build_catalog_filters(search, columns=("descripcion", "codigo::text"))
         sort_columns = {"id": "id", "codigo": "codigo", "porcentaje": "porcentaje", "descripcion": "descripcion"}
         order_by = self._build_order_by(sorts, sort_columns, default="porcentaje ASC", tiebreaker="id ASC")
         query = f"SELECT id, codigo, porcentaje, descripcion FROM ref.tipo_iva WHERE {where_clause} ORDER BY {order_by} LIMIT %s OFFSET %s"
         params.extend([limit, offset])
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        return (yield Query(query, params))
 
+    @query_plan
     def count_tipos_iva(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None) -> int:
         where_clause, params = self._build_catalog_filters(search, columns=("descripcion", "codigo::text"))
         query = f"SELECT COUNT(*) AS total FROM ref.tipo_iva WHERE {where_clause}"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                result = cur.fetchone()
-                return result.get("total", 0) if isinstance(result, dict) else result[0]
+        result = yield Query(query, params, fetch="row")
+        return result.get("total", 0) if isinstance(result, dict) else result[0]
 
     def create_tipo_iva(self, codigo: int, porcentaje: float, descripcion: str) -> int:
         query = "INSERT INTO ref.tipo_iva (codigo, porcentaje, descripcion) VALUES (%s, %s, %s) RETURNING id"
@@ -4164,25 +6757,21 @@ class Database:
             )
 
     # Deposits
+    @query_plan
     def fetch_depositos(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None, sorts: Optional[Sequence[Tuple[str, str]]] = None, limit: int = 80, offset: int = 0) -> List[Dict[str, Any]]:
         where_clause, params = self._build_catalog_filters(search)
         sort_columns = {"id": "id", "nombre": "nombre", "ubicacion": "ubicacion", "activo": "activo"}
         order_by = self._build_order_by(sorts, sort_columns, default="nombre ASC", tiebreaker="id ASC")
         query = f"SELECT id, nombre, ubicacion, activo FROM ref.deposito WHERE {where_clause} ORDER BY {order_by} LIMIT %s OFFSET %s"
         params.extend([limit, offset])
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        return (yield Query(query, params))
 
+    @query_plan
     def count_depositos(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None) -> int:
         where_clause, params = self._build_catalog_filters(search)
         query = f"SELECT COUNT(*) AS total FROM ref.deposito WHERE {where_clause}"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                result = cur.fetchone()
-                return result.get("total", 0) if isinstance(result, dict) else result[0]
+        result = yield Query(query, params, fetch="row")
+        return result.get("total", 0) if isinstance(result, dict) else result[0]
 
     def create_deposito(self, nombre: str, ubicacion: str, activo: bool = True) -> int:
         query = "INSERT INTO ref.deposito (nombre, ubicacion, activo) VALUES (%s, %s, %s) RETURNING id"
@@ -4223,25 +6812,21 @@ class Database:
             )
 
     # Payment Methods
+    @query_plan
     def fetch_formas_pago(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None, sorts: Optional[Sequence[Tuple[str, str]]] = None, limit: int = 80, offset: int = 0) -> List[Dict[str, Any]]:
         where_clause, params = self._build_catalog_filters(search, columns=("descripcion",))
         sort_columns = {"id": "id", "descripcion": "descripcion", "activa": "activa"}
         order_by = self._build_order_by(sorts, sort_columns, default="descripcion ASC", tiebreaker="id ASC")
         query = f"SELECT id, descripcion, activa FROM ref.forma_pago WHERE {where_clause} ORDER BY {order_by} LIMIT %s OFFSET %s"
         params.extend([limit, offset])
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        return (yield Query(query, params))
 
+    @query_plan
     def count_formas_pago(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None) -> int:
         where_clause, params = self._build_catalog_filters(search, columns=("descripcion",))
         query = f"SELECT COUNT(*) AS total FROM ref.forma_pago WHERE {where_clause}"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                result = cur.fetchone()
-                return result.get("total", 0) if isinstance(result, dict) else result[0]
+        result = yield Query(query, params, fetch="row")
+        return result.get("total", 0) if isinstance(result, dict) else result[0]
 
     def create_forma_pago(self, descripcion: str, activa: bool = True) -> int:
         query = "INSERT INTO ref.forma_pago (descripcion, activa) VALUES (%s, %s) RETURNING id"
@@ -4282,34 +6867,28 @@ class Database:
             )
 
     # Price Lists
+    @query_plan
     def fetch_listas_precio(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None, sorts: Optional[Sequence[Tuple[str, str]]] = None, limit: int = 80, offset: int = 0) -> List[Dict[str, Any]]:
         where_clause, params = self._build_catalog_filters(search)
         sort_columns = {"id": "id", "nombre": "nombre", "activa": "activa", "orden": "orden"}
         order_by = self._build_order_by(sorts, sort_columns, default="orden ASC", tiebreaker="id ASC")
         query = f"SELECT id, nombre, activa, orden FROM ref.lista_precio WHERE {where_clause} ORDER BY {order_by} LIMIT %s OFFSET %s"
         params.extend([limit, offset])
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        return (yield Query(query, params))
 
+    @query_plan
     def get_lista_precio_simple(self, lista_id: int) -> Optional[Dict[str, Any]]:
         """Fetch a single price list by ID, regardless of active status."""
         query = "SELECT id, nombre, activa, orden FROM ref.lista_precio WHERE id = %s"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (lista_id,))
-                rows = _rows_to_dicts(cur)
-                return rows[0] if rows else None
+        rows = yield Query(query, (lista_id,))
+        return rows[0] if rows else None
 
+    @query_plan
     def count_listas_precio(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None) -> int:
         where_clause, params = self._build_catalog_filters(search)
         query = f"SELECT COUNT(*) AS total FROM ref.lista_precio WHERE {where_clause}"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                result = cur.fetchone()
-                return result.get("total", 0) if isinstance(result, dict) else result[0]
+        result = yield Query(query, params, fetch="row")
+        return result.get("total", 0) if isinstance(result, dict) else result[0]
 
     def _next_lista_precio_orden(self, cur: Any, start: int = 1, exclude_id: Optional[int] = None) -> int:
         start_val = max(1, int(start))
@@ -4431,14 +7010,60 @@ class Database:
             )
 
     # Logs
+    def _build_log_filter(self, search: Optional[str], simple: Optional[str], advanced: Optional[Dict[str, Any]], solo_hoy: bool) -> Optional[LogFilter]:
+        """LogFilter for the log view; None when nothing can match (a user filter that is not an id)."""
+        advanced = advanced or {}
+        resultados = _normalize_log_result_filter(advanced.get("resultado"))
+        if resultados is None:
+            resultados = _normalize_log_result_filter(simple)
+
+        usuario = advanced.get("id_usuario", advanced.get("usuario"))
+        id_usuario = None
+        if usuario not in (None, "", "Todos", "---"):
+            try:
+                id_usuario = _coerce_optional_positive_int(usuario, "usuario")
+            except ValueError:
+                return None
+
+        desde = _parse_date_only(advanced.get("desde"))
+        hasta = _parse_date_only(advanced.get("hasta"))
+        if hasta is not None and not isinstance(advanced.get("hasta"), datetime):
+            hasta = hasta.replace(hour=23, minute=59, second=59)
+        if solo_hoy and desde is None and hasta is None:
+            desde = datetime.combine(date.today(), datetime.min.time())
+
+        def text(key: str) -> Optional[str]:
+            value = advanced.get(key)
+            value = str(value).strip() if value is not None else ""
+            return value if value and value not in ("Todos", "Todas", "---") else None
+
+        return LogFilter(
+            search=search.strip() if search and search.strip() else None,
+            id_usuario=id_usuario,
+            entidad=text("entidad"),
+            accion=text("accion"),
+            resultados=resultados,
+            desde=desde,
+            hasta=hasta,
+        )
+
     def fetch_logs(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None, sorts: Optional[Sequence[Tuple[str, str]]] = None, limit: int = 100, offset: int = 0, solo_hoy: bool = True) -> List[Dict[str, Any]]:
-        _ = (search, simple, advanced, sorts, limit, offset, solo_hoy)
-        return []
+        """Query the daily activity files through their sidecar indexes (newest first by default)."""
+        flt = self._build_log_filter(search, simple, advanced, solo_hoy)
+        if flt is None:
+            return []
+        self.flush_activity_log(timeout=1.0)
+        rows, _ = self._activity_index.query(flt, sorts=sorts, limit=limit, offset=offset)
+        return rows
 
     def count_logs(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None, solo_hoy: bool = True) -> int:
-        _ = (search, simple, advanced, solo_hoy)
-        return 0
+        flt = self._build_log_filter(search, simple, advanced, solo_hoy)
+        if flt is None:
+            return 0
+        self.flush_activity_log(timeout=1.0)
+        return self._activity_index.count(flt)
 
+    @query_plan
     def fetch_remitos(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None, sorts: Optional[Sequence[Tuple[str, str]]] = None, limit: int = 60, offset: int = 0) -> List[Dict[str, Any]]:
         filters = ["1=1"]
         params: List[Any] = []
@@ -4508,11 +7133,9 @@ class Database:
         """
         params.extend([limit, offset])
 
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        return (yield Query(query, params))
 
+    @query_plan
     def count_remitos(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None) -> int:
         filters = ["1=1"]
         params: List[Any] = []
@@ -4559,14 +7182,12 @@ class Database:
 
         where_clause = " AND ".join(filters)
         query = f"SELECT COUNT(*) as total FROM app.v_remito_resumen WHERE {where_clause}"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                res = cur.fetchone()
-                if res is None:
-                    return 0
-                return res.get("total", 0) if isinstance(res, dict) else res[0]
+        res = yield Query(query, params, fetch="row")
+        if res is None:
+            return 0
+        return res.get("total", 0) if isinstance(res, dict) else res[0]
 
+    @query_plan
     def fetch_remito_detalle(self, remito_id: int) -> List[Dict[str, Any]]:
         query = """
             SELECT
@@ -4581,10 +7202,7 @@ class Database:
             WHERE rd.id_remito = %s
             ORDER BY rd.nro_linea
         """
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (remito_id,))
-                return _rows_to_dicts(cur)
+        return (yield Query(query, (remito_id,)))
 
     def create_tipo_porcentaje(self, tipo: str) -> int:
         query = "INSERT INTO ref.tipo_porcentaje (tipo) VALUES (%s) RETURNING id"
@@ -4631,6 +7249,7 @@ class Database:
             raise ValueError(f"Error al crear tipo de movimiento: {e}")
 
     # Percentage Types
+    @query_plan
     def fetch_tipos_porcentaje(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None, sorts: Optional[Sequence[Tuple[str, str]]] = None, limit: int = 80, offset: int = 0) -> List[Dict[str, Any]]:
         filters = ["1=1"]
         params = []
@@ -4642,11 +7261,9 @@ class Database:
         order_by = self._build_order_by(sorts, sort_columns, default="tipo ASC", tiebreaker="id ASC")
         query = f"SELECT id, tipo FROM ref.tipo_porcentaje WHERE {where_clause} ORDER BY {order_by} LIMIT %s OFFSET %s"
         params.extend([limit, offset])
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        return (yield Query(query, params))
 
+    @query_plan
     def count_tipos_porcentaje(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None) -> int:
         filters = ["1=1"]
         params = []
@@ -4655,11 +7272,8 @@ class Database:
             params.append(f"%{search.strip()}%")
         where_clause = " AND ".join(filters)
         query = f"SELECT COUNT(*) AS total FROM ref.tipo_porcentaje WHERE {where_clause}"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                result = cur.fetchone()
-                return result.get("total", 0) if isinstance(result, dict) else result[0]
+        result = yield Query(query, params, fetch="row")
+        return result.get("total", 0) if isinstance(result, dict) else result[0]
 
     def delete_tipos_porcentaje(self, ids: Sequence[int]) -> None:
         query = "DELETE FROM ref.tipo_porcentaje WHERE id = ANY(%s)"
@@ -4674,6 +7288,7 @@ class Database:
             )
 
     # Document Types
+    @query_plan
     def fetch_tipos_documento(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None, sorts: Optional[Sequence[Tuple[str, str]]] = None, limit: int = 80, offset: int = 0) -> List[Dict[str, Any]]:
         filters = ["1=1"]
         params = []
@@ -4685,11 +7300,9 @@ class Database:
         order_by = self._build_order_by(sorts, sort_columns, default="nombre ASC", tiebreaker="id ASC")
         query = f"SELECT id, nombre, clase, afecta_stock, afecta_cuenta_corriente, codigo_afip, letra FROM ref.tipo_documento WHERE {where_clause} ORDER BY {order_by} LIMIT %s OFFSET %s"
         params.extend([limit, offset])
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        return (yield Query(query, params))
 
+    @query_plan
     def count_tipos_documento(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None) -> int:
         filters = ["1=1"]
         params = []
@@ -4698,11 +7311,8 @@ class Database:
             params.extend([f"%{search.strip()}%"] * 2)
         where_clause = " AND ".join(filters)
         query = f"SELECT COUNT(*) AS total FROM ref.tipo_documento WHERE {where_clause}"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                result = cur.fetchone()
-                return result.get("total", 0) if isinstance(result, dict) else result[0]
+        result = yield Query(query, params, fetch="row")
+        return result.get("total", 0) if isinstance(result, dict) else result[0]
 
     def delete_tipos_documento(self, ids: Sequence[int]) -> None:
         query = "DELETE FROM ref.tipo_documento WHERE id = ANY(%s)"
@@ -4717,6 +7327,7 @@ class Database:
             )
 
     # Article Movement Types
+    @query_plan
     def fetch_tipos_movimiento_articulo(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None, sorts: Optional[Sequence[Tuple[str, str]]] = None, limit: int = 80, offset: int = 0) -> List[Dict[str, Any]]:
         filters = ["1=1"]
         params = []
@@ -4728,11 +7339,9 @@ class Database:
         order_by = self._build_order_by(sorts, sort_columns, default="nombre ASC", tiebreaker="id ASC")
         query = f"SELECT id, nombre, signo_stock FROM ref.tipo_movimiento_articulo WHERE {where_clause} ORDER BY {order_by} LIMIT %s OFFSET %s"
         params.extend([limit, offset])
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        return (yield Query(query, params))
 
+    @query_plan
     def count_tipos_movimiento_articulo(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None) -> int:
         filters = ["1=1"]
         params = []
@@ -4741,11 +7350,8 @@ class Database:
             params.append(f"%{search.strip()}%")
         where_clause = " AND ".join(filters)
         query = f"SELECT COUNT(*) AS total FROM ref.tipo_movimiento_articulo WHERE {where_clause}"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                result = cur.fetchone()
-                return result.get("total", 0) if isinstance(result, dict) else result[0]
+        result = yield Query(query, params, fetch="row")
+        return result.get("total", 0) if isinstance(result, dict) else result[0]
 
     def delete_tipos_movimiento_articulo(self, ids: Sequence[int]) -> None:
         query = "DELETE FROM ref.tipo_movimiento_articulo WHERE id = ANY(%s)"
@@ -4760,6 +7366,7 @@ class Database:
             )
 
     # Security: Users and Roles
+    @query_plan
     def fetch_users(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None, sorts: Optional[Sequence[Tuple[str, str]]] = None, limit: int = 40, offset: int = 0) -> List[Dict[str, Any]]:
         filters = ["1=1"]
         params = []
@@ -4771,11 +7378,9 @@ class Database:
         order_by = self._build_order_by(sorts, sort_columns, default="nombre ASC")
         query = f"SELECT * FROM seguridad.v_usuario_publico WHERE {where_clause} ORDER BY {order_by} LIMIT %s OFFSET %s"
         params.extend([limit, offset])
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        return (yield Query(query, params))
 
+    @query_plan
     def count_users(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None) -> int:
         filters = ["1=1"]
         params = []
@@ -4784,18 +7389,13 @@ class Database:
             params.extend([f"%{search.strip()}%"] * 2)
         where_clause = " AND ".join(filters)
         query = f"SELECT COUNT(*) as total FROM seguridad.usuario WHERE {where_clause}"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                res = cur.fetchone()
-                return res.get("total", 0) if isinstance(res, dict) else res[0]
+        res = yield Query(query, params, fetch="row")
+        return res.get("total", 0) if isinstance(res, dict) else res[0]
 
+    @query_plan
     def list_roles(self) -> List[Dict[str, Any]]:
         query = "SELECT id, nombre FROM seguridad.rol ORDER BY nombre"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query)
-                return _rows_to_dicts(cur)
+        return (yield Query(query))
 
     def update_user_fields(self, user_id: int, updates: Dict[str, Any]) -> None:
         allowed = {"nombre", "email", "id_rol", "activo"}
@@ -4840,13 +7440,11 @@ class Database:
                 
                 return user_id
 
+    @query_plan
     def fetch_roles(self) -> List[Dict[str, Any]]:
         """Fetch all available roles for user creation."""
         query = "SELECT id, nombre FROM seguridad.rol ORDER BY id"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query)
-                return _rows_to_dicts(cur)
+        return (yield Query(query))
 
     def fetch_active_sessions(self, search: str = "", sorts: Optional[Sequence[Tuple[str, str]]] = None, limit: int = 10, offset: int = 0, **kwargs) -> List[Dict[str, Any]]:
         """Sesiones activas deshabilitadas: mantener compatibilidad devolviendo vacío."""
@@ -4952,25 +7550,21 @@ class Database:
 
 
     # System Configuration
+    @query_plan
     def fetch_config_sistema(self) -> Dict[str, Any]:
         """Fetch all system configuration as a dictionary keyed by 'clave'."""
         query = "SELECT clave, valor, tipo, descripcion FROM seguridad.config_sistema"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query)
-                rows = _rows_to_dicts(cur)
-                return {r["clave"]: {"valor": r["valor"], "tipo": r["tipo"], "descripcion": r["descripcion"]} for r in rows}
+        rows = yield Query(query)
+        return {r["clave"]: {"valor": r["valor"], "tipo": r["tipo"], "descripcion": r["descripcion"]} for r in rows}
 
+    @query_plan
     def get_config_value(self, clave: str) -> Optional[str]:
         """Get a single configuration value by key."""
         query = "SELECT valor FROM seguridad.config_sistema WHERE clave = %s"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (clave,))
-                res = cur.fetchone()
-                if res is None:
-                    return None
-                return res["valor"] if isinstance(res, dict) else res[0]
+        res = yield Query(query, (clave,), fetch="row")
+        if res is None:
+            return None
+        return res["valor"] if isinstance(res, dict) else res[0]
 
     def update_config_sistema(self, clave: str, valor: str) -> None:
         """Update a single configuration value."""
@@ -4996,7 +7590,8 @@ class Database:
                 cur.execute(query, (clave, valor))
 
     # Documents Resumen
-    def fetch_documentos_resumen(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None, sorts: Optional[Sequence[Tuple[str, str]]] = None, limit: int = 60, offset: int = 0) -> List[Dict[str, Any]]:
+    @query_plan
+    def fetch_documentos_resumen(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None, sorts: Optional[Sequence[Tuple[str, str]]] = None, limit: int = 60, offset: int = 0, *, keyset: bool = False, after: Optional[str] = None, before: Optional[str] = None, with_total: bool = False) -> List[Dict[str, Any]]:
         filters = ["1=1"]
         params = []
         advanced = advanced or {}
@@ -5053,6 +7648,14 @@ class Database:
             filters.append("id_entidad = %s")
             params.append(id_entidad)
 
+        id_forma_pago = _to_id(advanced.get("id_forma_pago"))
+        if id_forma_pago:
+            filters.append("id_forma_pago = %s")
+            params.append(id_forma_pago)
+
+        if advanced.get("con_saldo"):
+            filters.append("saldo_pendiente > 0")
+
         where_clause = " AND ".join(filters)
         sort_columns = {
         "id": "id", 
@@ -5064,36 +7667,44 @@ class Database:
         "estado": "estado",
         "usuario": "usuario",
         "letra": "letra",
-        "forma_pago": "forma_pago"
+        "forma_pago": "forma_pago",
+        "monto_pagado": "monto_pagado",
+        "saldo_pendiente": "saldo_pendiente"
     }
         order_by = self._build_order_by(sorts, sort_columns, default="fecha DESC")
-        query = f"SELECT * FROM app.v_documento_resumen WHERE {where_clause} ORDER BY {order_by} LIMIT %s OFFSET %s"
-        params.extend([limit, offset])
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
-
+        return (yield from self._paginated_plan(
+            select_sql="*",
+            from_sql="app.v_documento_resumen",
+            where_clause=where_clause,
+            params=params,
+            order_by=order_by,
+            limit=limit,
+            offset=offset,
+            keyset=keyset,
+            after=after,
+            before=before,
+            with_total=with_total,
+            estimate_table="app.documento",
+        ))
+
+    @query_plan
     def fetch_documento_resumen_by_id(self, doc_id: int) -> Optional[Dict[str, Any]]:
         query = "SELECT * FROM app.v_documento_resumen WHERE id = %s LIMIT 1"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (int(doc_id),))
-                rows = _rows_to_dicts(cur)
-                if not rows:
-                    return None
-                row = rows[0]
-                if "controlado_por" not in row:
-                    cur.execute("SELECT controlado_por FROM app.documento WHERE id = %s", (int(doc_id),))
-                    extra = cur.fetchone()
-                    if isinstance(extra, dict):
-                        row["controlado_por"] = extra.get("controlado_por")
-                    elif extra:
-                        row["controlado_por"] = extra[0]
-                    else:
-                        row["controlado_por"] = None
-                return row
+        rows = yield Query(query, (int(doc_id),))
+        if not rows:
+            return None
+        row = rows[0]
+        if "controlado_por" not in row:
+            extra = yield Query("SELECT controlado_por FROM app.documento WHERE id = %s", (int(doc_id),), fetch="row")
+            if isinstance(extra, dict):
+                row["controlado_por"] = extra.get("controlado_por")
+            elif extra:
+                row["controlado_por"] = extra[0]
+            else:
+                row["controlado_por"] = None
+        return row
 
+    @query_plan
     def count_documentos_resumen(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None) -> int:
         filters = ["1=1"]
         params = []
@@ -5152,15 +7763,21 @@ class Database:
             filters.append("id_entidad = %s")
             params.append(id_entidad)
 
+        id_forma_pago = _to_id(advanced.get("id_forma_pago"))
+        if id_forma_pago:
+            filters.append("id_forma_pago = %s")
+            params.append(id_forma_pago)
+
+        if advanced.get("con_saldo"):
+            filters.append("saldo_pendiente > 0")
+
         where_clause = " AND ".join(filters)
         query = f"SELECT COUNT(*) as total FROM app.v_documento_resumen WHERE {where_clause}"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                res = cur.fetchone()
-                if res is None: return 0
-                return res.get("total", 0) if isinstance(res, dict) else res[0]
+        res = yield Query(query, params, fetch="row")
+        if res is None: return 0
+        return res.get("total", 0) if isinstance(res, dict) else res[0]
 
+    @query_plan
     def fetch_documentos_pendientes(self, id_entidad: int, search: Optional[str] = None, limit: int = 60, offset: int = 0) -> List[Dict[str, Any]]:
         filters = ["doc.id_entidad_comercial = %s", "doc.estado NOT IN ('ANULADO', 'PAGADO', 'BORRADOR')"]
         params: List[Any] = [id_entidad]
@@ -5177,26 +7794,19 @@ class Database:
             LIMIT %s OFFSET %s
         """
         params.extend([limit, offset])
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        return (yield Query(query, params))
 
+    @query_plan
     def list_tipos_documento(self) -> List[Dict[str, Any]]:
         query = "SELECT id, nombre, clase, letra FROM ref.tipo_documento ORDER BY nombre"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query)
-                return _rows_to_dicts(cur)
+        return (yield Query(query))
 
+    @query_plan
     def get_max_document_total(self) -> float:
         query = "SELECT MAX(total) FROM app.documento"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query)
-                res = cur.fetchone()
-                val = res.get("max") if isinstance(res, dict) else (res[0] if res else None)
-                return float(val) if val is not None else 1000000.0
+        res = yield Query(query, fetch="row")
+        val = res.get("max") if isinstance(res, dict) else (res[0] if res else None)
+        return float(val) if val is not None else 1000000.0
 
     # Stock Movements
     def _movimientos_base_query(self) -> str:
@@ -5219,7 +7829,8 @@ class Database:
             LEFT JOIN seguridad.usuario u ON m.id_usuario = u.id
         """
 
-    def fetch_movimientos_stock(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None, sorts: Optional[Sequence[Tuple[str, str]]] = None, limit: int = 80, offset: int = 0) -> List[Dict[str, Any]]:
+    @query_plan
+    def fetch_movimientos_stock(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None, sorts: Optional[Sequence[Tuple[str, str]]] = None, limit: int = 80, offset: int = 0, *, keyset: bool = False, after: Optional[str] = None, before: Optional[str] = None, with_total: bool = False) -> List[Dict[str, Any]]:
         # Ensure view is updated (to support new traceability columns)
         # DDL Removed: View updates should be handled by migration scripts, not per-query.
         pass
@@ -5281,12 +7892,20 @@ class Database:
         }
         order_by = self._build_order_by(sorts, sort_columns, default="fecha DESC")
         base_query = self._movimientos_base_query()
-        query = f"SELECT * FROM ({base_query}) AS movs WHERE {where_clause} ORDER BY {order_by} LIMIT %s OFFSET %s"
-        params.extend([limit, offset])
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        return (yield from self._paginated_plan(
+            select_sql="*",
+            from_sql=f"({base_query}) AS movs",
+            where_clause=where_clause,
+            params=params,
+            order_by=order_by,
+            limit=limit,
+            offset=offset,
+            keyset=keyset,
+            after=after,
+            before=before,
+            with_total=with_total,
+            estimate_table="app.movimiento_articulo",
+        ))
 
     def count_movimientos_stock(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None) -> int:
         try:
@@ -5351,7 +7970,8 @@ class Database:
                 return res.get("total", 0) if isinstance(res, dict) else res[0]
 
     # Payments
-    def fetch_pagos(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None, sorts: Optional[Sequence[Tuple[str, str]]] = None, limit: int = 60, offset: int = 0) -> List[Dict[str, Any]]:
+    @query_plan
+    def fetch_pagos(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None, sorts: Optional[Sequence[Tuple[str, str]]] = None, limit: int = 60, offset: int = 0, *, keyset: bool = False, after: Optional[str] = None, before: Optional[str] = None, with_total: bool = False) -> List[Dict[str, Any]]:
         filters = ["1=1"]
         params = []
         advanced = advanced or {}
@@ -5404,32 +8024,42 @@ class Database:
             params.append(float(m_max))
 
         where_clause = " AND ".join(filters)
+        # Sort on the underlying expressions (not the output aliases) so they
+        # are also valid inside the keyset WHERE predicate.
         sort_columns = {
             "id": "p.id", 
             "fecha": "p.fecha", 
             "monto": "p.monto", 
-            "forma": "forma",
-            "entidad": "entidad",
+            "forma": "fp.descripcion",
+            "entidad": "COALESCE(ec.apellido || ' ' || ec.nombre, ec.razon_social)",
             "documento": "CASE WHEN d.numero_serie ~ '^[0-9]+$' THEN LPAD(d.numero_serie, 20, '0') ELSE d.numero_serie END"
         }
         order_by = self._build_order_by(sorts, sort_columns, default="p.fecha DESC")
-        query = f"""
-            SELECT p.*, fp.descripcion as forma, d.numero_serie as documento,
-                   COALESCE(ec.apellido || ' ' || ec.nombre, ec.razon_social) as entidad
-            FROM app.pago p
-            JOIN ref.forma_pago fp ON p.id_forma_pago = fp.id
-            LEFT JOIN app.documento d ON p.id_documento = d.id
-            LEFT JOIN app.entidad_comercial ec ON d.id_entidad_comercial = ec.id
-            WHERE {where_clause}
-            ORDER BY {order_by}
-            LIMIT %s OFFSET %s
-        """
-        params.extend([limit, offset])
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
-
+        return (yield from self._paginated_plan(
+            select_sql="""
+                p.*, fp.descripcion as forma, d.numero_serie as documento,
+                COALESCE(ec.apellido || ' ' || ec.nombre, ec.razon_social) as entidad
+            """,
+            from_sql="""
+                app.pago p
+                JOIN ref.forma_pago fp ON p.id_forma_pago = fp.id
+                LEFT JOIN app.documento d ON p.id_documento = d.id
+                LEFT JOIN app.entidad_comercial ec ON d.id_entidad_comercial = ec.id
+            """,
+            where_clause=where_clause,
+            params=params,
+            order_by=order_by,
+            limit=limit,
+            offset=offset,
+            keyset=keyset,
+            after=after,
+            before=before,
+            with_total=with_total,
+            estimate_table="app.pago",
+            tiebreaker="p.id",
+        ))
+
+    @query_plan
     def count_pagos(self, search: Optional[str] = None, simple: Optional[str] = None, advanced: Optional[Dict[str, Any]] = None) -> int:
         filters = ["1=1"]
         params = []
@@ -5490,13 +8120,11 @@ class Database:
             LEFT JOIN app.entidad_comercial ec ON d.id_entidad_comercial = ec.id
             WHERE {where_clause}
         """
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                res = cur.fetchone()
-                if res is None: return 0
-                return res.get("total", 0) if isinstance(res, dict) else res[0]
+        res = yield Query(query, params, fetch="row")
+        if res is None: return 0
+        return res.get("total", 0) if isinstance(res, dict) else res[0]
 
+    @query_plan
     def fetch_documento_detalle(self, documento_id: int) -> List[Dict[str, Any]]:
         query = """
             SELECT dd.*, 
@@ -5510,10 +8138,7 @@ class Database:
             WHERE dd.id_documento = %s
             ORDER BY dd.nro_linea
         """
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (documento_id,))
-                return _rows_to_dicts(cur)
+        return (yield Query(query, (documento_id,)))
     
     def create_stock_movement(
         self,
@@ -5630,7 +8255,8 @@ class Database:
                 payment_id = res.get("id") if isinstance(res, dict) else res[0]
 
                 # 2. Check balance and update status if fully paid
-                cur.execute("SELECT total, id_entidad_comercial, numero_serie FROM app.documento WHERE id = %s", (id_documento,))
+                # (monto_pagado already includes this payment: trg_documento_pago_ins)
+                cur.execute("SELECT total, id_entidad_comercial, numero_serie, monto_pagado FROM app.documento WHERE id = %s", (id_documento,))
                 doc_res = cur.fetchone()
                 doc_total = 0.0
                 doc_entidad = None
@@ -5640,14 +8266,12 @@ class Database:
                         doc_total = float(doc_res.get("total") if doc_res.get("total") is not None else 0)
                         doc_entidad = doc_res.get("id_entidad_comercial")
                         doc_numero = doc_res.get("numero_serie")
+                        total_paid = float(doc_res.get("monto_pagado") or 0)
                     else:
                         doc_total = float(doc_res[0] if doc_res[0] is not None else 0)
                         doc_entidad = doc_res[1]
                         doc_numero = doc_res[2]
-                    
-                    cur.execute("SELECT COALESCE(SUM(monto), 0) FROM app.pago WHERE id_documento = %s", (id_documento,))
-                    pay_res = cur.fetchone()
-                    total_paid = float(pay_res.get("coalesce") if isinstance(pay_res, dict) else (pay_res[0] or 0))
+                        total_paid = float(doc_res[3] or 0)
                     
                     # Use a small epsilon for float comparison
                     if total_paid >= (doc_total - 0.01):
@@ -5818,72 +8442,81 @@ class Database:
             if "total" in manual_values:
                 total = Decimal(str(manual_values["total"]))
 
-        with self._transaction() as cur:
-            # Header
-            numero_para_insertar = None
-            if numero_serie:
-                numero_para_insertar = str(numero_serie)
-                self._ensure_unique_document_number(cur, id_tipo_documento, numero_para_insertar)
-            else:
-                self._lock_document_number(cur, id_tipo_documento)
-                numero_para_insertar = str(self._next_document_number(cur, id_tipo_documento))
-            cur.execute(header_query, (
-                id_tipo_documento, id_entidad_comercial, id_deposito,
-                observacion, numero_para_insertar, desc_pct_normalized, desc_imp_normalized, self.current_user_id,
-                neto_total, subtotal, iva_total, total, sena,
-                final_fecha, fecha_vencimiento_value, id_lista_precio, direccion_entrega, controlado_por_value
-            ))
-            res = cur.fetchone()
-            doc_id = res[0] if isinstance(res, (list, tuple)) else res["id"]
+        # Automatic numbers are taken before the save, in a short transaction of their own,
+        # so the numbering row is not held while the document is written
+        numero_asignado: Optional[int] = None
+        if numero_serie:
+            numero_para_insertar = str(numero_serie).strip()
+        else:
+            numero_asignado = self.allocate_document_number(id_tipo_documento)
+            numero_para_insertar = str(numero_asignado)
 
-            # Details (batch insert)
-            unidades_por_bulto_snapshot = self._build_unidades_por_bulto_snapshot(cur, pricing["items"])
-            detail_rows = []
-            for i, item in enumerate(pricing["items"], 1):
-                article_id = _to_id(item.get("id_articulo"))
-                detail_rows.append(
-                    (
-                        doc_id,
-                        i,
-                        item["id_articulo"],
-                        item["cantidad"],
-                        item["precio_unitario"],
-                        item["descuento_porcentaje"],
-                        item["descuento_importe"],
-                        item["porcentaje_iva"],
-                        item["total_linea"],
-                        item.get("id_lista_precio"),
-                        item.get("observacion"),
-                        unidades_por_bulto_snapshot.get(article_id) if article_id is not None else None,
+        try:
+            with self._transaction() as cur:
+                # Header
+                if numero_asignado is None:
+                    self._ensure_unique_document_number(cur, id_tipo_documento, numero_para_insertar)
+                    self._claim_document_number(cur, id_tipo_documento, numero_para_insertar)
+                cur.execute(header_query, (
+                    id_tipo_documento, id_entidad_comercial, id_deposito,
+                    observacion, numero_para_insertar, desc_pct_normalized, desc_imp_normalized, self.current_user_id,
+                    neto_total, subtotal, iva_total, total, sena,
+                    final_fecha, fecha_vencimiento_value, id_lista_precio, direccion_entrega, controlado_por_value
+                ))
+                res = cur.fetchone()
+                doc_id = res[0] if isinstance(res, (list, tuple)) else res["id"]
+
+                # Details (batch insert)
+                unidades_por_bulto_snapshot = self._build_unidades_por_bulto_snapshot(cur, pricing["items"])
+                detail_rows = []
+                for i, item in enumerate(pricing["items"], 1):
+                    article_id = _to_id(item.get("id_articulo"))
+                    detail_rows.append(
+                        (
+                            doc_id,
+                            i,
+                            item["id_articulo"],
+                            item["cantidad"],
+                            item["precio_unitario"],
+                            item["descuento_porcentaje"],
+                            item["descuento_importe"],
+                            item["porcentaje_iva"],
+                            item["total_linea"],
+                            item.get("id_lista_precio"),
+                            item.get("observacion"),
+                            unidades_por_bulto_snapshot.get(article_id) if article_id is not None else None,
+                        )
                     )
-                )
-            cur.executemany(detail_query, detail_rows)
+                cur.executemany(detail_query, detail_rows)
             
-            # Log audit activity
-            self.log_activity(
-                entidad="app.documento",
-                accion="CREACION",
-                id_entidad=doc_id,
-                detalle={
-                    "tipo": id_tipo_documento,
-                    "numero": numero_para_insertar,
-                    "entidad": id_entidad_comercial,
-                    "total": float(total),
-                    "descuento_lineas": float(pricing["descuento_lineas_importe"]),
-                }
-            )
+                # Log audit activity
+                self.log_activity(
+                    entidad="app.documento",
+                    accion="CREACION",
+                    id_entidad=doc_id,
+                    detalle={
+                        "tipo": id_tipo_documento,
+                        "numero": numero_para_insertar,
+                        "entidad": id_entidad_comercial,
+                        "total": float(total),
+                        "descuento_lineas": float(pricing["descuento_lineas_importe"]),
+                    }
+                )
             
-            return doc_id
+                return doc_id
+        except Exception:
+            if numero_asignado is not None:
+                self.release_document_number(id_tipo_documento, numero_asignado)
+            raise
 
+    @query_plan
     def get_entity_balance(self, entity_id: int) -> float:
         """Returns the current balance from app.lista_cliente."""
         query = "SELECT saldo_cuenta FROM app.lista_cliente WHERE id_entidad_comercial = %s"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (entity_id,))
-                res = cur.fetchone()
-                return float(res[0]) if res else 0.0
+        res = yield Query(query, (entity_id,), fetch="row")
+        return float(res[0]) if res else 0.0
 
+    @query_plan
     def list_entidades_simple(self, limit: int = 200, only_active: bool = True) -> List[Dict[str, Any]]:
         where = "WHERE activo = True" if only_active else ""
         # Use parameterized query for LIMIT
@@ -5894,24 +8527,15 @@ class Database:
             ORDER BY nombre_completo ASC
             LIMIT %s
         """
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (int(limit),))
-                return _rows_to_dicts(cur)
+        return (yield Query(query, (int(limit),)))
 
+    @query_plan
     def get_entity_simple(self, entity_id: int) -> Optional[Dict[str, Any]]:
         """Fetch a single entity by ID, regardless of active status."""
-        query = """
-            SELECT id, nombre_completo, tipo, activo, domicilio
-            FROM app.v_entidad_detallada
-            WHERE id = %s
-        """
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (entity_id,))
-                rows = _rows_to_dicts(cur)
-                return rows[0] if rows else None
+        rows = yield self.prepared_statements.query("entity_simple", (entity_id,))
+        return rows[0] if rows else None
 
+    @query_plan
     def get_entity_detail(self, entity_id: int) -> Optional[Dict[str, Any]]:
         """Fetch entity metadata useful for printing."""
         query = """
@@ -5934,14 +8558,12 @@ class Database:
             WHERE id = %s
             LIMIT 1
         """
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (entity_id,))
-                rows = _rows_to_dicts(cur)
-                if not rows:
-                    return None
-                return rows[0]
+        rows = yield Query(query, (entity_id,))
+        if not rows:
+            return None
+        return rows[0]
 
+    @query_plan
     def list_articulos_simple(self, limit: int = 200) -> List[Dict[str, Any]]:
         # Use parameterized query for LIMIT
         query = """
@@ -5953,189 +8575,370 @@ class Database:
                 porcentaje_iva,
                 unidades_por_bulto,
                 activo
-            FROM app.v_articulo_detallado
+            FROM app.articulo_listado
             WHERE activo = True
             ORDER BY nombre ASC
             LIMIT %s
         """
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (int(limit),))
-                return _rows_to_dicts(cur)
+        return (yield Query(query, (int(limit),)))
 
+    @query_plan
     def get_article_simple(self, article_id: int) -> Optional[Dict[str, Any]]:
         """Fetch a single article by ID, regardless of active status."""
-        query = """
-            SELECT
-                id_articulo,
-                id_articulo AS id,
-                nombre,
-                codigo,
-                costo,
-                porcentaje_iva,
-                unidad_medida,
-                unidad_abreviatura,
-                unidades_por_bulto,
-                activo
-            FROM app.v_articulo_detallado
-            WHERE id_articulo = %s
+        rows = yield self.prepared_statements.query("article_simple", (article_id,))
+        return rows[0] if rows else None
+
+    @query_plan
+    def list_usuarios_simple(self, limit: int = 100) -> List[Dict[str, Any]]:
+        # Use parameterized query for LIMIT
+        query = "SELECT id, nombre FROM seguridad.usuario WHERE activo = True ORDER BY nombre ASC LIMIT %s"
+        return (yield Query(query, (int(limit),)))
+
+    @query_plan
+    def list_tipos_movimiento_simple(self) -> List[Dict[str, Any]]:
+        query = "SELECT id, nombre, signo_stock FROM ref.tipo_movimiento_articulo ORDER BY nombre ASC"
+        return (yield Query(query))
+
+    def confirm_document(self, doc_id: int) -> None:
         """
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (article_id,))
-                rows = _rows_to_dicts(cur)
-                return rows[0] if rows else None
+        Confirms a document:
+        1. Updates status to 'CONFIRMADO'.
+        2. Generates stock movements if the document type affects stock.
+        """
+        with self._transaction() as cur:
+            outcome = self._confirm_document_tx(cur, doc_id)
+            if outcome is None:
+                raise Exception("Comprobante no encontrado o ya confirmado.")
+            self._log_document_confirmation(outcome)
+
+    def confirm_documents(self, doc_ids: Sequence[int]) -> List[Dict[str, Any]]:
+        """
+        Confirm a batch of BORRADOR documents in one transaction.
+
+        Stock movements and CC debits/seña credits are written with one
+        statement per kind for the whole batch; remitos are still generated
+        per document. If the set-based pass fails (e.g. a trigger rejects one
+        document) it is rolled back to a savepoint and the documents are
+        confirmed one by one, each in its own savepoint, so only the failing
+        ones stay as drafts.
+
+        Returns one outcome per distinct id, in input order:
+        {id, ok, error, numero, clase, entidad, total, remito_id}.
+        """
+        ids: List[int] = []
+        outcomes: Dict[int, Dict[str, Any]] = {}
+        invalid: List[Dict[str, Any]] = []
+        for raw_id in doc_ids or []:
+            doc_id = _to_id(raw_id)
+            if doc_id is None:
+                invalid.append({"id": raw_id, "ok": False, "error": "Identificador de comprobante inválido."})
+                continue
+            if doc_id not in outcomes:
+                ids.append(doc_id)
+                outcomes[doc_id] = {"id": doc_id, "ok": False, "error": "Comprobante no encontrado o ya confirmado."}
+        if not ids:
+            return invalid
+
+        with self._transaction() as cur:
+            cur.execute("SAVEPOINT confirm_documents_batch")
+            try:
+                confirmed = self._confirm_documents_batch_tx(cur, ids)
+            except Exception as exc:
+                cur.execute("ROLLBACK TO SAVEPOINT confirm_documents_batch")
+                logger.warning(f"Batch confirmation of {len(ids)} documents failed ({exc}); confirming one by one")
+                confirmed = []
+                for doc_id in ids:
+                    cur.execute("SAVEPOINT confirm_document_item")
+                    try:
+                        outcome = self._confirm_document_tx(cur, doc_id)
+                    except Exception as item_exc:
+                        cur.execute("ROLLBACK TO SAVEPOINT confirm_document_item")
+                        outcomes[doc_id]["error"] = str(item_exc)
+                        continue
+                    cur.execute("RELEASE SAVEPOINT confirm_document_item")
+                    if outcome is not None:
+                        confirmed.append(outcome)
+            else:
+                cur.execute("RELEASE SAVEPOINT confirm_documents_batch")
+
+        for outcome in confirmed:
+            outcomes[outcome["id"]] = outcome
+            self._log_document_confirmation(outcome)
+        return [outcomes[doc_id] for doc_id in ids] + invalid
+
+    def _log_document_confirmation(self, outcome: Dict[str, Any]) -> None:
+        self.log_activity(
+            entidad="app.documento",
+            accion="CONFIRMACION",
+            id_entidad=outcome["id"],
+            detalle={
+                "numero": outcome.get("numero"),
+                "clase": outcome.get("clase"),
+                "entidad": outcome.get("entidad"),
+                "total": outcome.get("total"),
+            }
+        )
 
-    def list_usuarios_simple(self, limit: int = 100) -> List[Dict[str, Any]]:
-        # Use parameterized query for LIMIT
-        query = "SELECT id, nombre FROM seguridad.usuario WHERE activo = True ORDER BY nombre ASC LIMIT %s"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (int(limit),))
-                return _rows_to_dicts(cur)
+    _CONFIRM_RETURNING = """
+        RETURNING d.id, d.id_deposito, d.id_entidad_comercial, d.direccion_entrega, d.observacion, d.numero_serie,
+                  td.clase, td.afecta_stock, d.total, d.sena
+    """
 
-    def list_tipos_movimiento_simple(self) -> List[Dict[str, Any]]:
-        query = "SELECT id, nombre, signo_stock FROM ref.tipo_movimiento_articulo ORDER BY nombre ASC"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query)
-                return _rows_to_dicts(cur)
+    @staticmethod
+    def _confirmed_document_row(row: Any) -> Dict[str, Any]:
+        if isinstance(row, dict):
+            doc = dict(row)
+        else:
+            doc = dict(zip(
+                (
+                    "id", "id_deposito", "id_entidad_comercial", "direccion_entrega", "observacion",
+                    "numero_serie", "clase", "afecta_stock", "total", "sena",
+                ),
+                row,
+            ))
+        doc["total"] = Decimal(str(doc.get("total") or 0))
+        doc["sena"] = Decimal(str(doc.get("sena") or 0))
+        return doc
 
-    def confirm_document(self, doc_id: int) -> None:
-        """
-        Confirms a document:
-        1. Updates status to 'CONFIRMADO'.
-        2. Generates stock movements if the document type affects stock.
-        """
-        # Ensure view is updated (Idempotent)
-        with self.pool.connection() as conn:
-            with conn.cursor() as vcur:
-                vcur.execute(f"CREATE OR REPLACE VIEW app.v_movimientos_full AS {self._movimientos_base_query()}")
-                conn.commit()
+    @staticmethod
+    def _confirmation_outcome(doc: Dict[str, Any], remito_id: Optional[int]) -> Dict[str, Any]:
+        return {
+            "id": doc["id"],
+            "ok": True,
+            "error": None,
+            "numero": doc.get("numero_serie"),
+            "clase": doc.get("clase"),
+            "entidad": doc.get("id_entidad_comercial"),
+            "total": float(doc["total"]),
+            "remito_id": remito_id,
+        }
 
-        with self._transaction() as cur:
+    def _confirmation_cc_entries(self, doc: Dict[str, Any], pagos_existentes: Decimal) -> List[Tuple[Any, ...]]:
+        """(id_entidad, tipo, concepto, monto, id_documento, observacion) of the CC movements of a confirmation."""
+        entidad_id = doc.get("id_entidad_comercial")
+        if doc.get("clase") != "VENTA" or not entidad_id:
+            return []
+        doc_id = doc["id"]
+        doc_numero = doc.get("numero_serie")
+        entries: List[Tuple[Any, ...]] = []
+        if doc["total"] != 0:
+            concepto_debito = f"{doc['clase']} {doc_numero or doc_id}"
+            observacion_debito = (doc.get("observacion") or "").strip() or None
+            entries.append((int(entidad_id), "DEBITO", concepto_debito[:150], doc["total"], int(doc_id), observacion_debito))
+        if doc["sena"] > 0:
+            credito_sena = doc["sena"] - pagos_existentes
+            if credito_sena > 0:
+                concepto_sena = f"Seña {doc_numero or doc_id}"
+                observacion_sena = f"Seña del comprobante {doc_numero or doc_id}"
+                entries.append((int(entidad_id), "CREDITO", concepto_sena[:150], credito_sena, int(doc_id), observacion_sena))
+        return entries
+
+    def _confirm_document_tx(self, cur, doc_id: int) -> Optional[Dict[str, Any]]:
+        """Confirm one BORRADOR document inside the caller's transaction; None if it is not a draft."""
+        cur.execute(
+            f"""
+                UPDATE app.documento d
+                SET estado = 'CONFIRMADO'
+                FROM ref.tipo_documento td
+                WHERE d.id = %s
+                  AND d.estado = 'BORRADOR'
+                  AND td.id = d.id_tipo_documento
+                {self._CONFIRM_RETURNING}
+            """,
+            (doc_id,),
+        )
+        row = cur.fetchone()
+        if not row:
+            return None
+        doc = self._confirmed_document_row(row)
+        doc_id = doc["id"]
+        clase = doc["clase"]
+
+        if doc["afecta_stock"]:
+            id_tipo_mov = 2 if clase == "VENTA" else 1
             cur.execute(
                 """
-                    WITH updated AS (
-                        UPDATE app.documento d
-                        SET estado = 'CONFIRMADO'
-                        FROM ref.tipo_documento td
-                        WHERE d.id = %s
-                          AND d.estado = 'BORRADOR'
-                          AND td.id = d.id_tipo_documento
-                        RETURNING d.id, d.id_deposito, d.id_entidad_comercial, d.direccion_entrega, d.observacion, d.numero_serie,
-                                  td.clase, td.afecta_stock, d.total, d.sena
-                    )
-                    SELECT id, id_deposito, id_entidad_comercial, direccion_entrega, observacion, numero_serie, clase, afecta_stock, total, sena FROM updated
-                    """,
+                INSERT INTO app.movimiento_articulo (id_articulo, id_tipo_movimiento, cantidad, id_deposito, id_documento, observacion, id_usuario)
+                SELECT id_articulo, %s, cantidad, %s, %s, 'Confirmación de ' || %s, %s
+                FROM app.documento_detalle
+                WHERE id_documento = %s
+                """,
+                (id_tipo_mov, doc["id_deposito"], doc_id, clase, self.current_user_id, doc_id),
+            )
+
+        pagos_existentes = Decimal("0")
+        if clase == "VENTA" and doc.get("id_entidad_comercial") and doc["sena"] > 0:
+            cur.execute(
+                "SELECT COALESCE(SUM(monto), 0) FROM app.pago WHERE id_documento = %s",
                 (doc_id,),
             )
-            doc = cur.fetchone()
-            if not doc:
-                raise Exception("Comprobante no encontrado o ya confirmado.")
+            pagos_row = cur.fetchone()
+            pagos_val = pagos_row[0] if isinstance(pagos_row, (tuple, list)) else pagos_row
+            pagos_existentes = Decimal(str(pagos_val if pagos_val is not None else 0))
 
-            if isinstance(doc, dict):
-                doc_id = doc["id"]
-                depo_id = doc["id_deposito"]
-                entidad_id = doc.get("id_entidad_comercial")
-                direccion = doc.get("direccion_entrega")
-                observacion = doc.get("observacion")
-                doc_numero = doc.get("numero_serie")
-                clase = doc["clase"]
-                afecta_stk = doc["afecta_stock"]
-                doc_total = doc.get("total")
-                doc_sena = doc.get("sena")
-            else:
+        for entidad_id, tipo, concepto, monto, mov_doc_id, observacion in self._confirmation_cc_entries(doc, pagos_existentes):
+            cur.execute(
+                "SELECT app.registrar_movimiento_cc(%s::bigint, %s::varchar(20), %s::varchar(150), %s::numeric, %s::bigint, %s::bigint, %s::text, %s::bigint)",
                 (
-                    doc_id,
-                    depo_id,
                     entidad_id,
-                    direccion,
+                    tipo,
+                    concepto,
+                    monto,
+                    mov_doc_id,
+                    None,
                     observacion,
-                    doc_numero,
-                    clase,
-                    afecta_stk,
-                    doc_total,
-                    doc_sena,
-                ) = doc
-
-            doc_total = Decimal(str(doc_total or 0))
-            doc_sena = Decimal(str(doc_sena or 0))
-
-            if afecta_stk:
-                id_tipo_mov = 2 if clase == "VENTA" else 1
-                cur.execute(
-                    """
-                    INSERT INTO app.movimiento_articulo (id_articulo, id_tipo_movimiento, cantidad, id_deposito, id_documento, observacion, id_usuario)
-                    SELECT id_articulo, %s, cantidad, %s, %s, 'Confirmación de ' || %s, %s
-                    FROM app.documento_detalle
-                    WHERE id_documento = %s
-                    """,
-                    (id_tipo_mov, depo_id, doc_id, clase, self.current_user_id, doc_id),
-                )
+                    int(self.current_user_id) if self.current_user_id is not None else None
+                ),
+            )
 
-            if clase == "VENTA" and entidad_id:
-                concepto_debito = f"{clase} {doc_numero or doc_id}"
-                observacion_debito = (observacion or "").strip() or None
-                if doc_total != 0:
-                    cur.execute(
-                        "SELECT app.registrar_movimiento_cc(%s::bigint, %s::varchar(20), %s::varchar(150), %s::numeric, %s::bigint, %s::bigint, %s::text, %s::bigint)",
-                        (
-                            int(entidad_id),
-                            "DEBITO",
-                            concepto_debito[:150],
-                            doc_total,
-                            int(doc_id),
-                            None,
-                            observacion_debito,
-                            int(self.current_user_id) if self.current_user_id is not None else None
-                        ),
-                    )
-                if doc_sena > 0:
-                    cur.execute(
-                        "SELECT COALESCE(SUM(monto), 0) FROM app.pago WHERE id_documento = %s",
-                        (doc_id,),
-                    )
-                    pagos_row = cur.fetchone()
-                    pagos_val = None
-                    if isinstance(pagos_row, (tuple, list)):
-                        pagos_val = pagos_row[0]
-                    else:
-                        pagos_val = pagos_row
-                    pagos_existentes = Decimal(str(pagos_val if pagos_val is not None else 0))
-                    credito_sena = doc_sena - pagos_existentes
-                    if credito_sena > 0:
-                        concepto_sena = f"Seña {doc_numero or doc_id}"
-                        observacion_sena = f"Seña del comprobante {doc_numero or doc_id}"
-                        cur.execute(
-                            "SELECT app.registrar_movimiento_cc(%s::bigint, %s::varchar(20), %s::varchar(150), %s::numeric, %s::bigint, %s::bigint, %s::text, %s::bigint)",
-                            (
-                                int(entidad_id),
-                                "CREDITO",
-                                concepto_sena[:150],
-                                credito_sena,
-                                int(doc_id),
-                                None,
-                                observacion_sena,
-                                int(self.current_user_id) if self.current_user_id is not None else None
-                            ),
-                        )
-            
-            # Generar remito si corresponde (para documentos de VENTA: facturas, presupuestos, etc.)
-            self._ensure_remito_for_document(cur, doc_id)
-            
-            # Log audit activity
-            self.log_activity(
-                entidad="app.documento",
-                accion="CONFIRMACION",
-                id_entidad=doc_id,
-                detalle={
-                    "numero": doc_numero,
-                    "clase": clase,
-                    "entidad": entidad_id,
-                    "total": float(doc_total)
-                }
+        # Generar remito si corresponde (para documentos de VENTA: facturas, presupuestos, etc.)
+        remito_id = self._ensure_remito_for_document(cur, doc_id, doc_meta=doc)
+        return self._confirmation_outcome(doc, remito_id)
+
+    def _confirm_documents_batch_tx(self, cur, doc_ids: List[int]) -> List[Dict[str, Any]]:
+        """Set-based confirmation of the BORRADOR documents among `doc_ids` (caller's transaction)."""
+        cur.execute(
+            f"""
+                UPDATE app.documento d
+                SET estado = 'CONFIRMADO'
+                FROM ref.tipo_documento td
+                WHERE d.id = ANY(%s)
+                  AND d.estado = 'BORRADOR'
+                  AND td.id = d.id_tipo_documento
+                {self._CONFIRM_RETURNING}
+            """,
+            (doc_ids,),
+        )
+        by_id = {doc["id"]: doc for doc in (self._confirmed_document_row(row) for row in cur.fetchall())}
+        docs = [by_id[doc_id] for doc_id in doc_ids if doc_id in by_id]
+        if not docs:
+            return []
+
+        stock_ids = [doc["id"] for doc in docs if doc["afecta_stock"]]
+        if stock_ids:
+            cur.execute(
+                """
+                INSERT INTO app.movimiento_articulo (id_articulo, id_tipo_movimiento, cantidad, id_deposito, id_documento, observacion, id_usuario)
+                SELECT dd.id_articulo,
+                       CASE WHEN td.clase = 'VENTA' THEN 2 ELSE 1 END,
+                       dd.cantidad, d.id_deposito, d.id, 'Confirmación de ' || td.clase, %s
+                FROM app.documento_detalle dd
+                JOIN app.documento d ON d.id = dd.id_documento
+                JOIN ref.tipo_documento td ON td.id = d.id_tipo_documento
+                WHERE dd.id_documento = ANY(%s)
+                ORDER BY dd.id_documento, dd.nro_linea
+                """,
+                (self.current_user_id, stock_ids),
+            )
+
+        pagos: Dict[int, Decimal] = {}
+        sena_ids = [doc["id"] for doc in docs if doc["clase"] == "VENTA" and doc.get("id_entidad_comercial") and doc["sena"] > 0]
+        if sena_ids:
+            cur.execute(
+                "SELECT id_documento, COALESCE(SUM(monto), 0) FROM app.pago WHERE id_documento = ANY(%s) GROUP BY id_documento",
+                (sena_ids,),
+            )
+            for row in cur.fetchall():
+                values = tuple(row.values()) if isinstance(row, dict) else row
+                pagos[int(values[0])] = Decimal(str(values[1] if values[1] is not None else 0))
+
+        entries: List[Tuple[Any, ...]] = []
+        for doc in docs:
+            entries.extend(self._confirmation_cc_entries(doc, pagos.get(doc["id"], Decimal("0"))))
+        if entries:
+            self._register_cc_movements(cur, entries)
+
+        outcomes: List[Dict[str, Any]] = []
+        for doc in docs:
+            remito_id = self._ensure_remito_for_document(cur, doc["id"], doc_meta=doc)
+            outcomes.append(self._confirmation_outcome(doc, remito_id))
+        return outcomes
+
+    def _lock_cc_balances(self, cur, entity_ids: Iterable[Any]) -> None:
+        """
+        Lock the app.saldo_cuenta_corriente rows of these accounts (ordered by
+        id, so concurrent batches do not deadlock); accounts without one start at 0.
+        """
+        ids = sorted({int(i) for i in entity_ids if i is not None})
+        if not ids:
+            return
+        cur.execute(
+            """
+            INSERT INTO app.saldo_cuenta_corriente (id_entidad_comercial, saldo_actual, tipo_entidad, fecha_antiguedad)
+            SELECT e.id, 0, CASE WHEN e.tipo = 'PROVEEDOR' THEN 'PROVEEDOR' ELSE 'CLIENTE' END, app.fn_ventas_dia(now())
+            FROM app.entidad_comercial e
+            WHERE e.id = ANY(%s)
+            ON CONFLICT (id_entidad_comercial) DO NOTHING
+            """,
+            (ids,),
+        )
+        cur.execute(
+            """
+            SELECT id_entidad_comercial FROM app.saldo_cuenta_corriente
+            WHERE id_entidad_comercial = ANY(%s)
+            ORDER BY id_entidad_comercial
+            FOR UPDATE
+            """,
+            (ids,),
+        )
+        cur.fetchall()
+
+    def _register_cc_movements(
+        self,
+        cur,
+        entries: Sequence[Tuple[Any, ...]],
+        payment_ids: Optional[Sequence[Optional[int]]] = None,
+    ) -> None:
+        """
+        Insert several CC movements in one statement, with the running balance
+        app.registrar_movimiento_cc would compute calling it once per entry
+        (in `entries` order). The per-row saldo trigger then leaves each
+        account at its last saldo_nuevo. `payment_ids` (parallel to `entries`)
+        links each movement to its app.pago row.
+        """
+        # saldo_anterior is read from the balances: lock them like registrar_movimiento_cc does
+        self._lock_cc_balances(cur, {entry[0] for entry in entries})
+        columns = list(zip(*entries))
+        if payment_ids is None:
+            payment_ids = [None] * len(entries)
+        cur.execute(
+            """
+            WITH mov AS (
+                SELECT *
+                FROM unnest(%s::bigint[], %s::varchar(20)[], %s::varchar(150)[], %s::numeric(14,4)[], %s::bigint[], %s::text[], %s::bigint[])
+                    WITH ORDINALITY AS m(id_entidad, tipo, concepto, monto, id_documento, observacion, id_pago, ord)
+            ),
+            calc AS (
+                SELECT mov.*,
+                       COALESCE(s.saldo_actual, 0)
+                         + SUM(CASE WHEN mov.tipo IN ('DEBITO', 'AJUSTE_DEBITO') THEN mov.monto ELSE -mov.monto END)
+                             OVER (PARTITION BY mov.id_entidad ORDER BY mov.ord) AS saldo_nuevo,
+                       CASE WHEN mov.tipo IN ('DEBITO', 'AJUSTE_DEBITO') THEN mov.monto ELSE -mov.monto END AS delta
+                FROM mov
+                LEFT JOIN app.saldo_cuenta_corriente s ON s.id_entidad_comercial = mov.id_entidad
             )
+            INSERT INTO app.movimiento_cuenta_corriente (
+                id_entidad_comercial, tipo_movimiento, concepto, monto,
+                saldo_anterior, saldo_nuevo, id_documento, id_pago,
+                observacion, id_usuario
+            )
+            SELECT id_entidad, tipo, concepto, monto,
+                   saldo_nuevo - delta, saldo_nuevo, id_documento, id_pago,
+                   observacion, COALESCE(%s::bigint, NULLIF(current_setting('app.user_id', true), '')::BIGINT)
+            FROM calc
+            ORDER BY ord
+            """,
+            (
+                list(columns[0]),
+                list(columns[1]),
+                list(columns[2]),
+                list(columns[3]),
+                list(columns[4]),
+                list(columns[5]),
+                list(payment_ids),
+                int(self.current_user_id) if self.current_user_id is not None else None,
+            ),
+        )
 
     def _get_any_deposito_id(self, cur) -> int:
         cur.execute("SELECT id FROM ref.deposito ORDER BY id LIMIT 1")
@@ -6318,6 +9121,26 @@ class Database:
 
         return self._insert_remito_from_metadata(cur, doc_id, metadata)
 
+    @query_plan
+    def fetch_documentos_afip_pendientes(self, ids: Optional[Sequence[int]] = None, limit: int = 500) -> List[Dict[str, Any]]:
+        """
+        Comprobantes confirmados o pagados con tipo AFIP y sin CAE (rows of
+        v_documento_resumen), oldest first: the order they are numbered in AFIP.
+        """
+        filters = ["cae IS NULL", "codigo_afip IS NOT NULL", "estado = ANY(%s)"]
+        params: List[Any] = [[DocumentoEstado.CONFIRMADO.value, DocumentoEstado.PAGADO.value]]
+        if ids is not None:
+            filters.append("id = ANY(%s)")
+            params.append([int(i) for i in ids])
+        params.append(int(limit))
+        query = f"""
+            SELECT * FROM app.v_documento_resumen
+            WHERE {' AND '.join(filters)}
+            ORDER BY fecha ASC, id ASC
+            LIMIT %s
+        """
+        return (yield Query(query, tuple(params)))
+
     def update_document_afip_data(
         self,
         doc_id: int,
@@ -6471,33 +9294,142 @@ class Database:
         
         return True
 
-    def get_article_stock(self, article_id: int) -> float:
-        query = "SELECT stock_total FROM app.v_stock_total WHERE id_articulo = %s"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (article_id,))
-                res = cur.fetchone()
-                return float(res[0]) if res else 0.0
+    @query_plan
+    def get_article_stock(self, article_id: int, deposito_id: Optional[int] = None) -> float:
+        """Total stock of an article, or its stock in one deposit."""
+        if deposito_id is not None:
+            res = yield self.prepared_statements.query(
+                "article_stock_deposito", (article_id, deposito_id), fetch="row"
+            )
+        else:
+            res = yield self.prepared_statements.query("article_stock", (article_id,), fetch="row")
+        return float(res[0]) if res else 0.0
+
+    @query_plan
+    def fetch_article_stock_by_deposito(self, article_id: int) -> List[Dict[str, Any]]:
+        """Stock of an article in every deposit where it had movements."""
+        query = """
+            SELECT sd.id_deposito, d.nombre AS deposito, sd.stock_actual, sd.ultima_actualizacion
+            FROM app.articulo_stock_deposito sd
+            JOIN ref.deposito d ON d.id = sd.id_deposito
+            WHERE sd.id_articulo = %s
+            ORDER BY d.nombre
+        """
+        return (yield Query(query, (article_id,)))
+
+    @query_plan
+    def fetch_stock_by_deposito(
+        self,
+        deposito_id: int,
+        search: Optional[str] = None,
+        only_with_stock: bool = False,
+        limit: int = 100,
+        offset: int = 0,
+    ) -> List[Dict[str, Any]]:
+        """Articles of one deposit with their stock there (maintained table, no GROUP BY over movements)."""
+        filters = ["sd.id_deposito = %s"]
+        params: List[Any] = [deposito_id]
+        if only_with_stock:
+            filters.append("sd.stock_actual <> 0")
+        if search:
+            filters.append("(al.nombre ILIKE %s OR al.codigo ILIKE %s)")
+            params.extend([f"%{search.strip()}%"] * 2)
+        query = f"""
+            SELECT al.id, al.codigo, al.nombre, al.stock_minimo, sd.stock_actual, al.stock_actual AS stock_total
+            FROM app.articulo_stock_deposito sd
+            JOIN app.articulo_listado al ON al.id = sd.id_articulo
+            WHERE {" AND ".join(filters)}
+            ORDER BY al.nombre, al.id
+            LIMIT %s OFFSET %s
+        """
+        params.extend([limit, offset])
+        return (yield Query(query, params))
 
+    @query_plan
     def get_next_number(self, id_tipo_documento: int) -> int:
-        """Get the next serial number for a document type."""
-        query = "SELECT MAX(numero_serie::integer) FROM app.documento WHERE id_tipo_documento = %s AND numero_serie ~ '^[0-9]+$'"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (id_tipo_documento,))
-                res = cur.fetchone()
-                current_max = res[0] if res and res[0] is not None else 0
-                return current_max + 1
+        """Number the next document of this type would get (preview; nothing is taken)."""
+        res = yield self.prepared_statements.query("next_document_number", (int(id_tipo_documento),), fetch="row")
+        return int(res[0]) if res and res[0] is not None else 1
+
+    # Numbering (app.numeracion_documento): the counter row is locked only by the short
+    # transaction that takes the number, never by the document save itself.
+
+    def allocate_document_number(self, id_tipo_documento: int) -> int:
+        """
+        Take the next number of a document type in a transaction of its own.
+        If it ends up unused, hand it back with release_document_number.
+        """
+        with self._transaction() as cur:
+            cur.execute("SELECT app.fn_numero_documento_siguiente(%s)", (int(id_tipo_documento),))
+            return int(cur.fetchone()[0])
+
+    def release_document_number(self, id_tipo_documento: int, numero: Any) -> None:
+        """Record a taken but unused number (issued again under politica_huecos = 'REUTILIZAR')."""
+        numero_str = str(numero or "").strip()
+        if not numero_str.isdigit():
+            return
+        try:
+            with self._transaction() as cur:
+                cur.execute(
+                    "SELECT app.fn_numero_documento_liberar(%s, %s)",
+                    (int(id_tipo_documento), int(numero_str)),
+                )
+        except Exception:
+            logger.exception(f"Could not release document number {numero_str} (tipo {id_tipo_documento})")
+
+    def reserve_document_number(self, id_tipo_documento: int) -> int:
+        """
+        Reserve a number for a draft being edited. Pass it as `numero_serie`
+        to create_document, or cancel it with cancel_document_number_reservation.
+        """
+        with self._transaction() as cur:
+            cur.execute("SELECT app.fn_numero_documento_siguiente(%s)", (int(id_tipo_documento),))
+            numero = int(cur.fetchone()[0])
+            cur.execute(
+                """
+                INSERT INTO app.numeracion_documento_pendiente (id_tipo_documento, numero, estado, id_usuario)
+                VALUES (%s, %s, 'RESERVADO', %s)
+                """,
+                (int(id_tipo_documento), numero, self.current_user_id),
+            )
+        return numero
+
+    def cancel_document_number_reservation(self, id_tipo_documento: int, numero: Any) -> bool:
+        """Release a reserved number that will not be used. False if it was not reserved."""
+        numero_str = str(numero or "").strip()
+        if not numero_str.isdigit():
+            return False
+        with self._transaction() as cur:
+            cur.execute(
+                """
+                UPDATE app.numeracion_documento_pendiente
+                SET estado = 'LIBERADO', fecha = now()
+                WHERE id_tipo_documento = %s AND numero = %s AND estado = 'RESERVADO'
+                """,
+                (int(id_tipo_documento), int(numero_str)),
+            )
+            return cur.rowcount > 0
 
-    def _lock_document_number(self, cur, id_tipo_documento: int) -> None:
-        """Acquire an advisory lock for a document type to serialize numbering."""
-        cur.execute("SELECT pg_advisory_xact_lock(%s)", (id_tipo_documento,))
+    def expire_document_number_reservations(self, max_age_hours: float = 24) -> int:
+        """Release reservations older than `max_age_hours` (closed terminals, abandoned drafts)."""
+        with self._transaction() as cur:
+            cur.execute(
+                """
+                UPDATE app.numeracion_documento_pendiente
+                SET estado = 'LIBERADO', fecha = now()
+                WHERE estado = 'RESERVADO' AND fecha < now() - make_interval(secs => %s)
+                """,
+                (float(max_age_hours) * 3600.0,),
+            )
+            return max(0, cur.rowcount or 0)
 
-    def _next_document_number(self, cur, id_tipo_documento: int) -> int:
-        cur.execute("SELECT MAX(numero_serie::bigint) FROM app.documento WHERE id_tipo_documento = %s AND numero_serie ~ '^[0-9]+$'", (id_tipo_documento,))
-        res = cur.fetchone()
-        last = res[0] if res and res[0] is not None else 0
-        return int(last) + 1
+    def _claim_document_number(self, cur, id_tipo_documento: int, numero_serie: str) -> None:
+        """A number given explicitly (reserved or typed) is no longer pending."""
+        if numero_serie.isdigit():
+            cur.execute(
+                "DELETE FROM app.numeracion_documento_pendiente WHERE id_tipo_documento = %s AND numero = %s",
+                (id_tipo_documento, int(numero_serie)),
+            )
 
     def _ensure_unique_document_number(self, cur, id_tipo_documento: int, numero_serie: str) -> None:
         cur.execute(
@@ -6677,6 +9609,7 @@ class Database:
                 conn.commit()
                 return res[0] if res else 0
 
+    @query_plan
     def get_saldo_entidad(self, id_entidad: int) -> Dict[str, Any]:
         """Obtiene el saldo actual y detalles de cuenta corriente de una entidad."""
         query = """
@@ -6685,20 +9618,25 @@ class Database:
             FROM app.saldo_cuenta_corriente
             WHERE id_entidad_comercial = %s
         """
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (id_entidad,))
-                row = cur.fetchone()
-                if row:
-                    return {
-                        "id_entidad": row[0],
-                        "saldo": float(row[1]),
-                        "limite_credito": float(row[2]),
-                        "ultimo_movimiento": row[3],
-                        "tipo_entidad": row[4]
-                    }
-                return {"id_entidad": id_entidad, "saldo": 0.0, "limite_credito": 0.0}
+        row = yield Query(query, (id_entidad,), fetch="row")
+        if row:
+            return {
+                "id_entidad": row[0],
+                "saldo": float(row[1]),
+                "limite_credito": float(row[2]),
+                "ultimo_movimiento": row[3],
+                "tipo_entidad": row[4]
+            }
+        return {"id_entidad": id_entidad, "saldo": 0.0, "limite_credito": 0.0}
+
+    # Deuda con más de N días (advanced["antiguedad"] = "31" / "61" / "91")
+    _CC_ANTIGUEDAD_FILTERS = {
+        "31": "(saldo_31_60 + saldo_61_90 + saldo_mas_90) > 0",
+        "61": "(saldo_61_90 + saldo_mas_90) > 0",
+        "91": "saldo_mas_90 > 0",
+    }
 
+    @query_plan
     def fetch_cuentas_corrientes(
         self,
         search: Optional[str] = None,
@@ -6736,12 +9674,23 @@ class Database:
         if advanced.get("solo_con_saldo"):
             filters.append("saldo_actual != 0")
 
+        # Antigüedad de la deuda (tramos mantenidos en saldo_cuenta_corriente)
+        antiguedad = self._CC_ANTIGUEDAD_FILTERS.get(str(advanced.get("antiguedad") or ""))
+        if antiguedad:
+            filters.append(antiguedad)
+
         where_clause = " AND ".join(filters)
         sort_cols = {
             "entidad": "entidad",
             "saldo_actual": "saldo_actual",
+            "limite_credito": "limite_credito",
             "ultimo_movimiento": "ultimo_movimiento",
             "tipo_entidad": "tipo_entidad",
+            "total_movimientos": "total_movimientos",
+            "saldo_0_30": "saldo_0_30",
+            "saldo_31_60": "saldo_31_60",
+            "saldo_61_90": "saldo_61_90",
+            "saldo_mas_90": "saldo_mas_90",
         }
         order_by = self._build_order_by(sorts, sort_cols, default="saldo_actual DESC")
 
@@ -6753,11 +9702,9 @@ class Database:
         """
         params.extend([limit, offset])
         
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        return (yield Query(query, params))
 
+    @query_plan
     def count_cuentas_corrientes(
         self,
         search: Optional[str] = None,
@@ -6789,15 +9736,17 @@ class Database:
         if advanced.get("solo_con_saldo"):
             filters.append("saldo_actual != 0")
 
+        antiguedad = self._CC_ANTIGUEDAD_FILTERS.get(str(advanced.get("antiguedad") or ""))
+        if antiguedad:
+            filters.append(antiguedad)
+
         where_clause = " AND ".join(filters)
         query = f"SELECT COUNT(*) as total FROM app.v_cuenta_corriente_resumen WHERE {where_clause}"
         
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                res = cur.fetchone()
-                return res[0] if res else 0
+        res = yield Query(query, params, fetch="row")
+        return res[0] if res else 0
 
+    @query_plan
     def fetch_movimientos_cc(
         self,
         search: Optional[str] = None,
@@ -6860,11 +9809,9 @@ class Database:
         """
         params.extend([limit, offset])
         
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        return (yield Query(query, params))
 
+    @query_plan
     def count_movimientos_cc(
         self,
         search: Optional[str] = None,
@@ -6907,30 +9854,57 @@ class Database:
         where_clause = " AND ".join(filters)
         query = f"SELECT COUNT(*) FROM app.v_movimiento_cc_full WHERE {where_clause}"
         
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                res = cur.fetchone()
-                return res[0] if res else 0
+        res = yield Query(query, params, fetch="row")
+        return res[0] if res else 0
 
+    @query_plan
     def get_stats_cuenta_corriente(self) -> Dict[str, Any]:
         """Obtiene estadísticas de cuentas corrientes."""
         query = "SELECT * FROM app.v_stats_cuenta_corriente"
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query)
-                row = cur.fetchone()
-                if row:
-                    return {
-                        "deuda_clientes": float(row[0] or 0),
-                        "clientes_deudores": int(row[1] or 0),
-                        "deuda_proveedores": float(row[2] or 0),
-                        "proveedores_acreedores": int(row[3] or 0),
-                        "movimientos_hoy": int(row[4] or 0),
-                        "cobros_hoy": float(row[5] or 0),
-                        "facturacion_hoy": float(row[6] or 0),
-                    }
-                return {}
+        row = yield Query(query, fetch="row")
+        if row:
+            return {
+                "deuda_clientes": float(row[0] or 0),
+                "clientes_deudores": int(row[1] or 0),
+                "deuda_proveedores": float(row[2] or 0),
+                "proveedores_acreedores": int(row[3] or 0),
+                "movimientos_hoy": int(row[4] or 0),
+                "cobros_hoy": float(row[5] or 0),
+                "facturacion_hoy": float(row[6] or 0),
+                "deuda_0_30": float(row[7] or 0),
+                "deuda_31_60": float(row[8] or 0),
+                "deuda_61_90": float(row[9] or 0),
+                "deuda_mas_90": float(row[10] or 0),
+            }
+        return {}
+
+    def reconcile_cuentas_corrientes(self, *, force: bool = False) -> int:
+        """
+        Nightly job: recompute the movement counters and move the debt of
+        app.saldo_cuenta_corriente to its current aging bucket
+        (app.fn_cuenta_corriente_conciliar). Skipped when every account is
+        already aged to today, unless `force`. Returns the accounts updated.
+        """
+        with self._transaction() as cur:
+            # One terminal at a time; the others skip
+            cur.execute("SELECT pg_try_advisory_xact_lock(hashtext('app.fn_cuenta_corriente_conciliar'))")
+            if not cur.fetchone()[0]:
+                return 0
+            if not force:
+                cur.execute(
+                    """
+                    SELECT EXISTS (
+                        SELECT 1 FROM app.saldo_cuenta_corriente
+                        WHERE fecha_antiguedad IS DISTINCT FROM app.fn_ventas_dia(now())
+                    )
+                    """
+                )
+                if not cur.fetchone()[0]:
+                    return 0
+            cur.execute("SELECT app.fn_cuenta_corriente_conciliar()")
+            updated = int(cur.fetchone()[0] or 0)
+        self.log_activity("CUENTA_CORRIENTE", "CONCILIACION", detalle={"cuentas_actualizadas": updated})
+        return updated
 
     def registrar_pago_cuenta_corriente(
         self,
@@ -6983,6 +9957,266 @@ class Database:
                                   detalle={"monto": monto, "forma_pago": id_forma_pago, "id_pago": id_pago})
                 return mov_id
 
+    def apply_payments_bulk(self, payments: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Apply many payments in one transaction (e.g. the receipts of a bank statement).
+
+        Each line is {id_entidad and/or id_documento, id_forma_pago, monto, fecha,
+        referencia, observacion, concepto}. A line with id_documento pays that
+        document; otherwise its amount is allocated FIFO (oldest first) to the
+        entity's pending documents (same filter as fetch_documentos_pendientes)
+        and the remainder is recorded on account. The affected documents and
+        CC balances are locked once, up front (documents first, like
+        create_payment); payments, CC credits and PAGADO states are written
+        with one statement each for the whole batch. Named documents are
+        validated again once locked (estado, entity, saldo_pendiente). Invalid
+        lines are reported and skipped; the valid ones are applied all together
+        or not at all.
+
+        Returns one result per line, in input order:
+        {line, ok, error, id_entidad, id_documento, monto, pagos: [{id_pago,
+        id_documento, monto}], a_cuenta, documentos_pagados}.
+        """
+        results: List[Dict[str, Any]] = []
+        lines: List[Dict[str, Any]] = []
+        for line_no, raw in enumerate(payments or []):
+            raw = raw or {}
+            result: Dict[str, Any] = {
+                "line": line_no,
+                "ok": False,
+                "error": None,
+                "id_entidad": _to_id(raw.get("id_entidad")),
+                "id_documento": _to_id(raw.get("id_documento")),
+                "monto": 0.0,
+                "pagos": [],
+                "a_cuenta": 0.0,
+                "documentos_pagados": [],
+            }
+            results.append(result)
+            try:
+                monto = Decimal(str(raw.get("monto")).strip().replace(",", "."))
+            except (ArithmeticError, ValueError):
+                monto = Decimal("0")
+            if not monto.is_finite() or monto <= 0:
+                result["error"] = "Monto inválido."
+                continue
+            forma = _to_id(raw.get("id_forma_pago"))
+            if forma is None:
+                result["error"] = "Forma de pago inválida."
+                continue
+            if result["id_entidad"] is None and result["id_documento"] is None:
+                result["error"] = "Falta la entidad o el comprobante."
+                continue
+            fecha = raw.get("fecha")
+            if isinstance(fecha, (date, datetime)):
+                fecha = fecha.isoformat()
+            result["monto"] = float(monto)
+            lines.append({
+                "result": result,
+                "monto": monto,
+                "id_forma_pago": forma,
+                "fecha": str(fecha or "").strip() or None,
+                "referencia": str(raw.get("referencia") or "").strip()[:255] or None,
+                "observacion": str(raw.get("observacion") or "").strip() or None,
+                "concepto": str(raw.get("concepto") or "").strip() or "Pago recibido",
+            })
+        if not lines:
+            return results
+
+        with self._transaction() as cur:
+            # Reference data of every line, one query each
+            cur.execute(
+                "SELECT id FROM ref.forma_pago WHERE id = ANY(%s)",
+                (sorted({line["id_forma_pago"] for line in lines}),),
+            )
+            formas = {int(row[0]) for row in cur.fetchall()}
+            named_docs: Dict[int, Tuple[int, str]] = {}
+            doc_ids = sorted({line["result"]["id_documento"] for line in lines if line["result"]["id_documento"] is not None})
+            if doc_ids:
+                cur.execute(
+                    "SELECT id, id_entidad_comercial, estado FROM app.documento WHERE id = ANY(%s)",
+                    (doc_ids,),
+                )
+                named_docs = {int(row[0]): (int(row[1]), row[2]) for row in cur.fetchall()}
+            cur.execute(
+                "SELECT id FROM app.entidad_comercial WHERE id = ANY(%s)",
+                (sorted({line["result"]["id_entidad"] for line in lines if line["result"]["id_entidad"] is not None}
+                        | {named[0] for named in named_docs.values()}),),
+            )
+            entidades = {int(row[0]) for row in cur.fetchall()}
+
+            valid: List[Dict[str, Any]] = []
+            for line in lines:
+                result = line["result"]
+                if line["id_forma_pago"] not in formas:
+                    result["error"] = "Forma de pago inexistente."
+                    continue
+                if result["id_documento"] is not None:
+                    named = named_docs.get(result["id_documento"])
+                    if named is None:
+                        result["error"] = "Comprobante no encontrado."
+                        continue
+                    if named[1] in ("BORRADOR", "ANULADO"):
+                        result["error"] = f"No se puede registrar un pago para un comprobante en estado {named[1]}."
+                        continue
+                    if result["id_entidad"] is not None and result["id_entidad"] != named[0]:
+                        result["error"] = "El comprobante no pertenece a la entidad."
+                        continue
+                    result["id_entidad"] = named[0]
+                if result["id_entidad"] not in entidades:
+                    result["error"] = "Entidad no encontrada."
+                    continue
+                valid.append(line)
+            if not valid:
+                return results
+
+            # 1. Lock the named documents and the pending ones of the FIFO entities
+            explicit_ids = sorted({line["result"]["id_documento"] for line in valid if line["result"]["id_documento"] is not None})
+            fifo_entities = sorted({line["result"]["id_entidad"] for line in valid if line["result"]["id_documento"] is None})
+            cur.execute(
+                """
+                SELECT d.id, d.id_entidad_comercial, d.fecha, d.numero_serie, d.saldo_pendiente, d.estado
+                FROM app.documento d
+                WHERE d.id = ANY(%s)
+                   OR (d.id_entidad_comercial = ANY(%s)
+                       AND d.estado NOT IN ('ANULADO', 'PAGADO', 'BORRADOR')
+                       AND d.saldo_pendiente > 0)
+                ORDER BY d.id
+                FOR UPDATE
+                """,
+                (explicit_ids, fifo_entities),
+            )
+            locked = cur.fetchall()
+            numeros = {int(row[0]): row[3] for row in locked}
+            pending: Dict[int, Decimal] = {}
+            fifo: Dict[int, List[Tuple[Any, int]]] = {}
+            locked_docs: Dict[int, Tuple[int, str]] = {}
+            for row in locked:
+                doc_id, entidad_id = int(row[0]), int(row[1])
+                locked_docs[doc_id] = (entidad_id, row[5])
+                pending[doc_id] = Decimal(str(row[4] or 0))
+                if row[5] not in ("ANULADO", "PAGADO", "BORRADOR") and pending[doc_id] > 0:
+                    fifo.setdefault(entidad_id, []).append((row[2], doc_id))
+            for docs in fifo.values():
+                docs.sort()
+
+            # The checks above read the documents unlocked: repeat them on the locked rows,
+            # another session may have voided or paid a named document in between
+            still_valid: List[Dict[str, Any]] = []
+            for line in valid:
+                result = line["result"]
+                if result["id_documento"] is not None:
+                    entidad_id, estado = locked_docs.get(result["id_documento"], (None, None))
+                    if estado is None:
+                        result["error"] = "Comprobante no encontrado."
+                        continue
+                    if estado in ("BORRADOR", "ANULADO"):
+                        result["error"] = f"No se puede registrar un pago para un comprobante en estado {estado}."
+                        continue
+                    if entidad_id != result["id_entidad"]:
+                        result["error"] = "El comprobante no pertenece a la entidad."
+                        continue
+                    if pending[result["id_documento"]] <= 0:
+                        result["error"] = "El comprobante no tiene saldo pendiente."
+                        continue
+                still_valid.append(line)
+            valid = still_valid
+            if not valid:
+                return results
+
+            # 2. Lock the balances (accounts without one start at 0)
+            self._lock_cc_balances(cur, {line["result"]["id_entidad"] for line in valid})
+
+            # 3. Allocation, in line order
+            allocations: List[Tuple[Dict[str, Any], Optional[int], Decimal]] = []
+            for line in valid:
+                result = line["result"]
+                remaining = line["monto"]
+                if result["id_documento"] is not None:
+                    doc_id = result["id_documento"]
+                    allocations.append((line, doc_id, remaining))
+                    pending[doc_id] = pending.get(doc_id, Decimal("0")) - remaining
+                    continue
+                for _, doc_id in fifo.get(result["id_entidad"], []):
+                    if remaining <= 0:
+                        break
+                    available = pending[doc_id]
+                    if available <= 0:
+                        continue
+                    applied = min(available, remaining)
+                    allocations.append((line, doc_id, applied))
+                    pending[doc_id] = available - applied
+                    remaining -= applied
+                if remaining > 0:
+                    allocations.append((line, None, remaining))
+                    result["a_cuenta"] = float(remaining)
+
+            # 4. Payments (identity ids follow the ORDER BY) and their CC credits
+            cur.execute(
+                """
+                INSERT INTO app.pago (id_documento, id_forma_pago, monto, fecha, referencia, observacion)
+                SELECT id_documento, id_forma_pago, monto, COALESCE(fecha::timestamptz, now()), referencia, observacion
+                FROM unnest(%s::bigint[], %s::bigint[], %s::numeric(14,4)[], %s::text[], %s::varchar(255)[], %s::text[])
+                    WITH ORDINALITY AS p(id_documento, id_forma_pago, monto, fecha, referencia, observacion, ord)
+                ORDER BY ord
+                RETURNING id
+                """,
+                (
+                    [doc_id for _, doc_id, _ in allocations],
+                    [line["id_forma_pago"] for line, _, _ in allocations],
+                    [amount for _, _, amount in allocations],
+                    [line["fecha"] for line, _, _ in allocations],
+                    [line["referencia"] for line, _, _ in allocations],
+                    [line["observacion"] for line, _, _ in allocations],
+                ),
+            )
+            pago_ids = sorted(int(row[0]) for row in cur.fetchall())
+
+            entries: List[Tuple[Any, ...]] = []
+            for (line, doc_id, amount), pago_id in zip(allocations, pago_ids):
+                result = line["result"]
+                result["pagos"].append({"id_pago": pago_id, "id_documento": doc_id, "monto": float(amount)})
+                concepto = f"Pago doc {numeros.get(doc_id) or doc_id}" if doc_id is not None else line["concepto"]
+                mov_obs = line["observacion"] or ""
+                if line["referencia"]:
+                    mov_obs = f"{mov_obs} Ref: {line['referencia']}" if mov_obs else f"Ref: {line['referencia']}"
+                entries.append((result["id_entidad"], "CREDITO", concepto[:150], amount, doc_id, mov_obs or None))
+            self._register_cc_movements(cur, entries, payment_ids=pago_ids)
+
+            # 5. Documents now fully paid (monto_pagado kept by trg_documento_pago_ins)
+            touched = sorted({doc_id for _, doc_id, _ in allocations if doc_id is not None})
+            paid: Set[int] = set()
+            if touched:
+                cur.execute(
+                    """
+                    UPDATE app.documento
+                    SET estado = 'PAGADO'
+                    WHERE id = ANY(%s)
+                      AND estado NOT IN ('PAGADO', 'ANULADO', 'BORRADOR')
+                      AND monto_pagado >= total - 0.01
+                    RETURNING id
+                    """,
+                    (touched,),
+                )
+                paid = {int(row[0]) for row in cur.fetchall()}
+                for doc_id in sorted(paid):
+                    self._ensure_remito_for_document(cur, doc_id)
+
+            for line in valid:
+                result = line["result"]
+                result["ok"] = True
+                result["documentos_pagados"] = [p["id_documento"] for p in result["pagos"] if p["id_documento"] in paid]
+
+        applied = [result for result in results if result["ok"]]
+        self.log_activity("app.pago", "REGISTRO_MASIVO", detalle={
+            "lineas": len(results),
+            "aplicadas": len(applied),
+            "pagos": sum(len(result["pagos"]) for result in applied),
+            "monto": sum(result["monto"] for result in applied),
+            "documentos_pagados": sum(len(result["documentos_pagados"]) for result in applied),
+        })
+        return results
+
     def ajustar_saldo_cc(
         self,
         id_entidad: int,
@@ -7012,6 +10246,7 @@ class Database:
             sorts=[("fecha", "DESC")]
         )
 
+    @query_plan
     def fetch_remitos(
         self,
         search: Optional[str] = None,
@@ -7086,11 +10321,9 @@ class Database:
         """
         params.extend([limit, offset])
 
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                return _rows_to_dicts(cur)
+        return (yield Query(query, params))
 
+    @query_plan
     def count_remitos(
         self,
         search: Optional[str] = None,
@@ -7142,11 +10375,8 @@ class Database:
 
         query = f"SELECT COUNT(*) FROM app.v_remito_resumen WHERE {where_clause}"
 
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, params)
-                res = cur.fetchone()
-                return res[0] if res else 0
+        res = yield Query(query, params, fetch="row")
+        return res[0] if res else 0
 
     def update_remito_estado(self, remito_id: int, nuevo_estado: str) -> None:
         """Actualiza el estado del remito y registra las marcas de despacho/entrega."""
@@ -7185,6 +10415,7 @@ class Database:
                 raise ValueError("Remito no encontrado")
         self.log_activity("app.remito", "UPDATE_ESTADO", id_entidad=remito_id, detalle={"estado": estado_value})
 
+    @query_plan
     def fetch_remito_detalle(self, remito_id: int) -> List[Dict[str, Any]]:
         """Obtiene el detalle de items de un remito."""
         query = """
@@ -7200,7 +10431,4 @@ class Database:
             WHERE rd.id_remito = %s
             ORDER BY rd.nro_linea
         """
-        with self.pool.connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(query, (remito_id,))
-                return _rows_to_dicts(cur)
+        return (yield Query(query, (remito_id,)))
@@ -1,20 +1,23 @@
 """
 Async database layer for Flet application.
 
-This module provides async versions of critical database operations to prevent
-UI blocking when executing queries. It uses psycopg's AsyncConnectionPool.
+This module provides async versions of the Database read paths to prevent
+UI blocking when executing queries. Read methods written as query plans
+(`@query_plan`, see services/query_plan.py) run the very same SQL on
+psycopg's AsyncConnectionPool; the remaining fetch_/count_/get_/list_
+methods run on a worker thread against the sync pool.
 """
 
-import json
+import asyncio
+import functools
 import logging
-from typing import Any, Dict, List, Optional, Sequence, Tuple
+from typing import Any, Awaitable, Callable, Dict, Optional
 
 from psycopg_pool import AsyncConnectionPool
 
-from desktop_app.database import (
-    _to_id,
-    Database,
-)
+from desktop_app.database import Database
+from desktop_app.services.pool_policy import AsyncIdleChecker
+from desktop_app.services.query_plan import get_query_plan, run_plan_async
 
 logger = logging.getLogger(__name__)
 
@@ -23,43 +26,89 @@ class AsyncDatabase:
     """
     Async wrapper over Database class using AsyncConnectionPool.
     
-    This class provides async versions of heavy-lifting database operations
-    that are typically called from UI event handlers in Flet.
-    
-    Heavy operations are those that:
-    - Do complex queries with joins/aggregations
-    - Return large datasets (>100 rows)
-    - Are called during user-triggered actions (search, filter, load)
-    
-    Simple operations (config, logging) remain synchronous on the base Database.
+    Every read method of Database (fetch_*, count_*, get_*, list_* and any
+    other query plan, e.g. verify_article_prices) can be awaited from UI event
+    handlers in Flet with the same signature:
+
+        rows = await db_async.fetch_articles(search="tornillo", limit=60)
+        total = await db_async.count_articles(search="tornillo")
+
+    Methods defined as query plans execute on the async pool (no SQL is
+    duplicated here) with the user/ip session context of the sync Database;
+    the others are offloaded with asyncio.to_thread.
+    Writes stay synchronous on the base Database.
     """
+
+    _READ_PREFIXES = ("fetch_", "count_", "get_", "list_")
+
+    # Names kept from the first version of this class
+    _ALIASES = {"fetch_articulos": "fetch_articles"}
+    _COUNT_METHODS = {
+        "articulo": "count_articles",
+        "articulos": "count_articles",
+        "entidad": "count_entities",
+        "entidades": "count_entities",
+        "documentos": "count_documentos_resumen",
+        "movimientos": "count_movimientos_stock",
+        "pagos": "count_pagos",
+    }
     
     def __init__(self, db: Database):
         """Initialize async wrapper from existing Database instance."""
         self.db = db
         self.dsn = db.dsn
-        self.pool_min = db.pool_min
-        self.pool_max = db.pool_max
         self._async_pool: Optional[AsyncConnectionPool] = None
-        
-    async def _get_pool(self) -> AsyncConnectionPool:
-        """Lazily initialize async connection pool."""
-        if self._async_pool is None:
-            self._async_pool = AsyncConnectionPool(
-                conninfo=self.dsn,
-                min_size=self.pool_min,
-                max_size=self.pool_max,
-            )
+        self._pool_lock: Optional[asyncio.Lock] = None
+        self._pool_checker: Optional[AsyncIdleChecker] = None
+
+    async def _get_pool(self) -> Optional[AsyncConnectionPool]:
+        """
+        Lazily open the async pool with the connections Database lends it
+        from the terminal's budget. None when the budget leaves nothing for
+        it: query plans then run on the sync pool in a worker thread.
+        """
+        if self._async_pool is not None:
+            return self._async_pool
+        if self._pool_lock is None:
+            self._pool_lock = asyncio.Lock()
+        async with self._pool_lock:
+            if self._async_pool is None:
+                size = self.db.reserve_async_connections()
+                if size <= 0:
+                    return None
+                policy = self.db.pool_policy
+                if policy.check:
+                    self._pool_checker = AsyncIdleChecker(AsyncConnectionPool, policy.check_idle)
+                pool = AsyncConnectionPool(
+                    conninfo=self.dsn,
+                    min_size=1,
+                    max_size=size,
+                    open=False,
+                    **policy.pool_kwargs(
+                        AsyncConnectionPool,
+                        name="nexoryn-async",
+                        checker=self._pool_checker,
+                        configure=self.db.prepared_statements.configure_async,
+                    ),
+                )
+                try:
+                    await pool.open()
+                except Exception:
+                    self.db.release_async_connections()
+                    raise
+                self._async_pool = pool
+                self.db.async_pool = pool
         return self._async_pool
-    
+
     async def close_async(self) -> None:
-        """Close the async connection pool."""
+        """Close the async connection pool and return its connections to the sync budget."""
         if self._async_pool:
             try:
                 await self._async_pool.close()
             except Exception as e:
                 logger.error(f"Error closing async pool: {e}")
             self._async_pool = None
+            self.db.release_async_connections()
     
     def set_context(self, user_id: Optional[int], ip: Optional[str] = None) -> None:
         """Set user context (delegates to sync DB)."""
@@ -78,223 +127,45 @@ class AsyncDatabase:
                 (self.db.current_ip,)
             )
     
-    # ========== CRITICAL FETCH OPERATIONS (ASYNC) ==========
-    
-    async def fetch_entities(
-        self,
-        search: Optional[str] = None,
-        tipo: Optional[str] = None,
-        simple: Optional[str] = None,
-        advanced: Optional[Dict[str, Any]] = None,
-        sorts: Optional[Sequence[Tuple[str, str]]] = None,
-        limit: int = 60,
-        offset: int = 0,
-    ) -> List[Dict[str, Any]]:
-        """
-        Async version of fetch_entities - potentially heavy operation.
-        Fetches entidades with filtering and pagination.
-        """
-        pool = await self._get_pool()
-        
-        # Build filters (using sync database's logic)
-        where_clause, params = self.db._build_entity_filters(
-            search=search, tipo=tipo, advanced=advanced
-        )
-        
-        # Build sorting
-        sort_columns = {
-            "id": "id",
-            "nombre_completo": "nombre_completo",
-            "cuit": "cuit",
-            "email": "email",
-            "tipo": "tipo",
-            "condicion_iva": "condicion_iva",
-            "saldo_cuenta": "saldo_cuenta",
-        }
-        order_by = self.db._build_order_by(
-            sorts, sort_columns, default="nombre_completo ASC", tiebreaker="id ASC"
-        )
-        
-        # Apply advanced filters if provided
-        filters = [where_clause] if where_clause else []
-        if advanced:
-            if advanced.get("condicion_iva"):
-                filters.append("condicion_iva = %s")
-                params.append(advanced["condicion_iva"])
-            
-            id_tipo = _to_id(advanced.get("id_tipo"))
-            if id_tipo:
-                filters.append("id_tipo = %s")
-                params.append(id_tipo)
-        
-        where_clause = " AND ".join(filters) if filters else "TRUE"
-        
-        query = f"""
-            SELECT id, COALESCE(apellido || ' ' || nombre, razon_social) as nombre_completo,
-                   cuit, domicilio, email, tipo, condicion_iva, saldo_cuenta, activo
-            FROM app.v_entidad_detallada
-            WHERE {where_clause}
-            ORDER BY {order_by}
-            LIMIT %s
-            OFFSET %s
-        """
-        params.extend([limit, offset])
-        
-        async with pool.connection() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute(query, params)
-                rows = await cur.fetchall()
-                return _async_rows_to_dicts(rows, cur.description)
-    
-    async def fetch_documentos_resumen(
-        self,
-        search: Optional[str] = None,
-        simple: Optional[str] = None,
-        advanced: Optional[Dict[str, Any]] = None,
-        sorts: Optional[Sequence[Tuple[str, str]]] = None,
-        limit: int = 60,
-        offset: int = 0,
-    ) -> List[Dict[str, Any]]:
-        """
-        Async version of fetch_documentos_resumen - complex query with joins.
-        """
-        pool = await self._get_pool()
-        
-        filters = []
-        params = []
-        
-        # Date filters
-        if advanced:
-            f_desde = advanced.get("f_desde")
-            if f_desde:
-                filters.append("fecha >= %s")
-                params.append(f_desde)
-            
-            f_hasta = advanced.get("f_hasta")
-            if f_hasta:
-                filters.append("fecha <= %s")
-                params.append(f_hasta)
-            
-            id_entidad = _to_id(advanced.get("id_entidad"))
-            if id_entidad:
-                filters.append("id_entidad = %s")
-                params.append(id_entidad)
-            
-            numero = advanced.get("numero")
-            if numero:
-                filters.append("numero_serie ILIKE %s")
-                params.append(f"%{numero.strip()}%")
-        
-        where_clause = " AND ".join(filters) if filters else "TRUE"
-        
-        sort_columns = {
-            "id": "id",
-            "fecha": "fecha",
-            "numero": "numero_serie",
-            "entidad": "entidad",
-            "tipo": "tipo",
-            "total": "total",
-        }
-        order_by = self.db._build_order_by(
-            sorts, sort_columns, default="fecha DESC", tiebreaker="id DESC"
-        )
-        
-        async with pool.connection() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute(query, params)
-                rows = await cur.fetchall()
-                return _async_rows_to_dicts(rows, cur.description)
-    
-    async def fetch_pagos(
-        self,
-        search: Optional[str] = None,
-        simple: Optional[str] = None,
-        advanced: Optional[Dict[str, Any]] = None,
-        sorts: Optional[Sequence[Tuple[str, str]]] = None,
-        limit: int = 60,
-        offset: int = 0,
-    ) -> List[Dict[str, Any]]:
-        """
-        Async version of fetch_pagos - heavy join operation.
-        """
-        pool = await self._get_pool()
-        
-        filters = []
-        params = []
-        
-        if advanced:
-            f_desde = advanced.get("f_desde")
-            if f_desde:
-                filters.append("p.fecha >= %s")
-                params.append(f_desde)
-            
-            f_hasta = advanced.get("f_hasta")
-            if f_hasta:
-                filters.append("p.fecha <= %s")
-                params.append(f_hasta)
-        
-        where_clause = " AND ".join(filters) if filters else "TRUE"
-        
-        sort_columns = {
-            "id": "p.id",
-            "fecha": "p.fecha",
-            "monto": "p.monto",
-            "forma": "forma",
-        }
-        order_by = self.db._build_order_by(
-            sorts, sort_columns, default="p.fecha DESC"
-        )
-        
-        async with pool.connection() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute(query, params)
-                rows = await cur.fetchall()
-                return _async_rows_to_dicts(rows, cur.description)
-    
-    async def fetch_articulos(
-        self,
-        search: Optional[str] = None,
-        simple: Optional[str] = None,
-        advanced: Optional[Dict[str, Any]] = None,
-        sorts: Optional[Sequence[Tuple[str, str]]] = None,
-        limit: int = 60,
-        offset: int = 0,
-    ) -> List[Dict[str, Any]]:
-        """
-        Async version of fetch_articulos - inventory heavy operation.
-        """
-        pool = await self._get_pool()
-        
-        # Use sync logic to build robust filters
-        where_clause, params = self.db._build_article_filters(search, None, advanced)
-        
-        sort_columns = {
-            "id": "id",
-            "codigo": "id::text",
-            "descripcion": "nombre",
-            "stock": "stock_actual",
-            "precio": "costo",
-        }
-        order_by = self.db._build_order_by(
-            sorts, sort_columns, default="nombre ASC", tiebreaker="id ASC"
-        )
-        
-        query = f"""
-            SELECT *
-            FROM app.v_articulo_detallado
-            WHERE {where_clause}
-            ORDER BY {order_by}
-            LIMIT %s
-            OFFSET %s
-        """
-        params.extend([limit, offset])
-        
-        async with pool.connection() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute(query, params)
-                rows = await cur.fetchall()
-                return _async_rows_to_dicts(rows, cur.description)
-    
+    # ========== READ OPERATIONS (ASYNC) ==========
+
+    def __getattr__(self, name: str) -> Callable[..., Awaitable[Any]]:
+        # Only reached for names not defined on this class
+        target = self._ALIASES.get(name, name)
+        method = getattr(type(self.db), target, None) if not target.startswith("_") else None
+        plan = get_query_plan(method)
+        if plan is None and not target.startswith(self._READ_PREFIXES):
+            # Query plans are reads by construction; anything else must be a named read
+            raise AttributeError(f"{type(self).__name__!s} has no attribute {name!r}")
+        if not callable(method):
+            raise AttributeError(f"Database has no read method {target!r}")
+
+        if plan is not None:
+
+            bound = getattr(self.db, target)
+
+            @functools.wraps(method)
+            async def run_async(*args: Any, **kwargs: Any) -> Any:
+                pool = await self._get_pool()
+                if pool is None:
+                    return await asyncio.to_thread(bound, *args, **kwargs)
+                return await run_plan_async(
+                    plan(self.db, *args, **kwargs), pool, setup=self._setup_session_async
+                )
+
+            call = run_async
+        else:
+            bound = getattr(self.db, target)
+
+            @functools.wraps(method)
+            async def run_in_thread(*args: Any, **kwargs: Any) -> Any:
+                return await asyncio.to_thread(bound, *args, **kwargs)
+
+            call = run_in_thread
+        # Cache the coroutine function so later lookups skip __getattr__
+        self.__dict__[name] = call
+        return call
+
     async def count_results(
         self,
         table_view: str,
@@ -303,59 +174,9 @@ class AsyncDatabase:
     ) -> int:
         """
         Async count for pagination - helps prevent UI freeze on large datasets.
+        `table_view` names a list screen ("articulo", "documentos", ...) or a
+        count_* method suffix ("marcas" -> count_marcas).
         """
-        pool = await self._get_pool()
-        
-        if table_view == "articulo":
-            where_clause, params = self.db._build_article_filters(search, None, advanced)
-            query = f"SELECT COUNT(*) AS total FROM app.v_articulo_detallado WHERE {where_clause}"
-        else:
-            where_clause, params = self.db._build_catalog_filters(search, table_view, None)
-            
-            # Apply advanced filters
-            filters = [where_clause] if where_clause else []
-            if advanced and table_view == "documentos":
-                f_desde = advanced.get("f_desde")
-                if f_desde:
-                    filters.append("fecha >= %s")
-                    params.append(f_desde)
-                
-                f_hasta = advanced.get("f_hasta")
-                if f_hasta:
-                    filters.append("fecha <= %s")
-                    params.append(f_hasta)
-            
-            where_clause = " AND ".join(filters) if filters else "TRUE"
-            
-            # Assuming table_view matches table name for count if generic
-            # Note: Explicit query definition was missing in original code
-            query = f"SELECT COUNT(*) AS total FROM {table_view} WHERE {where_clause}"
-        
-        async with pool.connection() as conn:
-            async with conn.cursor() as cur:
-                await cur.execute(query, params)
-                row = await cur.fetchone()
-                if row:
-                    return row[0] if isinstance(row, tuple) else row.get("total", 0)
-                return 0
-
-
-def _async_rows_to_dicts(rows: List[tuple], description) -> List[Dict[str, Any]]:
-    """
-    Convert async cursor rows to list of dicts.
-    Handles psycopg async cursor results.
-    """
-    if not rows or not description:
-        return []
-    
-    # Get column names from description
-    columns = []
-    for col in description:
-        if hasattr(col, "name"):
-            columns.append(col.name)
-        elif isinstance(col, (list, tuple)):
-            columns.append(col[0])
-        else:
-            columns.append(str(col))
-    
-    return [dict(zip(columns, row)) for row in rows]
+        method = self._COUNT_METHODS.get(table_view) or f"count_{table_view}"
+        count = getattr(self, method)
+        return await count(search=search, advanced=advanced)
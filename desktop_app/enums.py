@@ -31,6 +31,15 @@ class BackupEstado(str, Enum):
     VALIDANDO = "VALIDANDO"
 
 
+class ActualizacionMasivaEstado(str, Enum):
+    """Estados de un trabajo de actualización masiva de precios por lotes."""
+    EN_CURSO = "EN_CURSO"
+    DETENIDO = "DETENIDO"  # detenido por el usuario, se puede reanudar
+    CANCELADO = "CANCELADO"  # descartado
+    FALLIDO = "FALLIDO"
+    COMPLETADO = "COMPLETADO"
+
+
 class ClaseDocumento(str, Enum):
     """Clases de documentos: ingreso o egreso."""
     VENTA = "VENTA"
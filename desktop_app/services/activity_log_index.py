@@ -0,0 +1,539 @@
+from __future__ import annotations
+
+import csv
+import io
+import json
+import logging
+import os
+import re
+import struct
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+_INDEX_MAGIC = b"NXLIDX1\n"
+_INDEX_VERSION = 1
+# Fields with a per-value posting list (row numbers) and a per-row code column.
+INDEXED_FIELDS = ("id_usuario", "entidad", "accion", "resultado", "hour")
+SORTABLE_FIELDS = ("id", "fecha_hora", "id_usuario", "entidad", "accion", "resultado")
+# Free-text search reads candidate rows in chunks of at most this many bytes,
+# starting a new chunk (seek) when the next candidate is further than the gap.
+_SEARCH_CHUNK_BYTES = 1 << 20
+_SEARCH_GAP_BYTES = 64 << 10
+
+
+@dataclass
+class LogFilter:
+    """Criteria for ActivityLogIndex.query; `None` means "no restriction"."""
+
+    search: Optional[str] = None  # substring over the whole raw row, case-insensitive
+    id_usuario: Optional[int] = None
+    entidad: Optional[str] = None  # substring, case-insensitive
+    accion: Optional[str] = None  # substring, case-insensitive
+    resultados: Optional[Sequence[str]] = None  # exact values, upper case
+    desde: Optional[datetime] = None
+    hasta: Optional[datetime] = None  # inclusive
+
+
+class _DayIndex:
+    """Index of one `activity_YYYY-MM-DD.txt` file, extended as the file grows."""
+
+    def __init__(self, day: date, columns: Sequence[str]) -> None:
+        self.day = day
+        self.default_columns = list(columns)
+        self.reset()
+
+    def reset(self) -> None:
+        self.indexed_bytes = 0
+        self.columns: List[str] = []
+        self.offsets = array("q")
+        self.secs = array("i")
+        self.values: Dict[str, List[str]] = {f: [] for f in INDEXED_FIELDS}
+        self.codes: Dict[str, array] = {f: array("I") for f in INDEXED_FIELDS}
+        self.postings: Dict[str, List[array]] = {f: [] for f in INDEXED_FIELDS}
+        self._lookup: Dict[str, Dict[str, int]] = {f: {} for f in INDEXED_FIELDS}
+        self.dirty = False
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def row_span(self, row: int) -> Tuple[int, int]:
+        end = self.offsets[row + 1] if row + 1 < len(self.offsets) else self.indexed_bytes
+        return self.offsets[row], end
+
+    def value(self, field: str, row: int) -> str:
+        return self.values[field][self.codes[field][row]]
+
+    # -- building ---------------------------------------------------------
+
+    def catch_up(self, path: Path) -> None:
+        """Index rows appended to `path` since the last call."""
+        size = path.stat().st_size
+        if size < self.indexed_bytes:
+            # File was truncated or replaced: start over.
+            self.reset()
+        if size == self.indexed_bytes:
+            return
+        base = self.indexed_bytes
+        with path.open("rb") as fh:
+            fh.seek(base)
+            data = fh.read(size - base)
+
+        record_start = 0
+        scan = 0
+        in_quotes = 0
+        while True:
+            nl = data.find(b"\n", scan)
+            if nl < 0:
+                break
+            in_quotes ^= data.count(b'"', scan, nl) & 1
+            scan = nl + 1
+            if in_quotes:
+                continue  # newline inside a quoted field
+            self._index_record(data[record_start:scan], base + record_start)
+            record_start = scan
+        # A trailing partial record is picked up once its newline is written.
+        self.indexed_bytes = base + record_start
+        self.dirty = True
+
+    def _index_record(self, raw: bytes, offset: int) -> None:
+        try:
+            fields = next(csv.reader(io.StringIO(raw.decode("utf-8", errors="replace"))), None)
+        except csv.Error:
+            fields = None
+        if not fields:
+            return
+        if offset == 0 and fields[0] == "id":
+            self.columns = list(fields)
+            return
+        if not self.columns:
+            self.columns = list(self.default_columns)
+        row = dict(zip(self.columns, fields))
+        fecha = row.get("fecha_hora") or ""
+        try:
+            stamp = datetime.fromisoformat(fecha)
+            sec = stamp.hour * 3600 + stamp.minute * 60 + stamp.second
+        except ValueError:
+            sec = 0
+        keys = {
+            "id_usuario": (row.get("id_usuario") or "").strip(),
+            "entidad": (row.get("entidad") or "").strip(),
+            "accion": (row.get("accion") or "").strip(),
+            "resultado": (row.get("resultado") or "").strip().upper(),
+            "hour": f"{sec // 3600:02d}",
+        }
+        n = len(self.offsets)
+        self.offsets.append(offset)
+        self.secs.append(sec)
+        for field_name, value in keys.items():
+            lookup = self._lookup[field_name]
+            code = lookup.get(value)
+            if code is None:
+                code = len(self.values[field_name])
+                lookup[value] = code
+                self.values[field_name].append(value)
+                self.postings[field_name].append(array("I"))
+            self.codes[field_name].append(code)
+            self.postings[field_name][code].append(n)
+
+    # -- persistence ------------------------------------------------------
+
+    def save(self, idx_path: Path) -> None:
+        named: List[Tuple[str, array]] = [("offsets", self.offsets), ("secs", self.secs)]
+        for field_name in INDEXED_FIELDS:
+            named.append((f"codes:{field_name}", self.codes[field_name]))
+            for code, posting in enumerate(self.postings[field_name]):
+                named.append((f"posting:{field_name}:{code}", posting))
+        meta = {
+            "version": _INDEX_VERSION,
+            "day": self.day.isoformat(),
+            "indexed_bytes": self.indexed_bytes,
+            "columns": self.columns,
+            "values": self.values,
+            "arrays": [[name, arr.typecode, len(arr)] for name, arr in named],
+        }
+        meta_bytes = json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        tmp_path = idx_path.with_name(idx_path.name + ".tmp")
+        with tmp_path.open("wb") as fh:
+            fh.write(_INDEX_MAGIC)
+            fh.write(struct.pack("<Q", len(meta_bytes)))
+            fh.write(meta_bytes)
+            for _, arr in named:
+                fh.write(arr.tobytes())
+        os.replace(tmp_path, idx_path)
+        self.dirty = False
+
+    @classmethod
+    def load(cls, idx_path: Path, day: date, columns: Sequence[str]) -> Optional["_DayIndex"]:
+        try:
+            data = idx_path.read_bytes()
+            if not data.startswith(_INDEX_MAGIC):
+                return None
+            pos = len(_INDEX_MAGIC)
+            (meta_len,) = struct.unpack_from("<Q", data, pos)
+            pos += 8
+            meta = json.loads(data[pos:pos + meta_len].decode("utf-8"))
+            pos += meta_len
+            if meta.get("version") != _INDEX_VERSION or meta.get("day") != day.isoformat():
+                return None
+            arrays: Dict[str, array] = {}
+            for name, typecode, count in meta["arrays"]:
+                arr = array(typecode)
+                size = count * arr.itemsize
+                arr.frombytes(data[pos:pos + size])
+                pos += size
+                arrays[name] = arr
+        except Exception:
+            logger.debug("Discarding unreadable activity log index %s", idx_path, exc_info=True)
+            return None
+
+        idx = cls(day, columns)
+        idx.indexed_bytes = int(meta["indexed_bytes"])
+        idx.columns = list(meta.get("columns") or [])
+        idx.offsets = arrays["offsets"]
+        idx.secs = arrays["secs"]
+        for field_name in INDEXED_FIELDS:
+            values = list(meta["values"][field_name])
+            idx.values[field_name] = values
+            idx._lookup[field_name] = {v: i for i, v in enumerate(values)}
+            idx.codes[field_name] = arrays[f"codes:{field_name}"]
+            idx.postings[field_name] = [arrays[f"posting:{field_name}:{i}"] for i in range(len(values))]
+        return idx
+
+
+class ActivityLogIndex:
+    """
+    Query engine over the daily activity CSV files in `logs_dir`.
+
+    Each day gets a sidecar `.idx` file with row offsets plus posting lists
+    for usuario, entidad, acción, resultado and hour bucket. Indexes are
+    extended incrementally with whatever was appended since the last query,
+    so filters and counts only touch the matching rows; row text is read
+    from disk just for the requested page (and for free-text search).
+    """
+
+    _FILE_RE = re.compile(r"^activity_(\d{4}-\d{2}-\d{2})\.txt$")
+
+    def __init__(
+        self,
+        logs_dir: Path,
+        columns: Sequence[str],
+        *,
+        max_cached_days: int = 62,
+        save_interval: float = 30.0,
+    ) -> None:
+        self.logs_dir = Path(logs_dir)
+        self.columns = list(columns)
+        self.max_cached_days = max(1, int(max_cached_days))
+        self.save_interval = save_interval
+        self._lock = threading.RLock()
+        self._days: "OrderedDict[date, _DayIndex]" = OrderedDict()
+        self._last_saved: Dict[date, float] = {}
+
+    def note_appended(self, paths: Sequence[Path]) -> None:
+        """
+        Index rows just appended to `paths` (ActivityLogWriter batch hook).
+        Sidecars are rewritten at most every `save_interval` seconds here;
+        queries and `save_dirty` persist the rest.
+        """
+        with self._lock:
+            now = time.monotonic()
+            for path in paths:
+                m = self._FILE_RE.match(Path(path).name)
+                if not m:
+                    continue
+                day = date.fromisoformat(m.group(1))
+                persist = now - self._last_saved.get(day, 0.0) >= self.save_interval
+                self._day_index(day, Path(path), persist=persist)
+
+    def save_dirty(self) -> None:
+        with self._lock:
+            for day, idx in self._days.items():
+                if idx.dirty:
+                    self._save(idx, self.logs_dir / f"activity_{day.isoformat()}.idx")
+
+    # -- public API -------------------------------------------------------
+
+    def query(
+        self,
+        flt: LogFilter,
+        *,
+        sorts: Optional[Sequence[Tuple[str, str]]] = None,
+        limit: int = 100,
+        offset: int = 0,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """Return (page of rows, total matches). Default order is newest first."""
+        with self._lock:
+            matches = [(idx, rows) for idx, rows in self._match_days(flt) if len(rows)]
+            total = sum(len(rows) for _, rows in matches)
+            limit = max(0, int(limit))
+            offset = max(0, int(offset))
+            if limit == 0 or offset >= total:
+                return [], total
+
+            sort_spec = [(k, str(d).lower()) for k, d in (sorts or []) if k in SORTABLE_FIELDS]
+            chronological = not sort_spec or (len(sort_spec) == 1 and sort_spec[0][0] in ("id", "fecha_hora"))
+            if chronological:
+                ascending = bool(sort_spec) and sort_spec[0][1] == "asc"
+                page = self._chronological_slice(matches, ascending, offset, limit)
+            else:
+                page = self._sorted_slice(matches, sort_spec, offset, limit)
+            return self._read_rows(page), total
+
+    def count(self, flt: LogFilter) -> int:
+        with self._lock:
+            return sum(len(rows) for _, rows in self._match_days(flt))
+
+    # -- day selection / indexing ----------------------------------------
+
+    def _available_days(self) -> List[Tuple[date, Path]]:
+        if not self.logs_dir.is_dir():
+            return []
+        days: List[Tuple[date, Path]] = []
+        for entry in self.logs_dir.iterdir():
+            m = self._FILE_RE.match(entry.name)
+            if not m:
+                continue
+            try:
+                days.append((date.fromisoformat(m.group(1)), entry))
+            except ValueError:
+                continue
+        days.sort()
+        return days
+
+    def _save(self, idx: _DayIndex, idx_path: Path) -> None:
+        try:
+            idx.save(idx_path)
+            self._last_saved[idx.day] = time.monotonic()
+        except OSError:
+            logger.warning("Could not save activity log index %s", idx_path, exc_info=True)
+
+    def _day_index(self, day: date, path: Path, *, persist: bool = True) -> _DayIndex:
+        idx = self._days.get(day)
+        idx_path = path.with_suffix(".idx")
+        if idx is None:
+            idx = _DayIndex.load(idx_path, day, self.columns) if idx_path.exists() else None
+            if idx is None:
+                idx = _DayIndex(day, self.columns)
+            self._days[day] = idx
+            while len(self._days) > self.max_cached_days:
+                _, evicted = self._days.popitem(last=False)
+                if evicted.dirty:
+                    self._save(evicted, self.logs_dir / f"activity_{evicted.day.isoformat()}.idx")
+        self._days.move_to_end(day)
+        try:
+            idx.catch_up(path)
+        except OSError:
+            logger.warning("Could not update activity log index for %s", path, exc_info=True)
+        if persist and idx.dirty:
+            self._save(idx, idx_path)
+        return idx
+
+    def _match_days(self, flt: LogFilter) -> Iterable[Tuple[_DayIndex, Sequence[int]]]:
+        first = flt.desde.date() if flt.desde else None
+        last = flt.hasta.date() if flt.hasta else None
+        for day, path in self._available_days():
+            if (first and day < first) or (last and day > last):
+                continue
+            idx = self._day_index(day, path)
+            yield idx, self._match_rows(idx, path, flt)
+
+    # -- filtering --------------------------------------------------------
+
+    def _allowed_codes(self, idx: _DayIndex, flt: LogFilter) -> Optional[Dict[str, set]]:
+        """Per-field sets of accepted value codes, or None when nothing can match."""
+        preds: Dict[str, Callable[[str], bool]] = {}
+        if flt.id_usuario is not None:
+            wanted = str(flt.id_usuario)
+            preds["id_usuario"] = lambda v: v == wanted
+        if flt.entidad:
+            needle_ent = flt.entidad.strip().lower()
+            preds["entidad"] = lambda v: needle_ent in v.lower()
+        if flt.accion:
+            needle_acc = flt.accion.strip().lower()
+            preds["accion"] = lambda v: needle_acc in v.lower()
+        if flt.resultados:
+            accepted = {str(r).upper() for r in flt.resultados}
+            preds["resultado"] = lambda v: v in accepted
+        lo_hour, hi_hour = self._hour_bounds(idx.day, flt)
+        if lo_hour > 0 or hi_hour < 23:
+            preds["hour"] = lambda v: lo_hour <= int(v) <= hi_hour
+
+        allowed: Dict[str, set] = {}
+        for field_name, pred in preds.items():
+            codes = {code for code, value in enumerate(idx.values[field_name]) if pred(value)}
+            if not codes:
+                return None
+            allowed[field_name] = codes
+        return allowed
+
+    @staticmethod
+    def _hour_bounds(day: date, flt: LogFilter) -> Tuple[int, int]:
+        lo = flt.desde.hour if flt.desde and flt.desde.date() == day else 0
+        hi = flt.hasta.hour if flt.hasta and flt.hasta.date() == day else 23
+        return lo, hi
+
+    def _match_rows(self, idx: _DayIndex, path: Path, flt: LogFilter) -> Sequence[int]:
+        allowed = self._allowed_codes(idx, flt)
+        if allowed is None:
+            return ()
+        if allowed:
+            # Drive from the smallest posting union, check the rest via code columns.
+            sizes = {
+                f: sum(len(idx.postings[f][c]) for c in codes) for f, codes in allowed.items()
+            }
+            driver = min(sizes, key=sizes.get)
+            if len(allowed[driver]) == 1:
+                candidates: Sequence[int] = idx.postings[driver][next(iter(allowed[driver]))]
+            else:
+                candidates = sorted(r for c in allowed[driver] for r in idx.postings[driver][c])
+            others = [(idx.codes[f], codes) for f, codes in allowed.items() if f != driver]
+            if others:
+                candidates = [r for r in candidates if all(col[r] in codes for col, codes in others)]
+        else:
+            candidates = range(len(idx))
+
+        lo_sec = self._boundary_sec(flt.desde, idx.day, 0)
+        hi_sec = self._boundary_sec(flt.hasta, idx.day, 86399)
+        if lo_sec > 0 or hi_sec < 86399:
+            secs = idx.secs
+            candidates = [r for r in candidates if lo_sec <= secs[r] <= hi_sec]
+
+        if flt.search and flt.search.strip():
+            try:
+                candidates = self._search_rows(idx, path, candidates, flt.search.strip())
+            except OSError:
+                return ()
+        return candidates
+
+    @staticmethod
+    def _search_rows(idx: _DayIndex, path: Path, candidates: Sequence[int], text: str) -> List[int]:
+        """Candidate rows (ascending) whose raw text contains `text` (caseless), read chunk by chunk."""
+        # bytes.lower() only folds ASCII, which is enough for an ASCII needle (UTF-8
+        # multi-byte sequences hold no ASCII bytes); otherwise rows are decoded.
+        ascii_needle = text.isascii()
+        needle_bytes = text.lower().encode("ascii") if ascii_needle else b""
+        needle = text.casefold()
+        found: List[int] = []
+        with path.open("rb") as fh:
+            first = 0
+            while first < len(candidates):
+                chunk_start, chunk_end = idx.row_span(candidates[first])
+                last = first + 1
+                while last < len(candidates):
+                    start, end = idx.row_span(candidates[last])
+                    if start - chunk_end > _SEARCH_GAP_BYTES or end - chunk_start > _SEARCH_CHUNK_BYTES:
+                        break
+                    chunk_end = end
+                    last += 1
+                fh.seek(chunk_start)
+                data = fh.read(chunk_end - chunk_start)
+                if ascii_needle:
+                    data = data.lower()
+                for r in candidates[first:last]:
+                    start, end = idx.row_span(r)
+                    if ascii_needle:
+                        hit = data.find(needle_bytes, start - chunk_start, end - chunk_start) >= 0
+                    else:
+                        row = data[start - chunk_start:end - chunk_start].decode("utf-8", errors="replace")
+                        hit = needle in row.casefold()
+                    if hit:
+                        found.append(r)
+                first = last
+        return found
+
+    @staticmethod
+    def _boundary_sec(value: Optional[datetime], day: date, default: int) -> int:
+        if value is None or value.date() != day:
+            return default
+        return value.hour * 3600 + value.minute * 60 + value.second
+
+    # -- ordering / paging ------------------------------------------------
+
+    @staticmethod
+    def _chronological_slice(
+        matches: List[Tuple[_DayIndex, Sequence[int]]],
+        ascending: bool,
+        offset: int,
+        limit: int,
+    ) -> List[Tuple[_DayIndex, int]]:
+        ordered = matches if ascending else list(reversed(matches))
+        page: List[Tuple[_DayIndex, int]] = []
+        skip = offset
+        for idx, rows in ordered:
+            if skip >= len(rows):
+                skip -= len(rows)
+                continue
+            seq = rows if ascending else rows[::-1]
+            for r in seq[skip:skip + (limit - len(page))]:
+                page.append((idx, r))
+            skip = 0
+            if len(page) >= limit:
+                break
+        return page
+
+    @staticmethod
+    def _sorted_slice(
+        matches: List[Tuple[_DayIndex, Sequence[int]]],
+        sort_spec: Sequence[Tuple[str, str]],
+        offset: int,
+        limit: int,
+    ) -> List[Tuple[_DayIndex, int]]:
+        items = [(idx, r) for idx, rows in reversed(matches) for r in reversed(rows)]
+
+        def key_for(field_name: str) -> Callable[[Tuple[_DayIndex, int]], Any]:
+            if field_name in ("id", "fecha_hora"):
+                return lambda it: (it[0].day, it[1])
+            if field_name == "id_usuario":
+                return lambda it: ActivityLogIndex._user_sort_key(it[0].value("id_usuario", it[1]))
+            return lambda it: it[0].value(field_name, it[1]).lower()
+
+        # Stable sorts applied from the last key to the first; ties stay newest first.
+        for field_name, direction in reversed(list(sort_spec)):
+            items.sort(key=key_for(field_name), reverse=direction == "desc")
+        return items[offset:offset + limit]
+
+    @staticmethod
+    def _user_sort_key(value: str) -> Tuple[int, int, str]:
+        """Numeric ids in numeric order; empty first, other text after the numbers."""
+        raw = value.strip()
+        if raw.lstrip("-").isdigit():
+            return (0, int(raw), "")
+        return (-1, 0, "") if not raw else (1, 0, raw.lower())
+
+    def _read_rows(self, page: Sequence[Tuple[_DayIndex, int]]) -> List[Dict[str, Any]]:
+        result: List[Dict[str, Any]] = []
+        handles: Dict[date, Any] = {}
+        try:
+            for idx, r in page:
+                fh = handles.get(idx.day)
+                if fh is None:
+                    path = self.logs_dir / f"activity_{idx.day.isoformat()}.txt"
+                    fh = handles[idx.day] = path.open("rb")
+                start, end = idx.row_span(r)
+                fh.seek(start)
+                raw = fh.read(end - start).decode("utf-8", errors="replace")
+                fields = next(csv.reader(io.StringIO(raw)), [])
+                result.append(self._convert_row(dict(zip(idx.columns or self.columns, fields))))
+        finally:
+            for fh in handles.values():
+                fh.close()
+        return result
+
+    @staticmethod
+    def _convert_row(row: Dict[str, Any]) -> Dict[str, Any]:
+        for key in ("id", "id_usuario", "id_entidad"):
+            raw = str(row.get(key) or "").strip()
+            row[key] = int(raw) if raw.lstrip("-").isdigit() else None
+        try:
+            row["fecha_hora"] = datetime.fromisoformat(str(row.get("fecha_hora") or ""))
+        except ValueError:
+            row["fecha_hora"] = None
+        return row
@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import csv
+import logging
+import threading
+import time
+from collections import deque
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Optional, Sequence, TextIO, Tuple
+
+logger = logging.getLogger(__name__)
+
+PathForDay = Callable[[date], Path]
+
+
+class ActivityLogWriter:
+    """
+    Background writer for the daily activity CSV files.
+
+    Callers only append to a bounded in-memory queue; a single thread drains
+    it in groups (every `flush_rows` rows or `flush_interval` seconds), keeps
+    the current day's file open and rotates it when rows roll over to a new
+    date. When the queue is full, non-critical rows are dropped immediately
+    and critical ones wait up to `block_timeout` seconds for room.
+    """
+
+    def __init__(
+        self,
+        path_for_day: PathForDay,
+        columns: Sequence[str],
+        *,
+        max_queue: int = 10_000,
+        flush_rows: int = 200,
+        flush_interval: float = 0.25,
+        block_timeout: float = 0.5,
+        on_batch_written: Optional[Callable[[Sequence[Path]], None]] = None,
+    ) -> None:
+        self.path_for_day = path_for_day
+        self.columns = list(columns)
+        self.max_queue = max(1, int(max_queue))
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_interval = max(0.01, float(flush_interval))
+        self.block_timeout = max(0.0, float(block_timeout))
+        self.on_batch_written = on_batch_written
+        self._queue: Deque[Tuple[int, Dict[str, Any]]] = deque()
+        self._cond = threading.Condition()
+        self._submitted_seq = 0
+        self._written_seq = 0
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._fh: Optional[TextIO] = None
+        self._fh_day: Optional[date] = None
+        self._writer: Any = None
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        with self._cond:
+            if self._thread and self._thread.is_alive():
+                return
+            self._closed = False
+            self._thread = threading.Thread(target=self._run, name="activity-log-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, row: Dict[str, Any], *, critical: bool = False) -> bool:
+        """Queue one row (`fecha_hora` in ISO format). Returns False if it was dropped."""
+        with self._cond:
+            if self._closed:
+                return False
+            if len(self._queue) >= self.max_queue:
+                if critical and self.block_timeout > 0:
+                    deadline = time.monotonic() + self.block_timeout
+                    while len(self._queue) >= self.max_queue and not self._closed:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+                if len(self._queue) >= self.max_queue or self._closed:
+                    self.dropped += 1
+                    return False
+            self._submitted_seq += 1
+            self._queue.append((self._submitted_seq, row))
+            if len(self._queue) >= self.flush_rows:
+                self._cond.notify_all()
+            return True
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Block until every row submitted so far is on disk (or `timeout` expires)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            target = self._submitted_seq
+            self._cond.notify_all()
+            while self._written_seq < target:
+                if self._thread is None or not self._thread.is_alive():
+                    return False
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write what is queued, then stop the thread and close the file."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout)
+        self._thread = None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            return {
+                "queued": len(self._queue),
+                "max_queue": self.max_queue,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+            }
+
+    def _run(self) -> None:
+        try:
+            while True:
+                with self._cond:
+                    deadline = time.monotonic() + self.flush_interval
+                    while not self._closed and len(self._queue) < self.flush_rows:
+                        if self._submitted_seq > self._written_seq and time.monotonic() >= deadline:
+                            break
+                        self._cond.wait(max(0.0, deadline - time.monotonic()) or self.flush_interval)
+                    batch = list(self._queue)
+                    self._queue.clear()
+                    closing = self._closed
+                    # Room was freed: wake critical producers waiting on a full queue.
+                    self._cond.notify_all()
+
+                if batch:
+                    self._write_batch(batch)
+                    with self._cond:
+                        self._written_seq = batch[-1][0]
+                        self._cond.notify_all()
+                if closing:
+                    with self._cond:
+                        if not self._queue:
+                            break
+        finally:
+            self._close_file()
+
+    def _write_batch(self, batch: Sequence[Tuple[int, Dict[str, Any]]]) -> None:
+        days = set()
+        for _, row in batch:
+            try:
+                day = self._row_day(row)
+                self._writer_for(day).writerow(row)
+                days.add(day)
+                self.written += 1
+            except Exception:
+                self.failed += 1
+                logger.exception(
+                    "Error writing activity file log (entidad=%s, accion=%s)",
+                    row.get("entidad"),
+                    row.get("accion"),
+                )
+                self._close_file()
+        try:
+            if self._fh:
+                self._fh.flush()
+        except Exception:
+            logger.exception("Error flushing activity file log")
+            self._close_file()
+        if self.on_batch_written and days:
+            try:
+                self.on_batch_written([self.path_for_day(day) for day in sorted(days)])
+            except Exception:
+                logger.exception("Activity log batch callback failed")
+
+    @staticmethod
+    def _row_day(row: Dict[str, Any]) -> date:
+        try:
+            return datetime.fromisoformat(str(row.get("fecha_hora") or "")).date()
+        except ValueError:
+            return date.today()
+
+    def _writer_for(self, day: date) -> Any:
+        if self._fh is not None and self._fh_day == day:
+            return self._writer
+        self._close_file()
+        path = self.path_for_day(day)
+        fh = path.open("a", encoding="utf-8", newline="")
+        writer = csv.DictWriter(fh, fieldnames=self.columns, delimiter=",")
+        if fh.tell() == 0:
+            writer.writeheader()
+        self._fh, self._fh_day, self._writer = fh, day, writer
+        return writer
+
+    def _close_file(self) -> None:
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            except Exception:
+                pass
+        self._fh, self._fh_day, self._writer = None, None, None
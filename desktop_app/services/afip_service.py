@@ -10,7 +10,8 @@ import xml.etree.ElementTree as ET
 from dataclasses import dataclass
 from decimal import Decimal, ROUND_HALF_UP
 from pathlib import Path
-from typing import Any, Dict, Optional
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 
 import requests
 import ssl
@@ -25,6 +26,9 @@ WSAA_WSDL_PROD = "https://wsaa.afip.gov.ar/ws/services/LoginCms?WSDL"
 WSFE_WSDL_HOMO = "https://wswhomo.afip.gov.ar/wsfev1/service.asmx?WSDL"
 WSFE_WSDL_PROD = "https://servicios1.afip.gov.ar/wsfev1/service.asmx?WSDL"
 
+# Vouchers per FECAESolicitar when FECompTotXRequest is not available
+DEFAULT_LOT_SIZE = 250
+
 logger = logging.getLogger(__name__)
 
 
@@ -121,9 +125,21 @@ class AfipService:
         env["MSYS_NO_PATHCONV"] = "1"
         return env
 
-    def __init__(self, cuit: str, cert_path: str, key_path: str, production: bool = False):
+    def __init__(
+        self,
+        cuit: str,
+        cert_path: str,
+        key_path: str,
+        production: bool = False,
+        wsfe_wsdl: Optional[str] = None,
+        wsaa_wsdl: Optional[str] = None,
+        token_provider: Optional[Callable[[], AfipToken]] = None,
+    ):
         """
         Direct AFIP WSAA + WSFEv1 integration (no SDK).
+        `wsfe_wsdl` / `wsaa_wsdl` override the endpoints (e.g. a local stand-in
+        server). `token_provider` supplies the access ticket instead of signing
+        a TRA with openssl and calling WSAA (the TA cache file is not used).
         """
         self.cuit = "".join(ch for ch in str(cuit) if ch.isdigit())
         self.cert_path = cert_path
@@ -136,6 +152,10 @@ class AfipService:
         self._condicion_map: Optional[Dict[str, int]] = None
         self._det_field_names: Optional[set] = None
         self._ta_cache_path: Optional[Path] = None
+        self._wsfe_wsdl_override = wsfe_wsdl
+        self._wsaa_wsdl_override = wsaa_wsdl
+        self._token_provider = token_provider
+        self._max_lot_size: Optional[int] = None
 
         self._session = requests.Session()
         adapter = SecureAfipSslAdapter(production=self.production)
@@ -146,9 +166,13 @@ class AfipService:
         self._openssl_path = self._find_openssl()
 
     def _wsaa_wsdl(self) -> str:
+        if self._wsaa_wsdl_override:
+            return self._wsaa_wsdl_override
         return WSAA_WSDL_PROD if self.production else WSAA_WSDL_HOMO
 
     def _wsfe_wsdl(self) -> str:
+        if self._wsfe_wsdl_override:
+            return self._wsfe_wsdl_override
         return WSFE_WSDL_PROD if self.production else WSFE_WSDL_HOMO
 
     def _get_wsaa_client(self) -> Client:
@@ -285,6 +309,9 @@ class AfipService:
         now = dt.datetime.utcnow()
         if self._token and self._token.expires_at > (now + dt.timedelta(minutes=1)):
             return self._token
+        if self._token_provider is not None:
+            self._token = self._token_provider()
+            return self._token
         cached = self._load_cached_token()
         if cached:
             return cached
@@ -321,30 +348,53 @@ class AfipService:
 
     def get_last_voucher_number(self, punto_venta: int, tipo_comprobante: int) -> int:
         try:
-            client = self._get_wsfe_client()
-            auth = self._auth()
-            last = client.service.FECompUltimoAutorizado(
-                Auth=auth,
-                PtoVta=int(punto_venta),
-                CbteTipo=int(tipo_comprobante),
-            )
-            if isinstance(last, int):
-                return last
-            payload = serialize_object(last)
-            if isinstance(payload, dict):
-                for key in ("CbteNro", "cbteNro"):
-                    if key in payload:
-                        return int(payload.get(key) or 0)
-                nested = payload.get("FECompUltimoAutorizadoResult")
-                if isinstance(nested, dict):
-                    for key in ("CbteNro", "cbteNro"):
-                        if key in nested:
-                            return int(nested.get(key) or 0)
-            return 0
+            return self._fetch_last_voucher_number(punto_venta, tipo_comprobante)
         except Exception as e:
             logger.error("Error obteniendo ultimo comprobante", exc_info=e)
             return 0
 
+    def _fetch_last_voucher_number(self, punto_venta: int, tipo_comprobante: int) -> int:
+        client = self._get_wsfe_client()
+        auth = self._auth()
+        last = client.service.FECompUltimoAutorizado(
+            Auth=auth,
+            PtoVta=int(punto_venta),
+            CbteTipo=int(tipo_comprobante),
+        )
+        if isinstance(last, int):
+            return last
+        payload = serialize_object(last)
+        if isinstance(payload, dict):
+            errors_msg = self._format_errors(payload.get("Errors"))
+            if errors_msg:
+                raise RuntimeError(errors_msg)
+            for key in ("CbteNro", "cbteNro"):
+                if key in payload:
+                    return int(payload.get(key) or 0)
+            nested = payload.get("FECompUltimoAutorizadoResult")
+            if isinstance(nested, dict):
+                for key in ("CbteNro", "cbteNro"):
+                    if key in nested:
+                        return int(nested.get(key) or 0)
+        return 0
+
+    def get_max_lot_size(self) -> int:
+        """Vouchers accepted per FECAESolicitar (FECompTotXRequest), cached per instance."""
+        if self._max_lot_size is not None:
+            return self._max_lot_size
+        size = 0
+        try:
+            client = self._get_wsfe_client()
+            res = client.service.FECompTotXRequest(Auth=self._auth())
+            payload = serialize_object(res)
+            if isinstance(payload, dict):
+                size = int(payload.get("RegXReq") or 0)
+        except Exception as e:
+            logger.warning("No se pudo obtener la cantidad de comprobantes por lote", exc_info=e)
+            return DEFAULT_LOT_SIZE
+        self._max_lot_size = size if size > 0 else DEFAULT_LOT_SIZE
+        return self._max_lot_size
+
     def authorize_invoice(self, data: Dict[str, Any]) -> Dict[str, Any]:
         if not data:
             return {"success": False, "error": "Datos de factura incompletos"}
@@ -362,27 +412,144 @@ class AfipService:
         if errors_msg:
             return {"success": False, "error": errors_msg}
 
+        det_list = self._det_responses(payload)
+        if not det_list:
+            return {"success": False, "error": "Respuesta AFIP invalida"}
+        return self._det_result(det_list[0])
+
+    def authorize_invoices(
+        self,
+        vouchers: Sequence[Dict[str, Any]],
+        max_lot_size: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Authorize several vouchers with lot requests (several FECAEDetRequest per
+        FECAESolicitar). Vouchers are grouped by PtoVta/CbteTipo keeping their order;
+        each group fetches FECompUltimoAutorizado once and is numbered from there
+        (CbteDesde/CbteHasta/CantReg of the input are ignored), in lots of up to
+        `max_lot_size` (FECompTotXRequest by default).
+
+        Returns one result per voucher, in input order: the keys of authorize_invoice
+        plus PtoVta, CbteTipo and CbteNro (the number sent).
+        """
+        results: List[Dict[str, Any]] = [{} for _ in vouchers]
+        groups: Dict[Tuple[int, int], List[int]] = {}
+        for idx, data in enumerate(vouchers):
+            try:
+                key = (int(data.get("PtoVta")), int(data.get("CbteTipo")))
+            except (AttributeError, TypeError, ValueError):
+                results[idx] = {"success": False, "error": "Datos de factura incompletos"}
+                continue
+            groups.setdefault(key, []).append(idx)
+        if not groups:
+            return results
+
+        lot_size = max(1, int(max_lot_size or self.get_max_lot_size()))
+        for (pto_vta, cbte_tipo), indexes in groups.items():
+            # (index, already retried)
+            queue = deque((idx, False) for idx in indexes)
+            last: Optional[int] = None
+            while queue:
+                if last is None:
+                    try:
+                        last = self._fetch_last_voucher_number(pto_vta, cbte_tipo)
+                    except Exception as exc:
+                        error = f"No se pudo obtener el ultimo comprobante autorizado: {exc}"
+                        for idx, _ in queue:
+                            results[idx] = {
+                                "success": False, "error": error,
+                                "PtoVta": pto_vta, "CbteTipo": cbte_tipo, "CbteNro": None,
+                            }
+                        break
+
+                lot = [queue.popleft() for _ in range(min(lot_size, len(queue)))]
+                numbered = [
+                    {**vouchers[idx], "CbteDesde": last + n, "CbteHasta": last + n}
+                    for n, (idx, _) in enumerate(lot, 1)
+                ]
+                lot_results, lot_failed = self._request_lot(numbered)
+                for (idx, _), res in zip(lot, lot_results):
+                    results[idx] = res
+
+                first_rejected = next((n for n, res in enumerate(lot_results) if not res.get("success")), None)
+                if first_rejected is None:
+                    last += len(lot)
+                    continue
+                # A rejected voucher takes no number, so the ones after it were out of
+                # sequence: ask AFIP for the last number again and retry those once
+                last = None
+                if not lot_failed:
+                    retry = [
+                        (idx, True)
+                        for n, (idx, retried) in enumerate(lot)
+                        if n > first_rejected and not retried and not lot_results[n].get("success")
+                    ]
+                    queue.extendleft(reversed(retry))
+        return results
+
+    def _request_lot(self, vouchers: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], bool]:
+        """One FECAESolicitar for numbered vouchers of one PtoVta/CbteTipo: (results, whole lot failed)."""
+        base = [
+            {"PtoVta": int(v.get("PtoVta")), "CbteTipo": int(v.get("CbteTipo")), "CbteNro": int(v.get("CbteDesde"))}
+            for v in vouchers
+        ]
+        try:
+            client = self._get_wsfe_client()
+            auth = self._auth()
+            request = self._build_lot_request(vouchers)
+            result = client.service.FECAESolicitar(Auth=auth, FeCAEReq=request)
+            payload = serialize_object(result)
+        except Exception as exc:
+            return [{**b, "success": False, "error": str(exc)} for b in base], True
+
+        errors_msg = self._format_errors(payload.get("Errors"))
+        det_list = self._det_responses(payload)
+        if not det_list:
+            error = errors_msg or "Respuesta AFIP invalida"
+            return [{**b, "success": False, "error": error} for b in base], True
+
+        by_number: Dict[int, Dict[str, Any]] = {}
+        for det in det_list:
+            try:
+                by_number[int(det.get("CbteDesde"))] = det
+            except (TypeError, ValueError):
+                continue
+        return [{**b, **self._det_result(by_number.get(b["CbteNro"]), errors_msg)} for b in base], False
+
+    def _det_responses(self, payload: Any) -> List[Dict[str, Any]]:
+        if not isinstance(payload, dict):
+            return []
         det_resp = payload.get("FeDetResp") or {}
         det_list = det_resp.get("FECAEDetResponse") if isinstance(det_resp, dict) else None
         if isinstance(det_list, dict):
             det_list = [det_list]
-        if not det_list:
-            return {"success": False, "error": "Respuesta AFIP invalida"}
+        return [det for det in det_list or [] if isinstance(det, dict)]
 
-        det = det_list[0]
+    def _det_result(self, det: Optional[Dict[str, Any]], fallback_error: str = "") -> Dict[str, Any]:
+        if not det:
+            return {"success": False, "error": fallback_error or "AFIP no devolvio resultado para el comprobante"}
         if det.get("Resultado") == "A" and det.get("CAE"):
             return {"success": True, "CAE": det.get("CAE"), "CAEFchVto": det.get("CAEFchVto")}
 
         obs_msg = self._format_errors(det.get("Observaciones"))
-        return {"success": False, "error": obs_msg or "AFIP rechazo la solicitud"}
+        return {"success": False, "error": obs_msg or fallback_error or "AFIP rechazo la solicitud"}
 
     def _build_fe_caereq(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return self._build_lot_request([data], cant_reg=int(data.get("CantReg", 1)))
+
+    def _build_lot_request(self, vouchers: Sequence[Dict[str, Any]], cant_reg: Optional[int] = None) -> Dict[str, Any]:
+        first = vouchers[0]
         cab = {
-            "CantReg": int(data.get("CantReg", 1)),
-            "PtoVta": int(data.get("PtoVta")),
-            "CbteTipo": int(data.get("CbteTipo")),
+            "CantReg": len(vouchers) if cant_reg is None else cant_reg,
+            "PtoVta": int(first.get("PtoVta")),
+            "CbteTipo": int(first.get("CbteTipo")),
+        }
+        return {
+            "FeCabReq": cab,
+            "FeDetReq": {"FECAEDetRequest": [self._build_fe_det(data) for data in vouchers]},
         }
 
+    def _build_fe_det(self, data: Dict[str, Any]) -> Dict[str, Any]:
         det: Dict[str, Any] = {
             "Concepto": int(data.get("Concepto", 1)),
             "DocTipo": int(data.get("DocTipo", 99)),
@@ -410,10 +577,7 @@ class AfipService:
             if field_name:
                 det[field_name] = int(cond_id)
 
-        return {
-            "FeCabReq": cab,
-            "FeDetReq": {"FECAEDetRequest": [det]},
-        }
+        return det
 
     def get_condicion_iva_receptor_id(self, name: str) -> Optional[int]:
         if not name:
@@ -2,6 +2,11 @@ from __future__ import annotations
 
 from typing import Any
 
+try:
+    from desktop_app.services.pricing_engine import round_price
+except ImportError:
+    from services.pricing_engine import round_price  # type: ignore
+
 
 def normalize_price_tipo(tipo: Any) -> str:
     raw = str(tipo or "").strip().upper()
@@ -10,7 +15,7 @@ def normalize_price_tipo(tipo: Any) -> str:
     return "MARGEN"
 
 
-def calc_price_from_cost_pct(cost: Any, pct: Any, tipo: Any) -> float:
+def calc_price_from_cost_pct(cost: Any, pct: Any, tipo: Any, redondeo: Any = False) -> float:
     try:
         safe_cost = max(0.0, float(cost or 0))
     except Exception:
@@ -21,8 +26,11 @@ def calc_price_from_cost_pct(cost: Any, pct: Any, tipo: Any) -> float:
         safe_pct = 0.0
 
     if normalize_price_tipo(tipo) == "DESCUENTO":
-        return max(0.0, safe_cost * (1 - (safe_pct / 100.0)))
-    return max(0.0, safe_cost * (1 + (safe_pct / 100.0)))
+        price = max(0.0, safe_cost * (1 - (safe_pct / 100.0)))
+    else:
+        price = max(0.0, safe_cost * (1 + (safe_pct / 100.0)))
+    # Same rounding the database applies when recomputing the lists (pricing_engine)
+    return round_price(price, redondeo)
 
 
 def calc_pct_from_cost_price(cost: Any, price: Any, tipo: Any) -> float:
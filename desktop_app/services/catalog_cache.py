@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Sequence, Set, Tuple
+
+
+class CatalogCache:
+    """
+    Thread-safe, size-bounded (LRU) cache for small catalog queries.
+
+    Every entry records the tables it was read from so it can be dropped when
+    one of them changes (see `invalidate_tables`, fed by LISTEN/NOTIFY). The
+    TTL is only a safety net for when change notifications are unavailable;
+    `ttl=None` keeps entries until they are invalidated or evicted.
+    """
+
+    def __init__(self, max_entries: int = 64, ttl: Optional[float] = 300.0) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._entries: "OrderedDict[str, Tuple[float, Any, Tuple[str, ...]]]" = OrderedDict()
+        # Bumped on every invalidation so a load that raced with a change is not stored.
+        self._generations: Dict[str, int] = {}
+        self._global_generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _normalize_table(table: str) -> str:
+        return str(table or "").strip().lower()
+
+    def _snapshot(self, tables: Sequence[str]) -> Tuple[int, Tuple[int, ...]]:
+        return self._global_generation, tuple(self._generations.get(t, 0) for t in tables)
+
+    def get_or_load(self, key: str, loader: Callable[[], Any], tables: Iterable[str] = ()) -> Any:
+        """Return the cached value for `key`, calling `loader` (outside the lock) on a miss."""
+        norm_tables = tuple(self._normalize_table(t) for t in tables if t)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value, _ = entry
+                if self.ttl is None or now - stored_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+            snapshot = self._snapshot(norm_tables)
+
+        value = loader()
+
+        with self._lock:
+            if self._snapshot(norm_tables) == snapshot:
+                self._entries[key] = (time.monotonic(), value, norm_tables)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Drop one entry, or everything when `key` is None."""
+        with self._lock:
+            self.invalidations += 1
+            if key is None:
+                self._entries.clear()
+                self._global_generation += 1
+            else:
+                self._entries.pop(key, None)
+
+    def invalidate_tables(self, tables: Iterable[str]) -> int:
+        """Drop every entry that depends on any of `tables`. Returns the number dropped."""
+        changed: Set[str] = {self._normalize_table(t) for t in tables if t}
+        if not changed:
+            return 0
+        with self._lock:
+            self.invalidations += 1
+            for table in changed:
+                self._generations[table] = self._generations.get(table, 0) + 1
+            stale = [k for k, (_, _, deps) in self._entries.items() if changed.intersection(deps)]
+            for k in stale:
+                del self._entries[k]
+            return len(stale)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "ttl": self.ttl,
+            }
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Callable, Optional, Sequence
+
+import psycopg
+
+logger = logging.getLogger(__name__)
+
+NotifyCallback = Callable[[str, str], None]
+StateCallback = Callable[[bool], None]
+
+
+class ChangeListener:
+    """
+    Dedicated background connection that LISTENs on a set of channels and
+    forwards every NOTIFY (channel, payload) to `on_notify`.
+
+    The connection is reopened after network blips; `on_state(False)` is
+    reported when it drops and `on_state(True)` once it is listening again,
+    so callers can treat the gap as "anything may have changed".
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        channels: Sequence[str],
+        on_notify: NotifyCallback,
+        *,
+        on_state: Optional[StateCallback] = None,
+        reconnect_delay: float = 5.0,
+        poll_timeout: float = 1.0,
+    ) -> None:
+        self.dsn = dsn
+        self.channels = [str(ch) for ch in channels if ch]
+        self.on_notify = on_notify
+        self.on_state = on_state
+        self.reconnect_delay = reconnect_delay
+        self.poll_timeout = poll_timeout
+        self.connected = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="db-change-listener", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 2.0) -> None:
+        self._stop.set()
+        thread = self._thread
+        if thread and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout)
+        self._thread = None
+
+    def _set_state(self, connected: bool) -> None:
+        if self.connected == connected:
+            return
+        self.connected = connected
+        if self.on_state:
+            try:
+                self.on_state(connected)
+            except Exception:
+                logger.exception("Change listener state callback failed")
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(self.dsn, autocommit=True) as conn:
+                    for channel in self.channels:
+                        conn.execute(f'LISTEN "{channel}"')
+                    self._set_state(True)
+                    while not self._stop.is_set():
+                        for notify in conn.notifies(timeout=self.poll_timeout):
+                            try:
+                                self.on_notify(notify.channel, notify.payload or "")
+                            except Exception:
+                                logger.exception("Change listener callback failed (channel=%s)", notify.channel)
+            except Exception as exc:
+                if not self._stop.is_set():
+                    logger.warning("Change listener disconnected: %s", exc)
+            self._set_state(False)
+            self._stop.wait(self.reconnect_delay)
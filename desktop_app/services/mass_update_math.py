@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+from typing import Any, List, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional: same results, computed per element
+    np = None  # type: ignore[assignment]
+
+
+def to_floats(values: Sequence[Any]) -> List[float]:
+    """Values as floats; None, empty and non-numeric values count as 0."""
+    out: List[float] = []
+    for value in values:
+        try:
+            out.append(float(value or 0))
+        except (TypeError, ValueError):
+            out.append(0.0)
+    return out
+
+
+def apply_operation(values: Sequence[Any], operation: str, value: Any) -> List[float]:
+    """
+    New values after a mass update operation, floored at 0 (same as
+    Database._apply_mass_update_operation / `GREATEST(0, ...)` in SQL).
+    """
+    try:
+        op_value = float(value or 0)
+    except (TypeError, ValueError):
+        op_value = 0.0
+    current = to_floats(values)
+    if np is not None:
+        arr = np.asarray(current, dtype=float)
+        if operation == "PCT_ADD":
+            arr = arr * (1 + op_value / 100.0)
+        elif operation == "PCT_SUB":
+            arr = arr * (1 - op_value / 100.0)
+        elif operation == "AMT_ADD":
+            arr = arr + op_value
+        elif operation == "AMT_SUB":
+            arr = arr - op_value
+        elif operation == "SET_VAL":
+            arr = np.full(arr.shape, op_value)
+        return np.maximum(arr, 0.0).tolist()
+
+    result: List[float] = []
+    for cur in current:
+        if operation == "PCT_ADD":
+            new_val = cur * (1 + op_value / 100.0)
+        elif operation == "PCT_SUB":
+            new_val = cur * (1 - op_value / 100.0)
+        elif operation == "AMT_ADD":
+            new_val = cur + op_value
+        elif operation == "AMT_SUB":
+            new_val = cur - op_value
+        elif operation == "SET_VAL":
+            new_val = op_value
+        else:
+            new_val = cur
+        result.append(max(0.0, new_val))
+    return result
+
+
+def diff_pcts(current: Sequence[float], new: Sequence[float]) -> List[float]:
+    """Percent change from `current` to `new`; 0 where the current value is not positive."""
+    if np is not None:
+        cur = np.asarray(current, dtype=float)
+        new_arr = np.asarray(new, dtype=float)
+        safe = np.where(cur > 0, cur, 1.0)
+        return np.where(cur > 0, (new_arr - cur) / safe * 100.0, 0.0).tolist()
+    return [((n - c) / c) * 100.0 if c > 0 else 0.0 for c, n in zip(current, new)]
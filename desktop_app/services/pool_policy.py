@@ -0,0 +1,152 @@
+from __future__ import annotations
+
+import inspect
+import logging
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PoolPolicy:
+    """
+    Connection budget and pool settings of one terminal.
+
+    `max_size` is the total number of server connections the terminal may
+    hold. The sync pool owns all of it until an async pool is opened; the
+    async pool then borrows up to `async_max` of them and the sync pool is
+    shrunk by the same amount (see Database.reserve_async_connections).
+
+    Connections idle for more than `check_idle` seconds are health-checked
+    on checkout, so a connection broken by a network blip is replaced
+    instead of failing the caller's query.
+    """
+
+    min_size: int = 1
+    max_size: int = 4
+    async_max: int = 1
+    timeout: float = 30.0
+    max_idle: float = 600.0
+    max_lifetime: float = 3600.0
+    check: bool = True
+    check_idle: float = 30.0
+
+    def __post_init__(self) -> None:
+        max_size = max(1, int(self.max_size))
+        object.__setattr__(self, "max_size", max_size)
+        object.__setattr__(self, "min_size", min(max(1, int(self.min_size)), max_size))
+        # At least one connection always stays with the sync pool
+        object.__setattr__(self, "async_max", min(max(0, int(self.async_max)), max_size - 1))
+
+    def sync_sizes(self, async_reserved: int = 0) -> tuple:
+        max_size = max(1, self.max_size - max(0, async_reserved))
+        return min(self.min_size, max_size), max_size
+
+    def pool_kwargs(
+        self,
+        pool_cls: Any,
+        *,
+        name: str,
+        checker: Optional["IdleChecker"] = None,
+        configure: Optional[Callable[[Any], Any]] = None,
+    ) -> Dict[str, Any]:
+        """Constructor options for `pool_cls`, limited to the ones the installed psycopg_pool accepts."""
+        wanted: Dict[str, Any] = {
+            "name": name,
+            "timeout": float(self.timeout),
+            "max_idle": float(self.max_idle),
+            "max_lifetime": float(self.max_lifetime),
+        }
+        if checker is not None and hasattr(pool_cls, "check_connection"):
+            wanted["check"] = checker.check
+            wanted["reset"] = checker.reset
+        if configure is not None:
+            wanted["configure"] = configure
+        try:
+            accepted = inspect.signature(pool_cls).parameters
+        except (TypeError, ValueError):
+            return {}
+        if any(param.kind is inspect.Parameter.VAR_KEYWORD for param in accepted.values()):
+            return wanted
+        return {key: value for key, value in wanted.items() if key in accepted}
+
+
+class IdleChecker:
+    """
+    `check`/`reset` callbacks for a psycopg pool: a connection is verified on
+    checkout only when it sat in the pool longer than `idle_seconds`.
+    """
+
+    def __init__(self, pool_cls: Any, idle_seconds: float) -> None:
+        self._check_connection = getattr(pool_cls, "check_connection", None)
+        self.idle_seconds = max(0.0, float(idle_seconds))
+        self._returned_at: "weakref.WeakKeyDictionary[Any, float]" = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.discarded = 0
+
+    def _is_stale(self, conn: Any) -> bool:
+        with self._lock:
+            returned_at = self._returned_at.get(conn)
+        return returned_at is None or time.monotonic() - returned_at >= self.idle_seconds
+
+    def check(self, conn: Any) -> Any:
+        if self._check_connection is None or not self._is_stale(conn):
+            return None
+        self.checks += 1
+        try:
+            return self._check_connection(conn)
+        except Exception:
+            # The pool discards the connection and hands out another one
+            self.discarded += 1
+            raise
+
+    def reset(self, conn: Any) -> None:
+        with self._lock:
+            self._returned_at[conn] = time.monotonic()
+
+    def stats(self) -> Dict[str, int]:
+        return {"checks": self.checks, "discarded": self.discarded}
+
+
+class AsyncIdleChecker(IdleChecker):
+    """IdleChecker for AsyncConnectionPool (async callbacks)."""
+
+    async def check(self, conn: Any) -> Any:  # type: ignore[override]
+        if self._check_connection is None or not self._is_stale(conn):
+            return None
+        self.checks += 1
+        try:
+            return await self._check_connection(conn)
+        except Exception:
+            self.discarded += 1
+            raise
+
+    async def reset(self, conn: Any) -> None:  # type: ignore[override]
+        IdleChecker.reset(self, conn)
+
+
+def pool_stats(pool: Any) -> Dict[str, Any]:
+    """psycopg_pool counters plus in-use/saturation figures (empty when unavailable)."""
+    get_stats = getattr(pool, "get_stats", None)
+    if get_stats is None:
+        return {}
+    try:
+        stats = dict(get_stats())
+    except Exception:
+        logger.debug("Could not read pool stats", exc_info=True)
+        return {}
+    size = int(stats.get("pool_size", 0) or 0)
+    available = int(stats.get("pool_available", 0) or 0)
+    max_size = int(stats.get("pool_max", getattr(pool, "max_size", 0)) or 0)
+    in_use = max(0, size - available)
+    stats["in_use"] = in_use
+    stats["saturation_pct"] = round(100.0 * in_use / max_size, 1) if max_size else 0.0
+    queued = int(stats.get("requests_queued", 0) or 0)
+    wait_ms = float(stats.get("requests_wait_ms", 0) or 0)
+    stats["avg_queued_wait_ms"] = round(wait_ms / queued, 2) if queued else 0.0
+    return stats
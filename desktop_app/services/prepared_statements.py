@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Any, Dict, Mapping, Optional, Sequence
+
+try:
+    from desktop_app.services.query_plan import FETCH_ALL, Query
+except ImportError:
+    from services.query_plan import FETCH_ALL, Query  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+
+class PreparedStatements:
+    """
+    Registry of the hot lookups that are always sent as server-side prepared
+    statements (`execute(..., prepare=True)`), by name.
+
+    The first call on each pooled connection prepares the statement; later
+    calls only send Bind/Execute with the parameters, so the server skips
+    parse and planning. Every other query is prepared by psycopg after
+    `threshold` executions on the same connection (`prepare_threshold`).
+
+    `enabled=False` disables both (needed behind PgBouncer in transaction
+    mode, where a prepared statement may live on another server connection).
+    """
+
+    def __init__(
+        self,
+        statements: Mapping[str, str],
+        *,
+        enabled: bool = True,
+        threshold: int = 5,
+        max_prepared: int = 100,
+    ) -> None:
+        self.enabled = bool(enabled)
+        self.threshold = max(0, int(threshold))
+        self.max_prepared = max(1, int(max_prepared))
+        self._statements: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._calls: Dict[str, int] = {}
+        for name, sql in statements.items():
+            self.register(name, sql)
+
+    def register(self, name: str, sql: str) -> str:
+        if name in self._statements and self._statements[name] != sql:
+            raise ValueError(f"Prepared statement {name!r} is already registered with another query")
+        self._statements[name] = sql
+        return sql
+
+    def sql(self, name: str) -> str:
+        return self._statements[name]
+
+    def names(self) -> Sequence[str]:
+        return tuple(self._statements)
+
+    @property
+    def prepare(self) -> bool:
+        # prepare=False (not None) also keeps psycopg from auto-preparing it
+        return self.enabled
+
+    @property
+    def prepare_threshold(self) -> Optional[int]:
+        return self.threshold if self.enabled else None
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._calls[name] = self._calls.get(name, 0) + 1
+
+    def query(self, name: str, params: Sequence[Any] = (), fetch: str = FETCH_ALL) -> Query:
+        """Query plan step for a registered statement."""
+        sql = self.sql(name)
+        self._count(name)
+        return Query(sql, params, fetch=fetch, prepare=self.prepare)
+
+    def execute(self, cur: Any, name: str, params: Sequence[Any] = ()) -> Any:
+        """Run a registered statement on an open cursor (e.g. inside `_transaction`)."""
+        sql = self.sql(name)
+        self._count(name)
+        return cur.execute(sql, params, prepare=self.prepare)
+
+    def configure(self, conn: Any) -> None:
+        """`configure` callback of the sync pool: applies the prepare policy to each new connection."""
+        conn.prepare_threshold = self.prepare_threshold
+        conn.prepared_max = self.max_prepared
+
+    async def configure_async(self, conn: Any) -> None:
+        """`configure` callback of the async pool."""
+        self.configure(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = dict(self._calls)
+        return {
+            "enabled": self.enabled,
+            "prepare_threshold": self.prepare_threshold,
+            "prepared_max": self.max_prepared,
+            "statements": {name: calls.get(name, 0) for name in self._statements},
+        }
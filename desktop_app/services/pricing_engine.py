@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import math
+from typing import Any, List, Optional, Sequence
+
+try:
+    from desktop_app.services.mass_update_math import np, to_floats
+except ImportError:
+    from services.mass_update_math import np, to_floats  # type: ignore
+
+# Articles with `redondeo` get their list prices rounded to a multiple of this (whole pesos)
+ROUNDING_STEP = 1.0
+# app.articulo_precio.precio is NUMERIC(14,4)
+PRICE_SCALE = 4
+
+
+# ---------------------------------------------------------------------------
+# SQL (set-based)
+# ---------------------------------------------------------------------------
+
+def factor_sql(pct: str = "ap.porcentaje", tipo: str = "tp.tipo") -> str:
+    """Cost-to-price factor of a price row: 1 - pct/100 for DESCUENTO, 1 + pct/100 otherwise."""
+    return (
+        f"(CASE WHEN COALESCE({tipo}, 'MARGEN') = 'DESCUENTO' "
+        f"THEN 1 - COALESCE({pct}, 0) / 100.0 "
+        f"ELSE 1 + COALESCE({pct}, 0) / 100.0 END)"
+    )
+
+
+def price_sql(
+    cost: str = "a.costo",
+    pct: str = "ap.porcentaje",
+    tipo: str = "tp.tipo",
+    redondeo: str = "a.redondeo",
+    step: float = ROUNDING_STEP,
+) -> str:
+    """List price from cost: `GREATEST(0, cost) * factor`, floored at 0 and rounded when `redondeo`."""
+    step_sql = repr(float(step))
+    raw = f"GREATEST(0, GREATEST(0, {cost}) * {factor_sql(pct, tipo)})"
+    return (
+        f"ROUND(CASE WHEN COALESCE({redondeo}, FALSE) "
+        f"THEN ROUND({raw} / {step_sql}) * {step_sql} "
+        f"ELSE {raw} END, {PRICE_SCALE})"
+    )
+
+
+def recompute_prices(
+    cur: Any,
+    articles_sql: str,
+    params: Sequence[Any] = (),
+    *,
+    list_ids: Optional[Sequence[int]] = None,
+    step: float = ROUNDING_STEP,
+    include_manual: bool = False,
+) -> int:
+    """
+    Recompute `app.articulo_precio.precio` from the current cost, percentage,
+    type and `redondeo` of every price row of the articles returned by
+    `articles_sql` (a `SELECT id ...`), optionally limited to `list_ids`.
+    Rows without a percentage hold a price entered by hand and are left
+    alone unless `include_manual`. One UPDATE; rows whose price does not
+    change are not written. Returns the number of prices changed.
+    """
+    row_filter = "" if include_manual else "AND src.porcentaje IS NOT NULL"
+    query_params: List[Any] = list(params)
+    if list_ids is not None:
+        row_filter += " AND src.id_lista_precio = ANY(%s)"
+        query_params.append([int(i) for i in list_ids])
+    cur.execute(
+        f"""
+        UPDATE app.articulo_precio ap
+        SET precio = x.precio_nuevo,
+            fecha_actualizacion = now()
+        FROM (
+            SELECT src.id_articulo, src.id_lista_precio,
+                   {price_sql(pct="src.porcentaje", step=step)} AS precio_nuevo
+            FROM app.articulo_precio src
+            JOIN app.articulo a ON a.id = src.id_articulo
+            LEFT JOIN ref.tipo_porcentaje tp ON tp.id = src.id_tipo_porcentaje
+            WHERE src.id_articulo IN ({articles_sql})
+              {row_filter}
+        ) x
+        WHERE ap.id_articulo = x.id_articulo
+          AND ap.id_lista_precio = x.id_lista_precio
+          AND ap.precio IS DISTINCT FROM x.precio_nuevo
+        """,
+        query_params,
+    )
+    return max(0, cur.rowcount or 0)
+
+
+# ---------------------------------------------------------------------------
+# Reference implementation (NumPy when available)
+# ---------------------------------------------------------------------------
+
+def round_price(price: float, redondeo: Any, step: float = ROUNDING_STEP) -> float:
+    """Half-up rounding to `step` (prices are never negative), like `ROUND` on numeric."""
+    if not redondeo:
+        return price
+    return math.floor(price / step + 0.5) * step
+
+
+def price_factors(tipos: Sequence[Any], porcentajes: Sequence[Any]) -> List[float]:
+    """Cost-to-price factor of each price row (same rule as `factor_sql`)."""
+    signs = [-1.0 if str(tipo or "").strip().upper() == "DESCUENTO" else 1.0 for tipo in tipos]
+    pcts = to_floats(porcentajes)
+    if np is not None:
+        return (1.0 + np.asarray(signs) * np.asarray(pcts, dtype=float) / 100.0).tolist()
+    return [1.0 + sign * pct / 100.0 for sign, pct in zip(signs, pcts)]
+
+
+def prices_from_costs(
+    costs: Sequence[float],
+    factors: Sequence[float],
+    redondeo: Optional[Sequence[Any]] = None,
+    step: float = ROUNDING_STEP,
+) -> List[float]:
+    """`max(0, max(0, cost) * factor)` element-wise, rounded where `redondeo` is set."""
+    if np is not None:
+        arr = np.maximum(np.maximum(np.asarray(costs, dtype=float), 0.0) * np.asarray(factors, dtype=float), 0.0)
+        if redondeo is not None:
+            mask = np.asarray([bool(flag) for flag in redondeo], dtype=bool)
+            arr = np.where(mask, np.floor(arr / step + 0.5) * step, arr)
+        return arr.tolist()
+    prices = [max(0.0, max(0.0, cost) * factor) for cost, factor in zip(costs, factors)]
+    if redondeo is None:
+        return prices
+    return [round_price(price, flag, step) for price, flag in zip(prices, redondeo)]
+
+
+def reference_prices(
+    costs: Sequence[Any],
+    porcentajes: Sequence[Any],
+    tipos: Sequence[Any],
+    redondeo: Optional[Sequence[Any]] = None,
+    step: float = ROUNDING_STEP,
+) -> List[float]:
+    """List prices for parallel columns of price rows; used to verify the SQL engine."""
+    return prices_from_costs(to_floats(costs), price_factors(tipos, porcentajes), redondeo, step)
@@ -0,0 +1,420 @@
+from __future__ import annotations
+
+import functools
+import inspect
+import json
+import logging
+import re
+import sys
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Sequence, Set, TypeVar
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; the last one is open-ended.
+LATENCY_BUCKETS_MS: Sequence[float] = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_OTHER_STATEMENTS = "<otras consultas>"
+_EXPLAIN_COOLDOWN = 600.0  # seconds between EXPLAINs of the same statement
+
+_current_operation: ContextVar[Optional[str]] = ContextVar("query_metrics_operation", default=None)
+
+_T = TypeVar("_T", bound=type)
+
+_COMMENT_RE = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"(?<![\w$.])-?\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\)", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+_EXPLAINABLE_RE = re.compile(r"^\s*(?:SELECT|WITH)\b", re.IGNORECASE)
+_WRITE_RE = re.compile(r"\b(?:INSERT|UPDATE|DELETE|MERGE|TRUNCATE|CREATE|ALTER|DROP|NEXTVAL|SETVAL|SET_CONFIG|PG_NOTIFY)\b", re.IGNORECASE)
+
+
+def normalize_sql(sql: Any) -> str:
+    """Statement shape used as metrics key: no comments, literals as `?`, IN lists collapsed."""
+    text = sql if isinstance(sql, str) else str(sql)
+    text = _COMMENT_RE.sub(" ", text)
+    text = _STRING_RE.sub("?", text)
+    text = _NUMBER_RE.sub("?", text)
+    text = _IN_LIST_RE.sub("IN (...)", text)
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def attribute_operations(cls: _T) -> _T:
+    """
+    Class decorator: each public method of `cls` runs as the current
+    operation (like `QueryMetrics.operation`), so InstrumentedPool does not
+    have to look for it on the call stack.
+    """
+    for name, func in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.isfunction(func) or inspect.isgeneratorfunction(func):
+            continue
+        setattr(cls, name, _as_operation(name, func))
+    return cls
+
+
+def _as_operation(name: str, func: Callable[..., Any]) -> Callable[..., Any]:
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        token = _current_operation.set(name)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current_operation.reset(token)
+
+    return wrapper
+
+
+class LatencyStats:
+    """Counters and a fixed-bucket latency histogram for one method or statement."""
+
+    __slots__ = ("count", "errors", "rows", "total_ms", "max_ms", "buckets")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.errors = 0
+        self.rows = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def add(self, elapsed_ms: float, rows: int = 0, error: bool = False) -> None:
+        self.count += 1
+        self.total_ms += elapsed_ms
+        if elapsed_ms > self.max_ms:
+            self.max_ms = elapsed_ms
+        if rows > 0:
+            self.rows += rows
+        if error:
+            self.errors += 1
+        for idx, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.buckets[idx] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def percentile(self, pct: float) -> float:
+        """Upper bound of the bucket holding the given percentile (max for the open bucket)."""
+        if not self.count:
+            return 0.0
+        target = self.count * pct / 100.0
+        seen = 0
+        for idx, hits in enumerate(self.buckets):
+            seen += hits
+            if seen >= target:
+                return float(LATENCY_BUCKETS_MS[idx]) if idx < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "rows": self.rows,
+            "total_ms": round(self.total_ms, 2),
+            "avg_ms": round(self.total_ms / self.count, 2) if self.count else 0.0,
+            "max_ms": round(self.max_ms, 2),
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "p99_ms": self.percentile(99),
+            "histogram": {
+                (f"<={bound:g}" if idx < len(LATENCY_BUCKETS_MS) else f">{LATENCY_BUCKETS_MS[-1]:g}"): hits
+                for idx, (bound, hits) in enumerate(zip(list(LATENCY_BUCKETS_MS) + [0], self.buckets))
+                if hits
+            },
+        }
+
+
+class QueryMetrics:
+    """
+    Per-method and per-statement latency of the queries run through an
+    InstrumentedPool, plus pool wait times.
+
+    Statements slower than `slow_query_ms` are logged (0 disables it) and kept
+    in a short list; with `explain_slow` the read-only ones are re-run once in
+    a while as `EXPLAIN (ANALYZE, BUFFERS)` on a background thread and the
+    plan is logged and kept for the diagnostics panel.
+    """
+
+    def __init__(
+        self,
+        *,
+        slow_query_ms: float = 500.0,
+        explain_slow: bool = False,
+        max_statements: int = 500,
+        max_slow_queries: int = 50,
+    ) -> None:
+        self.slow_query_ms = max(0.0, float(slow_query_ms or 0))
+        self.explain_slow = bool(explain_slow)
+        self.max_statements = max(1, int(max_statements))
+        self._lock = threading.Lock()
+        self._started_at = datetime.now()
+        self._methods: Dict[str, LatencyStats] = {}
+        self._statements: Dict[str, LatencyStats] = {}
+        self._statement_methods: Dict[str, Set[str]] = {}
+        self._pool_wait = LatencyStats()
+        self._slow: Deque[Dict[str, Any]] = deque(maxlen=max(1, int(max_slow_queries)))
+        self._plans: Dict[str, Dict[str, Any]] = {}
+        self._explained_at: Dict[str, float] = {}
+
+    @contextmanager
+    def operation(self, name: Optional[str]) -> Iterator[None]:
+        """Attribute the queries run inside the block to `name`."""
+        token = _current_operation.set(name)
+        try:
+            yield
+        finally:
+            _current_operation.reset(token)
+
+    def record(self, method: str, sql: Any, elapsed_ms: float, rows: int = 0, error: bool = False) -> str:
+        key = normalize_sql(sql)
+        with self._lock:
+            self._methods.setdefault(method, LatencyStats()).add(elapsed_ms, rows, error)
+            stats = self._statements.get(key)
+            if stats is None:
+                if len(self._statements) >= self.max_statements:
+                    key = _OTHER_STATEMENTS
+                stats = self._statements.setdefault(key, LatencyStats())
+            stats.add(elapsed_ms, rows, error)
+            self._statement_methods.setdefault(key, set()).add(method)
+            if self.slow_query_ms and elapsed_ms >= self.slow_query_ms:
+                self._slow.append({
+                    "at": datetime.now().isoformat(timespec="seconds"),
+                    "method": method,
+                    "elapsed_ms": round(elapsed_ms, 2),
+                    "rows": rows,
+                    "error": error,
+                    "sql": key,
+                })
+        return key
+
+    def record_pool_wait(self, elapsed_ms: float, error: bool = False) -> None:
+        with self._lock:
+            self._pool_wait.add(elapsed_ms, error=error)
+
+    def is_slow(self, elapsed_ms: float) -> bool:
+        return bool(self.slow_query_ms) and elapsed_ms >= self.slow_query_ms
+
+    def should_explain(self, key: str, sql: Any) -> bool:
+        """Claim an EXPLAIN slot for a slow read-only statement (at most once per cooldown)."""
+        if not self.explain_slow or key == _OTHER_STATEMENTS or not isinstance(sql, str):
+            return False
+        if not _EXPLAINABLE_RE.match(sql) or _WRITE_RE.search(sql):
+            return False
+        now = time.monotonic()
+        with self._lock:
+            last = self._explained_at.get(key)
+            if last is not None and now - last < _EXPLAIN_COOLDOWN:
+                return False
+            self._explained_at[key] = now
+        return True
+
+    def store_plan(self, key: str, method: str, elapsed_ms: float, plan: str) -> None:
+        with self._lock:
+            self._plans[key] = {
+                "at": datetime.now().isoformat(timespec="seconds"),
+                "method": method,
+                "elapsed_ms": round(elapsed_ms, 2),
+                "plan": plan,
+            }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._started_at = datetime.now()
+            self._methods.clear()
+            self._statements.clear()
+            self._statement_methods.clear()
+            self._pool_wait = LatencyStats()
+            self._slow.clear()
+            self._plans.clear()
+            self._explained_at.clear()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-ready copy of every counter; methods and statements sorted by total time."""
+        with self._lock:
+            methods = [{"method": name, **stats.as_dict()} for name, stats in self._methods.items()]
+            statements = [
+                {"sql": key, "methods": sorted(self._statement_methods.get(key, ())), **stats.as_dict()}
+                for key, stats in self._statements.items()
+            ]
+            snapshot = {
+                "generated_at": datetime.now().isoformat(timespec="seconds"),
+                "since": self._started_at.isoformat(timespec="seconds"),
+                "slow_query_ms": self.slow_query_ms,
+                "explain_slow": self.explain_slow,
+                "pool_wait": self._pool_wait.as_dict(),
+                "slow_queries": list(self._slow),
+                "plans": {key: dict(value) for key, value in self._plans.items()},
+            }
+        methods.sort(key=lambda item: item["total_ms"], reverse=True)
+        statements.sort(key=lambda item: item["total_ms"], reverse=True)
+        snapshot["methods"] = methods
+        snapshot["statements"] = statements
+        snapshot["totals"] = {
+            "queries": sum(item["count"] for item in methods),
+            "errors": sum(item["errors"] for item in methods),
+            "total_ms": round(sum(item["total_ms"] for item in methods), 2),
+        }
+        return snapshot
+
+    def dump_json(self, path: Path, snapshot: Optional[Dict[str, Any]] = None) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with path.open("w", encoding="utf-8") as fh:
+            json.dump(snapshot if snapshot is not None else self.snapshot(), fh, ensure_ascii=False, indent=2, default=str)
+        return path
+
+
+class InstrumentedPool:
+    """
+    ConnectionPool proxy that times connection checkout and every
+    cursor.execute/executemany into a QueryMetrics.
+
+    Queries are attributed to the operation set with `QueryMetrics.operation`
+    or `attribute_operations`. Only without one (e.g. a private helper on a
+    worker thread) the call stack is walked for the nearest public method
+    defined in `source_file` (the Database module).
+    """
+
+    def __init__(self, pool: Any, metrics: QueryMetrics, *, source_file: Optional[str] = None) -> None:
+        self._pool = pool
+        self.metrics = metrics
+        self.source_file = source_file
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._pool, name)
+
+    @contextmanager
+    def connection(self, *args: Any, **kwargs: Any) -> Iterator[Any]:
+        started = time.perf_counter()
+        acquired = False
+        try:
+            with self._pool.connection(*args, **kwargs) as conn:
+                acquired = True
+                self.metrics.record_pool_wait((time.perf_counter() - started) * 1000.0)
+                yield _InstrumentedConnection(conn, self)
+        except Exception:
+            if not acquired:
+                self.metrics.record_pool_wait((time.perf_counter() - started) * 1000.0, error=True)
+            raise
+
+    def _operation_name(self) -> str:
+        name = _current_operation.get()
+        if name:
+            return name
+        frame = sys._getframe(1)
+        private: Optional[str] = None
+        while frame is not None:
+            code = frame.f_code
+            if code.co_filename == self.source_file and code.co_varnames[:1] == ("self",):
+                if not code.co_name.startswith("_"):
+                    return code.co_name
+                if private is None:
+                    private = code.co_name
+            frame = frame.f_back
+        return private or "?"
+
+    def _observe(self, sql: Any, params: Any, elapsed_ms: float, rows: int, error: bool) -> None:
+        method = self._operation_name()
+        key = self.metrics.record(method, sql, elapsed_ms, rows, error)
+        if not self.metrics.is_slow(elapsed_ms):
+            return
+        logger.warning("Slow query (%.0f ms) in %s: %s", elapsed_ms, method, key[:500])
+        if not error and self.metrics.should_explain(key, sql):
+            threading.Thread(
+                target=self._explain,
+                args=(key, method, elapsed_ms, sql, params),
+                name="query-explain",
+                daemon=True,
+            ).start()
+
+    def _explain(self, key: str, method: str, elapsed_ms: float, sql: str, params: Any) -> None:
+        try:
+            with self._pool.connection() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(f"EXPLAIN (ANALYZE, BUFFERS) {sql}", params)
+                    lines = [row.get("QUERY PLAN") if isinstance(row, dict) else row[0] for row in cur.fetchall()]
+                conn.rollback()
+        except Exception as exc:
+            logger.warning("EXPLAIN of slow query failed (%s): %s", method, exc)
+            return
+        plan = "\n".join(str(line) for line in lines)
+        self.metrics.store_plan(key, method, elapsed_ms, plan)
+        logger.warning("Plan of slow query in %s (%.0f ms):\n%s", method, elapsed_ms, plan)
+
+
+class _InstrumentedConnection:
+    def __init__(self, conn: Any, owner: InstrumentedPool) -> None:
+        self._conn = conn
+        self._owner = owner
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._conn, name)
+
+    def __enter__(self) -> "_InstrumentedConnection":
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc: Any) -> Any:
+        return self._conn.__exit__(*exc)
+
+    def cursor(self, *args: Any, **kwargs: Any) -> "_InstrumentedCursor":
+        return _InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._owner)
+
+    def execute(self, query: Any, params: Any = None, **kwargs: Any) -> "_InstrumentedCursor":
+        cur = self.cursor()
+        cur.execute(query, params, **kwargs)
+        return cur
+
+
+class _InstrumentedCursor:
+    def __init__(self, cur: Any, owner: InstrumentedPool) -> None:
+        self._cur = cur
+        self._owner = owner
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cur, name)
+
+    def __enter__(self) -> "_InstrumentedCursor":
+        self._cur.__enter__()
+        return self
+
+    def __exit__(self, *exc: Any) -> Any:
+        return self._cur.__exit__(*exc)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._cur)
+
+    def execute(self, query: Any, params: Any = None, **kwargs: Any) -> "_InstrumentedCursor":
+        started = time.perf_counter()
+        error = False
+        try:
+            self._cur.execute(query, params, **kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000.0
+            rows = 0 if error else max(0, getattr(self._cur, "rowcount", 0) or 0)
+            self._owner._observe(query, params, elapsed_ms, rows, error)
+        return self
+
+    def executemany(self, query: Any, params_seq: Any, **kwargs: Any) -> None:
+        started = time.perf_counter()
+        error = False
+        try:
+            self._cur.executemany(query, params_seq, **kwargs)
+        except Exception:
+            error = True
+            raise
+        finally:
+            elapsed_ms = (time.perf_counter() - started) * 1000.0
+            rows = 0 if error else max(0, getattr(self._cur, "rowcount", 0) or 0)
+            # No EXPLAIN for batches: params_seq may be a consumed iterator
+            self._owner.metrics.record(self._owner._operation_name(), query, elapsed_ms, rows, error)
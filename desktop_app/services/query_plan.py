@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import functools
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Generator, List, Optional, Sequence
+
+# A read path written once as a generator: it yields Query objects, receives
+# each result back (dict rows) and returns the method's value. The same plan
+# runs on the sync ConnectionPool or on an AsyncConnectionPool.
+Plan = Generator["Query", Any, Any]
+
+FETCH_ALL = "all"
+FETCH_ONE = "one"
+FETCH_ROW = "row"
+FETCH_VALUE = "value"
+FETCH_NONE = "none"
+
+
+@dataclass(frozen=True)
+class Query:
+    """
+    One statement of a query plan.
+
+    `fetch` selects what is sent back to the plan: "all" (list of dicts),
+    "one" (first row as dict or None), "row" (first row as tuple or None),
+    "value" (first column of the first row or None) or "none".
+
+    `prepare` is passed to `cursor.execute`: True sends it as a server-side
+    prepared statement, False never prepares it, None lets psycopg decide
+    (`prepare_threshold`).
+    """
+
+    sql: str
+    params: Sequence[Any] = ()
+    fetch: str = FETCH_ALL
+    prepare: Optional[bool] = None
+
+
+def query_plan(method: Callable[..., Plan]) -> Callable[..., Any]:
+    """
+    Turn a plan generator method into a regular (sync) method.
+
+    Calling the method runs the plan through `self._run_query_plan`; the
+    generator function stays reachable as `.query_plan` so AsyncDatabase can
+    run the very same plan on its async pool.
+    """
+
+    @functools.wraps(method)
+    def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+        return self._run_query_plan(method(self, *args, **kwargs))
+
+    wrapper.query_plan = method  # type: ignore[attr-defined]
+    return wrapper
+
+
+def get_query_plan(func: Any) -> Optional[Callable[..., Plan]]:
+    return getattr(func, "query_plan", None)
+
+
+def _column_names(description: Any) -> List[str]:
+    return [col.name if hasattr(col, "name") else col[0] for col in description or ()]
+
+
+def _shape(query: Query, rows: List[Any], description: Any) -> Any:
+    if query.fetch == FETCH_NONE:
+        return None
+    if rows and not isinstance(rows[0], dict):
+        columns = _column_names(description)
+        rows = [dict(zip(columns, row)) for row in rows]
+    if query.fetch == FETCH_ALL:
+        return rows
+    first: Optional[Dict[str, Any]] = rows[0] if rows else None
+    if query.fetch == FETCH_ONE:
+        return first
+    if query.fetch == FETCH_ROW:
+        return tuple(first.values()) if first else None
+    return next(iter(first.values()), None) if first else None
+
+
+def _execute_kwargs(query: Query) -> Dict[str, Any]:
+    return {} if query.prepare is None else {"prepare": query.prepare}
+
+
+def _advance(plan: Plan, result: Any = None, error: Optional[BaseException] = None) -> tuple:
+    """Next (query, done, value) of a plan; `error` is raised inside the plan."""
+    try:
+        if error is not None:
+            return plan.throw(error), False, None
+        return plan.send(result), False, None
+    except StopIteration as stop:
+        return None, True, stop.value
+
+
+def run_plan(plan: Plan, pool: Any, setup: Optional[Callable[[Any], Any]] = None) -> Any:
+    """Run a plan on one connection of a psycopg ConnectionPool."""
+    query, done, value = _advance(plan)
+    if done:
+        return value
+    with pool.connection() as conn:
+        with conn.cursor() as cur:
+            if setup is not None:
+                setup(cur)
+            while not done:
+                try:
+                    cur.execute(query.sql, query.params, **_execute_kwargs(query))
+                    rows = cur.fetchall() if query.fetch != FETCH_NONE and cur.description else []
+                    result = _shape(query, rows, cur.description)
+                except Exception as exc:
+                    # The plan may handle the error (e.g. return a default) and go on
+                    # with more queries: those must not run in the aborted transaction
+                    conn.rollback()
+                    query, done, value = _advance(plan, error=exc)
+                    if not done and setup is not None:
+                        setup(cur)
+                    continue
+                query, done, value = _advance(plan, result)
+    return value
+
+
+async def run_plan_async(
+    plan: Plan,
+    pool: Any,
+    setup: Optional[Callable[[Any], Any]] = None,
+) -> Any:
+    """Run a plan on one connection of a psycopg AsyncConnectionPool."""
+    query, done, value = _advance(plan)
+    if done:
+        return value
+    async with pool.connection() as conn:
+        async with conn.cursor() as cur:
+            if setup is not None:
+                await setup(cur)
+            while not done:
+                try:
+                    await cur.execute(query.sql, query.params, **_execute_kwargs(query))
+                    rows = await cur.fetchall() if query.fetch != FETCH_NONE and cur.description else []
+                    result = _shape(query, rows, cur.description)
+                except Exception as exc:
+                    await conn.rollback()
+                    query, done, value = _advance(plan, error=exc)
+                    if not done and setup is not None:
+                        # Transaction-local session settings went with the rollback
+                        await setup(cur)
+                    continue
+                query, done, value = _advance(plan, result)
+    return value
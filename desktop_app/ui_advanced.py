@@ -121,6 +121,18 @@ def main(page: ft.Page) -> None:
         config.database_url,
         pool_min_size=config.db_pool_min,
         pool_max_size=config.db_pool_max,
+        pool_async_max=config.db_pool_async_max,
+        pool_timeout=config.db_pool_timeout,
+        pool_max_idle=config.db_pool_max_idle,
+        pool_max_lifetime=config.db_pool_max_lifetime,
+        pool_check=config.db_pool_check,
+        pool_check_idle=config.db_pool_check_idle,
+        prepared_statements=config.db_prepared_statements,
+        prepare_threshold=config.db_prepare_threshold,
+        mass_update_batch_size=config.db_mass_update_batch,
+        approx_count_threshold=config.db_approx_count_threshold,
+        slow_query_ms=config.db_slow_query_ms,
+        explain_slow_queries=config.db_explain_slow_queries,
     )
     
     # Load system configuration from DB
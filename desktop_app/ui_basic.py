@@ -67,6 +67,7 @@ try:
     )
     from desktop_app.components.toast import ToastManager
     from desktop_app.components.mass_update_view import MassUpdateView
+    from desktop_app.components.query_diagnostics_view import QueryDiagnosticsView
     from desktop_app.services.print_service import generate_pdf, generate_pdf_and_open, generate_pdf_and_print
     from desktop_app.services.document_pricing import calculate_document_totals, normalize_discount_pair, quantize_2, to_decimal
     from desktop_app.services.article_price_autocalc import (
@@ -102,6 +103,7 @@ except ImportError:
         SimpleFilterConfig,
     )
     from components.mass_update_view import MassUpdateView # type: ignore
+    from components.query_diagnostics_view import QueryDiagnosticsView # type: ignore
     from services.print_service import generate_pdf, generate_pdf_and_open, generate_pdf_and_print # type: ignore
     from services.document_pricing import calculate_document_totals, normalize_discount_pair, quantize_2, to_decimal  # type: ignore
     from services.article_price_autocalc import calc_pct_from_cost_price, calc_price_from_cost_pct, normalize_price_tipo  # type: ignore
@@ -197,8 +199,8 @@ def _normalize_price_tipo(tipo: Any) -> str:
     return normalize_price_tipo(tipo)
 
 
-def _calc_price_from_cost_pct(cost: Any, pct: Any, tipo: Any) -> float:
-    return calc_price_from_cost_pct(cost, pct, tipo)
+def _calc_price_from_cost_pct(cost: Any, pct: Any, tipo: Any, redondeo: Any = False) -> float:
+    return calc_price_from_cost_pct(cost, pct, tipo, redondeo)
 
 
 def _calc_pct_from_cost_price(cost: Any, price: Any, tipo: Any) -> float:
@@ -746,6 +748,18 @@ def main(page: ft.Page) -> None:
         config.database_url,
         pool_min_size=config.db_pool_min,
         pool_max_size=config.db_pool_max,
+        pool_async_max=config.db_pool_async_max,
+        pool_timeout=config.db_pool_timeout,
+        pool_max_idle=config.db_pool_max_idle,
+        pool_max_lifetime=config.db_pool_max_lifetime,
+        pool_check=config.db_pool_check,
+        pool_check_idle=config.db_pool_check_idle,
+        prepared_statements=config.db_prepared_statements,
+        prepare_threshold=config.db_prepare_threshold,
+        mass_update_batch_size=config.db_mass_update_batch,
+        approx_count_threshold=config.db_approx_count_threshold,
+        slow_query_ms=config.db_slow_query_ms,
+        explain_slow_queries=config.db_explain_slow_queries,
     )
 
     # Load system configuration from DB
@@ -1394,7 +1408,50 @@ def main(page: ft.Page) -> None:
 
         # Use professional scheduler as main scheduler
         scheduler = professional_scheduler
-        
+
+        # Conciliación nocturna de cuentas corrientes (antigüedad de la deuda);
+        # también al iniciar, por si el equipo estaba apagado a la hora programada
+        def run_cc_reconciliation():
+            try:
+                actualizadas = db.reconcile_cuentas_corrientes()
+                logger.info(f"Conciliación de cuentas corrientes: {actualizadas} cuentas actualizadas")
+            except Exception as e:
+                logger.error(f"Error en conciliación de cuentas corrientes: {e}")
+
+        try:
+            scheduler.add_job(
+                run_cc_reconciliation,
+                CronTrigger(hour=2, minute=0),
+                id='cc_reconciliation',
+                name='Conciliación de Cuentas Corrientes',
+                max_instances=1,
+                replace_existing=True,
+                next_run_time=datetime.now(),
+            )
+        except Exception as e:
+            logger.warning(f"No se pudo programar la conciliación de cuentas corrientes: {e}")
+
+        # Números reservados por borradores abandonados (terminal cerrada) vuelven a estar disponibles
+        def run_expire_number_reservations():
+            try:
+                liberados = db.expire_document_number_reservations()
+                if liberados:
+                    logger.info(f"Reservas de numeración vencidas: {liberados} números liberados")
+            except Exception as e:
+                logger.error(f"Error liberando reservas de numeración: {e}")
+
+        try:
+            scheduler.add_job(
+                run_expire_number_reservations,
+                CronTrigger(hour=2, minute=15),
+                id='document_number_reservations',
+                name='Vencimiento de Reservas de Numeración',
+                max_instances=1,
+                replace_existing=True,
+            )
+        except Exception as e:
+            logger.warning(f"No se pudo programar el vencimiento de reservas de numeración: {e}")
+
         afip: Optional[AfipService] = None
         if config.afip_cuit and config.afip_cert and config.afip_key:
             afip = AfipService(
@@ -2334,20 +2391,24 @@ def main(page: ft.Page) -> None:
         simple: Optional[str],
         advanced: Dict[str, Any],
         sorts: List[Tuple[str, str]],
+        after: Optional[str] = None,
+        before: Optional[str] = None,
     ):
         if db is None:
             raise provider_error()
         db.log_activity("ENTIDAD", "SELECT", detalle={"search": search, "tipo": simple, "offset": offset})
-        rows = db.fetch_entities(
+        return db.fetch_page(
+            "fetch_entities",
             search=search,
             tipo=simple,
             advanced=advanced,
             sorts=sorts,
             limit=limit,
             offset=offset,
+            keyset=True,
+            after=after,
+            before=before,
         )
-        total = db.count_entities(search=search, tipo=simple, advanced=advanced)
-        return rows, total
 
     def deactivate_entity(entity_id: int) -> None:
         if db is None:
@@ -2522,6 +2583,7 @@ def main(page: ft.Page) -> None:
             ),
         ],
         data_provider=entidades_provider,
+        keyset_pagination=True,
         advanced_filters=[
             AdvancedFilterControl("tipo", entidades_advanced_tipo),
             AdvancedFilterControl("apellido", entidades_advanced_apellido),
@@ -2594,6 +2656,8 @@ def main(page: ft.Page) -> None:
         simple: Optional[str],
         advanced: Dict[str, Any],
         sorts: List[Tuple[str, str]],
+        after: Optional[str] = None,
+        before: Optional[str] = None,
     ):
         if db is None:
             raise provider_error()
@@ -2608,16 +2672,18 @@ def main(page: ft.Page) -> None:
         else:
             activo = None
             
-        rows = db.fetch_articles(
+        return db.fetch_page(
+            "fetch_articles",
             search=search,
             activo_only=activo,
             advanced=advanced,
             sorts=sorts,
             limit=limit,
             offset=offset,
+            keyset=True,
+            after=after,
+            before=before,
         )
-        total = db.count_articles(search=search, activo_only=activo, advanced=advanced)
-        return rows, total
 
     def _current_lista_precio_id() -> int:
         raw = getattr(articulos_advanced_lista_precio, "value", None)
@@ -2869,6 +2935,7 @@ def main(page: ft.Page) -> None:
             ),
         ],
         data_provider=articulos_provider,
+        keyset_pagination=True,
         advanced_filters=[
             AdvancedFilterControl("nombre", articulos_advanced_nombre),
             AdvancedFilterControl("codigo", articulos_advanced_codigo),
@@ -3433,7 +3500,7 @@ def main(page: ft.Page) -> None:
             return
 
         tipo_label = _resolve_tipo_porcentaje_label(dd_tipo.value)
-        price_val = _calc_price_from_cost_pct(cost_val, pct_val, tipo_label)
+        price_val = _calc_price_from_cost_pct(cost_val, pct_val, tipo_label, bool(nuevo_articulo_redondeo.value))
 
         guard["active"] = True
         try:
@@ -3568,6 +3635,7 @@ def main(page: ft.Page) -> None:
             _sync_all_article_prices_from_cost()
 
         nuevo_articulo_costo.on_change = _on_cost_change
+        nuevo_articulo_redondeo.on_change = _on_cost_change
         nuevo_articulo_costo.on_submit = _on_cost_commit
         if hasattr(nuevo_articulo_costo, "on_blur"):
             nuevo_articulo_costo.on_blur = _on_cost_commit  # type: ignore[attr-defined]
@@ -4548,14 +4616,22 @@ def main(page: ft.Page) -> None:
     rubros_table.search_field.hint_text = "Buscar rubro…"
 
     # NEW: Generic providers and tables for expanded config
-    def create_catalog_provider(fetch_fn, count_fn):
-        def provider(offset, limit, search, simple, advanced, sorts):
+    def create_catalog_provider(fetch_fn, count_fn, keyset: bool = False):
+        def provider(offset, limit, search, simple, advanced, sorts, after=None, before=None):
             if db is None or db.is_closing: return [], 0
             try:
                 entidad_log = fetch_fn.__name__.replace("fetch_", "").upper()
                 db.log_activity(entidad_log, "SELECT", detalle={"search": search, "offset": offset})
                 
                 # Pass all arguments to be robust
+                if keyset:
+                    # Rows and total in one round trip
+                    return db.fetch_page(
+                        fetch_fn.__name__,
+                        search=search, limit=limit, offset=offset, simple=simple, advanced=advanced, sorts=sorts,
+                        keyset=True, after=after, before=before,
+                    )
+
                 try:
                     data = fetch_fn(search=search, limit=limit, offset=offset, simple=simple, advanced=advanced, sorts=sorts)
                 except TypeError:
@@ -5213,6 +5289,111 @@ def main(page: ft.Page) -> None:
 
         return payload
 
+    def _build_afip_voucher(
+        db_local: Database,
+        doc_row: Dict[str, Any],
+        punto_venta: int,
+    ) -> Tuple[Dict[str, Any], str]:
+        """
+        Datos del comprobante para AFIP (sin CbteDesde/CbteHasta) y su fecha para el QR.
+        ValueError con el mensaje para el usuario si falta algo.
+        """
+        doc_id = int(doc_row["id"])
+        codigo_afip = int(doc_row.get("codigo_afip"))
+        doc_full = db_local.get_document_full(doc_id)
+        if not doc_full:
+            raise ValueError("No se pudo cargar el comprobante completo para AFIP.")
+        pricing = _build_doc_fiscal_pricing_for_afip(db_local, doc_full)
+        total = float(quantize_2(to_decimal(pricing.get("total"), to_decimal("0"))))
+        neto = float(quantize_2(to_decimal(pricing.get("neto"), to_decimal("0"))))
+        iva_total = float(quantize_2(to_decimal(pricing.get("iva_total"), to_decimal("0"))))
+        iva_payload = _build_afip_iva_payload(
+            db_local,
+            pricing.get("iva_breakdown") or [],
+            pricing.get("neto"),
+            pricing.get("iva_total"),
+        )
+
+        entity = None
+        ent_id = doc_row.get("id_entidad") or doc_full.get("id_entidad_comercial")
+        if ent_id:
+            entity = db_local.fetch_entity_by_id(int(ent_id))
+
+        letra = str(doc_row.get("letra") or "").strip().upper()
+        es_letra_a = letra == "A" or codigo_afip in (1, 2, 3)
+        cuit_raw = (doc_row.get("cuit_receptor") or (entity or {}).get("cuit") or "").strip()
+        digits = "".join(ch for ch in cuit_raw if ch.isdigit())
+        doc_tipo = 99
+        doc_nro = 0
+        if digits:
+            if len(digits) == 11:
+                doc_tipo = 80
+                doc_nro = int(digits)
+            elif len(digits) <= 8:
+                doc_tipo = 96
+                doc_nro = int(digits)
+            else:
+                raise ValueError("CUIT/DNI del receptor inválido.")
+
+        if es_letra_a and doc_tipo != 80:
+            raise ValueError("Para comprobantes letra A se requiere CUIT válido del receptor.")
+
+        condicion_nombre = (entity or {}).get("condicion_iva")
+        condicion_id = afip.get_condicion_iva_receptor_id(condicion_nombre) if condicion_nombre else None
+        if es_letra_a and not condicion_id:
+            raise ValueError("Falta la condición IVA del receptor (requerida para letra A).")
+
+        invoice_data = {
+            "CantReg": 1,
+            "PtoVta": punto_venta,
+            "CbteTipo": codigo_afip,
+            "Concepto": 1,
+            "DocTipo": doc_tipo,
+            "DocNro": doc_nro,
+            "CbteFch": datetime.now().strftime("%Y%m%d"),
+            "ImpTotal": total,
+            "ImpTotConc": 0,
+            "ImpNeto": neto,
+            "ImpOpEx": 0,
+            "ImpIVA": iva_total,
+            "ImpTrib": 0,
+            "MonId": "PES",
+            "MonCotiz": 1,
+        }
+        if iva_payload:
+            invoice_data["Iva"] = iva_payload
+        if condicion_id is not None:
+            invoice_data["CondicionIVAReceptorId"] = condicion_id
+
+        fecha_doc = str(doc_full.get("fecha") or doc_row.get("fecha") or datetime.now().strftime("%Y-%m-%d"))[:10]
+        return invoice_data, fecha_doc
+
+    def _afip_cuit_emisor() -> str:
+        return "".join(ch for ch in str(getattr(afip, "cuit", "") or config.afip_cuit or "").strip() if ch.isdigit())
+
+    def _build_afip_qr_data(invoice_data: Dict[str, Any], numero: int, cae: Any, cuit_emisor: str, fecha_doc: str) -> str:
+        if not cae:
+            raise ValueError("CAE ausente para generar QR.")
+        qr_payload = {
+            "ver": 1,
+            "fecha": fecha_doc,
+            "cuit": int(cuit_emisor) if cuit_emisor else 0,
+            "ptoVta": int(invoice_data["PtoVta"]),
+            "tipoCmp": int(invoice_data["CbteTipo"]),
+            "nroCmp": int(numero),
+            "importe": float(quantize_2(to_decimal(invoice_data["ImpTotal"]))),
+            "moneda": "PES",
+            "ctz": 1,
+            "tipoDocRec": int(invoice_data["DocTipo"]),
+            "nroDocRec": int(invoice_data["DocNro"]),
+            "tipoCodAut": "E",
+            "codAut": cae,
+        }
+        qr_json = json.dumps(qr_payload, separators=(",", ":"), ensure_ascii=False)
+        qr_base64 = base64.b64encode(qr_json.encode("utf-8")).decode("ascii")
+        qr_param = quote(qr_base64, safe="")
+        return f"https://www.afip.gob.ar/fe/qr/?p={qr_param}"
+
     def _authorize_afip_doc(
         doc_row: Dict[str, Any],
         *,
@@ -5237,105 +5418,20 @@ def main(page: ft.Page) -> None:
             last = afip.get_last_voucher_number(punto_venta, codigo_afip)
             next_num = last + 1
 
-            doc_full = db_local.get_document_full(doc_id)
-            if not doc_full:
-                show_toast("No se pudo cargar el comprobante completo para AFIP.", kind="error")
-                return
-            pricing = _build_doc_fiscal_pricing_for_afip(db_local, doc_full)
-            total = float(quantize_2(to_decimal(pricing.get("total"), to_decimal("0"))))
-            neto = float(quantize_2(to_decimal(pricing.get("neto"), to_decimal("0"))))
-            iva_total = float(quantize_2(to_decimal(pricing.get("iva_total"), to_decimal("0"))))
-            iva_payload = _build_afip_iva_payload(
-                db_local,
-                pricing.get("iva_breakdown") or [],
-                pricing.get("neto"),
-                pricing.get("iva_total"),
-            )
-
-            entity = None
-            ent_id = doc_row.get("id_entidad") or doc_full.get("id_entidad_comercial")
-            if ent_id:
-                entity = db_local.fetch_entity_by_id(int(ent_id))
-
-            letra = str(doc_row.get("letra") or "").strip().upper()
-            es_letra_a = letra == "A" or codigo_afip in (1, 2, 3)
-            cuit_raw = (doc_row.get("cuit_receptor") or (entity or {}).get("cuit") or "").strip()
-            digits = "".join(ch for ch in cuit_raw if ch.isdigit())
-            doc_tipo = 99
-            doc_nro = 0
-            if digits:
-                if len(digits) == 11:
-                    doc_tipo = 80
-                    doc_nro = int(digits)
-                elif len(digits) <= 8:
-                    doc_tipo = 96
-                    doc_nro = int(digits)
-                else:
-                    show_toast("CUIT/DNI del receptor inválido.", kind="error")
-                    return
-
-            if es_letra_a and doc_tipo != 80:
-                show_toast("Para comprobantes letra A se requiere CUIT válido del receptor.", kind="error")
-                return
-
-            condicion_nombre = (entity or {}).get("condicion_iva")
-            condicion_id = afip.get_condicion_iva_receptor_id(condicion_nombre) if condicion_nombre else None
-            if es_letra_a and not condicion_id:
-                show_toast("Falta la condición IVA del receptor (requerida para letra A).", kind="error")
+            try:
+                invoice_data, fecha_doc = _build_afip_voucher(db_local, doc_row, punto_venta)
+            except ValueError as e:
+                show_toast(str(e), kind="error")
                 return
-
-            invoice_data = {
-                "CantReg": 1,
-                "PtoVta": punto_venta,
-                "CbteTipo": codigo_afip,
-                "Concepto": 1,
-                "DocTipo": doc_tipo,
-                "DocNro": doc_nro,
-                "CbteDesde": next_num,
-                "CbteHasta": next_num,
-                "CbteFch": datetime.now().strftime("%Y%m%d"),
-                "ImpTotal": total,
-                "ImpTotConc": 0,
-                "ImpNeto": neto,
-                "ImpOpEx": 0,
-                "ImpIVA": iva_total,
-                "ImpTrib": 0,
-                "MonId": "PES",
-                "MonCotiz": 1,
-            }
-            if iva_payload:
-                invoice_data["Iva"] = iva_payload
-            if condicion_id is not None:
-                invoice_data["CondicionIVAReceptorId"] = condicion_id
+            invoice_data["CbteDesde"] = next_num
+            invoice_data["CbteHasta"] = next_num
 
             res = afip.authorize_invoice(invoice_data)
             if res.get("success"):
-                cuit_emisor = "".join(ch for ch in str(getattr(afip, "cuit", "") or config.afip_cuit or "").strip() if ch.isdigit())
-                cae = res.get("CAE") or res.get("cae")
+                cuit_emisor = _afip_cuit_emisor()
                 qr_data = None
                 try:
-                    if not cae:
-                        raise ValueError("CAE ausente para generar QR.")
-                    fecha_doc = str(doc_full.get("fecha") or doc_row.get("fecha") or datetime.now().strftime("%Y-%m-%d"))[:10]
-                    qr_payload = {
-                        "ver": 1,
-                        "fecha": fecha_doc,
-                        "cuit": int(cuit_emisor) if cuit_emisor else 0,
-                        "ptoVta": int(punto_venta),
-                        "tipoCmp": int(codigo_afip),
-                        "nroCmp": int(next_num),
-                        "importe": float(quantize_2(to_decimal(total))),
-                        "moneda": "PES",
-                        "ctz": 1,
-                        "tipoDocRec": int(doc_tipo),
-                        "nroDocRec": int(doc_nro),
-                        "tipoCodAut": "E",
-                        "codAut": cae,
-                    }
-                    qr_json = json.dumps(qr_payload, separators=(",", ":"), ensure_ascii=False)
-                    qr_base64 = base64.b64encode(qr_json.encode("utf-8")).decode("ascii")
-                    qr_param = quote(qr_base64, safe="")
-                    qr_data = f"https://www.afip.gob.ar/fe/qr/?p={qr_param}"
+                    qr_data = _build_afip_qr_data(invoice_data, next_num, res.get("CAE") or res.get("cae"), cuit_emisor, fecha_doc)
                 except Exception:
                     qr_data = None
                     show_toast("No se pudo generar el QR fiscal del comprobante.", kind="warning")
@@ -5362,6 +5458,81 @@ def main(page: ft.Page) -> None:
         except Exception as e:
             show_toast(f"Error: {e}", kind="error")
 
+    def _authorize_afip_pending(doc_ids: Optional[Sequence[int]] = None) -> None:
+        """
+        Autoriza en lote los comprobantes pendientes de CAE (los seleccionados o todos):
+        se arman todos y se envían en lotes por punto de venta/tipo (AfipService.authorize_invoices).
+        """
+        if not afip:
+            show_toast("Servicio AFIP no configurado. Verifique CUIT y certificados en .env", kind="error")
+            return
+        db_local = get_db_or_toast()
+        if not db_local:
+            return
+
+        try:
+            rows = db_local.fetch_documentos_afip_pendientes(ids=doc_ids)
+            if not rows:
+                show_toast("No hay comprobantes pendientes de CAE.", kind="info")
+                return
+            show_toast(f"Solicitando CAE para {len(rows)} comprobantes...", kind="info")
+            punto_venta = int(getattr(config, "afip_punto_venta", 1) or 1)
+
+            failed: List[str] = []
+            pending: List[Tuple[Dict[str, Any], Dict[str, Any], str]] = []
+            for row in rows:
+                try:
+                    invoice_data, fecha_doc = _build_afip_voucher(db_local, row, punto_venta)
+                except Exception as e:
+                    failed.append(f"{row.get('tipo_documento')} {row.get('numero_serie')}: {e}")
+                    continue
+                pending.append((row, invoice_data, fecha_doc))
+
+            authorized = 0
+            cuit_emisor = _afip_cuit_emisor()
+            results = afip.authorize_invoices([invoice_data for _, invoice_data, _ in pending]) if pending else []
+            for (row, invoice_data, fecha_doc), res in zip(pending, results):
+                label = f"{row.get('tipo_documento')} {row.get('numero_serie')}"
+                if not res.get("success"):
+                    failed.append(f"{label}: {res.get('error')}")
+                    continue
+                try:
+                    qr_data = _build_afip_qr_data(invoice_data, res["CbteNro"], res.get("CAE"), cuit_emisor, fecha_doc)
+                except Exception:
+                    qr_data = None
+                try:
+                    db_local.update_document_afip_data(
+                        int(row["id"]),
+                        res["CAE"],
+                        res["CAEFchVto"],
+                        res["PtoVta"],
+                        res["CbteTipo"],
+                        cuit_emisor=cuit_emisor or None,
+                        qr_data=qr_data,
+                    )
+                    authorized += 1
+                except Exception as e:
+                    # AFIP ya lo autorizó: el CAE queda en el log para cargarlo a mano
+                    logger.error(f"CAE {res.get('CAE')} de {label} no se pudo guardar: {e}")
+                    failed.append(f"{label}: CAE {res.get('CAE')} no guardado ({e})")
+
+            if failed:
+                logger.warning("Autorización AFIP en lote con errores:\n" + "\n".join(failed))
+                show_toast(
+                    f"Autorizados {authorized} de {len(rows)}. Con error: {failed[0]}"
+                    + (f" (y {len(failed) - 1} más)" if len(failed) > 1 else ""),
+                    kind="warning" if authorized else "error",
+                )
+            else:
+                show_toast(f"Autorizados {authorized} comprobantes", kind="success")
+            if authorized:
+                documentos_summary_table.selected_ids.clear()
+                if hasattr(documentos_summary_table, "refresh"):
+                    documentos_summary_table.refresh()
+                refresh_all_stats()
+        except Exception as e:
+            show_toast(f"Error: {e}", kind="error")
+
     _authorize_afip_doc_core = _authorize_afip_doc
 
     def _confirm_afip_authorization(
@@ -5465,6 +5636,17 @@ def main(page: ft.Page) -> None:
             button_color=COLOR_WARNING,
         )
 
+    def _confirm_afip_batch_authorization() -> None:
+        selected = [int(i) for i in documentos_summary_table.selected_ids]
+        alcance = f"los {len(selected)} comprobantes seleccionados" if selected else "todos los comprobantes pendientes de CAE"
+        ask_confirm(
+            "Autorizar AFIP en lote",
+            f"Vas a facturar electrónicamente {alcance} en AFIP. Esta acción es irreversible y no se puede volver atrás. ¿Deseás continuar?",
+            "Autorizar AFIP",
+            lambda: _authorize_afip_pending(selected or None),
+            button_color=COLOR_WARNING,
+        )
+
     def _confirm_document(
         doc_id: int,
         *,
@@ -5968,20 +6150,22 @@ def main(page: ft.Page) -> None:
         except Exception as e:
             logger.warning(f"Falló al actualizar tabla de movimientos: {e}")
 
-    def movimientos_data_provider(offset, limit, search, simple, advanced, sorts):
+    def movimientos_data_provider(offset, limit, search, simple, advanced, sorts, after=None, before=None):
         if not db:
             return [], 0
         try:
-            rows = db.fetch_movimientos_stock(
+            return db.fetch_page(
+                "fetch_movimientos_stock",
                 search=search,
                 simple=simple,
                 advanced=advanced,
                 sorts=sorts,
                 limit=limit,
                 offset=offset,
+                keyset=True,
+                after=after,
+                before=before,
             )
-            total = db.count_movimientos_stock(search=search, simple=simple, advanced=advanced)
-            return rows, total
         except Exception:
             return [], 0
 
@@ -6009,8 +6193,13 @@ def main(page: ft.Page) -> None:
             
             doc_adv_entidad.options = shared_ent_options
             pago_adv_entidad.options = shared_ent_options
+
+            formas = db.fetch_formas_pago(limit=100)
+            doc_adv_forma.options = [ft.dropdown.Option("0", "Todas")] + [
+                ft.dropdown.Option(str(f["id"]), f["descripcion"]) for f in formas
+            ]
             
-            for ctrl in [doc_adv_tipo, doc_adv_entidad, pago_adv_entidad]:
+            for ctrl in [doc_adv_tipo, doc_adv_entidad, pago_adv_entidad, doc_adv_forma]:
                 try:
                     if ctrl.page: ctrl.update()
                 except Exception as e:
@@ -6126,6 +6315,9 @@ def main(page: ft.Page) -> None:
 
     doc_adv_desde = _date_field("Desde", width=130)
     doc_adv_hasta = _date_field("Hasta", width=130)
+
+    doc_adv_forma = ft.Dropdown(label="Forma de Pago", options=[ft.dropdown.Option("0", "Todas")], width=180, value="0"); _style_input(doc_adv_forma)
+    doc_adv_con_saldo = ft.Switch(label="Solo con saldo", value=False)
     
     documentos_summary_table: Optional[GenericTable] = None
 
@@ -6185,6 +6377,7 @@ def main(page: ft.Page) -> None:
             ColumnConfig(key="entidad", label="Entidad", width=200),
             ColumnConfig(key="total", label="Total", width=120, formatter=_format_money),
             ColumnConfig(key="forma_pago", label="Forma de Pago", width=130),
+            ColumnConfig(key="saldo_pendiente", label="Saldo", width=110, formatter=_format_money),
             ColumnConfig(key="estado", label="Estado", width=120, renderer=lambda row: _status_pill(row.get("estado"), row)),
             ColumnConfig(key="usuario", label="Usuario", width=120),
             ColumnConfig(
@@ -6283,7 +6476,8 @@ def main(page: ft.Page) -> None:
                 )
             ),
         ],
-        data_provider=create_catalog_provider(db.fetch_documentos_resumen, db.count_documentos_resumen),
+        data_provider=create_catalog_provider(db.fetch_documentos_resumen, db.count_documentos_resumen, keyset=True),
+        keyset_pagination=True,
         advanced_filters=[
             AdvancedFilterControl("id_entidad", doc_adv_entidad),
             AdvancedFilterControl("tipo", doc_adv_tipo),
@@ -6292,6 +6486,8 @@ def main(page: ft.Page) -> None:
             AdvancedFilterControl("desde", doc_adv_desde),
             AdvancedFilterControl("hasta", doc_adv_hasta),
             AdvancedFilterControl("estado", doc_adv_estado),
+            AdvancedFilterControl("id_forma_pago", doc_adv_forma),
+            AdvancedFilterControl("con_saldo", doc_adv_con_saldo, getter=lambda c: c.value),
             AdvancedFilterControl("total_min", doc_adv_total_container, getter=lambda _: doc_adv_total.start_value, setter=reset_range_slider),
             AdvancedFilterControl("total_max", doc_adv_total_container, getter=lambda _: doc_adv_total.end_value, setter=reset_range_slider),
         ],
@@ -6312,6 +6508,10 @@ def main(page: ft.Page) -> None:
             "Consulta de facturas, presupuestos y compras.", 
             documentos_summary_table.build(),
             actions=[
+                btn_afip_lote := ft.OutlinedButton("Autorizar AFIP", icon=ft.icons.SECURITY,
+                                   tooltip="Solicitar CAE de los comprobantes seleccionados (o de todos los pendientes)",
+                                   on_click=lambda e: _confirm_afip_batch_authorization(),
+                                   style=ft.ButtonStyle(shape=ft.RoundedRectangleBorder(radius=8))),
                 btn_nuevo_comprobante := ft.ElevatedButton("Nuevo Comprobante", icon=ft.icons.ADD_ROUNDED, bgcolor=COLOR_ACCENT, color="#FFFFFF", 
                                    on_click=lambda e: open_nuevo_comprobante(),
                                    style=ft.ButtonStyle(shape=ft.RoundedRectangleBorder(radius=8))),
@@ -6569,6 +6769,7 @@ def main(page: ft.Page) -> None:
             ),
         ],
         data_provider=movimientos_data_provider,
+        keyset_pagination=True,
         advanced_filters=[
             AdvancedFilterControl("articulo", mov_adv_art),
             AdvancedFilterControl("tipo_movimiento", mov_adv_tipo),
@@ -6683,7 +6884,8 @@ def main(page: ft.Page) -> None:
                 renderer=lambda row: ft.IconButton(ft.icons.INFO_OUTLINE, tooltip="Ver observaciones", icon_color=COLOR_ACCENT if row.get("observacion") else "grey", on_click=lambda _: show_payment_info(row.get("observacion"))),
             ),
         ],
-        data_provider=create_catalog_provider(db.fetch_pagos, db.count_pagos),
+        data_provider=create_catalog_provider(db.fetch_pagos, db.count_pagos, keyset=True),
+        keyset_pagination=True,
         advanced_filters=[
             AdvancedFilterControl("referencia", pago_adv_ref),
             AdvancedFilterControl("entidad", pago_adv_entidad),
@@ -6882,6 +7084,7 @@ def main(page: ft.Page) -> None:
     cc_adv_tipo = _dropdown("Tipo", [("", "Todos"), ("CLIENTE", "Clientes"), ("PROVEEDOR", "Proveedores")], value="", width=180, on_change=_cc_live)
     cc_adv_estado = _dropdown("Estado", [("", "Todos"), ("DEUDOR", "Deudores"), ("A_FAVOR", "A Favor"), ("AL_DIA", "Al Día")], value="", width=180, on_change=_cc_live)
     cc_adv_solo_saldo = ft.Switch(label="Solo con saldo", value=False, on_change=_cc_live)
+    cc_adv_antiguedad = _dropdown("Antigüedad", [("", "Todas"), ("31", "Más de 30 días"), ("61", "Más de 60 días"), ("91", "Más de 90 días")], value="", width=180, on_change=_cc_live)
 
     def cuentas_provider(offset, limit, search, simple, advanced, sorts):
         if db is None:
@@ -7135,6 +7338,9 @@ def main(page: ft.Page) -> None:
             ColumnConfig(key="saldo_actual", label="Saldo", width=150, renderer=lambda row: _saldo_pill(row.get("saldo_actual"))),
             ColumnConfig(key="limite_credito", label="Límite Créd.", width=120, formatter=_format_money),
             ColumnConfig(key="ultimo_movimiento", label="Últ. Movimiento", width=150, formatter=_format_datetime),
+            ColumnConfig(key="saldo_31_60", label="31-60 días", width=110, formatter=_format_money),
+            ColumnConfig(key="saldo_61_90", label="61-90 días", width=110, formatter=_format_money),
+            ColumnConfig(key="saldo_mas_90", label="+90 días", width=110, formatter=_format_money),
             ColumnConfig(key="total_movimientos", label="Movs.", width=80),
             ColumnConfig(key="acciones", label="", width=80, renderer=lambda row: ft.IconButton(
                 ft.icons.HISTORY_ROUNDED, 
@@ -7148,6 +7354,7 @@ def main(page: ft.Page) -> None:
             AdvancedFilterControl("tipo_entidad", cc_adv_tipo),
             AdvancedFilterControl("estado", cc_adv_estado),
             AdvancedFilterControl("solo_con_saldo", cc_adv_solo_saldo, getter=lambda c: c.value),
+            AdvancedFilterControl("antiguedad", cc_adv_antiguedad),
         ],
         id_field="id_entidad_comercial",
         show_inline_controls=False,
@@ -7267,7 +7474,11 @@ def main(page: ft.Page) -> None:
                 load_sistema_config()
             elif idx in tab_to_table:
                 _run_in_background(_run_on_ui, tab_to_table[idx].refresh)
-    
+            elif idx == 13 and diagnostics_view is not None:
+                _run_in_background(_run_on_ui, diagnostics_view.refresh)
+
+    diagnostics_view = QueryDiagnosticsView(db, show_toast) if db else None
+
     config_tabs = ft.Tabs(
         scrollable=True,
         on_change=on_config_tab_change,
@@ -7405,6 +7616,10 @@ def main(page: ft.Page) -> None:
                     expand=True, spacing=10,
                 ),
             ),
+            make_tab(
+                text="Diagnóstico",
+                content=diagnostics_view or ft.Container(),
+            ),
         ],
     )
 
@@ -7440,7 +7655,7 @@ def main(page: ft.Page) -> None:
     )
     wire_refresh(
         documentos_summary_table,
-        [doc_adv_entidad, doc_adv_tipo, doc_adv_desde, doc_adv_hasta],
+        [doc_adv_entidad, doc_adv_tipo, doc_adv_desde, doc_adv_hasta, doc_adv_forma, doc_adv_con_saldo],
     )
     wire_refresh(
         movimientos_table,
@@ -7590,6 +7805,40 @@ def main(page: ft.Page) -> None:
     # =========================================================================
     CURRENT_USER_ROLE = "EMPLEADO"  # Default, will be set on login
     monitor_started = False
+    change_watch_started = False
+
+    def watch_table_changes() -> None:
+        """Refresh the visible table when its source tables change in any terminal."""
+        nonlocal change_watch_started
+        if change_watch_started or not db:
+            return
+        change_watch_started = True
+
+        def is_current(key: str) -> Callable[[], bool]:
+            return lambda: current_view.get("key") == key and not window_is_closing
+
+        def dispatch(fn: Callable[..., None], **kwargs: Any) -> None:
+            _run_in_background(_run_on_ui, fn, **kwargs)
+
+        watched = [
+            ("entidades", entidades_table, ["app.entidad_comercial"]),
+            ("articulos", articulos_table, ["app.articulo", "app.movimiento_articulo"]),
+            ("documentos", documentos_summary_table, ["app.documento", "app.pago"]),
+            ("remitos", remitos_table, ["app.remito"]),
+            ("movimientos", movimientos_table, ["app.movimiento_articulo"]),
+            ("pagos", pagos_table, ["app.pago"]),
+            ("cuentas", cuentas_table, ["app.movimiento_cuenta_corriente", "app.entidad_comercial"]),
+            ("precios", precios_table, ["ref.lista_precio"]),
+        ]
+        for key, table, tables in watched:
+            table.watch_changes(db.subscribe_changes, tables, is_active=is_current(key), dispatch=dispatch)
+
+        def on_cc_change(_tables: Any) -> None:
+            if current_view.get("key") == "cuentas":
+                _run_in_background(_run_on_ui, refresh_cc_stats)
+
+        db.subscribe_changes(["app.movimiento_cuenta_corriente"], on_cc_change)
+
     admin_export_tables = [
         entidades_table, 
         articulos_table, 
@@ -7641,6 +7890,7 @@ def main(page: ft.Page) -> None:
             btn_nueva_entidad, 
             btn_nuevo_articulo, 
             btn_nuevo_comprobante, 
+            btn_afip_lote,
             btn_nuevo_pago,
             btn_registrar_pago_cc,
             btn_ajuste_saldo_cc
@@ -7930,7 +8180,8 @@ def main(page: ft.Page) -> None:
 
                                 refresh_all_stats()
 
-                                key = current_view.get("key")
+                                # With live notifications, open views refresh themselves (watch_table_changes).
+                                key = None if db.change_notifications_available else current_view.get("key")
                                 if key == "entidades":
                                     _run_in_background(_run_on_ui, entidades_table.refresh, silent=True)
                                 elif key == "articulos":
@@ -7967,6 +8218,7 @@ def main(page: ft.Page) -> None:
             threading.Thread(target=background_monitor, daemon=True).start()
 
         start_background_monitor()
+        watch_table_changes()
 
         db.log_activity("SISTEMA", "LOGIN_OK", detalle={"modo": "BASIC_UI", "usuario": user["nombre"], "acceso": mode})
         try:
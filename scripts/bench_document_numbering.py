@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Document numbering under concurrency: --terminals threads (one connection
+each, like the cashiers of a store) save --documents documents of the same
+type at the same time.
+
+- anterior: advisory lock per type + MAX(numero_serie) + 1 inside the
+  transaction that saves the document (held for the whole save).
+- contador: number taken with app.fn_numero_documento_siguiente in a short
+  transaction of its own, then the document is saved.
+
+--work-ms simulates the rest of the save (details, stock, triggers) with
+pg_sleep inside the document transaction. A temporary document type is
+created and deleted (with its documents) at the end.
+
+    python scripts/bench_document_numbering.py --terminals 10 --documents 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+import psycopg
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from desktop_app.config import load_config
+
+INSERT_SQL = """
+    INSERT INTO app.documento (id_tipo_documento, id_entidad_comercial, numero_serie, observacion)
+    VALUES (%s, %s, %s, 'bench_document_numbering')
+"""
+
+
+def _save_legacy(cur: psycopg.Cursor, tipo: int, entidad: int, work_s: float) -> None:
+    with cur.connection.transaction():
+        cur.execute("SELECT pg_advisory_xact_lock(%s)", (tipo,))
+        cur.execute(
+            "SELECT MAX(numero_serie::bigint) FROM app.documento "
+            "WHERE id_tipo_documento = %s AND numero_serie ~ '^[0-9]+$'",
+            (tipo,),
+        )
+        numero = (cur.fetchone()[0] or 0) + 1
+        cur.execute(INSERT_SQL, (tipo, entidad, str(numero)))
+        cur.execute("SELECT pg_sleep(%s)", (work_s,))
+
+
+def _save_counter(cur: psycopg.Cursor, tipo: int, entidad: int, work_s: float) -> None:
+    with cur.connection.transaction():
+        cur.execute("SELECT app.fn_numero_documento_siguiente(%s)", (tipo,))
+        numero = cur.fetchone()[0]
+    with cur.connection.transaction():
+        cur.execute(INSERT_SQL, (tipo, entidad, str(numero)))
+        cur.execute("SELECT pg_sleep(%s)", (work_s,))
+
+
+def _run(
+    dsn: str,
+    save: Callable[[psycopg.Cursor, int, int, float], None],
+    tipo: int,
+    entidad: int,
+    terminals: int,
+    documents: int,
+    work_s: float,
+) -> Tuple[float, List[float], List[str]]:
+    barrier = threading.Barrier(terminals)
+    latencies: List[float] = []
+    errors: List[str] = []
+    lock = threading.Lock()
+
+    def terminal() -> None:
+        with psycopg.connect(dsn, autocommit=True) as conn:
+            with conn.cursor() as cur:
+                barrier.wait()
+                for _ in range(documents):
+                    started = time.perf_counter()
+                    try:
+                        save(cur, tipo, entidad, work_s)
+                    except psycopg.Error as exc:
+                        with lock:
+                            errors.append(str(exc).splitlines()[0])
+                        continue
+                    with lock:
+                        latencies.append((time.perf_counter() - started) * 1000.0)
+
+    threads = [threading.Thread(target=terminal) for _ in range(terminals)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started, latencies, errors
+
+
+def _check_numbers(cur: psycopg.Cursor, tipo: int) -> Tuple[int, int, int]:
+    """(documents, duplicated numbers, gaps between 1 and the highest number)"""
+    cur.execute(
+        """
+        SELECT COUNT(*), COUNT(*) - COUNT(DISTINCT numero_serie), COALESCE(MAX(numero_serie::bigint), 0)
+        FROM app.documento WHERE id_tipo_documento = %s
+        """,
+        (tipo,),
+    )
+    total, duplicated, highest = cur.fetchone()
+    cur.execute(
+        """
+        SELECT COUNT(*) FROM generate_series(1, %s) g
+        WHERE NOT EXISTS (
+            SELECT 1 FROM app.documento WHERE id_tipo_documento = %s AND numero_serie = g::text
+        )
+        """,
+        (highest, tipo),
+    )
+    return total, duplicated, cur.fetchone()[0]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--terminals", type=int, default=10, help="Concurrent terminals (default: 10)")
+    parser.add_argument("--documents", type=int, default=50, help="Documents per terminal (default: 50)")
+    parser.add_argument("--work-ms", type=float, default=20.0, help="Rest of the save, simulated with pg_sleep (default: 20)")
+    parser.add_argument("--dsn", default=None, help="Connection string (default: DATABASE_URL / .env)")
+    args = parser.parse_args()
+
+    dsn = args.dsn or load_config().database_url
+    work_s = args.work_ms / 1000.0
+    with psycopg.connect(dsn, autocommit=True) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id FROM app.entidad_comercial ORDER BY id LIMIT 1")
+            entidad = cur.fetchone()
+            if not entidad:
+                print("Se necesita al menos una entidad comercial.")
+                return 1
+            print(f"{args.terminals} terminales x {args.documents} comprobantes, {args.work_ms:.0f} ms de guardado")
+            print(f"{'modo':<10} {'comp/s':>8} {'p50':>9} {'p95':>9} {'errores':>8} {'duplic.':>8} {'huecos':>7}")
+            for label, save in (("anterior", _save_legacy), ("contador", _save_counter)):
+                cur.execute(
+                    "INSERT INTO ref.tipo_documento (nombre, clase) VALUES (%s, 'VENTA') RETURNING id",
+                    (f"BENCH {label} {int(time.time()) % 100000}",),
+                )
+                tipo = cur.fetchone()[0]
+                try:
+                    elapsed, latencies, errors = _run(
+                        dsn, save, tipo, entidad[0], args.terminals, args.documents, work_s
+                    )
+                    total, duplicated, gaps = _check_numbers(cur, tipo)
+                    ordered = sorted(latencies) or [0.0]
+                    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+                    print(
+                        f"{label:<10} {total / elapsed if elapsed else 0:>8.1f} "
+                        f"{statistics.median(ordered):>7.1f}ms {p95:>7.1f}ms "
+                        f"{len(errors):>8} {duplicated:>8} {gaps:>7}"
+                    )
+                    if errors:
+                        print(f"  primer error: {errors[0]}")
+                finally:
+                    cur.execute("DELETE FROM app.documento WHERE id_tipo_documento = %s", (tipo,))
+                    cur.execute("DELETE FROM ref.tipo_documento WHERE id = %s", (tipo,))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
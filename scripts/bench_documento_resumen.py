@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Comprobantes list queries over app.v_documento_resumen with the maintained
+payment columns (app.documento.forma_pago / saldo_pendiente) vs. the previous
+view, which looked up the first payment with a correlated subquery per row.
+
+Synthetic documents (and a payment for --paid of them) are inserted until the
+table has --documents rows; everything runs in one transaction that is rolled
+back at the end. Use a copy of the database or run it off-hours.
+
+    python scripts/bench_documento_resumen.py --documents 500000
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import psycopg
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from desktop_app.config import load_config
+
+# The view as it was before the payment summary columns
+LEGACY_VIEW_SQL = """
+CREATE TEMPORARY VIEW v_documento_resumen_legacy AS
+SELECT
+  doc.id,
+  td.nombre AS tipo_documento,
+  td.letra,
+  doc.fecha,
+  doc.numero_serie,
+  doc.estado,
+  doc.total,
+  COALESCE(ec.razon_social, TRIM(COALESCE(ec.apellido, '') || ' ' || COALESCE(ec.nombre, ''))) AS entidad,
+  u.nombre AS usuario,
+  (SELECT fp.descripcion FROM app.pago p JOIN ref.forma_pago fp ON fp.id = p.id_forma_pago WHERE p.id_documento = doc.id ORDER BY p.id LIMIT 1) as forma_pago
+FROM app.documento doc
+JOIN ref.tipo_documento td ON td.id = doc.id_tipo_documento
+JOIN app.entidad_comercial ec ON ec.id = doc.id_entidad_comercial
+LEFT JOIN seguridad.usuario u ON u.id = doc.id_usuario
+"""
+
+SEED_DOCUMENTS_SQL = """
+    INSERT INTO app.documento (id_tipo_documento, id_entidad_comercial, estado, fecha, numero_serie, neto, subtotal, total)
+    SELECT %(tipo)s, %(entidad)s, 'CONFIRMADO', now() - (g || ' minutes')::interval, 'BENCH-' || g,
+           t.total, t.total, t.total
+    FROM generate_series(1, %(count)s) AS g
+    CROSS JOIN LATERAL (SELECT round((random() * 100000)::numeric, 2) AS total) t
+"""
+
+SEED_PAYMENTS_SQL = """
+    INSERT INTO app.pago (id_documento, id_forma_pago, monto)
+    SELECT d.id, (%(formas)s::bigint[])[1 + (d.id %% cardinality(%(formas)s::bigint[]))::int], d.total
+    FROM app.documento d
+    WHERE d.numero_serie LIKE 'BENCH-%%' AND random() < %(paid)s
+"""
+
+# (label, query using {view}); forma_pago sorts and counts are what the comprobantes table runs
+QUERIES: List[Tuple[str, str]] = [
+    ("página fecha", "SELECT * FROM {view} ORDER BY fecha DESC, id DESC LIMIT 50"),
+    ("página forma_pago", "SELECT * FROM {view} ORDER BY forma_pago ASC, id ASC LIMIT 50"),
+    ("filtro forma_pago", "SELECT * FROM {view} WHERE forma_pago = %(forma)s ORDER BY fecha DESC, id DESC LIMIT 50"),
+    ("conteo", "SELECT COUNT(*) FROM {view}"),
+    ("conteo forma_pago", "SELECT COUNT(*) FROM {view} WHERE forma_pago = %(forma)s"),
+]
+
+
+def _timings(cur: psycopg.Cursor, sql: str, params: dict, rounds: int) -> List[float]:
+    cur.execute(sql, params)  # warm-up
+    cur.fetchall()
+    timings: List[float] = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        cur.execute(sql, params)
+        cur.fetchall()
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=500_000, help="Documents in the table while measuring (default: 500000)")
+    parser.add_argument("--paid", type=float, default=0.7, help="Share of the synthetic documents with a payment (default: 0.7)")
+    parser.add_argument("--rounds", type=int, default=5, help="Timed runs per query and view (default: 5)")
+    parser.add_argument("--dsn", default=None, help="Connection string (default: DATABASE_URL / .env)")
+    args = parser.parse_args()
+
+    dsn = args.dsn or load_config().database_url
+    with psycopg.connect(dsn) as conn:
+        with conn.cursor() as cur:
+            try:
+                cur.execute("SELECT set_config('app.user_id', '0', true)")
+                cur.execute("SELECT id FROM ref.tipo_documento ORDER BY id LIMIT 1")
+                tipo = cur.fetchone()
+                cur.execute("SELECT id FROM app.entidad_comercial ORDER BY id LIMIT 1")
+                entidad = cur.fetchone()
+                cur.execute("SELECT id, descripcion FROM ref.forma_pago ORDER BY id")
+                formas = cur.fetchall()
+                if not tipo or not entidad or not formas:
+                    print("Se necesitan un tipo de documento, una entidad y formas de pago.")
+                    return 1
+                cur.execute("SELECT COUNT(*) FROM app.documento")
+                missing = max(0, args.documents - cur.fetchone()[0])
+                if missing:
+                    print(f"Insertando {missing} comprobantes sintéticos...")
+                    cur.execute(SEED_DOCUMENTS_SQL, {"tipo": tipo[0], "entidad": entidad[0], "count": missing})
+                    cur.execute(SEED_PAYMENTS_SQL, {"formas": [f[0] for f in formas], "paid": args.paid})
+                cur.execute("ANALYZE app.documento")
+                cur.execute("ANALYZE app.pago")
+                cur.execute(LEGACY_VIEW_SQL)
+
+                params = {"forma": formas[0][1]}
+                print(f"{'consulta':<20} {'antes p50':>11} {'ahora p50':>11} {'mejora':>8}")
+                for label, sql in QUERIES:
+                    before = statistics.median(_timings(cur, sql.format(view="v_documento_resumen_legacy"), params, args.rounds))
+                    after = statistics.median(_timings(cur, sql.format(view="app.v_documento_resumen"), params, args.rounds))
+                    speedup = before / after if after else 0.0
+                    print(f"{label:<20} {before:>9.1f}ms {after:>9.1f}ms {speedup:>7.1f}x")
+            finally:
+                conn.rollback()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Time of the mass update preview over the whole catalog: the aggregate
+(Database.preview_mass_update_stats, one SQL pass) and the per-row preview
+used for the selection table (Database.preview_mass_update).
+
+    python scripts/bench_mass_update_preview.py --operation PCT_ADD --value 10
+    python scripts/bench_mass_update_preview.py --list-id 1
+
+Read-only: nothing is updated.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from desktop_app.config import load_config
+from desktop_app.database import Database
+from desktop_app.services import mass_update_math
+
+
+def _timings(func: Callable[[], object], rounds: int) -> List[float]:
+    func()  # warm-up
+    timings: List[float] = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--operation", default="PCT_ADD", choices=["PCT_ADD", "PCT_SUB", "AMT_ADD", "AMT_SUB", "SET_VAL"])
+    parser.add_argument("--value", type=float, default=10.0)
+    parser.add_argument("--list-id", type=int, default=None, help="Preview a price list change instead of the cost")
+    parser.add_argument("--rounds", type=int, default=5, help="Timed runs per method (default: 5)")
+    parser.add_argument("--dsn", default=None, help="Connection string (default: DATABASE_URL / .env)")
+    args = parser.parse_args()
+
+    db = Database(args.dsn or load_config().database_url, listen_for_changes=False)
+    target = "LISTA_PRECIO" if args.list_id else "COSTO"
+    kwargs = dict(filters={}, target=target, operation=args.operation, value=args.value, list_id=args.list_id)
+    try:
+        stats = db.preview_mass_update_stats(**kwargs)
+        rows = db.preview_mass_update(limit=None, **kwargs)["rows"]
+        print(f"{stats['articles']} artículos, {len(rows)} filas de vista previa (NumPy: {'sí' if mass_update_math.np is not None else 'no'})")
+        for label, func in (
+            ("agregado (SQL)", lambda: db.preview_mass_update_stats(**kwargs)),
+            ("por fila", lambda: db.preview_mass_update(limit=None, **kwargs)),
+        ):
+            timings = _timings(func, args.rounds)
+            print(f"{label:<16} p50 {statistics.median(timings):>9.1f} ms   máx {max(timings):>9.1f} ms")
+    finally:
+        db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Per-call latency of the hot lookups (Database._HOT_STATEMENTS) sent as plain
+text queries vs. server-side prepared statements.
+
+Run it from a cashier terminal against the LAN server:
+
+    python scripts/bench_prepared_statements.py --iterations 500
+
+Only SELECTs are executed; the connection is rolled back at the end.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+
+import psycopg
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from desktop_app.config import load_config
+from desktop_app.database import _HOT_STATEMENTS
+
+# Sample parameters for each hot statement
+SAMPLE_QUERIES: Dict[str, str] = {
+    "config_value": "SELECT clave FROM seguridad.config_sistema ORDER BY clave LIMIT %s",
+    "article_simple": "SELECT id FROM app.articulo ORDER BY id DESC LIMIT %s",
+    "entity_simple": "SELECT id FROM app.entidad_comercial ORDER BY id DESC LIMIT %s",
+    "article_prices": "SELECT id FROM app.articulo ORDER BY id DESC LIMIT %s",
+    "article_stock": "SELECT id FROM app.articulo ORDER BY id DESC LIMIT %s",
+    "article_stock_deposito": "SELECT id_articulo, id_deposito FROM app.articulo_stock_deposito ORDER BY id_articulo DESC LIMIT %s",
+    "next_document_number": "SELECT id FROM ref.tipo_documento ORDER BY id LIMIT %s",
+}
+
+
+def _sample_params(conn: psycopg.Connection, name: str, count: int) -> List[Tuple[Any, ...]]:
+    with conn.cursor() as cur:
+        cur.execute(SAMPLE_QUERIES[name], (count,))
+        return [tuple(row) for row in cur.fetchall()]
+
+
+def _measure(conn: psycopg.Connection, sql: str, params: Sequence[Tuple[Any, ...]], iterations: int, prepare: bool) -> List[float]:
+    timings: List[float] = []
+    with conn.cursor() as cur:
+        # Warm-up: prepares the statement / fills caches on both sides
+        cur.execute(sql, params[0], prepare=prepare)
+        cur.fetchall()
+        for i in range(iterations):
+            started = time.perf_counter()
+            cur.execute(sql, params[i % len(params)], prepare=prepare)
+            cur.fetchall()
+            timings.append((time.perf_counter() - started) * 1000.0)
+    return timings
+
+
+def _summary(timings: List[float]) -> Tuple[float, float]:
+    ordered = sorted(timings)
+    p95 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+    return statistics.median(ordered), p95
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=300, help="Calls per statement and mode (default: 300)")
+    parser.add_argument("--samples", type=int, default=50, help="Distinct parameter values per statement (default: 50)")
+    parser.add_argument("--dsn", default=None, help="Connection string (default: DATABASE_URL / .env)")
+    args = parser.parse_args()
+
+    dsn = args.dsn or load_config().database_url
+    # prepare_threshold=None: only the explicit prepare=True calls are prepared
+    with psycopg.connect(dsn, prepare_threshold=None) as conn:
+        print(f"{'statement':<22} {'text p50':>10} {'text p95':>10} {'prep p50':>10} {'prep p95':>10} {'speedup':>8}")
+        for name, sql in _HOT_STATEMENTS.items():
+            params = _sample_params(conn, name, args.samples)
+            if not params:
+                print(f"{name:<22} (sin datos de muestra)")
+                continue
+            text_p50, text_p95 = _summary(_measure(conn, sql, params, args.iterations, prepare=False))
+            prep_p50, prep_p95 = _summary(_measure(conn, sql, params, args.iterations, prepare=True))
+            speedup = text_p50 / prep_p50 if prep_p50 else 0.0
+            print(
+                f"{name:<22} {text_p50:>8.3f}ms {text_p95:>8.3f}ms "
+                f"{prep_p50:>8.3f}ms {prep_p95:>8.3f}ms {speedup:>7.2f}x"
+            )
+        conn.rollback()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Recomputation of every list price from the article cost over a synthetic
+catalog (default: 100k articles x 6 price lists).
+
+Without --dsn only the reference implementation (pricing_engine.reference_prices,
+NumPy when available) is timed. With --dsn the same catalog is inserted in a
+transaction, recomputed with the set-based SQL engine
+(pricing_engine.recompute_prices, one UPDATE) and checked against the
+reference; the transaction is rolled back at the end.
+
+    python scripts/bench_pricing_engine.py
+    python scripts/bench_pricing_engine.py --articles 100000 --lists 6 --dsn postgresql://...
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from desktop_app.services import pricing_engine
+
+# Synthetic catalog (new articles get ids above `offset`); every 4th list is a discount
+SEED_SQL = """
+    INSERT INTO app.articulo (nombre, costo, redondeo)
+    SELECT 'bench_pricing_engine ' || g, round((random() * 50000)::numeric, 2), (g %% 3 = 0)
+    FROM generate_series(1, %(articles)s) AS g
+"""
+
+PRICES_SQL = """
+    INSERT INTO app.articulo_precio (id_articulo, id_lista_precio, precio, porcentaje, id_tipo_porcentaje)
+    SELECT a.id, lp.id, 0, round((random() * 80)::numeric, 2),
+           CASE WHEN lp.n %% 4 = 0 THEN %(descuento)s ELSE %(margen)s END
+    FROM app.articulo a
+    CROSS JOIN (
+        SELECT id, row_number() OVER (ORDER BY id) AS n FROM ref.lista_precio ORDER BY id LIMIT %(lists)s
+    ) lp
+    WHERE a.id > %(offset)s
+"""
+
+
+def _timings(func: Callable[[], object], rounds: int) -> List[float]:
+    func()  # warm-up
+    timings: List[float] = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return timings
+
+
+def _synthetic_columns(rows: int) -> Tuple[List[float], List[float], List[str], List[bool]]:
+    rng = random.Random(42)
+    costs = [round(rng.uniform(0, 50000), 2) for _ in range(rows)]
+    pcts = [round(rng.uniform(0, 80), 2) for _ in range(rows)]
+    tipos = ["DESCUENTO" if i % 4 == 0 else "MARGEN" for i in range(rows)]
+    redondeo = [i % 3 == 0 for i in range(rows)]
+    return costs, pcts, tipos, redondeo
+
+
+def _bench_sql(dsn: str, articles: int, lists: int, rounds: int, tolerance: float) -> int:
+    import psycopg
+
+    with psycopg.connect(dsn) as conn:
+        with conn.cursor() as cur:
+            try:
+                cur.execute("SELECT COALESCE(max(id), 0) FROM app.articulo")
+                offset = cur.fetchone()[0]
+                cur.execute("SELECT count(*) FROM ref.lista_precio")
+                available = cur.fetchone()[0]
+                cur.execute("SELECT tipo, id FROM ref.tipo_porcentaje")
+                tipos = dict(cur.fetchall())
+                if available < lists or "MARGEN" not in tipos or "DESCUENTO" not in tipos:
+                    print(f"Se necesitan {lists} listas de precio y los tipos MARGEN/DESCUENTO.")
+                    return 1
+                cur.execute(SEED_SQL, {"articles": articles})
+                cur.execute(PRICES_SQL, {
+                    "offset": offset, "lists": lists,
+                    "margen": tipos["MARGEN"], "descuento": tipos["DESCUENTO"],
+                })
+                rows = cur.rowcount
+                articles_sql, params = "SELECT id FROM app.articulo WHERE id > %s", [offset]
+
+                def recompute() -> float:
+                    # Zero the prices so every round writes every row
+                    cur.execute("UPDATE app.articulo_precio SET precio = 0 WHERE id_articulo > %s", (offset,))
+                    started = time.perf_counter()
+                    pricing_engine.recompute_prices(cur, articles_sql, params)
+                    return time.perf_counter() - started
+
+                recompute()  # warm-up
+                timings = [recompute() * 1000.0 for _ in range(rounds)]
+                median = statistics.median(timings)
+                print(f"{'SQL (1 UPDATE)':<18} p50 {median:>9.1f} ms   máx {max(timings):>9.1f} ms   {rows / median * 1000.0 if median else 0:>11.0f} precios/s")
+
+                cur.execute(
+                    """
+                    SELECT a.costo, ap.porcentaje, tp.tipo, a.redondeo, ap.precio
+                    FROM app.articulo_precio ap
+                    JOIN app.articulo a ON a.id = ap.id_articulo
+                    LEFT JOIN ref.tipo_porcentaje tp ON tp.id = ap.id_tipo_porcentaje
+                    WHERE ap.id_articulo > %s
+                    """,
+                    (offset,),
+                )
+                fetched = cur.fetchall()
+                expected = pricing_engine.reference_prices(
+                    [r[0] for r in fetched], [r[1] for r in fetched], [r[2] for r in fetched], [r[3] for r in fetched]
+                )
+                mismatches = sum(1 for r, price in zip(fetched, expected) if abs(float(r[4]) - price) > tolerance)
+                print(f"Verificación contra la referencia: {len(fetched)} precios, {mismatches} diferencias")
+                return 1 if mismatches else 0
+            finally:
+                conn.rollback()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--articles", type=int, default=100_000, help="Synthetic articles (default: 100000)")
+    parser.add_argument("--lists", type=int, default=6, help="Price lists per article (default: 6)")
+    parser.add_argument("--rounds", type=int, default=5, help="Timed runs per method (default: 5)")
+    parser.add_argument("--tolerance", type=float, default=0.005, help="Max SQL vs. reference difference (default: 0.005)")
+    parser.add_argument("--dsn", default=None, help="Also time the SQL engine on this database (rolled back)")
+    args = parser.parse_args()
+
+    rows = args.articles * args.lists
+    costs, pcts, tipos, redondeo = _synthetic_columns(rows)
+    print(f"{args.articles} artículos x {args.lists} listas = {rows} precios (NumPy: {'sí' if pricing_engine.np is not None else 'no'})")
+    timings = _timings(lambda: pricing_engine.reference_prices(costs, pcts, tipos, redondeo), args.rounds)
+    median = statistics.median(timings)
+    print(f"{'referencia':<18} p50 {median:>9.1f} ms   máx {max(timings):>9.1f} ms   {rows / median * 1000.0 if median else 0:>11.0f} precios/s")
+
+    if args.dsn:
+        return _bench_sql(args.dsn, args.articles, args.lists, args.rounds, args.tolerance)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Throughput of stock movement inserts (what confirming a document does) with
+the previous row-level stock trigger vs. the statement-level
+app.fn_sync_stock_resumen.
+
+Each round inserts one "document" of --lines movements with a single
+INSERT ... SELECT, like Database.confirm_document. Everything runs in one
+transaction that is rolled back at the end (triggers included), but it holds
+an exclusive lock on app.movimiento_articulo while it runs: use a copy of the
+database or run it off-hours.
+
+    python scripts/bench_stock_trigger.py --lines 200 --rounds 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+import psycopg
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from desktop_app.config import load_config
+
+# Row-level trigger as it was before the statement-level version
+LEGACY_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION app.fn_sync_stock_resumen_bench_row()
+RETURNS TRIGGER AS $fn$
+DECLARE
+  v_signo INTEGER;
+  v_new_stock NUMERIC(14,4);
+BEGIN
+  SELECT signo_stock INTO v_signo
+  FROM ref.tipo_movimiento_articulo
+  WHERE id = COALESCE(NEW.id_tipo_movimiento, OLD.id_tipo_movimiento);
+
+  IF (TG_OP = 'INSERT') THEN
+    INSERT INTO app.articulo_stock_resumen (id_articulo, stock_total)
+    VALUES (NEW.id_articulo, NEW.cantidad * v_signo)
+    ON CONFLICT (id_articulo) DO UPDATE
+    SET stock_total = app.articulo_stock_resumen.stock_total + (NEW.cantidad * v_signo),
+        ultima_actualizacion = now();
+
+    SELECT stock_total INTO v_new_stock
+    FROM app.articulo_stock_resumen
+    WHERE id_articulo = NEW.id_articulo;
+
+    UPDATE app.movimiento_articulo
+    SET stock_resultante = v_new_stock
+    WHERE id = NEW.id;
+  ELSIF (TG_OP = 'UPDATE') THEN
+    UPDATE app.articulo_stock_resumen
+    SET stock_total = stock_total - (OLD.cantidad * v_signo) + (NEW.cantidad * v_signo),
+        ultima_actualizacion = now()
+    WHERE id_articulo = NEW.id_articulo;
+  END IF;
+  RETURN NULL;
+END;
+$fn$ LANGUAGE plpgsql;
+
+ALTER TABLE app.movimiento_articulo DISABLE TRIGGER trg_sync_stock_resumen_ins;
+ALTER TABLE app.movimiento_articulo DISABLE TRIGGER trg_sync_stock_resumen_upd;
+CREATE TRIGGER trg_sync_stock_resumen_bench_row
+AFTER INSERT OR UPDATE ON app.movimiento_articulo
+FOR EACH ROW EXECUTE FUNCTION app.fn_sync_stock_resumen_bench_row();
+"""
+
+INSERT_SQL = """
+    INSERT INTO app.movimiento_articulo (id_articulo, id_tipo_movimiento, cantidad, id_deposito, observacion)
+    SELECT a.id, %s, 1 + (random() * 5)::int, %s, 'bench_stock_trigger'
+    FROM unnest(%s::bigint[]) AS a(id)
+"""
+
+
+def _round_timings(cur: psycopg.Cursor, rounds: int, params: tuple) -> List[float]:
+    # The first (warm-up) document is not counted
+    cur.execute(INSERT_SQL, params)
+    timings: List[float] = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        cur.execute(INSERT_SQL, params)
+        timings.append((time.perf_counter() - started) * 1000.0)
+    return timings
+
+
+def _report(label: str, timings: List[float], lines: int) -> float:
+    median = statistics.median(timings)
+    docs_per_s = 1000.0 / median if median else 0.0
+    print(f"{label:<16} p50 {median:>9.2f} ms/doc   máx {max(timings):>9.2f} ms   {docs_per_s:>7.1f} doc/s   {docs_per_s * lines:>9.0f} líneas/s")
+    return median
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=200, help="Movements per document (default: 200)")
+    parser.add_argument("--rounds", type=int, default=20, help="Documents per trigger version (default: 20)")
+    parser.add_argument("--dsn", default=None, help="Connection string (default: DATABASE_URL / .env)")
+    args = parser.parse_args()
+
+    dsn = args.dsn or load_config().database_url
+    with psycopg.connect(dsn) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id FROM app.articulo ORDER BY id LIMIT %s", (args.lines,))
+            article_ids = [row[0] for row in cur.fetchall()]
+            cur.execute("SELECT id FROM ref.deposito ORDER BY id LIMIT 1")
+            deposito = cur.fetchone()
+            cur.execute("SELECT id FROM ref.tipo_movimiento_articulo WHERE signo_stock > 0 ORDER BY id LIMIT 1")
+            tipo = cur.fetchone()
+            if not article_ids or not deposito or not tipo:
+                print("Se necesitan artículos, un depósito y un tipo de movimiento de ingreso.")
+                return 1
+            # Same article list repeated up to --lines movements
+            lines = (article_ids * (args.lines // len(article_ids) + 1))[: args.lines]
+            params = (tipo[0], deposito[0], lines)
+
+            try:
+                cur.execute("SAVEPOINT bench")
+                statement = _round_timings(cur, args.rounds, params)
+                cur.execute("ROLLBACK TO SAVEPOINT bench")
+
+                cur.execute(LEGACY_TRIGGER_SQL)
+                row_level = _round_timings(cur, args.rounds, params)
+            finally:
+                conn.rollback()
+
+    print(f"{args.rounds} documentos de {len(lines)} líneas")
+    before = _report("por fila", row_level, len(lines))
+    after = _report("por sentencia", statement, len(lines))
+    if after:
+        print(f"Mejora: {before / after:.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,379 @@
+"""
+AfipService.authorize_invoices against a local stand-in WSFE server.
+
+The server speaks SOAP over HTTP with a reduced WSFEv1 WSDL and numbers
+vouchers like AFIP does: each FECAEDetRequest must carry the next number of
+its PtoVta/CbteTipo, otherwise it is rejected with an observation. WSAA is
+skipped with a token provider.
+"""
+
+import datetime as dt
+import threading
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+import pytest
+
+pytest.importorskip("zeep")
+
+from desktop_app.services.afip_service import AfipService, AfipToken
+
+NS = "http://ar.gov.afip.dif.FEV1/"
+TOKEN = "token-de-prueba"
+SIGN = "firma-de-prueba"
+CUIT = "20-11111111-2"
+
+# (operation, request element fields)
+OPERATIONS = {
+    "FECompUltimoAutorizado": (
+        '<s:element name="Auth" type="tns:FEAuthRequest"/>'
+        '<s:element name="PtoVta" type="s:int"/>'
+        '<s:element name="CbteTipo" type="s:int"/>',
+        "FERecuperaLastCbteResponse",
+    ),
+    "FECompTotXRequest": (
+        '<s:element name="Auth" type="tns:FEAuthRequest"/>',
+        "FERegXReqResponse",
+    ),
+    "FECAESolicitar": (
+        '<s:element name="Auth" type="tns:FEAuthRequest"/>'
+        '<s:element name="FeCAEReq" type="tns:FECAERequest"/>',
+        "FECAEResponse",
+    ),
+}
+
+TYPES = """
+<s:complexType name="FEAuthRequest"><s:sequence>
+  <s:element minOccurs="0" name="Token" type="s:string"/>
+  <s:element minOccurs="0" name="Sign" type="s:string"/>
+  <s:element name="Cuit" type="s:long"/>
+</s:sequence></s:complexType>
+<s:complexType name="Err"><s:sequence>
+  <s:element name="Code" type="s:int"/>
+  <s:element minOccurs="0" name="Msg" type="s:string"/>
+</s:sequence></s:complexType>
+<s:complexType name="ArrayOfErr"><s:sequence>
+  <s:element minOccurs="0" maxOccurs="unbounded" name="Err" type="tns:Err"/>
+</s:sequence></s:complexType>
+<s:complexType name="Obs"><s:sequence>
+  <s:element name="Code" type="s:int"/>
+  <s:element minOccurs="0" name="Msg" type="s:string"/>
+</s:sequence></s:complexType>
+<s:complexType name="ArrayOfObs"><s:sequence>
+  <s:element minOccurs="0" maxOccurs="unbounded" name="Obs" type="tns:Obs"/>
+</s:sequence></s:complexType>
+<s:complexType name="AlicIva"><s:sequence>
+  <s:element name="Id" type="s:int"/>
+  <s:element name="BaseImp" type="s:double"/>
+  <s:element name="Importe" type="s:double"/>
+</s:sequence></s:complexType>
+<s:complexType name="ArrayOfAlicIva"><s:sequence>
+  <s:element minOccurs="0" maxOccurs="unbounded" name="AlicIva" type="tns:AlicIva"/>
+</s:sequence></s:complexType>
+<s:complexType name="FECAECabRequest"><s:sequence>
+  <s:element name="CantReg" type="s:int"/>
+  <s:element name="PtoVta" type="s:int"/>
+  <s:element name="CbteTipo" type="s:int"/>
+</s:sequence></s:complexType>
+<s:complexType name="FECAEDetRequest"><s:sequence>
+  <s:element name="Concepto" type="s:int"/>
+  <s:element name="DocTipo" type="s:int"/>
+  <s:element name="DocNro" type="s:long"/>
+  <s:element name="CbteDesde" type="s:long"/>
+  <s:element name="CbteHasta" type="s:long"/>
+  <s:element minOccurs="0" name="CbteFch" type="s:string"/>
+  <s:element name="ImpTotal" type="s:double"/>
+  <s:element name="ImpTotConc" type="s:double"/>
+  <s:element name="ImpNeto" type="s:double"/>
+  <s:element name="ImpOpEx" type="s:double"/>
+  <s:element name="ImpTrib" type="s:double"/>
+  <s:element name="ImpIVA" type="s:double"/>
+  <s:element minOccurs="0" name="MonId" type="s:string"/>
+  <s:element name="MonCotiz" type="s:double"/>
+  <s:element minOccurs="0" name="Iva" type="tns:ArrayOfAlicIva"/>
+</s:sequence></s:complexType>
+<s:complexType name="ArrayOfFECAEDetRequest"><s:sequence>
+  <s:element minOccurs="0" maxOccurs="unbounded" name="FECAEDetRequest" type="tns:FECAEDetRequest"/>
+</s:sequence></s:complexType>
+<s:complexType name="FECAERequest"><s:sequence>
+  <s:element minOccurs="0" name="FeCabReq" type="tns:FECAECabRequest"/>
+  <s:element minOccurs="0" name="FeDetReq" type="tns:ArrayOfFECAEDetRequest"/>
+</s:sequence></s:complexType>
+<s:complexType name="FECAEDetResponse"><s:sequence>
+  <s:element name="Concepto" type="s:int"/>
+  <s:element name="DocTipo" type="s:int"/>
+  <s:element name="DocNro" type="s:long"/>
+  <s:element name="CbteDesde" type="s:long"/>
+  <s:element name="CbteHasta" type="s:long"/>
+  <s:element minOccurs="0" name="CbteFch" type="s:string"/>
+  <s:element minOccurs="0" name="Resultado" type="s:string"/>
+  <s:element minOccurs="0" name="Observaciones" type="tns:ArrayOfObs"/>
+  <s:element minOccurs="0" name="CAE" type="s:string"/>
+  <s:element minOccurs="0" name="CAEFchVto" type="s:string"/>
+</s:sequence></s:complexType>
+<s:complexType name="ArrayOfFECAEDetResponse"><s:sequence>
+  <s:element minOccurs="0" maxOccurs="unbounded" name="FECAEDetResponse" type="tns:FECAEDetResponse"/>
+</s:sequence></s:complexType>
+<s:complexType name="FECAEResponse"><s:sequence>
+  <s:element minOccurs="0" name="FeDetResp" type="tns:ArrayOfFECAEDetResponse"/>
+  <s:element minOccurs="0" name="Errors" type="tns:ArrayOfErr"/>
+</s:sequence></s:complexType>
+<s:complexType name="FERecuperaLastCbteResponse"><s:sequence>
+  <s:element name="PtoVta" type="s:int"/>
+  <s:element name="CbteTipo" type="s:int"/>
+  <s:element name="CbteNro" type="s:int"/>
+  <s:element minOccurs="0" name="Errors" type="tns:ArrayOfErr"/>
+</s:sequence></s:complexType>
+<s:complexType name="FERegXReqResponse"><s:sequence>
+  <s:element name="RegXReq" type="s:int"/>
+  <s:element minOccurs="0" name="Errors" type="tns:ArrayOfErr"/>
+</s:sequence></s:complexType>
+"""
+
+
+def _wsdl(location: str) -> str:
+    elements = "".join(
+        f'<s:element name="{op}"><s:complexType><s:sequence>{fields}</s:sequence></s:complexType></s:element>'
+        f'<s:element name="{op}Response"><s:complexType><s:sequence>'
+        f'<s:element minOccurs="0" name="{op}Result" type="tns:{result}"/>'
+        f"</s:sequence></s:complexType></s:element>"
+        for op, (fields, result) in OPERATIONS.items()
+    )
+    messages = "".join(
+        f'<wsdl:message name="{op}SoapIn"><wsdl:part name="parameters" element="tns:{op}"/></wsdl:message>'
+        f'<wsdl:message name="{op}SoapOut"><wsdl:part name="parameters" element="tns:{op}Response"/></wsdl:message>'
+        for op in OPERATIONS
+    )
+    port_ops = "".join(
+        f'<wsdl:operation name="{op}"><wsdl:input message="tns:{op}SoapIn"/>'
+        f'<wsdl:output message="tns:{op}SoapOut"/></wsdl:operation>'
+        for op in OPERATIONS
+    )
+    binding_ops = "".join(
+        f'<wsdl:operation name="{op}"><soap:operation soapAction="{NS}{op}" style="document"/>'
+        '<wsdl:input><soap:body use="literal"/></wsdl:input>'
+        '<wsdl:output><soap:body use="literal"/></wsdl:output></wsdl:operation>'
+        for op in OPERATIONS
+    )
+    return (
+        '<?xml version="1.0" encoding="utf-8"?>'
+        '<wsdl:definitions xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/" '
+        'xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/" '
+        f'xmlns:s="http://www.w3.org/2001/XMLSchema" xmlns:tns="{NS}" targetNamespace="{NS}">'
+        f'<wsdl:types><s:schema elementFormDefault="qualified" targetNamespace="{NS}">'
+        f"{TYPES}{elements}</s:schema></wsdl:types>"
+        f'{messages}<wsdl:portType name="ServiceSoap">{port_ops}</wsdl:portType>'
+        '<wsdl:binding name="ServiceSoap" type="tns:ServiceSoap">'
+        '<soap:binding transport="http://schemas.xmlsoap.org/soap/http"/>'
+        f"{binding_ops}</wsdl:binding>"
+        '<wsdl:service name="Service"><wsdl:port name="ServiceSoap" binding="tns:ServiceSoap">'
+        f'<soap:address location="{escape(location)}"/></wsdl:port></wsdl:service>'
+        "</wsdl:definitions>"
+    )
+
+
+def _local(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _child(el: ET.Element, name: str) -> ET.Element:
+    return next(c for c in el if _local(c.tag) == name)
+
+
+def _text(el: ET.Element, name: str) -> str:
+    return (_child(el, name).text or "").strip()
+
+
+def _xml(tag: str, fields: Iterable[Tuple[str, Any]]) -> str:
+    return f"<{tag}>" + "".join(f"<{k}>{escape(str(v))}</{k}>" for k, v in fields) + f"</{tag}>"
+
+
+class StandInWsfe:
+    """
+    WSFE state: last authorized number per (PtoVta, CbteTipo). A voucher
+    whose DocNro is in `reject` gets an observation instead of a CAE.
+    """
+
+    def __init__(self, last: Dict[Tuple[int, int], int], reject: Iterable[int] = (), reg_x_req: int = 250):
+        self.last = dict(last)
+        self.reject = set(reject)
+        self.reg_x_req = reg_x_req
+        self.lots: List[Tuple[int, int, List[int]]] = []
+        self.last_number_calls = 0
+        self.lock = threading.Lock()
+
+    def handle(self, op: ET.Element) -> str:
+        auth = _child(op, "Auth")
+        assert (_text(auth, "Token"), _text(auth, "Sign"), _text(auth, "Cuit")) == (TOKEN, SIGN, "20111111112")
+        name = _local(op.tag)
+        with self.lock:
+            if name == "FECompUltimoAutorizado":
+                key = (int(_text(op, "PtoVta")), int(_text(op, "CbteTipo")))
+                self.last_number_calls += 1
+                body = _xml("FECompUltimoAutorizadoResult", [
+                    ("PtoVta", key[0]), ("CbteTipo", key[1]), ("CbteNro", self.last.get(key, 0)),
+                ])
+            elif name == "FECompTotXRequest":
+                body = _xml("FECompTotXRequestResult", [("RegXReq", self.reg_x_req)])
+            else:
+                body = "<FECAESolicitarResult>" + self._solicitar(_child(op, "FeCAEReq")) + "</FECAESolicitarResult>"
+        return f'<{name}Response xmlns="{NS}">{body}</{name}Response>'
+
+    def _solicitar(self, req: ET.Element) -> str:
+        cab = _child(req, "FeCabReq")
+        key = (int(_text(cab, "PtoVta")), int(_text(cab, "CbteTipo")))
+        dets = [d for d in _child(req, "FeDetReq") if _local(d.tag) == "FECAEDetRequest"]
+        assert int(_text(cab, "CantReg")) == len(dets)
+        self.lots.append((key[0], key[1], [int(_text(d, "CbteDesde")) for d in dets]))
+
+        out = []
+        for det in dets:
+            numero = int(_text(det, "CbteDesde"))
+            doc_nro = int(_text(det, "DocNro"))
+            fields = [(k, _text(det, k)) for k in ("Concepto", "DocTipo", "DocNro", "CbteDesde", "CbteHasta", "CbteFch")]
+            if numero != self.last.get(key, 0) + 1:
+                obs = (10016, "El numero o fecha del comprobante no se corresponde con el proximo a autorizar.")
+            elif doc_nro in self.reject:
+                obs = (10015, "El receptor informado no es valido.")
+            else:
+                obs = None
+            if obs is None:
+                self.last[key] = numero
+                cae = f"7{key[0]:04d}{key[1]:03d}{numero:06d}"
+                out.append(_xml("FECAEDetResponse", fields + [("Resultado", "A"), ("CAE", cae), ("CAEFchVto", "20261026")]))
+            else:
+                observaciones = "<Observaciones>" + _xml("Obs", [("Code", obs[0]), ("Msg", obs[1])]) + "</Observaciones>"
+                out.append(
+                    _xml("FECAEDetResponse", fields + [("Resultado", "R")]).replace(
+                        "</FECAEDetResponse>", observaciones + "</FECAEDetResponse>"
+                    )
+                )
+        return "<FeDetResp>" + "".join(out) + "</FeDetResp>"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        host, port = self.server.server_address[:2]
+        self._send(_wsdl(f"http://{host}:{port}/wsfev1/service.asmx"))
+
+    def do_POST(self) -> None:
+        envelope = ET.fromstring(self.rfile.read(int(self.headers["Content-Length"])))
+        body = next(el for el in envelope if _local(el.tag) == "Body")
+        response = self.server.wsfe.handle(body[0])
+        self._send(
+            '<?xml version="1.0" encoding="utf-8"?>'
+            '<soap:Envelope xmlns:soap="http://schemas.xmlsoap.org/soap/envelope/">'
+            f"<soap:Body>{response}</soap:Body></soap:Envelope>"
+        )
+
+    def _send(self, text: str) -> None:
+        data = text.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+@pytest.fixture
+def serve_wsfe():
+    servers = []
+
+    def start(wsfe: StandInWsfe) -> AfipService:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        server.wsfe = wsfe
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        host, port = server.server_address[:2]
+        expires_at = dt.datetime.utcnow() + dt.timedelta(hours=12)
+        return AfipService(
+            CUIT,
+            "sin-certificado.crt",
+            "sin-clave.key",
+            wsfe_wsdl=f"http://{host}:{port}/wsfev1/service.asmx?WSDL",
+            token_provider=lambda: AfipToken(token=TOKEN, sign=SIGN, expires_at=expires_at),
+        )
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def _voucher(doc_nro: int, cbte_tipo: int = 6, pto_vta: int = 3) -> Dict[str, Any]:
+    return {
+        "PtoVta": pto_vta,
+        "CbteTipo": cbte_tipo,
+        "Concepto": 1,
+        "DocTipo": 96,
+        "DocNro": doc_nro,
+        "CbteFch": "20261016",
+        "ImpTotal": 121,
+        "ImpNeto": 100,
+        "ImpIVA": 21,
+        "Iva": [{"Id": 5, "BaseImp": 100, "Importe": 21}],
+    }
+
+
+def _numbers(results: List[Dict[str, Any]]) -> List[Tuple[bool, int, int, Optional[int]]]:
+    return [(r["success"], r["PtoVta"], r["CbteTipo"], r["CbteNro"]) for r in results]
+
+
+def test_lots_are_split_and_numbered_per_group(serve_wsfe):
+    wsfe = StandInWsfe(last={(3, 6): 40, (3, 1): 7})
+    afip = serve_wsfe(wsfe)
+    tipos = [6, 1, 6, 6, 1, 6, 6]
+
+    results = afip.authorize_invoices([_voucher(1000 + n, t) for n, t in enumerate(tipos)], max_lot_size=2)
+
+    assert _numbers(results) == [
+        (True, 3, 6, 41), (True, 3, 1, 8), (True, 3, 6, 42), (True, 3, 6, 43),
+        (True, 3, 1, 9), (True, 3, 6, 44), (True, 3, 6, 45),
+    ]
+    assert wsfe.lots == [(3, 6, [41, 42]), (3, 6, [43, 44]), (3, 6, [45]), (3, 1, [8, 9])]
+    assert wsfe.last_number_calls == 2
+    assert results[0]["CAE"] == "70003006000041"
+    assert results[0]["CAEFchVto"] == "20261026"
+
+
+def test_lot_size_defaults_to_fecomptotxrequest(serve_wsfe):
+    wsfe = StandInWsfe(last={(3, 6): 0}, reg_x_req=2)
+    afip = serve_wsfe(wsfe)
+
+    results = afip.authorize_invoices([_voucher(1000 + n) for n in range(3)])
+
+    assert all(r["success"] for r in results)
+    assert wsfe.lots == [(3, 6, [1, 2]), (3, 6, [3])]
+
+
+def test_partial_rejection_retries_the_vouchers_left_out_of_sequence(serve_wsfe):
+    wsfe = StandInWsfe(last={(3, 6): 10}, reject={3002})
+    afip = serve_wsfe(wsfe)
+
+    results = afip.authorize_invoices([_voucher(3001 + n) for n in range(4)], max_lot_size=4)
+
+    assert _numbers(results) == [(True, 3, 6, 11), (False, 3, 6, 12), (True, 3, 6, 12), (True, 3, 6, 13)]
+    assert results[1]["error"] == "10015: El receptor informado no es valido."
+    # The lot is sent once; 3003/3004 were out of sequence and are retried after a new FECompUltimoAutorizado
+    assert wsfe.lots == [(3, 6, [11, 12, 13, 14]), (3, 6, [12, 13])]
+    assert wsfe.last_number_calls == 2
+    assert wsfe.last[(3, 6)] == 13
+
+
+def test_a_voucher_is_retried_only_once(serve_wsfe):
+    wsfe = StandInWsfe(last={(3, 6): 0}, reject={5001, 5002})
+    afip = serve_wsfe(wsfe)
+
+    results = afip.authorize_invoices([_voucher(n) for n in (5000, 5001, 5002, 5003)], max_lot_size=4)
+
+    assert _numbers(results) == [(True, 3, 6, 1), (False, 3, 6, 2), (False, 3, 6, 2), (False, 3, 6, 3)]
+    assert wsfe.lots == [(3, 6, [1, 2, 3, 4]), (3, 6, [2, 3])]
+    assert results[2]["error"].startswith("10015:")
+    # 5003 was out of sequence twice; it stays pending for the next run
+    assert results[3]["error"].startswith("10016:")
+    assert wsfe.last[(3, 6)] == 1